@@ -1,9 +1,20 @@
-from typing import Dict, Any
+import hashlib
+import json
+import time
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from utils.openai_client import openai_client
 from utils.ollama_client import ollama_client
+from utils.llm_telemetry import llm_call_site
+from utils.answer_cache import edu_answer_cache
+from utils.answer_bank import answer_bank
+from agents.safety_agent import moderate_generation
 from config.settings import settings
 
 
+# 请求未提供年级时使用的年级，预生成回答库也按此年级生成
+DEFAULT_GRADE = "小学低年级"
+
+
 class EduAgent:
     """
     教育代理，负责教育内容问答
@@ -28,6 +39,23 @@ class EduAgent:
             "艺术", "音乐", "体育", "道德与法治", "信息技术"
         ]
         
+        # 学科分类的系统提示
+        self.subject_system_prompt = f"""你是一个教育领域的专家，能够准确判断问题所属的学科。
+请分析用户给出的问题最适合归类到哪个学科领域。
+可选的学科包括：{', '.join(self.subjects)}
+请直接回答最相关的学科名称，如果不确定，请回答"通用"。"""
+        
+        # 回答问题时的固定要求，追加在系统提示之后
+        self.answer_requirements = """
+        请根据以下要求回答：
+        1. 使用适合该年龄段的语言和例子
+        2. 回答要准确、科学
+        3. 可以适当增加趣味性
+        4. 鼓励孩子继续探索和学习
+        5. 如果问题不清晰，可以询问更多细节
+        6. 结合推荐的教学方式进行回答
+        """
+        
         # 定义年龄段特点和适配策略
         self.age_groups = {
             "5-6岁": {
@@ -52,39 +80,33 @@ class EduAgent:
             }
         }
     
+    @llm_call_site("subject")
     def _get_subject_context(self, question: str) -> str:
         """
         使用大模型分析问题涉及的学科领域
         """
-        # 构造提示词
-        prompt = f"""
-        请分析以下问题最适合归类到哪个学科领域：
-        
-        问题: "{question}"
-        
-        可选的学科包括：{', '.join(self.subjects)}
-        
-        请直接回答最相关的学科名称，如果不确定，请回答"通用"。
-        """
-        
+        # 学科列表和回复要求固定在系统消息中，问题放在最后
         messages = [
-            {"role": "system", "content": "你是一个教育领域的专家，能够准确判断问题所属的学科。"},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": self.subject_system_prompt},
+            {"role": "user", "content": f'问题: "{question}"'}
         ]
         
         # 根据配置选择使用OpenAI还是Ollama
         try:
+            # 学科分类结果近似确定，开启结果缓存
             if settings.use_ollama:
                 response = ollama_client.chat_completion(
                     messages=messages,
                     temperature=0.1,
-                    max_tokens=10
+                    max_tokens=10,
+                    cache=True
                 )
             else:
                 response = openai_client.chat_completion(
                     messages=messages,
                     temperature=0.1,
-                    max_tokens=10
+                    max_tokens=10,
+                    cache=True
                 )
             subject = response.strip()
             # 验证返回的学科是否在我们的学科列表中
@@ -129,71 +151,172 @@ class EduAgent:
         else:
             return "通用"
     
-    def answer_question(self, question: str, user_info: Dict[str, Any]) -> str:
-        """
-        使用OpenAI智能回答教育相关问题
+    @property
+    def answer_namespace(self) -> str:
+        """回答提示词和所用模型的指纹，任一变化时预生成的回答不再使用"""
+        if settings.use_ollama:
+            model = f"ollama:{getattr(settings, 'ollama_default_model', '')}"
+        else:
+            model = "openai:deepseek-chat"
+        raw = json.dumps(
+            [model, self.system_prompt, self.answer_requirements, self.age_groups], ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+    
+    def build_answer_messages(self, question: str, user_age: str, user_grade: str, subject: str) -> List[Dict[str, str]]:
         """
-        if user_info is None:
-            user_info = {}
-            
-        user_age = user_info.get("age", "7-8岁")
-        user_grade = user_info.get("grade", "小学低年级")
-        
-        # 获取问题涉及的学科
-        subject = self._get_subject_context(question)
+        构造回答问题的消息，实时问答和预生成回答库共用
         
+        Args:
+            question: 问题内容
+            user_age: 年龄段
+            user_grade: 年级
+            subject: 学科
+        """
         # 获取年龄段特点
         age_group_info = self.age_groups.get(user_age, self.age_groups["7-8岁"])
         
-        # 构造提示词
-        prompt = f"""
+        # 系统提示和回答要求固定不变；同一孩子的年龄信息其次；
+        # 每轮变化的学科和问题放在最后，保证前缀稳定、可复用KV缓存
+        return [
+            {"role": "system", "content": self.system_prompt + self.answer_requirements},
+            {"role": "user", "content": f"""
         用户是一个{user_age}的孩子{age_group_info["description"]}，正在{user_grade}学习。
-        他提出了一个问题: "{question}"
-        
-        该问题可能涉及的学科领域: {subject}
         该年龄段特点: {age_group_info["characteristics"]}
         推荐教学方式: {age_group_info["approach"]}
         
-        请根据以下要求回答：
-        1. 使用适合该年龄段的语言和例子
-        2. 回答要准确、科学
-        3. 可以适当增加趣味性
-        4. 鼓励孩子继续探索和学习
-        5. 如果问题不清晰，可以询问更多细节
-        6. 结合推荐的教学方式进行回答
-        """
-        
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": prompt}
+        该问题可能涉及的学科领域: {subject}
+        他提出了一个问题: "{question}"
+        """}
         ]
-        
+    
+    def generate_answer(
+        self,
+        messages: List[Dict[str, str]],
+        on_token: Optional[Callable[[str], None]] = None,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        调用模型生成回答，不经过缓存和输出审查
+        """
         # 根据配置选择使用OpenAI还是Ollama
         if settings.use_ollama:
-            response = ollama_client.chat_completion(
+            return ollama_client.chat_completion(
                 messages=messages,
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=500,
+                on_token=on_token,
+                session_id=session_id
             )
-        else:
-            response = openai_client.chat_completion(
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
+        return openai_client.chat_completion(
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            on_token=on_token,
+            session_id=session_id
+        )
+    
+    def answer_question(
+        self,
+        question: str,
+        user_info: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+        subject: Optional[str] = None
+    ) -> str:
+        """
+        使用OpenAI智能回答教育相关问题
+        
+        Args:
+            question: 问题内容
+            user_info: 用户信息（年龄、年级等）
+            on_token: 增量文本回调，提供时以流式方式生成回答
+            subject: 已知的学科（如分诊结果），为空时调用模型判断
+        
+        user_info中包含session_id时，同一会话的多轮问答会复用模型上下文。
+        """
+        return self._answer_question(question, user_info, on_token, subject)[0]
+    
+    @llm_call_site("edu")
+    def _answer_question(
+        self,
+        question: str,
+        user_info: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+        subject: Optional[str] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        回答问题并返回回答和学科；命中预生成回答库或近似问题缓存时使用条目记录的学科，
+        未命中才调用模型判断学科，参数同answer_question
+        """
+        if user_info is None:
+            user_info = {}
+            
+        user_age = user_info.get("age", "7-8岁")
+        user_grade = user_info.get("grade", DEFAULT_GRADE)
+        age_group = user_age if user_age in self.age_groups else "7-8岁"
+        session_id = user_info.get("session_id")
+        # 带会话上下文生成的回答依赖之前的对话，不能给其他孩子复用，也不应复用别人的回答
+        cache_enabled = getattr(settings, 'edu_answer_cache_enabled', True) and not session_id
+        cache_namespace = f"{age_group}|{user_grade}"
+        
+        # 先查预生成回答库（按默认年级生成），再查同一年龄段和年级问过的意思相同的问题；
+        # 复用的回答仍按当前孩子的设置审查
+        cached = None
+        if getattr(settings, 'answer_bank_enabled', True) and user_grade == DEFAULT_GRADE:
+            cached = answer_bank.lookup(age_group, question, self.answer_namespace)
+        if cached is None and cache_enabled:
+            cached = edu_answer_cache.get(cache_namespace, question)
+        if cached is not None:
+            answer = moderate_generation(
+                lambda callback: self._replay_answer(cached.answer, callback), on_token, user_info.get("user_id")
             )
+            return answer, subject or cached.subject
+        
+        # 未命中时才获取问题涉及的学科
+        if not subject:
+            subject = self._get_subject_context(question)
+        
+        messages = self.build_answer_messages(question, user_age, user_grade, subject)
+        
+        def generate(callback: Optional[Callable[[str], None]]) -> str:
+            start = time.perf_counter()
+            response = self.generate_answer(messages, on_token=callback, session_id=session_id)
+            # 缓存审查前的完整回答，命中时再按提问孩子的屏蔽词审查；被截断的生成不会走到这里
+            if cache_enabled:
+                edu_answer_cache.set(cache_namespace, question, response, time.perf_counter() - start, subject)
+            return response
         
-        return response
+        # 边生成边审查回答，敏感词在下发前就被处理
+        return moderate_generation(generate, on_token, user_info.get("user_id")), subject
     
-    def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _replay_answer(answer: str, on_token: Optional[Callable[[str], None]]) -> str:
+        """
+        以生成的方式返回缓存的回答，流式请求时整段回调一次
+        """
+        if on_token is not None and answer:
+            on_token(answer)
+        return answer
+    
+    def process_request(
+        self,
+        request: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         """
         处理教育问答请求
+        
+        Args:
+            request: 请求信息
+            on_token: 增量文本回调，提供时回答会逐块回调
         """
         question = request.get("content", "")
         user_info = {
             "user_id": request.get("user_id", "unknown_user"),
             "age": request.get("age", "7-8岁"),
-            "grade": request.get("grade", "小学低年级"),
-            "grade_level": request.get("grade_level", "小学低年级")
+            "grade": request.get("grade", DEFAULT_GRADE),
+            "grade_level": request.get("grade_level", DEFAULT_GRADE),
+            "session_id": request.get("session_id")
         }
         
         # 如果提供了grade_level，根据它来确定age
@@ -208,12 +331,13 @@ class EduAgent:
             elif "五" in grade_level or "六" in grade_level:
                 user_info["age"] = "11-12岁"
         
-        answer = self.answer_question(question, user_info)
+        # 学科只判断一次：已有分诊结果时直接使用，否则命中缓存时取条目的学科，未命中时才调用模型
+        answer, subject = self._answer_question(question, user_info, on_token, request.get("subject"))
         
         return {
             "agent": "edu",
             "question": question,
             "answer": answer,
-            "subject": self._get_subject_context(question),
+            "subject": subject,
             "status": "processed"
         }
\ No newline at end of file
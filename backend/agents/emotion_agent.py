@@ -1,9 +1,71 @@
-from typing import Dict, Any, List
+import random
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from utils.openai_client import openai_client
 from utils.ollama_client import ollama_client
+from utils.llm_telemetry import llm_call_site
+from utils.emotion_lexicon import emotion_lexicon, EmotionPrediction
+from agents.safety_agent import moderate_generation
 from config.settings import settings
 
 
+class _ReplySplitter:
+    """
+    拆分单次调用模式的流式回复：分析部分留作解析，"回复:"之后的内容逐块转发
+
+    标记和分析行前缀兼容全角冒号"："，中文模型经常这样输出。
+    """
+    
+    MARKER = "回复:"
+    ANALYSIS_PREFIXES = ("情绪类型:", "情绪强度:", "分析理由:", "应对建议:")
+    
+    def __init__(self, on_token: Optional[Callable[[str], None]] = None):
+        self.on_token = on_token
+        self.header = ""
+        self.received = False
+        self._buffer = ""
+        self._started = False
+        self._parts: List[str] = []
+    
+    def _forward(self, text: str) -> None:
+        if not self._parts:
+            text = text.lstrip()
+        if text:
+            self._parts.append(text)
+            if self.on_token is not None:
+                self.on_token(text)
+    
+    def feed(self, token: str) -> None:
+        """输入一块模型输出，可直接作为on_token回调"""
+        self.received = True
+        if self._started:
+            self._forward(token)
+            return
+        self._buffer += token
+        # 全角和半角冒号都是一个字符，替换后位置不变
+        index = self._buffer.replace('：', ':').find(self.MARKER)
+        if index >= 0:
+            self._started = True
+            self.header = self._buffer[:index]
+            rest = self._buffer[index + len(self.MARKER):]
+            self._buffer = ""
+            self._forward(rest)
+    
+    def finish(self) -> str:
+        """
+        结束输入并返回回复；模型未按格式输出"回复:"时，把分析行以外的内容作为回复
+        """
+        if not self._started:
+            self.header = self._buffer
+            lines = [
+                line for line in self._buffer.split('\n')
+                if not line.strip().replace('：', ':').startswith(self.ANALYSIS_PREFIXES)
+            ]
+            self._started = True
+            self._forward("\n".join(lines).strip())
+        return "".join(self._parts)
+
+
 class EmotionAgent:
     """
     情感代理，负责情感陪伴和心理支持
@@ -66,29 +128,51 @@ class EmotionAgent:
                 "response_strategy": "耐心解答疑问，鼓励孩子继续探索"
             }
         }
+        
+        # 情绪分析的系统提示
+        self.analysis_system_prompt = f"""你是一个儿童情绪识别专家，请分析孩子表达的内容中体现的情绪，严格按照要求格式回复。
+可能的情绪类型包括：{', '.join(self.emotions.keys())}
+请按以下格式回复：
+情绪类型: [主要情绪]
+情绪强度: [低/中/高]
+分析理由: [简要说明判断依据]
+应对建议: [针对该情绪的初步应对建议]"""
+        
+        # 提供情感支持时的固定要求，追加在系统提示之后
+        self.support_requirements = """
+        请根据以下要求提供情感支持：
+        1. 表达理解和共情
+        2. 给予适当安慰
+        3. 保持积极正面的态度
+        4. 鼓励孩子表达更多感受
+        5. 结合推荐应对策略给出建设性建议
+        6. 用温暖、友善的语言
+        7. 如果情绪强度很高，建议寻求成人帮助
+        """
+        
+        # 单次调用模式：一次生成同时完成情绪识别和情感回复。分析部分与情绪分析的格式一致，
+        # 只保留情绪类型和强度两行，回复放在最后，孩子能尽早看到流式输出的回复
+        strategies = "\n".join(
+            f"{emotion}: {info['response_strategy']}" for emotion, info in self.emotions.items()
+        )
+        self.combined_system_prompt = self.system_prompt + self.support_requirements + f"""
+请同时完成情绪识别和情感回复，严格按照要求格式回复。
+可能的情绪类型及推荐应对策略：
+{strategies}
+请按以下格式回复，前两行各占一行，"回复:"之后是直接对孩子说的话：
+情绪类型: [主要情绪]
+情绪强度: [低/中/高]
+回复: [给孩子的情感支持回复]"""
     
+    @llm_call_site("emotion_analysis")
     def analyze_emotion(self, content: str) -> Dict[str, Any]:
         """
         分析用户表达的情绪
         """
-        # 构造提示词
-        emotion_types = list(self.emotions.keys())
-        prompt = f"""
-        请分析以下孩子表达的内容中体现的情绪：
-        "{content}"
-        
-        可能的情绪类型包括：{', '.join(emotion_types)}
-        
-        请按以下格式回复：
-        情绪类型: [主要情绪]
-        情绪强度: [低/中/高]
-        分析理由: [简要说明判断依据]
-        应对建议: [针对该情绪的初步应对建议]
-        """
-        
+        # 情绪类型和回复格式固定在系统消息中，孩子的表达放在最后
         messages = [
-            {"role": "system", "content": "你是一个儿童情绪识别专家，严格按照要求格式回复。"},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": self.analysis_system_prompt},
+            {"role": "user", "content": f'孩子表达的内容: "{content}"'}
         ]
         
         # 根据配置选择使用OpenAI还是Ollama
@@ -105,7 +189,13 @@ class EmotionAgent:
                 max_tokens=200
             )
         
-        # 解析响应
+        return self._parse_emotion_analysis(response)
+    
+    @staticmethod
+    def _parse_emotion_analysis(response: str) -> Dict[str, Any]:
+        """
+        解析情绪分析格式的回复，单次调用模式的回复前几行使用同一格式
+        """
         lines = response.strip().split('\n')
         result = {
             "emotion": "未知",
@@ -115,6 +205,7 @@ class EmotionAgent:
         }
         
         for line in lines:
+            line = line.strip().replace('：', ':')
             if line.startswith("情绪类型:"):
                 result["emotion"] = line.replace("情绪类型:", "").strip()
             elif line.startswith("情绪强度:"):
@@ -126,9 +217,24 @@ class EmotionAgent:
         
         return result
     
-    def provide_emotional_support(self, content: str, emotion_analysis: Dict[str, Any]) -> str:
+    @llm_call_site("emotion")
+    def provide_emotional_support(
+        self,
+        content: str,
+        emotion_analysis: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[Any] = None
+    ) -> str:
         """
         提供情感支持和陪伴
+        
+        Args:
+            content: 孩子表达的内容
+            emotion_analysis: 情绪分析结果
+            on_token: 增量文本回调，提供时以流式方式生成回复
+            session_id: 会话ID，同一会话的多轮陪伴会复用模型上下文
+            user_id: 用户ID，用于按该用户的过滤规则审查回复
         """
         emotion = emotion_analysis.get("emotion", "未知")
         intensity = emotion_analysis.get("intensity", "中")
@@ -140,54 +246,141 @@ class EmotionAgent:
             "response_strategy": "提供通用的情感支持"
         })
         
-        # 构造提示词
-        prompt = f"""
-        一个孩子表达了以下内容: "{content}"
+        # 固定要求放在系统消息中，每轮变化的情绪分析和孩子的表达放在最后
+        messages = [
+            {"role": "system", "content": self.system_prompt + self.support_requirements},
+            {"role": "user", "content": f"""
         情绪分析结果: 情绪类型为{emotion}，强度为{intensity}
         情绪描述: {emotion_info["description"]}
         初步应对建议: {suggestion}
         推荐应对策略: {emotion_info["response_strategy"]}
+        一个孩子表达了以下内容: "{content}"
+        """}
+        ]
         
-        请根据以下要求提供情感支持：
-        1. 表达理解和共情
-        2. 给予适当安慰
-        3. 保持积极正面的态度
-        4. 鼓励孩子表达更多感受
-        5. 结合推荐应对策略给出建设性建议
-        6. 用温暖、友善的语言
-        7. 如果情绪强度很高，建议寻求成人帮助
+        def generate(callback: Optional[Callable[[str], None]]) -> str:
+            # 根据配置选择使用OpenAI还是Ollama
+            if settings.use_ollama:
+                return ollama_client.chat_completion(
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=400,
+                    on_token=callback,
+                    session_id=session_id
+                )
+            return openai_client.chat_completion(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=400,
+                on_token=callback,
+                session_id=session_id
+            )
+        
+        # 边生成边审查回复，敏感词在下发前就被处理
+        return moderate_generation(generate, on_token, user_id)
+    
+    @llm_call_site("emotion")
+    def analyze_and_support(
+        self,
+        content: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[Any] = None
+    ) -> Tuple[Dict[str, Any], str]:
         """
+        一次调用同时完成情绪分析和情感支持
         
+        Args:
+            content: 孩子表达的内容
+            on_token: 增量文本回调，提供时以流式方式生成，只回调"回复:"之后的内容
+            session_id: 会话ID，同一会话的多轮陪伴会复用模型上下文
+            user_id: 用户ID，用于按该用户的过滤规则审查回复
+        
+        Returns:
+            (情绪分析结果, 情感支持回复)
+        """
         messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": self.combined_system_prompt},
+            {"role": "user", "content": f'孩子表达的内容: "{content}"'}
         ]
+        analysis: Dict[str, Any] = {}
         
-        # 根据配置选择使用OpenAI还是Ollama
-        if settings.use_ollama:
-            response = ollama_client.chat_completion(
-                messages=messages,
-                temperature=0.7,
-                max_tokens=400
-            )
-        else:
-            response = openai_client.chat_completion(
-                messages=messages,
-                temperature=0.7,
-                max_tokens=400
-            )
+        def generate(callback: Optional[Callable[[str], None]]) -> str:
+            splitter = _ReplySplitter(callback)
+            try:
+                # 根据配置选择使用OpenAI还是Ollama
+                client = ollama_client if settings.use_ollama else openai_client
+                response = client.chat_completion(
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    on_token=splitter.feed if callback is not None else None,
+                    session_id=session_id
+                )
+                if not splitter.received:
+                    splitter.feed(response)
+                return splitter.finish()
+            finally:
+                # 回复开始前分析部分已经完整，中途被输出审查截断时同样可用
+                analysis.update(self._parse_emotion_analysis(splitter.header))
         
-        return response
+        # 边生成边审查回复，敏感词在下发前就被处理
+        response = moderate_generation(generate, on_token, user_id)
+        return analysis, response
+    
+    def _lexicon_analysis(self, prediction: EmotionPrediction) -> Dict[str, Any]:
+        """
+        将本地情绪判断转换为与模型分析相同格式的情绪分析
+        """
+        return {
+            "emotion": prediction.emotion,
+            "intensity": prediction.intensity,
+            "reason": "命中情绪词: " + "、".join(prediction.cues),
+            "suggestion": self.emotions[prediction.emotion]["response_strategy"]
+        }
     
-    def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _compare_with_lexicon(prediction: Optional[EmotionPrediction], emotion_analysis: Dict[str, Any]) -> None:
+        """
+        记录本地判断与模型情绪分析的对比
+        """
+        if prediction is not None:
+            emotion_lexicon.record_comparison(prediction.emotion, emotion_analysis.get("emotion", "未知"))
+    
+    def _audit_lexicon(self, content: str, prediction: EmotionPrediction) -> None:
+        """
+        在后台调用模型分析情绪，核对直接采用的本地判断，不影响本次回复
+        """
+        def audit() -> None:
+            try:
+                self._compare_with_lexicon(prediction, self.analyze_emotion(content))
+            except Exception as e:
+                print(f"情绪词典抽样核对失败: {e}")
+        
+        threading.Thread(target=audit, daemon=True).start()
+    
+    def process_request(
+        self,
+        request: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         """
         处理情感陪伴请求
+        
+        Args:
+            request: 请求信息
+            on_token: 增量文本回调，提供时回复会逐块回调
         """
         content = request.get("content", "")
         user_id = request.get("user_id", "unknown_user")
         emotion_type = request.get("emotion_type", None)
+        support_response = None
+        
+        lexicon_enabled = getattr(settings, 'emotion_lexicon_enabled', True)
+        prediction = emotion_lexicon.predict(content, settings.emotion_lexicon_threshold) \
+            if lexicon_enabled and not emotion_type else None
         
-        # 如果指定了情绪类型，直接使用
+        # 如果指定了情绪类型，直接使用；其次使用分诊给出的情绪分析，再次使用有把握的本地判断
         if emotion_type and emotion_type in self.emotions:
             emotion_analysis = {
                 "emotion": emotion_type,
@@ -195,12 +388,30 @@ class EmotionAgent:
                 "reason": "用户指定",
                 "suggestion": self.emotions[emotion_type]["response_strategy"]
             }
+        elif request.get("emotion_analysis"):
+            emotion_analysis = request["emotion_analysis"]
+            self._compare_with_lexicon(prediction, emotion_analysis)
+        elif prediction and prediction.confidence >= settings.emotion_lexicon_threshold:
+            emotion_analysis = self._lexicon_analysis(prediction)
+            if random.random() < settings.emotion_lexicon_audit_rate:
+                self._audit_lexicon(content, prediction)
+        elif getattr(settings, 'emotion_single_call_enabled', True):
+            # 没有现成的情绪分析时，一次调用同时得到分析和回复
+            emotion_analysis, support_response = self.analyze_and_support(
+                content, on_token=on_token, session_id=request.get("session_id"), user_id=request.get("user_id")
+            )
+            self._compare_with_lexicon(prediction, emotion_analysis)
         else:
             # 分析情绪
             emotion_analysis = self.analyze_emotion(content)
+            self._compare_with_lexicon(prediction, emotion_analysis)
         
         # 提供情感支持
-        support_response = self.provide_emotional_support(content, emotion_analysis)
+        if support_response is None:
+            support_response = self.provide_emotional_support(
+                content, emotion_analysis, on_token=on_token, session_id=request.get("session_id"),
+                user_id=request.get("user_id")
+            )
         
         return {
             "agent": "emotion",
@@ -1,9 +1,24 @@
-from typing import Dict, Any, List, Optional, TypedDict, Annotated, Tuple
+from typing import Dict, Any, List, Optional, TypedDict, Annotated, Tuple, Callable, AsyncIterator
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
 import json
 from datetime import datetime
 import threading
+from config.settings import settings
+from utils.hierarchical_summary import hierarchical_summarizer
+from agents.memory_agent import MemoryAgent
+from utils.memory_store import user_memory_store
+from utils.speculation import SpeculativeRun, speculation_stats
+
+def _latest_error(previous: Optional[str], current: Optional[str]) -> Optional[str]:
+    """错误信息的合并规则：并行分支可能在同一步都写入，保留最新的非空值"""
+    return current if current is not None else previous
+
 
 # 定义全局状态模式
 class AgentState(TypedDict):
@@ -23,6 +38,9 @@ class AgentState(TypedDict):
     confidence: float
     target_agent: str
 
+    # 分诊结果（安全结论、目标代理、学科、情绪）
+    triage: Dict[str, Any]
+
     # 专业agent处理结果
     agent_results: Dict[str, Any]
 
@@ -31,6 +49,7 @@ class AgentState(TypedDict):
     long_term_context: Dict[str, Any]             # 长期记忆（用户画像）
     relevant_context: List[Dict[str, Any]]         # 当前相关上下文
     conversation_summary: Optional[str]             # 对话摘要
+    summary_state: Dict[str, Any]                  # 分层摘要状态（单轮→会话→长期）
     session_memory: Dict[str, Any]                 # 会话级记忆
 
     # 最终响应
@@ -38,17 +57,121 @@ class AgentState(TypedDict):
     response_metadata: Dict[str, Any]
 
     # 错误处理
-    error_message: Optional[str]
+    error_message: Annotated[Optional[str], _latest_error]
     retry_count: int
 
+class _ParallelBranches:
+    """
+    一次工作流执行中安全检查和意图分析两个并行分支共享的状态
+
+    - 本次执行的分诊调用只发起一次
+    - 安全检查确定内容被整体屏蔽时，意图分析分支取消尚未完成的调用
+    - 开启推测执行时，路由确定前启动的代理调用
+    """
+
+    def __init__(self):
+        self.blocked = asyncio.Event()
+        self.speculation: Optional[SpeculativeRun] = None
+        self._triage: Optional[asyncio.Future] = None
+
+    def triage(self, content: str) -> asyncio.Future:
+        """获取本次执行共用的分诊调用（首次调用时发起）"""
+        if self._triage is None:
+            from agents.triage_agent import TriageAgent
+
+            self._triage = asyncio.ensure_future(TriageAgent().atriage(content))
+        return self._triage
+
+    def block(self) -> None:
+        """安全检查确定内容被屏蔽"""
+        self.blocked.set()
+
+    async def unless_blocked(self, call: asyncio.Future) -> Any:
+        """
+        等待调用完成；安全检查先确定内容被屏蔽时取消调用
+
+        Args:
+            call: 意图分析的调用
+
+        Returns:
+            调用结果，被取消时为None
+        """
+        blocked = asyncio.ensure_future(self.blocked.wait())
+        try:
+            await asyncio.wait({call, blocked}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        finally:
+            blocked.cancel()
+        if call.done():
+            return call.result()
+        call.cancel()
+        return None
+
+    def resolve_speculation(self, target_agent: str, content: str) -> None:
+        """
+        路由确定后处理推测执行：与猜测一致且内容未被改写时保留，否则取消
+
+        Args:
+            target_agent: 路由结果
+            content: 交给代理的内容（可能已被安全检查改写）
+        """
+        run = self.speculation
+        if run is None or (run.agent == target_agent and run.content == content):
+            return
+        self.speculation = None
+        run.cancel(discarded=run.agent == target_agent)
+
+    def take_speculation(self, agent: str) -> Optional[SpeculativeRun]:
+        """取出与该代理一致的推测执行，没有时返回None"""
+        run = self.speculation
+        if run is None or run.agent != agent:
+            return None
+        self.speculation = None
+        return run
+
+    def close(self) -> None:
+        """工作流结束时取消未被采用的推测执行（如中途出错未走到代理节点）"""
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+
+
 @dataclass
 class HappyPartnerGraph:
     """Happy Partner LangGraph 工作流管理器"""
 
     def __init__(self):
         self.graph = StateGraph(AgentState)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 跨轮次保存每个用户的对话历史和分层摘要状态，与接口层共用全局记忆存储
+        self.memory_agent = MemoryAgent(store=user_memory_store)
         self._build_graph()
 
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取执行同步代理调用的线程池（首次使用时创建）"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'workflow_max_workers', 64),
+                    thread_name_prefix="workflow"
+                )
+            return self._executor
+
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        在线程池中执行同步调用并等待结果，期间事件循环可以处理其他会话
+
+        复制当前上下文，调用点标记和调度优先级在线程中仍然有效。
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(context.run, func, *args, **kwargs)
+        )
+
     def _build_graph(self):
         """构建LangGraph工作流 - 包含记忆管理"""
         # 添加节点
@@ -75,9 +198,11 @@ class HappyPartnerGraph:
 
         # 线性流程边
         self.graph.add_edge("input_processing", "context_enrichment")
+
+        # 安全检查和意图分析并行执行，两者都完成后再路由
         self.graph.add_edge("context_enrichment", "safety_check")
-        self.graph.add_edge("safety_check", "intent_analysis")
-        self.graph.add_edge("intent_analysis", "route_agent")
+        self.graph.add_edge("context_enrichment", "intent_analysis")
+        self.graph.add_edge(["safety_check", "intent_analysis"], "route_agent")
 
         # 条件路由边
         self.graph.add_conditional_edges(
@@ -139,6 +264,8 @@ class HappyPartnerGraph:
                 state["relevant_context"] = []
             if "conversation_summary" not in state:
                 state["conversation_summary"] = None
+            if not state.get("summary_state"):
+                state["summary_state"] = hierarchical_summarizer.new_state()
             if "session_memory" not in state:
                 state["session_memory"] = {}
 
@@ -240,110 +367,147 @@ class HappyPartnerGraph:
 
         return profile
 
-    def _safety_check(self, state: AgentState) -> AgentState:
-        """安全检查节点 - 优化版本，结合关键词过滤和智能分析"""
-        try:
-            from agents.safety_agent import SafetyAgent
+    async def _safety_check(self, state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        """
+        安全检查节点 - 关键词过滤
 
-            safety_agent = SafetyAgent()
+        与意图分析并行执行，只返回本节点更新的字段；内容被整体屏蔽时通知意图分析分支取消。
+        命中敏感词或家长屏蔽词时与SafetyAgent.filter_content的第一层过滤一样直接屏蔽，
+        不交给模型复核；分诊结果只用于路由、学科和情绪。
+        """
+        branches = self._get_branches(config)
+        content = state["content"]
+        try:
+            from agents.safety_agent import BLOCKED_CONTENT
 
-            # 第一步：快速关键词预过滤
-            is_pre_safe, pre_issues = self._quick_keyword_filter(state["content"])
+            # 快速关键词预过滤（含该用户的家长屏蔽词）；首次使用或到了核对时间时会同步查询数据库，放到线程池执行
+            is_pre_safe, pre_issues = await self._run_blocking(self._quick_keyword_filter, content, state["user_id"])
 
             if is_pre_safe and not pre_issues:
                 # 预过滤通过，直接判定为安全，跳过大模型调用
-                state["safety_check_passed"] = True
-                state["safety_issues"] = []
-                state["filtered_content"] = None
-                print(f"安全检查：内容 '{state['content']}' 通过预过滤")
-                return state
-
-            # 第二步：对于有潜在风险的内容，使用精确的大模型分析
-            safety_result = safety_agent.filter_content(state["content"])
-
-            state["safety_check_passed"] = safety_result.get("is_safe", True)
-            state["safety_issues"] = safety_result.get("issues", [])
-            state["filtered_content"] = safety_result.get("filtered_content")
-
-            print(f"安全检查：内容 '{state['content']}' - 安全状态: {state['safety_check_passed']}")
-
-            # 如果内容不安全，更新内容为过滤后的内容
-            if not state["safety_check_passed"] and state["filtered_content"]:
-                state["content"] = state["filtered_content"]
-
-            return state
+                print(f"安全检查：内容 '{content}' 通过预过滤")
+                return {"safety_check_passed": True, "safety_issues": [], "filtered_content": None}
+
+            print(f"安全检查：内容 '{content}' 命中敏感词，已屏蔽")
+            branches.block()
+            return {
+                "safety_check_passed": False,
+                "safety_issues": pre_issues,
+                "filtered_content": BLOCKED_CONTENT,
+                "content": BLOCKED_CONTENT
+            }
 
         except Exception as e:
             print(f"安全检查异常: {e}")
-            state["error_message"] = f"安全检查失败: {str(e)}"
-            return state
+            return {"error_message": f"安全检查失败: {str(e)}"}
 
-    def _quick_keyword_filter(self, content: str) -> Tuple[bool, List[str]]:
+    @staticmethod
+    def _is_blocked(state: Dict[str, Any]) -> bool:
+        """内容是否被整体屏蔽（没有可用的改写），此时无需再分析意图"""
+        from agents.safety_agent import BLOCKED_CONTENT
+
+        return not state.get("safety_check_passed", True) and state.get("filtered_content") == BLOCKED_CONTENT
+
+    def _quick_keyword_filter(self, content: str, user_id: Optional[str] = None) -> Tuple[bool, List[str]]:
         """快速关键词预过滤 - 提升性能"""
         if not content or len(content.strip()) < 2:
             return True, []
 
-        # 定义高风险关键词（更精确的匹配）
-        high_risk_keywords = {
-            # 暴力相关
-            '暴力', '杀人', '死亡', '打斗', '伤害', '武器', '刀', '枪', '炸弹',
-            # 成人内容
-            '色情', '性爱', '裸体', '成人', '性暗示', '性行为',
-            # 危险行为
-            '自杀', '自残', '毒品', '酗酒', '抽烟', '爆炸',
-            # 隐私信息
-            '身份证', '密码', '银行卡', '手机号', '地址',
-            # 仇恨言论
-            '傻逼', '废物', '去死', '他妈的'
-        }
+        # 与SafetyAgent共用同一个编译好的关键词匹配器，一次扫描得到敏感词、放行词和家长屏蔽词
+        from agents.safety_agent import (
+            get_user_safety_matcher, SAFE_CONTEXT_CATEGORY, PARENTAL_CATEGORY, PARENTAL_ISSUE_PREFIX
+        )
 
-        content_lower = content.lower()
         found_issues = []
+        parental_issues = []
+        safe_context = False
+        for match in get_user_safety_matcher(user_id).find_all(content):
+            if match.category == SAFE_CONTEXT_CATEGORY:
+                safe_context = True
+            elif match.category == PARENTAL_CATEGORY:
+                issue = f"{PARENTAL_ISSUE_PREFIX}{match.keyword}"
+                if issue not in parental_issues:
+                    parental_issues.append(issue)
+            else:
+                issue = f"检测到敏感词: {match.keyword}"
+                if issue not in found_issues:
+                    found_issues.append(issue)
 
-        # 检查高风险关键词 - 使用更精确的匹配
-        for keyword in high_risk_keywords:
-            if keyword in content_lower:
-                found_issues.append(f"检测到敏感词: {keyword}")
+        # 家长屏蔽词不受放行词影响
+        if parental_issues:
+            return False, parental_issues + found_issues
 
         # 对于教育、情感等正常内容，直接通过
-        educational_keywords = {'学习', '教育', '数学', '科学', '语文', '英语', '问题', '帮助', '难过', '开心', '考试'}
-        if any(keyword in content_lower for keyword in educational_keywords):
+        if safe_context:
             return True, []
 
         # 如果没有发现高风险关键词，认为是安全的
         return len(found_issues) == 0, found_issues
 
-    def _analyze_intent(self, state: AgentState) -> AgentState:
-        """意图分析节点"""
+    async def _analyze_intent(self, state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        """
+        意图分析节点
+
+        与安全检查并行执行，只返回本节点更新的字段；安全检查先确定内容被屏蔽时取消尚未完成的调用。
+        """
+        branches = self._get_branches(config)
+        if branches.blocked.is_set():
+            return {"intent": "safety", "confidence": 1.0}
         try:
-            from agents.meta_agent import MetaAgent
+            # 开启推测执行时，在等待路由的同时先启动最可能的代理
+            self._start_speculation(state, branches)
+
+            # 本地意图分类器有把握时直接路由，不等待分诊调用
+            if getattr(settings, 'intent_classifier_enabled', True):
+                from utils.intent_classifier import intent_classifier
+
+                threshold = getattr(settings, 'intent_confidence_threshold', 0.9)
+                agent_type, confidence = intent_classifier.predict(state["content"], threshold)
+                if confidence >= threshold:
+                    return {"intent": agent_type, "confidence": confidence}
+
+            triage_enabled = getattr(settings, 'llm_triage_enabled', True)
+            if triage_enabled:
+                # 使用分诊结果进行意图识别
+                call = branches.triage(state["content"])
+            else:
+                from agents.meta_agent import MetaAgent
 
-            meta_agent = MetaAgent()
-            request = {
-                "content": state["content"],
-                "user_id": state["user_id"]
-            }
+                meta_agent = MetaAgent()
+                request = {
+                    "content": state["content"],
+                    "user_id": state["user_id"]
+                }
 
-            # 使用MetaAgent进行意图识别
-            agent_type = meta_agent.route_request(request)
-            state["intent"] = agent_type
-            state["confidence"] = 0.8  # 默认置信度
+                # 使用MetaAgent进行意图识别
+                call = asyncio.ensure_future(self._run_blocking(meta_agent.route_request, request))
 
-            return state
+            result = await branches.unless_blocked(call)
+            if result is None:
+                print(f"意图分析：内容 '{state['content']}' 已被安全检查屏蔽，取消意图分析")
+                return {"intent": "safety", "confidence": 1.0}
+
+            update: Dict[str, Any] = {"confidence": 0.8}  # 默认置信度
+            if triage_enabled:
+                update["triage"] = result
+                update["intent"] = result["target_agent"]
+            else:
+                update["intent"] = result
+            return update
 
         except Exception as e:
-            state["error_message"] = f"意图分析失败: {str(e)}"
-            return state
+            return {"error_message": f"意图分析失败: {str(e)}"}
 
-    def _route_agent(self, state: AgentState) -> AgentState:
+    def _route_agent(self, state: AgentState, config: Optional[RunnableConfig] = None) -> AgentState:
         """路由决策节点"""
         try:
             intent = state.get("intent", "edu")
 
             # 根据意图确定目标agent
-            if intent == "safety" and not state["safety_check_passed"]:
-                # 如果是安全问题且内容不安全，路由到错误处理
+            if (intent == "safety" and not state["safety_check_passed"]) or self._is_blocked(state):
+                # 如果是安全问题且内容不安全，或内容已被整体屏蔽，路由到错误处理
                 state["target_agent"] = "error"
+                state["error_message"] = state.get("error_message") or "安全检查未通过，内容已被屏蔽"
             elif intent in ["edu", "emotion"]:
                 state["target_agent"] = intent
             else:
@@ -351,34 +515,146 @@ class HappyPartnerGraph:
                 state["target_agent"] = "edu"
                 state["intent"] = "edu"
 
-            return state
-
         except Exception as e:
             state["error_message"] = f"路由决策失败: {str(e)}"
             state["target_agent"] = "error"
-            return state
+
+        # 路由确定后，推测执行的代理与路由一致时保留，否则取消
+        self._get_branches(config).resolve_speculation(state["target_agent"], state["content"])
+        return state
 
     def _determine_agent_path(self, state: AgentState) -> str:
         """确定agent路径的条件函数"""
         target_agent = state.get("target_agent", "edu")
         return target_agent
 
-    def _edu_agent_process(self, state: AgentState) -> AgentState:
-        """教育agent处理节点"""
-        try:
-            from agents.edu_agent import EduAgent
-
-            edu_agent = EduAgent()
+    @staticmethod
+    def _run_config(on_token: Optional[Callable[[str], None]] = None) -> RunnableConfig:
+        """构造一次工作流执行的运行配置：并行分支共享的状态，以及流式接口的增量文本回调"""
+        configurable: Dict[str, Any] = {"branches": _ParallelBranches()}
+        if on_token is not None:
+            configurable["on_token"] = on_token
+        return {"configurable": configurable}
+
+    @staticmethod
+    def _get_branches(config: Optional[RunnableConfig]) -> _ParallelBranches:
+        """从运行配置中取出并行分支共享的状态，未提供时（如直接调用compiled_graph）各分支独立执行"""
+        branches = (config or {}).get("configurable", {}).get("branches")
+        return branches if branches is not None else _ParallelBranches()
+
+    @staticmethod
+    def _get_token_callback(config: Optional[RunnableConfig]) -> Optional[Callable[[str], None]]:
+        """从运行配置中取出流式增量文本回调（仅流式接口会提供）"""
+        if not config:
+            return None
+        return config.get("configurable", {}).get("on_token")
+
+    def _build_agent_request(self, agent: str, state: AgentState) -> Dict[str, Any]:
+        """
+        构造专业代理的请求
+
+        Args:
+            agent: edu或emotion
+            state: 工作流状态，已有分诊结果时带上学科或情绪分析
+
+        Returns:
+            代理请求
+        """
+        request = {
+            "content": state["content"],
+            "user_id": state["user_id"],
+            "session_id": state.get("session_id")
+        }
+        triage = state.get("triage") or {}
+        if agent == "edu":
             # 安全地获取user_context，如果不存在则使用默认值
             user_context = state.get("user_context", {})
-            request = {
-                "content": state["content"],
-                "user_id": state["user_id"],
-                "grade_level": user_context.get("grade_level", "小学低年级")
-            }
+            request["grade_level"] = user_context.get("grade_level", "小学低年级")
+            request["subject"] = triage.get("subject")
+        elif triage:
+            from agents.triage_agent import TriageAgent
+
+            emotion_analysis = TriageAgent().to_emotion_analysis(triage)
+            if emotion_analysis is not None:
+                request["emotion_analysis"] = emotion_analysis
+        return request
+
+    async def _call_agent(
+        self,
+        agent: str,
+        request: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """在线程池中调用专业代理处理请求"""
+        if agent == "edu":
+            from agents.edu_agent import EduAgent
 
-            print(f"教育agent处理请求: {request}")
-            result = edu_agent.process_request(request)
+            return await self._run_blocking(EduAgent().process_request, request, on_token=on_token)
+        from agents.emotion_agent import EmotionAgent
+
+        return await self._run_blocking(EmotionAgent().process_request, request, on_token=on_token)
+
+    def _guess_agent(self, content: str, profile: Dict[str, Any]) -> Optional[str]:
+        """
+        在路由完成前猜测目标代理：先看本地意图分类器，再看用户画像中的代理使用偏好
+
+        Args:
+            content: 用户内容
+            profile: 用户画像
+
+        Returns:
+            edu或emotion，把握不足时为None
+        """
+        from utils.intent_classifier import intent_classifier
+
+        threshold = getattr(settings, 'speculative_agent_threshold', 0.8)
+        probabilities = intent_classifier.predict_proba(content) if content.strip() else {}
+        if probabilities:
+            agent = max(probabilities, key=probabilities.get)
+            if agent in ("edu", "emotion") and probabilities[agent] >= threshold:
+                return agent
+
+        preferred = profile.get("preferred_agents") or {}
+        total = sum(preferred.values())
+        candidates = {agent: count for agent, count in preferred.items() if agent in ("edu", "emotion")}
+        if total and candidates:
+            agent = max(candidates, key=candidates.get)
+            if candidates[agent] / total >= threshold:
+                return agent
+        return None
+
+    def _start_speculation(self, state: AgentState, branches: _ParallelBranches) -> None:
+        """
+        开启推测执行时，在路由完成前先启动最可能的代理
+
+        推测时还没有分诊结果，教育代理自行判断学科、情感代理自行分析情绪；
+        生成的文本在路由确认前不会下发。
+        """
+        if not getattr(settings, 'speculative_agent_enabled', False) or branches.speculation is not None:
+            return
+        agent = self._guess_agent(state["content"], state.get("long_term_context") or {})
+        if agent is None:
+            speculation_stats.record_skip()
+            return
+        request = self._build_agent_request(agent, state)
+        run = SpeculativeRun(agent, state["content"])
+        run.start(lambda on_token: self._call_agent(agent, request, on_token))
+        branches.speculation = run
+
+    async def _run_agent_node(self, agent: str, state: AgentState, config: Optional[RunnableConfig]) -> Dict[str, Any]:
+        """专业代理节点的公共部分：路由与推测一致时采用推测结果，否则正常调用"""
+        on_token = self._get_token_callback(config)
+        run = self._get_branches(config).take_speculation(agent)
+        if run is not None:
+            print(f"{agent}代理采用推测执行的结果")
+            return await run.commit(on_token)
+        return await self._call_agent(agent, self._build_agent_request(agent, state), on_token)
+
+    async def _edu_agent_process(self, state: AgentState, config: Optional[RunnableConfig] = None) -> AgentState:
+        """教育agent处理节点"""
+        try:
+            print(f"教育agent处理请求: {state['content']}")
+            result = await self._run_agent_node("edu", state, config)
             print(f"教育agent返回结果: {result}")
 
             state["agent_results"]["edu"] = result
@@ -390,18 +666,10 @@ class HappyPartnerGraph:
             state["error_message"] = f"教育agent处理失败: {str(e)}"
             return state
 
-    def _emotion_agent_process(self, state: AgentState) -> AgentState:
+    async def _emotion_agent_process(self, state: AgentState, config: Optional[RunnableConfig] = None) -> AgentState:
         """情感agent处理节点"""
         try:
-            from agents.emotion_agent import EmotionAgent
-
-            emotion_agent = EmotionAgent()
-            request = {
-                "content": state["content"],
-                "user_id": state["user_id"]
-            }
-
-            result = emotion_agent.process_request(request)
+            result = await self._run_agent_node("emotion", state, config)
             state["agent_results"]["emotion"] = result
 
             return state
@@ -414,24 +682,33 @@ class HappyPartnerGraph:
     def _update_memory(self, state: AgentState) -> AgentState:
         """LangGraph记忆更新节点"""
         try:
-            # 构建对话记录
+            agent_result = state["agent_results"].get(state["target_agent"], {})
+            response = agent_result.get("answer", agent_result.get("response", ""))
+
+            # 构建对话记录：只保存本轮的扁平字段，不嵌入相关上下文和代理结果，
+            # 否则每条记录都会包含之前的全部记录，大小逐轮翻倍
             conversation_record = {
                 "user_id": state["user_id"],
                 "session_id": state["session_id"],
-                "original_content": state["original_content"],
-                "content": state["content"],
-                "filtered_content": state["filtered_content"],
+                "content": state["original_content"],
+                "response": response,
+                "agent": state["target_agent"],
                 "intent": state["intent"],
-                "target_agent": state["target_agent"],
-                "safety_check_passed": state["safety_check_passed"],
-                "agent_results": state["agent_results"],
-                "relevant_context": state["relevant_context"],
-                "timestamp": datetime.now().isoformat(),
-                "metadata": state["response_metadata"]
+                "timestamp": datetime.now().isoformat()
             }
 
-            # 添加到LangGraph管理的对话历史中
+            # 添加到LangGraph管理的对话历史中，并保存供该用户的下一轮使用
             state["conversation_history"].append(conversation_record)
+            self.memory_agent.store.append(state["user_id"], conversation_record)
+
+            # 单轮摘要只在本地截断，累积一批后由总结节点合并进会话摘要
+            hierarchical_summarizer.add_turn(
+                state["summary_state"],
+                state["original_content"],
+                response,
+                state["target_agent"],
+                state["session_id"]
+            )
 
             # 更新会话记忆
             self._update_session_memory(state)
@@ -482,7 +759,7 @@ class HappyPartnerGraph:
                             user_id=int(state["user_id"]) if state["user_id"].isdigit() else 1,
                             session_id=state["session_id"],
                             agent_type=state["target_agent"],
-                            user_input=conversation_record["original_content"],
+                            user_input=conversation_record["content"],
                             agent_response=json.dumps({
                                 "response": state.get("final_response", ""),
                                 "metadata": state["response_metadata"],
@@ -517,10 +794,8 @@ class HappyPartnerGraph:
 
     def _should_summarize(self, state: AgentState) -> str:
         """判断是否需要总结上下文"""
-        # 每5轮对话总结一次，或者对话历史过长时总结
-        conversation_count = len(state["conversation_history"])
-
-        if conversation_count > 0 and conversation_count % 5 == 0:
+        # 待合并的轮次攒够一批时更新会话摘要
+        if hierarchical_summarizer.needs_update(state["summary_state"]):
             return "summarize"
 
         # 如果上下文过长，也需要总结
@@ -530,32 +805,19 @@ class HappyPartnerGraph:
 
         return "continue"
 
-    def _summarize_context(self, state: AgentState) -> AgentState:
+    async def _summarize_context(self, state: AgentState) -> AgentState:
         """上下文总结节点"""
         try:
-            # 如果没有足够的历史，跳过总结
-            if len(state["conversation_history"]) < 3:
-                return state
-
-            # 构建需要总结的历史文本
-            history_to_summarize = state["conversation_history"][-5:]  # 总结最近5轮
-
-            summary_text = self._generate_summary(history_to_summarize)
+            # 增量更新分层摘要：只合并新攒的一批轮次，摘要大小有上限，不再累积拼接
+            await self._run_blocking(hierarchical_summarizer.update, state["summary_state"])
+            state["conversation_summary"] = hierarchical_summarizer.render(state["summary_state"]) or None
 
-            if summary_text:
-                # 更新对话摘要
-                if state["conversation_summary"]:
-                    # 累积式摘要
-                    state["conversation_summary"] = f"{state['conversation_summary']}\n\n最新摘要: {summary_text}"
-                else:
-                    state["conversation_summary"] = summary_text
-
-                # 清理早期的对话历史，保留关键信息
-                if len(state["conversation_history"]) > 10:
-                    # 保留最近5轮和重要的早期对话
-                    important_convs = [conv for conv in state["conversation_history"][:-5]
-                                     if conv.get("target_agent") in ["edu", "emotion"]]
-                    state["conversation_history"] = important_convs[-3:] + state["conversation_history"][-5:]
+            # 清理早期的对话历史，保留关键信息
+            if len(state["conversation_history"]) > 10:
+                # 保留最近5轮和重要的早期对话
+                important_convs = [conv for conv in state["conversation_history"][:-5]
+                                 if conv.get("agent", conv.get("target_agent")) in ["edu", "emotion"]]
+                state["conversation_history"] = important_convs[-3:] + state["conversation_history"][-5:]
 
             return state
 
@@ -563,52 +825,6 @@ class HappyPartnerGraph:
             state["error_message"] = f"上下文总结失败: {str(e)}"
             return state
 
-    def _generate_summary(self, history: List[Dict[str, Any]]) -> str:
-        """生成对话摘要"""
-        try:
-            from utils.openai_client import openai_client
-
-            # 构建历史文本
-            history_text = ""
-            for i, conv in enumerate(history, 1):
-                user_content = conv.get("original_content", "无内容")
-                agent_response = conv.get("final_response", conv.get("response", "无回应"))
-                agent_type = conv.get("target_agent", "unknown")
-
-                history_text += f"{i}. 用户: {user_content}\n"
-                history_text += f"   {agent_type}助手: {agent_response[:100]}...\n\n"
-
-            if not history_text.strip():
-                return ""
-
-            prompt = f"""
-            请为以下儿童对话历史生成一个简洁摘要（50-100字）：
-
-            {history_text}
-
-            摘要要求：
-            1. 突出孩子关心的主要话题
-            2. 总结互动特点
-            3. 用简洁友好的语言
-            """
-
-            messages = [
-                {"role": "system", "content": "你是一个专业的对话总结助手。"},
-                {"role": "user", "content": prompt}
-            ]
-
-            response = openai_client.chat_completion(
-                messages=messages,
-                temperature=0.3,
-                max_tokens=150
-            )
-
-            return response.strip()
-
-        except Exception as e:
-            print(f"生成摘要失败: {e}")
-            return ""
-
     def _generate_response(self, state: AgentState) -> AgentState:
         """生成最终响应节点"""
         try:
@@ -659,7 +875,7 @@ class HappyPartnerGraph:
 
     def _handle_error(self, state: AgentState) -> AgentState:
         """错误处理节点"""
-        error_message = state.get("error_message", "未知错误")
+        error_message = state.get("error_message") or "未知错误"
 
         # 根据错误类型提供不同的错误响应
         if "安全" in error_message:
@@ -678,9 +894,10 @@ class HappyPartnerGraph:
 
         return state
 
-    async def process_message(self, user_id: str, content: str, session_id: Optional[str] = None) -> Dict[str, Any]:
-        """处理用户消息的主要入口"""
-        initial_state = AgentState(
+    def _build_initial_state(self, user_id: str, content: str, session_id: Optional[str] = None) -> AgentState:
+        """构建工作流的初始状态，载入该用户之前的对话历史和分层摘要状态"""
+        summary_state = self.memory_agent.get_summary_state(user_id)
+        return AgentState(
             user_id=user_id,
             session_id=session_id,
             content=content,
@@ -691,12 +908,14 @@ class HappyPartnerGraph:
             intent="",
             confidence=0.0,
             target_agent="",
+            triage={},
             agent_results={},
             # LangGraph增强的记忆字段
-            conversation_history=[],
+            conversation_history=self.memory_agent.get_conversation_history(10, user_id),
             long_term_context={},
             relevant_context=[],
-            conversation_summary=None,
+            conversation_summary=hierarchical_summarizer.render(summary_state) or None,
+            summary_state=summary_state,
             session_memory={},
             user_context={},
             final_response="",
@@ -705,9 +924,8 @@ class HappyPartnerGraph:
             retry_count=0
         )
 
-        # 执行LangGraph工作流
-        final_state = self.compiled_graph.invoke(initial_state)
-
+    def _build_result(self, final_state: Dict[str, Any]) -> Dict[str, Any]:
+        """将工作流最终状态转换为接口返回结果"""
         return {
             "response": final_state.get("final_response", ""),
             "metadata": final_state.get("response_metadata", {}),
@@ -728,5 +946,85 @@ class HappyPartnerGraph:
             "conversation_history": final_state.get("conversation_history", [])
         }
 
+    async def process_message(self, user_id: str, content: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """处理用户消息的主要入口"""
+        initial_state = self._build_initial_state(user_id, content, session_id)
+
+        # 异步执行LangGraph工作流，等待模型时事件循环可以处理其他会话
+        config = self._run_config()
+        try:
+            final_state = await self.compiled_graph.ainvoke(initial_state, config=config)
+        finally:
+            self._get_branches(config).close()
+
+        return self._build_result(final_state)
+
+    def _describe_node(self, node: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """生成节点完成时的进度事件"""
+        event = {"type": "node", "node": node}
+        if state.get("error_message"):
+            event["error"] = state["error_message"]
+        if node == "safety_check":
+            event["passed"] = state.get("safety_check_passed", False)
+        elif node == "intent_analysis":
+            event["intent"] = state.get("intent", "")
+        elif node == "route_agent":
+            event["target_agent"] = state.get("target_agent", "")
+        return event
+
+    async def stream_message(
+        self,
+        user_id: str,
+        content: str,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以事件流方式处理用户消息
+
+        依次产出三类事件：
+        - node: 每个工作流节点完成时的进度（安全检查通过、路由到edu等）
+        - token: agent生成回答时的增量文本，模型吐出即转发
+        - complete: 工作流结束后的完整结果，结构与process_message一致
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def on_token(token: str) -> None:
+            # 代理调用在线程池中执行，需要线程安全地投递到事件循环
+            loop.call_soon_threadsafe(queue.put_nowait, {"type": "token", "content": token})
+
+        async def run_graph() -> Dict[str, Any]:
+            final_state: Dict[str, Any] = {}
+            config = self._run_config(on_token)
+            try:
+                async for update in self.compiled_graph.astream(
+                    self._build_initial_state(user_id, content, session_id),
+                    config=config,
+                    stream_mode="updates"
+                ):
+                    for node, node_state in update.items():
+                        if not node_state:
+                            continue
+                        final_state.update(node_state)
+                        queue.put_nowait(self._describe_node(node, final_state))
+                return final_state
+            finally:
+                self._get_branches(config).close()
+                queue.put_nowait(done)
+
+        task = asyncio.create_task(run_graph())
+        try:
+            while True:
+                event = await queue.get()
+                if event is done:
+                    break
+                yield event
+            final_state = await task
+            yield {"type": "complete", "data": self._build_result(final_state)}
+        finally:
+            if not task.done():
+                task.cancel()
+
 # 创建全局工作流实例
 happy_partner_graph = HappyPartnerGraph()
\ No newline at end of file
@@ -1,5 +1,15 @@
-from typing import Dict, Any, List
-from utils.openai_client import openai_client
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+from utils.memory_store import UserMemoryStore
+from utils.hierarchical_summary import HierarchicalSummarizer, hierarchical_summarizer
+from config.settings import settings
+
+
+# 未提供用户ID时使用的用户，与process_request的默认值一致
+DEFAULT_USER_ID = "unknown_user"
+# 内存中最多保留摘要状态的用户数，超出时丢弃最久未使用的
+MAX_SUMMARY_USERS = 1000
 
 
 class MemoryAgent:
@@ -7,39 +17,100 @@ class MemoryAgent:
     记忆代理，负责对话历史存储和上下文管理
     """
     
-    def __init__(self):
-        # 初始化对话历史存储
-        self.conversation_history: List[Dict[str, Any]] = []
+    def __init__(self, store: Optional[UserMemoryStore] = None, summarizer: Optional[HierarchicalSummarizer] = None):
+        """
+        Args:
+            store: 对话记忆存储，为空时使用仅在本实例内有效的内存存储；
+                服务中传入全局的utils.memory_store.user_memory_store
+            summarizer: 分层摘要器，为空时使用全局摘要器
+        """
+        self.store = store if store is not None else UserMemoryStore(
+            capacity=settings.memory_store_capacity,
+            max_total_bytes=settings.memory_store_max_bytes
+        )
+        self.summarizer = summarizer or hierarchical_summarizer
+        self._summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._summaries_lock = threading.Lock()
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        """默认用户的对话历史"""
+        return self.store.get(DEFAULT_USER_ID)
     
-    def store_conversation(self, conversation: Dict[str, Any]) -> None:
+    def store_conversation(self, conversation: Dict[str, Any], user_id: Optional[Union[int, str]] = None) -> None:
         """
         存储对话历史
         
         Args:
             conversation: 包含对话信息的字典
+            user_id: 用户ID，为空时使用对话中的user_id
         """
-        self.conversation_history.append(conversation)
+        if user_id is None:
+            user_id = conversation.get("user_id", DEFAULT_USER_ID)
+        self.store.append(user_id, conversation)
+        
+        # 单轮摘要在本地完成；攒够一批或会话切换后在后台合并摘要，不阻塞本次存储
+        state = self.get_summary_state(user_id, seed=False)
+        self._add_turn(state, conversation)
+        if self.summarizer.needs_update(state):
+            threading.Thread(target=self.summarizer.update, args=(state,), daemon=True).start()
+    
+    def _add_turn(self, state: Dict[str, Any], conversation: Dict[str, Any]) -> None:
+        self.summarizer.add_turn(
+            state,
+            conversation.get("content", conversation.get("question", conversation.get("user_input", ""))),
+            conversation.get("response", conversation.get("answer", conversation.get("agent_response", ""))),
+            conversation.get("agent", "unknown"),
+            conversation.get("session_id")
+        )
     
-    def get_conversation_history(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_summary_state(self, user_id: Union[int, str], seed: bool = True) -> Dict[str, Any]:
+        """
+        取得用户的分层摘要状态；进程重启或被淘汰后从最近一批对话重新开始
+        
+        Args:
+            user_id: 用户ID
+            seed: 新建状态时是否用已存储的最近一批对话填充
+        """
+        key = str(user_id)
+        with self._summaries_lock:
+            state = self._summaries.get(key)
+            if state is not None:
+                self._summaries.move_to_end(key)
+                return state
+            state = self.summarizer.new_state()
+            self._summaries[key] = state
+            while len(self._summaries) > MAX_SUMMARY_USERS:
+                self._summaries.popitem(last=False)
+        history = self.store.get(user_id, self.summarizer.batch_turns)
+        # 不填充时当前这条由调用方加入，跳过以免重复
+        for conversation in (history if seed else history[:-1]):
+            self._add_turn(state, conversation)
+        return state
+    
+    def get_conversation_history(self, limit: int = 10, user_id: Union[int, str] = DEFAULT_USER_ID) -> List[Dict[str, Any]]:
         """
         获取最近的对话历史
         
         Args:
             limit: 返回的对话历史条数限制
+            user_id: 用户ID
             
         Returns:
             最近的对话历史列表
         """
-        # 返回最近的对话历史，最多limit条
-        return self.conversation_history[-limit:] if self.conversation_history else []
+        # 返回该用户最近的对话历史，最多limit条
+        return self.store.get(user_id, limit)
     
-    def clear_conversation_history(self) -> None:
+    def clear_conversation_history(self, user_id: Union[int, str] = DEFAULT_USER_ID) -> None:
         """
-        清空对话历史
+        清空一个用户的对话历史
         """
-        self.conversation_history.clear()
+        self.store.clear(user_id)
+        with self._summaries_lock:
+            self._summaries.pop(str(user_id), None)
     
-    def get_context(self) -> Dict[str, Any]:
+    def get_context(self, user_id: Union[int, str] = DEFAULT_USER_ID) -> Dict[str, Any]:
         """
         获取当前对话上下文
         
@@ -47,13 +118,16 @@ class MemoryAgent:
             包含上下文信息的字典
         """
         return {
-            "history_count": len(self.conversation_history),
-            "recent_history": self.get_conversation_history(3)
+            "history_count": self.store.count(user_id),
+            "recent_history": self.get_conversation_history(3, user_id)
         }
     
     def summarize_conversation_history(self, user_id: str) -> str:
         """
-        使用OpenAI总结对话历史
+        获取对话历史摘要
+        
+        摘要随存储的对话分层增量更新（单轮→会话→长期），这里只在还没有任何合并结果时
+        合并一次，调用开销与历史长短无关。
         
         Args:
             user_id: 用户ID
@@ -61,49 +135,13 @@ class MemoryAgent:
         Returns:
             对话历史摘要
         """
-        # 获取最近的对话历史
-        history = self.get_conversation_history(10)
-        
-        if not history:
+        if not self.store.count(user_id):
             return "暂无对话历史"
         
-        # 构造对话历史文本
-        history_text = ""
-        for i, conv in enumerate(history, 1):
-            agent = conv.get("agent", "unknown")
-            content = conv.get("content", conv.get("question", "无内容"))
-            response = conv.get("response", conv.get("answer", "无回应"))
-            history_text += f"{i}. 用户与{agent}代理对话:\n"
-            history_text += f"   用户: {content}\n"
-            history_text += f"   回应: {response}\n\n"
-        
-        # 构造提示词
-        prompt = f"""
-        请为以下儿童用户(ID: {user_id})的对话历史生成一个简洁摘要：
-        
-        {history_text}
-        
-        摘要要求：
-        1. 突出孩子关心的主要话题
-        2. 总结孩子的兴趣点
-        3. 保持积极正面的语调
-        4. 用易于理解的语言
-        5. 控制在100字以内
-        """
-        
-        messages = [
-            {"role": "system", "content": "你是一个专业的对话历史总结助手。"},
-            {"role": "user", "content": prompt}
-        ]
-        
-        # 调用OpenAI API生成摘要
-        response = openai_client.chat_completion(
-            messages=messages,
-            temperature=0.3,
-            max_tokens=150
-        )
-        
-        return response
+        state = self.get_summary_state(user_id)
+        if not state["session"] and not state["long_term"]:
+            self.summarizer.update(state, force=True)
+        return self.summarizer.render(state)
     
     def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -116,12 +154,14 @@ class MemoryAgent:
             处理结果
         """
         action = request.get("action", "get_context")
-        user_id = request.get("user_id", "unknown_user")
+        user_id = request.get("user_id")
+        if user_id is None:
+            user_id = DEFAULT_USER_ID
         
         if action == "store":
             conversation = request.get("conversation", {})
             conversation["user_id"] = user_id
-            self.store_conversation(conversation)
+            self.store_conversation(conversation, user_id)
             return {
                 "agent": "memory",
                 "action": "store",
@@ -130,7 +170,7 @@ class MemoryAgent:
             }
         elif action == "get_history":
             limit = request.get("limit", 10)
-            history = self.get_conversation_history(limit)
+            history = self.get_conversation_history(limit, user_id)
             return {
                 "agent": "memory",
                 "action": "get_history",
@@ -146,7 +186,7 @@ class MemoryAgent:
                 "summary": summary
             }
         elif action == "clear":
-            self.clear_conversation_history()
+            self.clear_conversation_history(user_id)
             return {
                 "agent": "memory",
                 "action": "clear",
@@ -154,7 +194,7 @@ class MemoryAgent:
                 "message": "对话历史已清空"
             }
         else:  # 默认获取上下文
-            context = self.get_context()
+            context = self.get_context(user_id)
             return {
                 "agent": "memory",
                 "action": "get_context",
@@ -1,5 +1,19 @@
 from typing import Dict, Any
 from utils.openai_client import openai_client
+from utils.intent_classifier import intent_classifier
+from config.settings import settings
+from utils.llm_telemetry import llm_call_site
+
+
+ROUTER_SYSTEM_PROMPT = """你是一个智能请求路由系统，请根据用户输入内容判断应该路由到哪个功能模块，严格按照要求回复。
+
+可选的功能模块有：
+1. safety - 内容安全审查，处理包含敏感、危险或不适当内容的请求
+2. edu - 教育问答，处理学习、教育、知识问答类请求
+3. emotion - 情感陪伴，处理情绪表达、情感交流、心理支持类请求
+4. memory - 记忆管理，处理需要访问或管理对话历史的请求
+
+请只回复模块名称，不要包含其他内容。"""
 
 
 class MetaAgent:
@@ -18,37 +32,38 @@ class MetaAgent:
     
     def route_request(self, request: Dict[str, Any]) -> str:
         """
-        使用OpenAI智能路由请求到合适的代理
+        路由请求到合适的代理
+
+        先由本地意图分类器判断，置信度达到阈值时直接使用分类结果，否则调用LLM路由
         """
         content = request.get("content", "")
-        user_id = request.get("user_id", "unknown_user")
         
-        # 构造提示词
-        prompt = f"""
-        你是一个智能请求路由系统，请根据用户输入内容判断应该路由到哪个功能模块。
+        if settings.intent_classifier_enabled:
+            threshold = settings.intent_confidence_threshold
+            agent_type, confidence = intent_classifier.predict(content, threshold)
+            if confidence >= threshold:
+                return agent_type
         
-        可选的功能模块有：
-        1. safety - 内容安全审查，处理包含敏感、危险或不适当内容的请求
-        2. edu - 教育问答，处理学习、教育、知识问答类请求
-        3. emotion - 情感陪伴，处理情绪表达、情感交流、心理支持类请求
-        4. memory - 记忆管理，处理需要访问或管理对话历史的请求
-        
-        用户ID: {user_id}
-        用户输入: {content}
-        
-        请只回复模块名称，不要包含其他内容。
+        return self._route_with_llm(content)
+    
+    @llm_call_site("router")
+    def _route_with_llm(self, content: str) -> str:
         """
-        
+        使用OpenAI智能路由请求到合适的代理
+        """
+        # 固定的路由说明放在系统消息中作为稳定前缀，用户输入放在最后，
+        # 便于推理服务复用相同前缀的KV缓存
         messages = [
-            {"role": "system", "content": "你是一个智能请求路由系统，严格按照要求回复。"},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+            {"role": "user", "content": f"用户输入: {content}"}
         ]
         
-        # 调用OpenAI API进行智能路由
+        # 调用OpenAI API进行智能路由；路由结果近似确定，相同输入直接复用缓存
         response = openai_client.chat_completion(
             messages=messages,
             temperature=0.1,  # 使用较低的温度以获得更确定的结果
-            max_tokens=10
+            max_tokens=10,
+            cache=True
         )
         
         # 解析响应，提取代理类型
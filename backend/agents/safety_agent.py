@@ -1,6 +1,239 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union, Callable, Tuple
 from utils.openai_client import openai_client
+from utils.llm_telemetry import llm_call_site
+from utils.keyword_matcher import keyword_matchers, KeywordMatcher
+from utils.safety_verdict_cache import safety_verdict_cache
+from utils.output_moderator import OutputModerator, OutputBlocked
+from config.settings import settings
+import hashlib
 import re
+import time
+
+
+# 敏感关键词（第一层过滤），SafetyAgent和工作流的快速预过滤共用
+SENSITIVE_KEYWORDS: Dict[str, List[str]] = {
+    # 暴力相关
+    'violence': ['暴力', '打斗', '武器', '刀', '枪', '血腥', '死亡', '杀害', '杀人', '伤害', '打架', '炸弹'],
+    # 成人内容相关
+    'adult': ['色情', '性爱', '裸体', '成人', '性暗示', '性行为'],
+    # 危险行为相关
+    'dangerous': ['自杀', '自残', '毒品', '酗酒', '吸烟', '抽烟', '危险动作', '炸药', '爆炸'],
+    # 隐私信息相关
+    'privacy': ['身份证', '手机号', '地址', '密码', '银行卡', '账号', '身份证号'],
+    # 仇恨言论相关
+    'hate': ['歧视', '仇恨', '种族主义', '性别歧视', '宗教歧视', '骂人', '傻逼', '废物', '去死', '他妈的']
+}
+
+# 常见的学习、情感类词语；工作流预过滤命中这些词时直接放行，不调用大模型复核
+SAFE_CONTEXT_CATEGORY = 'safe_context'
+SAFE_CONTEXT_KEYWORDS: List[str] = ['学习', '教育', '数学', '科学', '语文', '英语', '问题', '帮助', '难过', '开心', '考试']
+
+SAFETY_MATCHER = 'safety'
+
+# 家长为单个孩子设置的屏蔽词，与全局词表编译进同一个按用户缓存的匹配器
+PARENTAL_CATEGORY = 'parental'
+PARENTAL_ISSUE_PREFIX = '检测到家长设置的屏蔽词: '
+# 内容被整体屏蔽（没有可用的改写）时替换成的文本
+BLOCKED_CONTENT = '[内容包含敏感信息，已被过滤]'
+USER_MATCHER_PREFIX = 'safety:user:'
+# 缓存的用户匹配器对应的(上次与数据库核对的时间, 过滤设置的更新时间)
+_user_matcher_checks: Dict[str, Tuple[float, Any]] = {}
+
+
+def update_safety_keywords(
+    sensitive_keywords: Optional[Dict[str, List[str]]] = None,
+    safe_context_keywords: Optional[List[str]] = None
+) -> KeywordMatcher:
+    """
+    重新编译共享的安全关键词匹配器，编译完成后整体替换
+
+    Args:
+        sensitive_keywords: {分类: 敏感关键词}，为空时使用默认列表
+        safe_context_keywords: 放行词列表，为空时使用默认列表
+
+    Returns:
+        新的匹配器
+    """
+    keywords = dict(SENSITIVE_KEYWORDS if sensitive_keywords is None else sensitive_keywords)
+    keywords[SAFE_CONTEXT_CATEGORY] = SAFE_CONTEXT_KEYWORDS if safe_context_keywords is None else safe_context_keywords
+    matcher = keyword_matchers.register(SAFETY_MATCHER, keywords)
+    # 按用户编译的匹配器包含全局词表，需要随之重建
+    keyword_matchers.remove_prefix(USER_MATCHER_PREFIX)
+    return matcher
+
+
+def get_safety_matcher() -> KeywordMatcher:
+    """获取共享的安全关键词匹配器"""
+    return keyword_matchers.get(SAFETY_MATCHER) or update_safety_keywords()
+
+
+def parse_blocked_keywords(filters: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    从家长的过滤设置中取出屏蔽词
+
+    Args:
+        filters: 过滤设置字典，屏蔽词放在blocked_keywords中，可为列表或逗号分隔的字符串
+
+    Returns:
+        去掉空白和重复后的屏蔽词列表
+    """
+    blocked = (filters or {}).get("blocked_keywords") or []
+    if isinstance(blocked, str):
+        blocked = re.split(r'[,，、\s]+', blocked)
+    keywords: List[str] = []
+    for word in blocked:
+        if isinstance(word, str) and word.strip() and word.strip() not in keywords:
+            keywords.append(word.strip())
+    return keywords
+
+
+def compile_user_content_filters(
+    user_id: Union[int, str],
+    filters: Optional[Dict[str, Any]],
+    updated_at: Any = None
+) -> KeywordMatcher:
+    """
+    把用户的屏蔽词和全局词表编译为一个匹配器并缓存，设置更新后调用即可替换旧的匹配器
+
+    Args:
+        user_id: 用户ID
+        filters: 过滤设置字典
+        updated_at: 过滤设置在数据库中的更新时间，用于之后判断缓存是否过期
+
+    Returns:
+        该用户的匹配器，没有屏蔽词时直接使用全局匹配器
+    """
+    name = f"{USER_MATCHER_PREFIX}{user_id}"
+    base_version = keyword_matchers.version(SAFETY_MATCHER)
+    base = get_safety_matcher()
+    blocked = parse_blocked_keywords(filters)
+    if blocked:
+        keywords = dict(base.keywords)
+        keywords[PARENTAL_CATEGORY] = blocked
+        matcher = keyword_matchers.register(name, keywords)
+    else:
+        matcher = keyword_matchers.put(name, base)
+    _user_matcher_checks[name] = (time.monotonic(), updated_at)
+    # 编译期间全局词表被更新时不缓存基于旧词表的结果
+    if keyword_matchers.version(SAFETY_MATCHER) != base_version:
+        keyword_matchers.remove(name)
+    return matcher
+
+
+def invalidate_user_content_filters(user_id: Union[int, str]) -> None:
+    """
+    丢弃用户缓存的匹配器，下次使用时从数据库重新加载
+
+    Args:
+        user_id: 用户ID
+    """
+    name = f"{USER_MATCHER_PREFIX}{user_id}"
+    keyword_matchers.remove(name)
+    _user_matcher_checks.pop(name, None)
+
+
+def get_user_safety_matcher(user_id: Optional[Union[int, str]]) -> KeywordMatcher:
+    """
+    获取用户的安全关键词匹配器，未缓存时从数据库加载家长设置并编译
+
+    缓存超过content_filter_recheck_seconds后与数据库中设置的更新时间核对，
+    家长在其他工作进程修改的设置随之生效；设置未变时继续使用已编译的匹配器。
+
+    Args:
+        user_id: 用户ID，为空或无法识别时使用全局匹配器
+
+    Returns:
+        匹配器
+    """
+    if user_id is None or not str(user_id).isdigit():
+        return get_safety_matcher()
+    name = f"{USER_MATCHER_PREFIX}{user_id}"
+    matcher = keyword_matchers.get(name)
+    checked = _user_matcher_checks.get(name)
+    recheck_seconds = getattr(settings, 'content_filter_recheck_seconds', 30)
+    if matcher is not None and checked is not None and time.monotonic() - checked[0] < recheck_seconds:
+        return matcher
+
+    try:
+        from db.database import SessionLocal
+        from db.database_service import DatabaseService
+
+        db = SessionLocal()
+        try:
+            db_filter = DatabaseService.get_content_filters(db, int(user_id))
+            filters = db_filter.filters if db_filter is not None else None
+            updated_at = db_filter.updated_at if db_filter is not None else None
+        finally:
+            db.close()
+    except Exception as e:
+        # 读取失败时本次使用已缓存的匹配器或全局词表，下次再核对
+        print(f"加载用户{user_id}的内容过滤设置失败: {e}")
+        return matcher or get_safety_matcher()
+    if matcher is not None and checked is not None and checked[1] == updated_at:
+        _user_matcher_checks[name] = (time.monotonic(), updated_at)
+        return matcher
+    return compile_user_content_filters(user_id, filters, updated_at)
+
+
+update_safety_keywords()
+
+
+def create_output_moderator(
+    user_id: Optional[Union[int, str]] = None,
+    on_token: Optional[Callable[[str], None]] = None
+) -> Optional[OutputModerator]:
+    """
+    按配置创建模型输出的流式审查器，使用该用户的匹配器（含家长屏蔽词）
+
+    Args:
+        user_id: 用户ID
+        on_token: 下游增量文本回调
+
+    Returns:
+        审查器，关闭输出审查时为None
+    """
+    if not getattr(settings, 'output_moderation_enabled', True):
+        return None
+    categories = {
+        category.strip()
+        for category in getattr(settings, 'output_moderation_categories', '').split(',')
+        if category.strip()
+    }
+    return OutputModerator(
+        get_user_safety_matcher(user_id),
+        on_token=on_token,
+        mode=getattr(settings, 'output_moderation_mode', 'redact'),
+        categories=categories or None
+    )
+
+
+def moderate_generation(
+    generate: Callable[[Optional[Callable[[str], None]]], str],
+    on_token: Optional[Callable[[str], None]] = None,
+    user_id: Optional[Union[int, str]] = None
+) -> str:
+    """
+    对一次回复生成做输出审查
+
+    流式生成时审查器包住on_token逐块审查，cutoff模式命中时立即中止生成；
+    非流式生成时对完整回复做一次扫描。
+
+    Args:
+        generate: 以增量回调为参数发起生成的函数，回调为None时为非流式生成
+        on_token: 下游增量文本回调
+        user_id: 用户ID
+
+    Returns:
+        审查后的回复
+    """
+    moderator = create_output_moderator(user_id, on_token)
+    if moderator is None:
+        return generate(on_token)
+    try:
+        response = generate(moderator.feed if on_token is not None else None)
+    except OutputBlocked:
+        response = ""
+    return moderator.finish(response)
 
 
 class SafetyAgent:
@@ -22,70 +255,105 @@ class SafetyAgent:
         8. 禁止歧视性、仇恨性言论
         """
         
-        # 定义敏感关键词列表（第一层过滤）
-        self.sensitive_keywords = {
-            # 暴力相关
-            'violence': ['暴力', '打斗', '武器', '刀', '枪', '血腥', '死亡', '杀害', '伤害', '打架'],
-            # 成人内容相关
-            'adult': ['色情', '性爱', '裸体', '成人', '性暗示', '性行为'],
-            # 危险行为相关
-            'dangerous': ['自杀', '自残', '毒品', '酗酒', '吸烟', '危险动作', '炸药', '爆炸'],
-            # 隐私信息相关
-            'privacy': ['身份证', '手机号', '地址', '密码', '银行卡', '账号', '身份证号'],
-            # 仇恨言论相关
-            'hate': ['歧视', '仇恨', '种族主义', '性别歧视', '宗教歧视', '骂人']
-        }
+        # 第二层审查的系统提示，内容固定，作为各次请求共享的前缀
+        self.review_system_prompt = f"""你是一个专业的儿童内容安全审查员，请根据以下安全指导原则审查用户内容，严格按照要求格式回复。
+{self.safety_guidelines}
+请分析该内容是否适合儿童，并按以下格式回复：
+安全状态: [安全/不安全]
+检测到的问题: [具体问题描述，如果安全则写"无"]
+过滤后内容: [如果内容不安全，提供修改建议；如果安全则写"保持原样"]"""
     
-    def _pre_filter_content(self, content: str) -> Dict[str, Any]:
+    @property
+    def verdict_namespace(self) -> str:
+        """审查提示词和所用模型的指纹，任一变化时缓存的安全结论不再命中"""
+        if openai_client.use_ollama:
+            model = f"ollama:{getattr(settings, 'ollama_default_model', '')}"
+        else:
+            model = "openai:deepseek-chat"
+        raw = f"{model}\n{self.review_system_prompt}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+        
+    @property
+    def sensitive_keywords(self) -> Dict[str, List[str]]:
+        """当前生效的敏感关键词（第一层过滤），按分类组织"""
+        matcher = get_safety_matcher()
+        return {category: words for category, words in matcher.keywords.items() if category != SAFE_CONTEXT_CATEGORY}
+    
+    def _pre_filter_content(self, content: str, user_id: Optional[Union[int, str]] = None) -> Dict[str, Any]:
         """
-        第一层过滤：基于关键词的快速过滤
+        第一层过滤：基于关键词的快速过滤，包含该用户的家长屏蔽词
         """
         issues = []
-        is_safe = True
         
-        # 检查内容中是否包含敏感关键词
-        for category, keywords in self.sensitive_keywords.items():
-            for keyword in keywords:
-                if keyword in content:  # 使用简单的包含检查而不是正则表达式
-                    issues.append(f"检测到{category}相关敏感内容: {keyword}")
-                    is_safe = False
+        # 一次扫描找出所有分类的敏感关键词，同一关键词只报告一次
+        for match in get_user_safety_matcher(user_id).find_all(content):
+            if match.category == SAFE_CONTEXT_CATEGORY:
+                continue
+            if match.category == PARENTAL_CATEGORY:
+                issue = f"{PARENTAL_ISSUE_PREFIX}{match.keyword}"
+            else:
+                issue = f"检测到{match.category}相关敏感内容: {match.keyword}"
+            if issue not in issues:
+                issues.append(issue)
         
         return {
-            "is_safe": is_safe,
+            "is_safe": not issues,
             "issues": issues
         }
     
-    def filter_content(self, content: str) -> Dict[str, Any]:
+    def check_parental_filters(self, content: str, user_id: Optional[Union[int, str]]) -> Optional[Dict[str, Any]]:
+        """
+        只检查家长设置的屏蔽词，供不经过关键词预过滤的路径（如分诊）在调用模型前使用
+
+        Args:
+            content: 用户内容
+            user_id: 用户ID
+
+        Returns:
+            命中时返回不安全的审查结果，否则为None
+        """
+        match = get_user_safety_matcher(user_id).search(content, categories={PARENTAL_CATEGORY})
+        if match is None:
+            return None
+        return {
+            "original_content": content,
+            "is_safe": False,
+            "issues": [f"{PARENTAL_ISSUE_PREFIX}{match.keyword}"],
+            "filtered_content": BLOCKED_CONTENT
+        }
+    
+    @llm_call_site("safety")
+    def filter_content(self, content: str, user_id: Optional[Union[int, str]] = None) -> Dict[str, Any]:
         """
         使用OpenAI智能过滤内容中的敏感信息（第二层过滤）
         """
         # 先进行关键词预过滤
-        pre_filter_result = self._pre_filter_content(content)
+        pre_filter_result = self._pre_filter_content(content, user_id)
         if not pre_filter_result["is_safe"]:
             return {
                 "original_content": content,
                 "is_safe": False,
                 "issues": pre_filter_result["issues"],
-                "filtered_content": "[内容包含敏感信息，已被过滤]"
+                "filtered_content": BLOCKED_CONTENT
             }
         
-        # 构造提示词
-        prompt = f"""
-        你是一个专业的儿童内容安全审查员，请根据以下安全指导原则审查用户内容：
-        
-        {self.safety_guidelines}
-        
-        用户内容: "{content}"
-        
-        请分析该内容是否适合儿童，并按以下格式回复：
-        安全状态: [安全/不安全]
-        检测到的问题: [具体问题描述，如果安全则写"无"]
-        过滤后内容: [如果内容不安全，提供修改建议；如果安全则写"保持原样"]
-        """
+        # 相同内容（忽略全半角、繁简、空白和标点差异）已审查过时直接使用之前的结论
+        use_cache = getattr(settings, 'safety_verdict_cache_enabled', True)
+        if use_cache:
+            namespace = self.verdict_namespace
+            verdict = safety_verdict_cache.get(content, namespace)
+            if verdict is not None:
+                return {
+                    "original_content": content,
+                    "is_safe": verdict["is_safe"],
+                    "issues": list(verdict["issues"]),
+                    "filtered_content": verdict["filtered_content"] or content
+                }
         
+        # 审查原则和回复格式固定在系统消息中，待审查内容放在最后
         messages = [
-            {"role": "system", "content": "你是一个专业的儿童内容安全审查员，严格按照要求格式回复。"},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": self.review_system_prompt},
+            {"role": "user", "content": f'用户内容: "{content}"'}
         ]
         
         # 调用OpenAI API进行内容安全审查
@@ -104,8 +372,10 @@ class SafetyAgent:
             "filtered_content": content
         }
         
+        parsed = False
         for line in lines:
             if line.startswith("安全状态:"):
+                parsed = True
                 result["is_safe"] = "不安全" not in line
             elif line.startswith("检测到的问题:"):
                 issues = line.replace("检测到的问题:", "").strip()
@@ -116,6 +386,14 @@ class SafetyAgent:
                 if filtered != "保持原样":
                     result["filtered_content"] = filtered
         
+        # 只缓存模型给出的明确结论，调用失败或格式不符时下次重新审查
+        if use_cache and parsed:
+            safety_verdict_cache.set(content, namespace, {
+                "is_safe": result["is_safe"],
+                "issues": result["issues"],
+                "filtered_content": None if result["filtered_content"] == content else result["filtered_content"]
+            })
+        
         return result
     
     def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -123,7 +401,8 @@ class SafetyAgent:
         处理安全审查请求
         """
         content = request.get("content", "")
-        filter_result = self.filter_content(content)
+        # 已有分诊结果时直接使用，不再重复调用模型
+        filter_result = request.get("safety_result") or self.filter_content(content, request.get("user_id"))
         
         return {
             "agent": "safety",
@@ -0,0 +1,225 @@
+from typing import Dict, Any, List, Optional
+from utils.openai_client import openai_client
+from utils.llm_telemetry import llm_call_site
+from agents.safety_agent import SafetyAgent, BLOCKED_CONTENT
+from agents.edu_agent import EduAgent
+from agents.emotion_agent import EmotionAgent
+
+
+class TriageAgent:
+    """
+    分诊代理，一次模型调用同时给出安全结论、目标代理、学科和情绪
+
+    替代依次调用SafetyAgent.filter_content、MetaAgent.route_request和
+    EduAgent._get_subject_context的做法，各代理直接使用分诊结果而不再重复询问。
+    回复中缺失或无法解析的字段分别回退到关键词过滤、默认路由和关键词学科匹配。
+    """
+
+    VALID_AGENTS = ["safety", "edu", "emotion", "memory"]
+
+    def __init__(self):
+        self.safety_agent = SafetyAgent()
+        self.edu_agent = EduAgent()
+        self.emotion_agent = EmotionAgent()
+
+        # 固定的分诊说明放在系统消息中，作为各次请求共享的前缀
+        self.system_prompt = f"""你是儿童陪伴应用的请求分诊系统，需要一次性完成内容安全审查、功能模块路由、学科判断和情绪识别，严格按照要求格式回复。
+{self.safety_agent.safety_guidelines}
+可选的功能模块有：
+1. safety - 内容安全审查，处理包含敏感、危险或不适当内容的请求
+2. edu - 教育问答，处理学习、教育、知识问答类请求
+3. emotion - 情感陪伴，处理情绪表达、情感交流、心理支持类请求
+4. memory - 记忆管理，处理需要访问或管理对话历史的请求
+
+可选的学科包括：{', '.join(self.edu_agent.subjects)}，不确定或不属于学习问题时写"通用"。
+可能的情绪类型包括：{', '.join(self.emotion_agent.emotions.keys())}，没有明显情绪时写"无"。
+
+请按以下格式回复：
+安全状态: [安全/不安全]
+检测到的问题: [具体问题描述，如果安全则写"无"]
+过滤后内容: [如果内容不安全，提供修改建议；如果安全则写"保持原样"]
+目标模块: [safety/edu/emotion/memory]
+学科: [学科名称]
+情绪类型: [主要情绪]
+情绪强度: [低/中/高]"""
+
+    @llm_call_site("triage")
+    def triage(self, content: str) -> Dict[str, Any]:
+        """
+        对用户输入进行分诊
+
+        Args:
+            content: 用户输入内容
+
+        Returns:
+            分诊结果，包含is_safe、issues、filtered_content、target_agent、
+            subject、emotion、intensity，以及记录回退字段的fallbacks
+        """
+        # 分诊结果近似确定，相同输入直接复用缓存
+        try:
+            response = openai_client.chat_completion(
+                messages=self._build_messages(content),
+                temperature=0.1,
+                max_tokens=200,
+                cache=True
+            )
+        except Exception as e:
+            print(f"分诊调用失败: {e}")
+            response = ""
+
+        return self.parse_response(content, response)
+
+    async def atriage(self, content: str) -> Dict[str, Any]:
+        """
+        异步分诊，等待模型回复时不阻塞事件循环，参数和返回值同triage
+        """
+        with llm_call_site("triage"):
+            try:
+                response = await openai_client.achat_completion(
+                    messages=self._build_messages(content),
+                    temperature=0.1,
+                    max_tokens=200,
+                    cache=True
+                )
+            except Exception as e:
+                print(f"分诊调用失败: {e}")
+                response = ""
+
+        return self.parse_response(content, response)
+
+    def _build_messages(self, content: str) -> List[Dict[str, str]]:
+        """构造分诊请求的消息"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f'用户内容: "{content}"'}
+        ]
+
+    def parse_response(self, content: str, response: str) -> Dict[str, Any]:
+        """
+        解析分诊回复，缺失或无效的字段使用回退方案
+
+        Args:
+            content: 用户输入内容
+            response: 模型回复
+
+        Returns:
+            分诊结果
+        """
+        fields = {}
+        for line in (response or "").strip().split('\n'):
+            line = line.strip().replace('：', ':')
+            if ':' in line:
+                key, value = line.split(':', 1)
+                fields[key.strip()] = value.strip().strip('[]').strip()
+
+        result = {
+            "original_content": content,
+            "is_safe": True,
+            "issues": [],
+            "filtered_content": content,
+            "target_agent": "edu",
+            "subject": None,
+            "emotion": None,
+            "intensity": "中",
+            "fallbacks": []
+        }
+
+        # 安全结论：无法解析时回退到关键词过滤，与SafetyAgent的第一层过滤一致
+        status = fields.get("安全状态")
+        if status in ("安全", "不安全"):
+            result["is_safe"] = status == "安全"
+            issues = fields.get("检测到的问题", "无")
+            if issues and issues != "无":
+                result["issues"] = [issues]
+            filtered = fields.get("过滤后内容", "保持原样")
+            if filtered and filtered != "保持原样":
+                result["filtered_content"] = filtered
+        else:
+            pre_filter_result = self.safety_agent._pre_filter_content(content)
+            result["is_safe"] = pre_filter_result["is_safe"]
+            result["issues"] = pre_filter_result["issues"]
+            if not pre_filter_result["is_safe"]:
+                result["filtered_content"] = BLOCKED_CONTENT
+            result["fallbacks"].append("safety")
+
+        # 目标代理：无效时默认路由到edu，与MetaAgent一致
+        target = fields.get("目标模块", "").lower()
+        if target in self.VALID_AGENTS:
+            result["target_agent"] = target
+        else:
+            result["fallbacks"].append("target_agent")
+
+        # 学科：不在学科列表中时回退到关键词匹配
+        subject = fields.get("学科")
+        if subject in self.edu_agent.subjects or subject == "通用":
+            result["subject"] = subject
+        else:
+            result["subject"] = self.edu_agent._fallback_subject_detection(content)
+            result["fallbacks"].append("subject")
+
+        # 情绪：无法识别时留空，由EmotionAgent自行分析
+        emotion = fields.get("情绪类型")
+        if emotion in self.emotion_agent.emotions:
+            result["emotion"] = emotion
+            intensity = fields.get("情绪强度")
+            if intensity in ("低", "中", "高"):
+                result["intensity"] = intensity
+
+        return result
+
+    def to_safety_result(self, triage_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        转换为SafetyAgent.filter_content的结果格式
+        """
+        return {
+            "original_content": triage_result["original_content"],
+            "is_safe": triage_result["is_safe"],
+            "issues": triage_result["issues"],
+            "filtered_content": triage_result["filtered_content"]
+        }
+
+    def to_emotion_analysis(self, triage_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        转换为EmotionAgent.analyze_emotion的结果格式，未识别出情绪时返回None
+        """
+        emotion = triage_result.get("emotion")
+        if not emotion:
+            return None
+        return {
+            "emotion": emotion,
+            "intensity": triage_result.get("intensity", "中"),
+            "reason": "分诊结果",
+            "suggestion": self.emotion_agent.emotions[emotion]["response_strategy"]
+        }
+
+    def to_agent_request(self, request: Dict[str, Any], triage_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        把分诊结果附加到代理请求中，各代理据此跳过重复的模型调用
+
+        Args:
+            request: 原始请求
+            triage_result: 分诊结果
+
+        Returns:
+            附加了safety_result、subject和emotion_analysis的新请求
+        """
+        enriched = dict(request)
+        enriched["safety_result"] = self.to_safety_result(triage_result)
+        enriched["subject"] = triage_result.get("subject")
+        emotion_analysis = self.to_emotion_analysis(triage_result)
+        if emotion_analysis is not None:
+            enriched["emotion_analysis"] = emotion_analysis
+        return enriched
+
+    def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理分诊请求
+        """
+        content = request.get("content", "")
+        triage_result = self.triage(content)
+
+        return {
+            "agent": "triage",
+            "result": triage_result,
+            "status": "processed"
+        }
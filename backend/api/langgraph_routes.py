@@ -1,5 +1,6 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional, List
 from datetime import datetime
@@ -11,6 +12,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from agents.langgraph_workflow import happy_partner_graph
+from utils.llm_scheduler import llm_scheduler, priority_for_input_mode
 from db.database import get_db
 from db.database_service import DatabaseService
 from schemas import (
@@ -38,12 +40,13 @@ async def langgraph_chat(
     返回LangGraph工作流处理结果，包含智能路由和协作代理的响应
     """
     try:
-        # 执行LangGraph工作流
-        result = await happy_partner_graph.process_message(
-            user_id=str(request.user_id or 1),
-            content=request.content,
-            session_id=request.session_id
-        )
+        # 执行LangGraph工作流，语音请求以更高优先级调度
+        with llm_scheduler.priority(priority_for_input_mode(request.input_mode)):
+            result = await happy_partner_graph.process_message(
+                user_id=str(request.user_id or 1),
+                content=request.content,
+                session_id=request.session_id
+            )
 
         # 存储到数据库
         DatabaseService.create_conversation(
@@ -71,34 +74,45 @@ async def langgraph_chat(
         raise HTTPException(status_code=500, detail=f"聊天处理失败: {str(e)}")
 
 
+def _format_sse(event: Dict[str, Any]) -> str:
+    """将工作流事件编码为Server-Sent Events格式"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
 @router.post("/chat/stream")
 async def langgraph_chat_stream(
     request: ChatRequest,
     db: Session = Depends(get_db)
 ):
     """
-    LangGraph流式聊天接口（实验性）
+    LangGraph流式聊天接口（Server-Sent Events）
 
-    提供实时的agent处理状态更新
+    按顺序推送以下事件：
+    - **node**: 工作流节点完成进度（安全检查结果、路由目标等）
+    - **token**: 模型生成的增量文本，生成即推送
+    - **complete**: 完整处理结果，结构与 /langgraph/chat 的工作流结果一致
+    - **error**: 处理失败时的错误信息
     """
-    try:
-        # 这里可以实现流式响应
-        # 目前返回完整结果作为演示
-        result = await happy_partner_graph.process_message(
-            user_id=str(request.user_id or 1),
-            content=request.content,
-            session_id=request.session_id
-        )
-
-        return {
-            "type": "complete",
-            "data": result,
-            "session_id": request.session_id
-        }
-
-    except Exception as e:
-        logger.error(f"LangGraph流式聊天失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"流式聊天失败: {str(e)}")
+    async def event_stream():
+        try:
+            with llm_scheduler.priority(priority_for_input_mode(request.input_mode)):
+                async for event in happy_partner_graph.stream_message(
+                    user_id=str(request.user_id or 1),
+                    content=request.content,
+                    session_id=request.session_id
+                ):
+                    if event["type"] == "complete":
+                        event["session_id"] = request.session_id
+                    yield _format_sse(event)
+        except Exception as e:
+            logger.error(f"LangGraph流式聊天失败: {str(e)}")
+            yield _format_sse({"type": "error", "detail": f"流式聊天失败: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/workflow/state")
@@ -0,0 +1,210 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from utils.llm_cache import llm_result_cache
+from utils.singleflight import llm_singleflight
+from utils.ollama_client import ollama_client
+from utils.llm_scheduler import llm_scheduler
+from utils.openai_client import openai_client
+from utils.llm_telemetry import llm_telemetry
+from utils.intent_classifier import intent_classifier
+from utils.emotion_lexicon import emotion_lexicon
+from utils.safety_verdict_cache import safety_verdict_cache
+from utils.answer_cache import edu_answer_cache
+from utils.answer_bank import answer_bank
+from utils.speculation import speculation_stats
+from config.settings import settings
+
+router = APIRouter(prefix="/llm", tags=["LLM"])
+
+
+@router.get("/cache/stats")
+async def get_llm_cache_stats() -> Dict[str, Any]:
+    """
+    获取确定性LLM调用结果缓存的统计信息
+
+    返回命中数、未命中数、命中率、淘汰数和当前条目数
+    """
+    return llm_result_cache.get_stats()
+
+
+@router.get("/coalescing/stats")
+async def get_llm_coalescing_stats() -> Dict[str, Any]:
+    """
+    获取相同请求合并的统计信息
+
+    返回实际执行的上游请求数、被合并的请求数和当前进行中的请求数
+    """
+    return llm_singleflight.get_stats()
+
+
+@router.get("/hosts")
+async def get_llm_hosts() -> Dict[str, Any]:
+    """
+    获取各Ollama节点的状态
+
+    返回每个节点的健康状态、已加载模型、当前队列深度和延迟
+    """
+    return ollama_client.get_host_stats()
+
+
+@router.get("/scheduler/stats")
+async def get_llm_scheduler_stats() -> Dict[str, Any]:
+    """
+    获取LLM调度的统计信息
+
+    返回各后端的并发上限、执行中和排队中的调用数，以及各优先级的准入、拒绝、
+    超时次数和排队时间
+    """
+    return llm_scheduler.get_stats()
+
+
+@router.get("/breakers")
+async def get_llm_breakers() -> Dict[str, Any]:
+    """
+    获取LLM后端的熔断状态
+
+    返回主备后端、各后端熔断器状态（closed/open/half_open）、窗口失败率和延迟分位数，
+    以及对冲和备用切换次数
+    """
+    return openai_client.get_resilience_stats()
+
+
+@router.get("/telemetry")
+async def get_llm_telemetry() -> Dict[str, Any]:
+    """
+    获取LLM调用遥测
+
+    按调用点（router/triage/safety/subject/edu/emotion_analysis/emotion/summary）、后端和模型
+    返回调用数、失败数、模型换入次数，以及服务耗时、排队时间、首字延迟、prefill/decode/模型加载耗时、
+    输入输出令牌数和生成速度的直方图
+    """
+    return llm_telemetry.get_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_llm_metrics() -> str:
+    """
+    以Prometheus文本格式导出LLM调用遥测
+    """
+    return llm_telemetry.export_prometheus()
+
+
+@router.get("/intent/stats")
+async def get_intent_classifier_stats() -> Dict[str, Any]:
+    """
+    获取本地意图分类器的状态
+
+    返回是否启用、置信度阈值、各类别训练样本数、词表大小，以及预测次数和无需调用LLM路由的比例
+    """
+    return {
+        "enabled": settings.intent_classifier_enabled,
+        "threshold": settings.intent_confidence_threshold,
+        **intent_classifier.get_stats()
+    }
+
+
+@router.get("/emotion-lexicon/stats")
+async def get_emotion_lexicon_stats() -> Dict[str, Any]:
+    """
+    获取情绪词典预判的状态
+
+    返回是否启用、置信度阈值、抽样核对比例，以及预判次数、无需模型分析情绪的比例和与模型结论的一致率
+    """
+    return {
+        "enabled": settings.emotion_lexicon_enabled,
+        "threshold": settings.emotion_lexicon_threshold,
+        "audit_rate": settings.emotion_lexicon_audit_rate,
+        **emotion_lexicon.get_stats()
+    }
+
+
+@router.get("/speculation/stats")
+async def get_speculation_stats() -> Dict[str, Any]:
+    """
+    获取代理推测执行的统计信息
+
+    返回是否启用、猜测阈值，以及推测次数、命中率、浪费的令牌数（被放弃的推测已生成的增量文本块数）
+    和累计节省的等待时间，用于调整阈值
+    """
+    return {
+        "enabled": settings.speculative_agent_enabled,
+        "threshold": settings.speculative_agent_threshold,
+        **speculation_stats.get_stats()
+    }
+
+
+@router.post("/cache/clear")
+async def clear_llm_cache() -> Dict[str, Any]:
+    """
+    清空确定性LLM调用结果缓存（例如更新提示词或模型后）
+    """
+    llm_result_cache.clear()
+    logger.info("LLM结果缓存已清空")
+    return {"message": "LLM结果缓存已清空"}
+
+
+@router.get("/answer-cache/stats")
+async def get_answer_cache_stats() -> Dict[str, Any]:
+    """
+    获取EduAgent近似问题回答缓存的统计信息
+
+    返回命中率、平均命中相似度、节省的生成时间、淘汰数和当前条目数
+    """
+    return edu_answer_cache.get_stats()
+
+
+@router.post("/answer-cache/clear")
+async def clear_answer_cache() -> Dict[str, Any]:
+    """
+    清空EduAgent回答缓存（例如调整回答提示词后）
+    """
+    edu_answer_cache.clear()
+    logger.info("EduAgent回答缓存已清空")
+    return {"message": "EduAgent回答缓存已清空"}
+
+
+@router.get("/answer-bank/stats")
+async def get_answer_bank_stats() -> Dict[str, Any]:
+    """
+    获取预生成回答库的统计信息
+
+    返回已载入的回答数、命中率和节省的生成时间
+    """
+    return answer_bank.get_stats()
+
+
+@router.post("/answer-bank/reload")
+async def reload_answer_bank() -> Dict[str, Any]:
+    """
+    重新载入预生成回答库（批量任务运行完成后调用）
+    """
+    answer_bank.reload()
+    logger.info("预生成回答库将在下次查询时重新载入")
+    return {"message": "预生成回答库将在下次查询时重新载入"}
+
+
+@router.get("/safety-cache/stats")
+async def get_safety_cache_stats() -> Dict[str, Any]:
+    """
+    获取安全审查结论缓存的统计信息
+
+    返回内存和数据库命中数、未命中数、命中率、淘汰和过期数
+    """
+    return safety_verdict_cache.get_stats()
+
+
+@router.post("/safety-cache/invalidate")
+async def invalidate_safety_cache() -> Dict[str, Any]:
+    """
+    清除全部安全审查结论（例如修改安全指导原则或更换审查模型后）
+    """
+    deleted = safety_verdict_cache.invalidate()
+    logger.info(f"安全审查结论缓存已清除，删除{deleted}条持久化结论")
+    return {"message": "安全审查结论缓存已清除", "deleted": deleted}
@@ -105,10 +105,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 # 使用绝对导入
 from agents.meta_agent import MetaAgent
-from agents.safety_agent import SafetyAgent
+from agents.safety_agent import SafetyAgent, compile_user_content_filters, parse_blocked_keywords
 from agents.edu_agent import EduAgent
 from agents.memory_agent import MemoryAgent
+from utils.memory_store import user_memory_store
 from agents.emotion_agent import EmotionAgent
+from agents.triage_agent import TriageAgent
+from config.settings import settings
+from utils.llm_scheduler import llm_scheduler, priority_for_input_mode
 from db.database import get_db
 from db.database_service import DatabaseService
 from models.user import Conversation, SecurityLog
@@ -143,8 +147,9 @@ router = APIRouter()
 meta_agent = MetaAgent()
 safety_agent = SafetyAgent()
 edu_agent = EduAgent()
-memory_agent = MemoryAgent()
+memory_agent = MemoryAgent(store=user_memory_store)
 emotion_agent = EmotionAgent()
+triage_agent = TriageAgent()
 
 # 初始化音频服务
 stt_service = STTService()
@@ -163,27 +168,41 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     - **user_id**: 用户ID，默认为1
     - **session_id**: 可选的会话ID
     - **content**: 用户输入的聊天内容
+    - **input_mode**: 输入方式（text/voice），可选
     
     返回对应代理的处理结果
     """
-    # 通过MetaAgent路由请求
-    request_dict = request.dict()
-    routing_result = meta_agent.process_request(request_dict)
-    agent_type = routing_result["agent"]
-    
-    # 根据路由结果分发到对应代理处理
-    if agent_type == "safety":
-        result = safety_agent.process_request(request_dict)
-    elif agent_type == "edu":
-        result = edu_agent.process_request(request_dict)
-    elif agent_type == "memory":
-        result = memory_agent.process_request(request_dict)
-    elif agent_type == "emotion":
-        result = emotion_agent.process_request(request_dict)
-    else:
-        # 默认使用EduAgent处理
-        result = edu_agent.process_request(request_dict)
-        agent_type = "edu"
+    # 语音请求以更高优先级调度模型调用
+    with llm_scheduler.priority(priority_for_input_mode(request.input_mode)):
+        request_dict = request.dict()
+        # 家长屏蔽词只在本地匹配，命中时直接交给SafetyAgent，不再调用模型
+        parental_result = safety_agent.check_parental_filters(request.content, request.user_id)
+        if parental_result is not None:
+            request_dict["safety_result"] = parental_result
+            agent_type = "safety"
+        elif settings.llm_triage_enabled:
+            # 一次分诊调用得到安全结论、目标代理、学科和情绪，各代理不再重复询问
+            triage_result = triage_agent.triage(request.content)
+            request_dict = triage_agent.to_agent_request(request_dict, triage_result)
+            agent_type = triage_result["target_agent"] if triage_result["is_safe"] else "safety"
+        else:
+            # 通过MetaAgent路由请求
+            routing_result = meta_agent.process_request(request_dict)
+            agent_type = routing_result["agent"]
+
+        # 根据路由结果分发到对应代理处理
+        if agent_type == "safety":
+            result = safety_agent.process_request(request_dict)
+        elif agent_type == "edu":
+            result = edu_agent.process_request(request_dict)
+        elif agent_type == "memory":
+            result = memory_agent.process_request(request_dict)
+        elif agent_type == "emotion":
+            result = emotion_agent.process_request(request_dict)
+        else:
+            # 默认使用EduAgent处理
+            result = edu_agent.process_request(request_dict)
+            agent_type = "edu"
     
     # 存储对话历史
     DatabaseService.create_conversation(
@@ -299,6 +318,16 @@ async def emotion_support(request: EmotionSupportRequest, db: Session = Depends(
     )
 
 
+@router.get("/memory/stats")
+async def memory_stats() -> Dict[str, Any]:
+    """
+    获取对话记忆存储的统计信息
+
+    返回常驻内存的用户数、总条数和字节数、每个用户的平均占用以及占用最多的用户
+    """
+    return user_memory_store.get_stats()
+
+
 @router.post("/memory/manage", response_model=MemoryActionResponse)
 async def memory_manage(request: MemoryActionRequest, db: Session = Depends(get_db)):
     """
@@ -563,21 +592,39 @@ async def get_user_learning_progress(user_id: int, db: Session = Depends(get_db)
     }
 
 
+@router.get("/users/{user_id}/content-filters")
+async def get_content_filters(user_id: int, db: Session = Depends(get_db)):
+    """
+    获取用户内容过滤设置
+    
+    - **user_id**: 用户ID
+    
+    返回家长为该用户保存的内容过滤设置，未设置时为空
+    """
+    db_filter = DatabaseService.get_content_filters(db, user_id)
+    return {
+        "user_id": user_id,
+        "filters": db_filter.filters if db_filter is not None else {}
+    }
+
+
 @router.post("/users/{user_id}/content-filters")
 async def update_content_filters(user_id: int, filters: dict, db: Session = Depends(get_db)):
     """
     更新用户内容过滤设置
     
     - **user_id**: 用户ID
-    - **filters**: 过滤设置字典
+    - **filters**: 过滤设置字典，blocked_keywords为家长设置的屏蔽词列表
     
-    更新并返回用户的内容过滤设置
+    保存设置并重新编译该用户的关键词匹配器，返回更新后的设置
     """
-    # 在实际实现中，这里会将过滤设置保存到数据库
-    # 目前我们简化处理，仅返回设置
+    db_filter = DatabaseService.update_content_filters(db, user_id, filters)
+    # 立即用新设置替换本进程缓存的匹配器，其他工作进程在核对间隔后发现更新
+    compile_user_content_filters(user_id, db_filter.filters, db_filter.updated_at)
     return {
         "user_id": user_id,
-        "filters": filters,
+        "filters": db_filter.filters,
+        "blocked_keywords": parse_blocked_keywords(db_filter.filters),
         "message": "内容过滤设置已更新"
     }
 
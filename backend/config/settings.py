@@ -21,12 +21,103 @@ class Settings(BaseSettings):  # type: ignore
     openai_base_url: str = os.environ.get(
         "OPENAI_BASE_URL", "https://api.deepseek.com/v1"
     )
+    openai_timeout: int = int(os.environ.get("OPENAI_TIMEOUT", "60"))
 
     # Ollama配置
     use_ollama: bool = os.environ.get("USE_OLLAMA", "true").lower() == "true"
     ollama_base_url: str = os.environ.get("OLLAMA_BASE_URL", "http://100.64.255.128:11434")
     ollama_default_model: str = os.environ.get("OLLAMA_DEFAULT_MODEL", "paopao")
     ollama_timeout: int = int(os.environ.get("OLLAMA_TIMEOUT", "60"))
+    # 多节点部署时以逗号分隔的节点地址列表，为空时只使用ollama_base_url
+    ollama_hosts: str = os.environ.get("OLLAMA_HOSTS", "")
+    ollama_health_check_interval: float = float(os.environ.get("OLLAMA_HEALTH_CHECK_INTERVAL", "15"))
+    ollama_host_max_failures: int = int(os.environ.get("OLLAMA_HOST_MAX_FAILURES", "2"))
+    # chat: 使用/api/chat并由模型模板拼接；generate: 使用/api/generate和手工拼接的qwen模板
+    ollama_api_mode: str = os.environ.get("OLLAMA_API_MODE", "chat")
+    ollama_keep_alive: str = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+    # 与Modelfile中的num_ctx保持一致，用于限制跨轮复用的上下文长度
+    ollama_num_ctx: int = int(os.environ.get("OLLAMA_NUM_CTX", "2048"))
+    ollama_session_max: int = int(os.environ.get("OLLAMA_SESSION_MAX", "256"))
+    ollama_session_max_turns: int = int(os.environ.get("OLLAMA_SESSION_MAX_TURNS", "6"))
+
+    # LLM HTTP连接池配置（Ollama和OpenAI兼容后端共用）
+    llm_pool_max_connections: int = int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", "20"))
+    llm_pool_max_keepalive: int = int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "10"))
+    llm_keepalive_expiry: float = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "30"))
+    llm_connect_timeout: float = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+
+    # 确定性调用（路由、学科分类）结果缓存
+    llm_cache_enabled: bool = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_max_entries: int = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1024"))
+    llm_cache_ttl: int = int(os.environ.get("LLM_CACHE_TTL", "600"))
+    # EduAgent近似问题回答缓存：措辞不同但意思相同的问题复用同一年龄段已生成的回答
+    edu_answer_cache_enabled: bool = os.environ.get("EDU_ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    edu_answer_cache_max_entries: int = int(os.environ.get("EDU_ANSWER_CACHE_MAX_ENTRIES", "2048"))
+    edu_answer_cache_threshold: float = float(os.environ.get("EDU_ANSWER_CACHE_THRESHOLD", "0.7"))
+    edu_answer_cache_ttl: int = int(os.environ.get("EDU_ANSWER_CACHE_TTL", "86400"))
+    # 预生成回答库：EduAgent先查低峰期批量生成的高频课程问题回答
+    answer_bank_enabled: bool = os.environ.get("ANSWER_BANK_ENABLED", "true").lower() == "true"
+    answer_bank_threshold: float = float(os.environ.get("ANSWER_BANK_THRESHOLD", "0.7"))
+    answer_bank_max_entries: int = int(os.environ.get("ANSWER_BANK_MAX_ENTRIES", "100000"))
+    # MemoryAgent对话记忆：每个用户保留的条数、所有用户的总字节数上限，以及是否写入数据库
+    memory_store_capacity: int = int(os.environ.get("MEMORY_STORE_CAPACITY", "50"))
+    memory_store_max_bytes: int = int(os.environ.get("MEMORY_STORE_MAX_BYTES", str(32 * 1024 * 1024)))
+    memory_store_persistent: bool = os.environ.get("MEMORY_STORE_PERSISTENT", "true").lower() == "true"
+    # 持久化时读取对话记忆前，距上次核对超过多少秒才查询数据库是否有其他进程的改动
+    memory_store_recheck_seconds: float = float(os.environ.get("MEMORY_STORE_RECHECK_SECONDS", "1.0"))
+    # 相同请求合并：并发的相同(模型, 消息, 参数)调用共享一次上游请求
+    llm_coalesce_enabled: bool = os.environ.get("LLM_COALESCE_ENABLED", "true").lower() == "true"
+    # LLM调度：各后端并发上限和各优先级的最长排队秒数
+    llm_scheduler_enabled: bool = os.environ.get("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+    llm_max_concurrency_ollama: int = int(os.environ.get("LLM_MAX_CONCURRENCY_OLLAMA", "4"))
+    llm_max_concurrency_openai: int = int(os.environ.get("LLM_MAX_CONCURRENCY_OPENAI", "16"))
+    llm_queue_deadline_voice: float = float(os.environ.get("LLM_QUEUE_DEADLINE_VOICE", "5"))
+    llm_queue_deadline_text: float = float(os.environ.get("LLM_QUEUE_DEADLINE_TEXT", "15"))
+    llm_queue_deadline_background: float = float(os.environ.get("LLM_QUEUE_DEADLINE_BACKGROUND", "60"))
+    # 熔断和备用后端：llm_fallback_backend可设为ollama或openai（与主后端不同时生效）
+    llm_fallback_backend: str = os.environ.get("LLM_FALLBACK_BACKEND", "")
+    llm_breaker_enabled: bool = os.environ.get("LLM_BREAKER_ENABLED", "true").lower() == "true"
+    llm_breaker_window: int = int(os.environ.get("LLM_BREAKER_WINDOW", "20"))
+    llm_breaker_min_calls: int = int(os.environ.get("LLM_BREAKER_MIN_CALLS", "5"))
+    llm_breaker_failure_rate: float = float(os.environ.get("LLM_BREAKER_FAILURE_RATE", "0.5"))
+    llm_breaker_slow_call_seconds: float = float(os.environ.get("LLM_BREAKER_SLOW_CALL_SECONDS", "20"))
+    llm_breaker_slow_call_rate: float = float(os.environ.get("LLM_BREAKER_SLOW_CALL_RATE", "0.5"))
+    llm_breaker_open_seconds: float = float(os.environ.get("LLM_BREAKER_OPEN_SECONDS", "30"))
+    # 对冲：主后端超过该延迟分位数仍未返回时向备用后端再发一次请求
+    llm_hedge_enabled: bool = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    llm_hedge_percentile: float = float(os.environ.get("LLM_HEDGE_PERCENTILE", "0.95"))
+    # LangGraph工作流：仍为同步实现的代理调用（流式生成、输出审查）放到线程池执行，不阻塞事件循环
+    workflow_max_workers: int = int(os.environ.get("WORKFLOW_MAX_WORKERS", "64"))
+    # 推测执行：路由完成前按本地意图分类器或用户的代理使用偏好先启动最可能的代理，路由一致时采用结果
+    speculative_agent_enabled: bool = os.environ.get("SPECULATIVE_AGENT_ENABLED", "false").lower() == "true"
+    speculative_agent_threshold: float = float(os.environ.get("SPECULATIVE_AGENT_THRESHOLD", "0.8"))
+    # 使用一次分诊调用代替依次的安全审查、路由和学科判断调用
+    llm_triage_enabled: bool = os.environ.get("LLM_TRIAGE_ENABLED", "true").lower() == "true"
+    # EmotionAgent单次调用：一次生成同时给出情绪分析和回复，代替先分析再回复的两次调用
+    emotion_single_call_enabled: bool = os.environ.get("EMOTION_SINGLE_CALL_ENABLED", "true").lower() == "true"
+    # 情绪词典预判：置信度达到阈值时直接使用本地判断的情绪，不再调用模型分析情绪
+    emotion_lexicon_enabled: bool = os.environ.get("EMOTION_LEXICON_ENABLED", "true").lower() == "true"
+    emotion_lexicon_threshold: float = float(os.environ.get("EMOTION_LEXICON_THRESHOLD", "0.75"))
+    # 本地判断直接采用时，按此比例在后台调用模型分析情绪以统计一致率
+    emotion_lexicon_audit_rate: float = float(os.environ.get("EMOTION_LEXICON_AUDIT_RATE", "0.05"))
+    # 本地意图分类：置信度达到阈值时直接路由，否则再调用LLM路由
+    intent_classifier_enabled: bool = os.environ.get("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+    intent_confidence_threshold: float = float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", "0.9"))
+    intent_model_path: str = os.environ.get("INTENT_MODEL_PATH", "./intent_model.json")
+    # 安全审查结论缓存：按归一化内容缓存模型给出的结论，持久化到数据库，重启后仍有效
+    safety_verdict_cache_enabled: bool = os.environ.get("SAFETY_VERDICT_CACHE_ENABLED", "true").lower() == "true"
+    safety_verdict_cache_max_entries: int = int(os.environ.get("SAFETY_VERDICT_CACHE_MAX_ENTRIES", "4096"))
+    safety_verdict_cache_ttl: int = int(os.environ.get("SAFETY_VERDICT_CACHE_TTL", "604800"))
+    # 输出审查：用关键词自动机流式扫描EduAgent和EmotionAgent的回复；redact为打码，cutoff为截断
+    output_moderation_enabled: bool = os.environ.get("OUTPUT_MODERATION_ENABLED", "true").lower() == "true"
+    output_moderation_mode: str = os.environ.get("OUTPUT_MODERATION_MODE", "redact")
+    # 逗号分隔的审查分类；暴力、隐私等分类的词（刀、地址）在正常讲解中很常见，默认不审查
+    output_moderation_categories: str = os.environ.get("OUTPUT_MODERATION_CATEGORIES", "adult,hate,parental")
+    # 家长过滤设置：缓存的用户匹配器超过此秒数后与数据库核对更新时间，其他工作进程的修改随之生效
+    content_filter_recheck_seconds: float = float(os.environ.get("CONTENT_FILTER_RECHECK_SECONDS", "30"))
+    # 调用遥测：按调用点和模型记录延迟、排队时间和令牌数；模型加载超过阈值视为一次换入
+    llm_telemetry_enabled: bool = os.environ.get("LLM_TELEMETRY_ENABLED", "true").lower() == "true"
+    llm_model_load_threshold_ms: float = float(os.environ.get("LLM_MODEL_LOAD_THRESHOLD_MS", "500"))
 
     # 移除env_file配置以避免加载问题
     # class Config: # type: ignore
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, text
-from models.user import User, Session as UserSession, Conversation, ArchivedConversation, SecurityLog
+from models.user import User, Session as UserSession, Conversation, ArchivedConversation, SecurityLog, ContentFilter
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 import logging
@@ -533,4 +533,42 @@ class DatabaseService:
             安全日志列表
         """
         return db.query(SecurityLog).filter(SecurityLog.user_id == user_id).order_by(
-            SecurityLog.created_at.desc()).limit(limit).all()
\ No newline at end of file
+            SecurityLog.created_at.desc()).limit(limit).all()
+    
+    @staticmethod
+    def get_content_filters(db: Session, user_id: int) -> Optional[ContentFilter]:
+        """
+        获取用户的内容过滤设置
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            
+        Returns:
+            内容过滤设置对象，未设置时为None
+        """
+        return db.query(ContentFilter).filter(ContentFilter.user_id == user_id).first()
+    
+    @staticmethod
+    def update_content_filters(db: Session, user_id: int, filters: dict) -> ContentFilter:
+        """
+        创建或更新用户的内容过滤设置
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            filters: 过滤设置字典
+            
+        Returns:
+            保存后的内容过滤设置对象
+        """
+        db_filter = DatabaseService.get_content_filters(db, user_id)
+        if db_filter is None:
+            db_filter = ContentFilter(user_id=user_id, filters=filters)
+            db.add(db_filter)
+        else:
+            db_filter.filters = filters  # type: ignore
+        db.commit()
+        db.refresh(db_filter)
+        logger.info(f"更新内容过滤设置: 用户{user_id}")
+        return db_filter
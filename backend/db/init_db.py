@@ -9,7 +9,7 @@ from sqlalchemy.orm import sessionmaker
 from db.database import Base
 from config.settings import Settings
 # 确保所有模型都被导入，这样Base.metadata.create_all才能创建所有表
-from models.user import User, Session, Conversation, ArchivedConversation, SecurityLog
+from models.user import User, Session, Conversation, ArchivedConversation, SecurityLog, SafetyVerdict, ContentFilter, AnswerBankEntry, UserMemory
 from models.voiceprint import Voiceprint
 import logging
 
@@ -17,6 +17,7 @@ else:
 # 导入路由
 from api.routes import router
 from api.langgraph_routes import router as langgraph_router
+from api.llm_routes import router as llm_router
 
 app = FastAPI(title="Happy Partner - 儿童教育AI系统",
               description="一个多代理架构的儿童教育AI系统，专注于教育辅助和情感陪伴 - 支持LangGraph工作流",
@@ -34,6 +35,7 @@ app.add_middleware(
 # 包含路由
 app.include_router(router, prefix="/api")
 app.include_router(langgraph_router, prefix="/api")
+app.include_router(llm_router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -1,3 +1,3 @@
 # Models模块初始化文件
-from .user import User, Session, Conversation, ArchivedConversation, SecurityLog
+from .user import User, Session, Conversation, ArchivedConversation, SecurityLog, SafetyVerdict, ContentFilter, AnswerBankEntry, UserMemory
 from .voiceprint import Voiceprint, VoiceVerificationLog
\ No newline at end of file
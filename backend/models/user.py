@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, LargeBinary, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, LargeBinary, JSON, Float
 from datetime import datetime, timezone
 from db.database import Base
 
@@ -58,4 +58,54 @@ class SecurityLog(Base):
     content = Column(Text)
     is_safe = Column(Integer)  # 0 for unsafe, 1 for safe
     filtered_content = Column(Text)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class SafetyVerdict(Base):
+    __tablename__ = "safety_verdicts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # 归一化内容的哈希，与审查规则版本一起唯一确定一条结论
+    content_hash = Column(String, unique=True, index=True)
+    # 审查提示词和模型的指纹，规则或模型变化后旧结论不再命中
+    namespace = Column(String, index=True)
+    verdict = Column(JSON)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ContentFilter(Base):
+    __tablename__ = "content_filters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, unique=True, index=True)
+    # 家长配置的过滤规则，如{"blocked_keywords": [...]}
+    filters = Column(JSON, default=dict)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+
+class AnswerBankEntry(Base):
+    __tablename__ = "answer_bank"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # 年龄段、归一化问题和回答提示词指纹的哈希，唯一确定一条预生成回答
+    question_key = Column(String, unique=True, index=True)
+    # EduAgent回答提示词和所用模型的指纹，提示词或模型变化后旧回答不再使用
+    namespace = Column(String, index=True)
+    age_group = Column(String, index=True)
+    subject = Column(String)
+    question = Column(Text)
+    answer = Column(Text)
+    # 生成该回答用去的秒数
+    generation_time = Column(Float, default=0.0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class UserMemory(Base):
+    __tablename__ = "user_memories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # MemoryAgent的用户标识，未登录用户也有记录，因此不关联users表
+    user_id = Column(String, index=True)
+    entry = Column(JSON)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
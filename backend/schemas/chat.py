@@ -8,6 +8,7 @@ class ChatRequest(BaseModel):
     content: str = Field(..., description="用户输入的聊天内容", example="你好，今天天气怎么样？")
     user_id: Optional[int] = Field(1, description="用户ID，默认为1", example=1)
     session_id: Optional[int] = Field(None, description="会话ID，可选", example=123)
+    input_mode: Optional[str] = Field("text", description="输入方式：text为文字输入，voice为语音转写，语音请求优先调度", example="text")
     
 
 class ChatResponse(BaseModel):
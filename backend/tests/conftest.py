@@ -12,6 +12,7 @@ if sys.platform == "win32":
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from db.database import Base
 from db.init_db import init_db
 from main import app
@@ -27,6 +28,16 @@ def setup_database():
     init_db()
     yield
 
+@pytest.fixture
+def session_factory():
+    """内存SQLite会话工厂，每个测试一个独立的数据库"""
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
 @pytest.fixture(scope="function")
 def client():
     """创建测试客户端"""
@@ -0,0 +1,120 @@
+import pytest
+from unittest.mock import patch
+from models.user import AnswerBankEntry
+from agents.edu_agent import EduAgent, DEFAULT_GRADE
+from utils.answer_bank import AnswerBank
+from utils.answer_cache import NearDuplicateAnswerCache
+from tools.build_answer_bank import build_answer_bank, load_questions
+
+
+class TestAnswerBank:
+    """测试预生成回答库"""
+
+    def test_save_and_lookup(self, session_factory):
+        """测试保存后可按近似问题查到，且按年龄段和提示词指纹隔离"""
+        bank = AnswerBank(session_factory=session_factory)
+        assert bank.save("7-8岁", "科学", "什么是光合作用", "植物做饭", "ns1", 3.0)
+        restarted = AnswerBank(session_factory=session_factory)
+        assert restarted.lookup("7-8岁", "请问什么是光合作用呀", "ns1").answer == "植物做饭"
+        assert restarted.lookup("9-10岁", "什么是光合作用", "ns1") is None
+        assert restarted.lookup("7-8岁", "什么是光合作用", "ns2") is None
+        assert restarted.get_stats()["entries"] == 0
+
+    def test_save_updates_loaded_index(self, session_factory):
+        """测试已载入索引后保存的回答立即可用，重复保存覆盖旧回答"""
+        bank = AnswerBank(session_factory=session_factory)
+        assert bank.lookup("7-8岁", "什么是光合作用", "ns") is None
+        bank.save("7-8岁", "科学", "什么是光合作用", "旧回答", "ns")
+        bank.save("7-8岁", "科学", "什么是光合作用", "新回答", "ns")
+        db = session_factory()
+        assert db.query(AnswerBankEntry).count() == 1
+        db.close()
+        bank.reload()
+        assert bank.lookup("7-8岁", "什么是光合作用", "ns").answer == "新回答"
+
+    def test_error_answer_not_saved(self, session_factory):
+        """测试调用出错的回答不保存"""
+        bank = AnswerBank(session_factory=session_factory)
+        assert bank.save("7-8岁", "科学", "什么是光合作用", "调用OpenAI API时出错: timeout", "ns") is False
+        assert bank.contains("7-8岁", "什么是光合作用", "ns") is False
+
+
+class TestBuildAnswerBank:
+    """测试批量预生成任务"""
+
+    QUESTIONS = {"科学": ["什么是光合作用", "为什么天空是蓝色的"], "魔法": ["怎么变魔术"]}
+
+    def test_generate_and_resume(self, session_factory):
+        """测试按学科×年龄段生成，再次运行时跳过已完成的问题"""
+        bank = AnswerBank(session_factory=session_factory)
+        agent = EduAgent()
+        with patch.object(EduAgent, "generate_answer", return_value="回答") as llm, \
+             patch.object(agent, "build_answer_messages", wraps=agent.build_answer_messages) as build:
+            # 内存数据库只有一个共享连接，单线程生成避免并发提交冲突
+            first = build_answer_bank(self.QUESTIONS, ages=["5-6岁", "7-8岁"], workers=1, limit=3, bank=bank, agent=agent)
+            second = build_answer_bank(self.QUESTIONS, ages=["5-6岁", "7-8岁"], workers=1, bank=bank, agent=agent)
+        # 与EduAgent处理未提供年级的请求时使用相同的年级
+        assert {call.args[2] for call in build.call_args_list} == {DEFAULT_GRADE}
+        assert first["generated"] == 3
+        assert first["unknown_subjects"] == ["魔法"]
+        assert second["skipped"] == 3
+        assert second["generated"] == 1
+        assert llm.call_count == 4
+        assert second["answers_per_minute"] > 0
+
+    def test_failed_generation_retried_next_run(self, session_factory):
+        """测试生成失败的问题不写入，下次运行重新生成"""
+        bank = AnswerBank(session_factory=session_factory)
+        with patch.object(EduAgent, "generate_answer", return_value="调用OpenAI API时出错: timeout"):
+            report = build_answer_bank({"科学": ["什么是光合作用"]}, ages=["7-8岁"], bank=bank)
+        assert report["failed"] == 1
+        assert bank.contains("7-8岁", "什么是光合作用", EduAgent().answer_namespace) is False
+
+    def test_deadline_stops_new_work(self, session_factory):
+        """测试到达截止时间后不再开始新的生成"""
+        bank = AnswerBank(session_factory=session_factory)
+        with patch.object(EduAgent, "generate_answer", return_value="回答") as llm:
+            report = build_answer_bank(self.QUESTIONS, ages=["7-8岁"], deadline=0, bank=bank)
+        llm.assert_not_called()
+        assert report["remaining"] == 2
+
+    def test_unknown_age(self):
+        """测试未知年龄段报错"""
+        with pytest.raises(ValueError):
+            build_answer_bank(self.QUESTIONS, ages=["20岁"], bank=AnswerBank())
+
+    def test_bundled_questions_use_known_subjects(self):
+        """测试内置问题列表的学科都在EduAgent.subjects中"""
+        questions = load_questions("tools/answer_bank_questions.json")
+        assert set(questions) <= set(EduAgent().subjects)
+
+
+class TestEduAgentAnswerBank:
+    """测试EduAgent先查预生成回答库"""
+
+    def test_bank_hit_skips_generation(self, session_factory):
+        """测试命中预生成回答时不调用模型"""
+        agent = EduAgent()
+        bank = AnswerBank(session_factory=session_factory)
+        bank.save("9-10岁", "科学", "什么是光合作用", "预生成的回答", agent.answer_namespace)
+        with patch("agents.edu_agent.answer_bank", bank), \
+             patch("agents.edu_agent.edu_answer_cache", NearDuplicateAnswerCache()), \
+             patch.object(EduAgent, "_get_subject_context", return_value="通用") as subject, \
+             patch.object(EduAgent, "generate_answer", return_value="实时回答") as llm:
+            answer = agent.answer_question("什么是光合作用呢", {"age": "9-10岁"})
+            # 命中时不判断学科，返回回答库条目的学科
+            result = agent.process_request({"content": "什么是光合作用呀", "grade_level": "三年级"})
+            llm.assert_not_called()
+            subject.assert_not_called()
+            assert result["subject"] == "科学"
+            # 回答库按默认年级生成，其他年级实时生成
+            agent.answer_question("什么是光合作用呢", {"age": "9-10岁", "grade": "小学高年级"})
+        assert answer == "预生成的回答"
+        assert llm.call_count == 1
+
+    def test_namespace_follows_prompt(self):
+        """测试回答提示词变化时指纹随之变化"""
+        agent = EduAgent()
+        namespace = agent.answer_namespace
+        agent.answer_requirements += "7. 回答不超过100字"
+        assert agent.answer_namespace != namespace
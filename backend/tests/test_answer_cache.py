@@ -0,0 +1,168 @@
+import pytest
+from unittest.mock import patch
+from agents.edu_agent import EduAgent
+from utils.keyword_matcher import KeywordMatcher
+from utils.answer_cache import NearDuplicateAnswerCache, MinHasher, normalize_question, shingles, jaccard
+
+
+class TestMinHash:
+    """测试MinHash签名"""
+
+    def test_signature_estimates_jaccard(self):
+        """测试签名相同位置相等的比例接近真实Jaccard相似度"""
+        hasher = MinHasher(num_perm=256)
+        left = shingles(normalize_question("为什么天空是蓝色的"))
+        right = shingles(normalize_question("为什么天空是蓝的"))
+        a, b = hasher.signature(left), hasher.signature(right)
+        estimate = sum(x == y for x, y in zip(a, b)) / len(a)
+        assert abs(estimate - jaccard(left, right)) < 0.15
+
+    def test_normalize_question(self):
+        """测试归一化去掉标点、空白和语气词"""
+        assert normalize_question("请问 什么是光合作用呀？") == "什么是光合作用"
+
+
+class TestNearDuplicateAnswerCache:
+    """测试近似问题回答缓存"""
+
+    def test_near_duplicate_hit(self):
+        """测试措辞略有不同的问题命中，并累计节省的生成时间"""
+        cache = NearDuplicateAnswerCache()
+        cache.set("7-8岁", "什么是光合作用？", "光合作用是植物做饭", 2.5)
+        cached = cache.get("7-8岁", "请问什么是光合作用呢")
+        assert cached.answer == "光合作用是植物做饭"
+        assert cached.similarity == 1.0
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["saved_generation_seconds"] == 2.5
+
+    def test_different_question_misses(self):
+        """测试相似度不足的问题不命中"""
+        cache = NearDuplicateAnswerCache()
+        cache.set("7-8岁", "为什么天空是蓝色的", "因为散射")
+        assert cache.get("7-8岁", "为什么大海是蓝色的") is None
+        assert cache.get("7-8岁", "为什么天空是红色的") is None
+        assert cache.get_stats()["misses"] == 2
+
+    def test_numbers_must_match(self):
+        """测试数字不同的算术题不命中"""
+        cache = NearDuplicateAnswerCache()
+        cache.set("7-8岁", "3加5等于几", "等于8")
+        assert cache.get("7-8岁", "3加6等于几") is None
+        assert cache.get("7-8岁", "3 加 5 等于几？").answer == "等于8"
+
+    def test_namespace_isolated(self):
+        """测试不同年龄段的回答不混用"""
+        cache = NearDuplicateAnswerCache()
+        cache.set("5-6岁", "什么是光合作用", "简单的回答")
+        assert cache.get("11-12岁", "什么是光合作用") is None
+
+    def test_threshold_configurable(self):
+        """测试降低阈值后更宽松的改写也能命中"""
+        question, variant = "为什么天空是蓝色的", "为什么天空是蓝的"
+        strict = NearDuplicateAnswerCache(threshold=0.9)
+        strict.set("7-8岁", question, "因为散射")
+        assert strict.get("7-8岁", variant) is None
+        loose = NearDuplicateAnswerCache(threshold=0.6)
+        loose.set("7-8岁", question, "因为散射")
+        assert loose.get("7-8岁", variant).answer == "因为散射"
+
+    def test_short_and_error_not_cached(self):
+        """测试过短的问题和调用出错的回答不缓存"""
+        cache = NearDuplicateAnswerCache()
+        assert cache.set("7-8岁", "为什么", "回答") is False
+        assert cache.set("7-8岁", "什么是光合作用", "调用OpenAI API时出错: timeout") is False
+        assert cache.get("7-8岁", "为什么") is None
+        assert cache.get_stats()["skipped"] == 1
+
+    def test_lru_eviction_cleans_buckets(self):
+        """测试超出容量时淘汰最久未使用的条目并清理LSH桶"""
+        cache = NearDuplicateAnswerCache(max_entries=2)
+        cache.set("7-8岁", "什么是光合作用", "A")
+        cache.set("7-8岁", "恐龙为什么会灭绝", "B")
+        cache.get("7-8岁", "什么是光合作用")
+        cache.set("7-8岁", "月亮为什么会变圆", "C")
+        assert cache.get("7-8岁", "恐龙为什么会灭绝") is None
+        assert cache.get("7-8岁", "什么是光合作用").answer == "A"
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["size"] == 2
+        assert stats["buckets"] <= 2 * cache.bands
+
+    def test_ttl_expiry(self):
+        """测试过期的回答不再命中"""
+        cache = NearDuplicateAnswerCache(ttl=10)
+        with patch("utils.answer_cache.time.time", return_value=1000.0):
+            cache.set("7-8岁", "什么是光合作用", "A")
+        with patch("utils.answer_cache.time.time", return_value=1011.0):
+            assert cache.get("7-8岁", "什么是光合作用") is None
+        assert cache.get_stats()["expirations"] == 1
+
+
+class TestEduAgentAnswerCache:
+    """测试EduAgent使用近似问题回答缓存"""
+
+    def test_rephrased_question_reuses_answer(self):
+        """测试改写后的问题不再调用模型，流式请求也能收到回答"""
+        cache = NearDuplicateAnswerCache()
+        with patch("agents.edu_agent.edu_answer_cache", cache), \
+             patch("agents.edu_agent.settings.use_ollama", False), \
+             patch("agents.edu_agent.openai_client.chat_completion", return_value="植物用阳光做饭") as llm:
+            agent = EduAgent()
+            first = agent.answer_question("什么是光合作用？", {"age": "7-8岁"}, subject="科学")
+            tokens = []
+            second = agent.answer_question("请问什么是光合作用呀", {"age": "7-8岁"}, on_token=tokens.append, subject="科学")
+        assert llm.call_count == 1
+        assert first == second == "植物用阳光做饭"
+        assert "".join(tokens) == second
+
+    def test_subject_resolved_only_on_miss(self):
+        """测试没有分诊学科时只在未命中缓存时判断学科，命中时使用缓存条目的学科"""
+        cache = NearDuplicateAnswerCache()
+        with patch("agents.edu_agent.edu_answer_cache", cache), \
+             patch.object(EduAgent, "_get_subject_context", return_value="科学") as subject, \
+             patch.object(EduAgent, "generate_answer", return_value="植物用阳光做饭") as llm:
+            agent = EduAgent()
+            first = agent.process_request({"content": "什么是光合作用？"})
+            second = agent.process_request({"content": "请问什么是光合作用呀"})
+        assert subject.call_count == 1
+        assert llm.call_count == 1
+        assert first["subject"] == second["subject"] == "科学"
+        assert second["answer"] == "植物用阳光做饭"
+
+    def test_cached_answer_moderated_per_user(self):
+        """测试缓存的回答按提问孩子的屏蔽词重新审查"""
+        cache = NearDuplicateAnswerCache()
+        cache.set("7-8岁|小学低年级", "恐龙为什么会灭绝", "恐龙因为小行星撞击而灭绝")
+        with patch("agents.edu_agent.edu_answer_cache", cache), \
+             patch("agents.safety_agent.get_user_safety_matcher") as matcher:
+            matcher.return_value = KeywordMatcher({"parental": ["恐龙"]})
+            answer = EduAgent().answer_question("恐龙为什么会灭绝呢", {"age": "7-8岁", "user_id": 1}, subject="科学")
+        assert "恐龙" not in answer
+
+    def test_session_context_not_shared(self):
+        """测试带会话上下文的回答不写入也不读取缓存，不同年级的回答互不复用"""
+        cache = NearDuplicateAnswerCache()
+        with patch("agents.edu_agent.edu_answer_cache", cache), \
+             patch("agents.edu_agent.settings.use_ollama", False), \
+             patch("agents.edu_agent.openai_client.chat_completion", return_value="回答") as llm:
+            agent = EduAgent()
+            agent.answer_question("那它为什么是绿色的", {"session_id": "s1"}, subject="科学")
+            agent.answer_question("那它为什么是绿色的", {}, subject="科学")
+            agent.answer_question("那它为什么是绿色的", {"session_id": "s2"}, subject="科学")
+            agent.answer_question("那它为什么是绿色的", {"grade": "小学高年级"}, subject="科学")
+        assert llm.call_count == 4
+        assert cache.get_stats()["size"] == 2
+
+    def test_disabled(self):
+        """测试关闭缓存时每次都调用模型"""
+        cache = NearDuplicateAnswerCache()
+        with patch("agents.edu_agent.settings.edu_answer_cache_enabled", False), \
+             patch("agents.edu_agent.edu_answer_cache", cache), \
+             patch("agents.edu_agent.settings.use_ollama", False), \
+             patch("agents.edu_agent.openai_client.chat_completion", return_value="回答") as llm:
+            agent = EduAgent()
+            agent.answer_question("什么是光合作用", {}, subject="科学")
+            agent.answer_question("什么是光合作用", {}, subject="科学")
+        assert llm.call_count == 2
+        assert cache.get_stats()["size"] == 0
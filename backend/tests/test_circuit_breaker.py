@@ -0,0 +1,202 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from utils.circuit_breaker import CircuitBreaker, circuit_breakers
+from utils.openai_client import openai_client
+
+
+@pytest.fixture
+def client():
+    """主后端为ollama、备用后端为openai的客户端，熔断器状态每个测试重置"""
+    circuit_breakers.clear()
+    with patch.object(openai_client, "primary", "ollama"), \
+         patch.object(openai_client, "fallback", "openai"), \
+         patch.object(openai_client, "breaker_enabled", True), \
+         patch.object(openai_client, "hedge_enabled", False), \
+         patch.object(openai_client, "fallbacks", 0), \
+         patch.object(openai_client, "hedged", 0), \
+         patch.object(openai_client, "hedge_wins", 0):
+        yield openai_client
+    circuit_breakers.clear()
+
+
+class TestCircuitBreaker:
+    """测试熔断器状态变化"""
+
+    def test_opens_on_failure_rate(self):
+        """测试失败率达到阈值后熔断"""
+        breaker = CircuitBreaker("ollama", window=10, min_calls=4, failure_rate=0.5)
+        for success in (True, False, True, False):
+            assert breaker.allow()
+            breaker.record(success, 0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow() is False
+        assert breaker.get_stats()["rejected"] == 1
+
+    def test_opens_on_slow_calls(self):
+        """测试慢调用率达到阈值后熔断"""
+        breaker = CircuitBreaker("ollama", min_calls=2, slow_call_seconds=1, slow_call_rate=0.5)
+        breaker.record(True, 2)
+        breaker.record(True, 2)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_half_open_recovery(self):
+        """测试熔断时间过后半开，只放行一次试探调用，成功后恢复"""
+        breaker = CircuitBreaker("ollama", min_calls=1, open_seconds=0.01)
+        breaker.record(False, 0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        time.sleep(0.02)
+        assert breaker.allow() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow() is False
+        breaker.record(True, 0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_failure_reopens(self):
+        """测试半开试探失败后重新熔断"""
+        breaker = CircuitBreaker("ollama", min_calls=1, open_seconds=0.01)
+        breaker.record(False, 0.1)
+        time.sleep(0.02)
+        assert breaker.allow()
+        breaker.record(False, 0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.get_stats()["times_opened"] == 2
+
+    def test_latency_percentile(self):
+        """测试延迟分位数在样本足够后才返回"""
+        breaker = CircuitBreaker("ollama", min_calls=3)
+        breaker.record(True, 0.1)
+        assert breaker.latency_percentile(0.95) is None
+        breaker.record(True, 0.2)
+        breaker.record(True, 0.3)
+        assert breaker.latency_percentile(0.5) == 0.2
+        assert breaker.latency_percentile(0.95) == 0.3
+
+
+class TestFallbackAndHedging:
+    """测试备用后端切换和对冲请求"""
+
+    def test_fallback_on_error(self, client):
+        """测试主后端失败时切换到备用后端"""
+        def fake_complete(backend, *args):
+            if backend == "ollama":
+                raise Exception("ollama down")
+            return "来自openai"
+
+        with patch.object(client, "_complete", side_effect=fake_complete):
+            assert client.chat_completion([{"role": "user", "content": "你好"}]) == "来自openai"
+        assert client.fallbacks == 1
+        assert circuit_breakers["ollama"].failures == 1
+
+    def test_open_breaker_skips_primary(self, client):
+        """测试主后端熔断后直接使用备用后端"""
+        calls = []
+
+        def fake_complete(backend, *args):
+            calls.append(backend)
+            return backend
+
+        from utils.circuit_breaker import get_circuit_breaker
+        breaker = get_circuit_breaker("ollama")
+        breaker._open()
+        with patch.object(client, "_complete", side_effect=fake_complete):
+            assert client.chat_completion([{"role": "user", "content": "你好"}]) == "openai"
+        assert calls == ["openai"]
+        assert client.get_resilience_stats()["breakers"]["ollama"]["state"] == "open"
+
+    def test_all_backends_fail(self, client):
+        """测试所有后端都失败时返回错误信息"""
+        with patch.object(client, "_complete", side_effect=Exception("boom")):
+            result = client.chat_completion([{"role": "user", "content": "你好"}])
+        assert "出错" in result and "boom" in result
+
+    def test_no_fallback_after_partial_stream(self, client):
+        """测试流式调用已输出内容后失败不再切换后端"""
+        tokens = []
+
+        def fake_complete(backend, messages, model, temperature, max_tokens, timeout, on_token, *args):
+            if backend == "ollama":
+                on_token("一")
+                raise Exception("ollama down")
+            on_token("二")
+            return "二"
+
+        with patch.object(client, "_complete", side_effect=fake_complete):
+            result = client.chat_completion([{"role": "user", "content": "你好"}], on_token=tokens.append)
+        assert tokens == ["一"]
+        assert "出错" in result
+
+    def test_sync_hedge(self, client):
+        """测试主后端超过延迟分位数后发起对冲请求，取先返回的结果"""
+        from utils.circuit_breaker import get_circuit_breaker
+        breaker = get_circuit_breaker("ollama")
+        for _ in range(breaker.min_calls):
+            breaker.record(True, 0.01)
+
+        def fake_complete(backend, *args):
+            if backend == "ollama":
+                time.sleep(0.3)
+                return "慢"
+            return "快"
+
+        with patch.object(client, "hedge_enabled", True), \
+             patch.object(client, "_complete", side_effect=fake_complete):
+            assert client.chat_completion([{"role": "user", "content": "你好"}]) == "快"
+        assert client.hedged == 1
+        assert client.hedge_wins == 1
+
+    def test_hedge_fires_when_primary_pool_full(self, client):
+        """测试主后端的线程池被慢请求占满时，对冲请求仍能发出"""
+        import threading
+        from utils.circuit_breaker import get_circuit_breaker
+        breaker = get_circuit_breaker("ollama")
+        for _ in range(breaker.min_calls):
+            breaker.record(True, 0.01)
+        release = threading.Event()
+
+        def fake_complete(backend, *args):
+            if backend == "ollama":
+                release.wait(2)
+                return "慢"
+            return "快"
+
+        with patch.object(client, "hedge_enabled", True), \
+             patch.object(client, "_complete", side_effect=fake_complete):
+            executor = client._get_hedge_executor("ollama")
+            blockers = [executor.submit(release.wait, 2) for _ in range(executor._max_workers)]
+            start = time.monotonic()
+            try:
+                assert client.chat_completion([{"role": "user", "content": "你好"}]) == "快"
+                assert time.monotonic() - start < 1
+            finally:
+                release.set()
+                for blocker in blockers:
+                    blocker.result()
+        assert client.hedge_wins == 1
+
+    def test_async_hedge_cancels_loser(self, client):
+        """测试异步对冲在胜出后取消落后的请求"""
+        from utils.circuit_breaker import get_circuit_breaker
+        breaker = get_circuit_breaker("ollama")
+        for _ in range(breaker.min_calls):
+            breaker.record(True, 0.01)
+        cancelled = []
+
+        async def fake_acomplete(backend, *args):
+            if backend == "ollama":
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(backend)
+                    raise
+                return "慢"
+            return "快"
+
+        with patch.object(client, "hedge_enabled", True), \
+             patch.object(client, "_acomplete", side_effect=fake_acomplete):
+            result = asyncio.run(client.achat_completion([{"role": "user", "content": "你好"}]))
+        assert result == "快"
+        assert cancelled == ["ollama"]
+        # 被取消的请求不计入失败
+        assert circuit_breakers["ollama"].failures == 0
@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import patch
+from db.database_service import DatabaseService
+from agents.safety_agent import (
+    SafetyAgent, PARENTAL_CATEGORY, USER_MATCHER_PREFIX, compile_user_content_filters,
+    get_safety_matcher, get_user_safety_matcher, invalidate_user_content_filters,
+    parse_blocked_keywords, update_safety_keywords
+)
+from utils.keyword_matcher import keyword_matchers
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    """用内存数据库替换加载过滤设置时使用的数据库"""
+    with patch("db.database.SessionLocal", session_factory):
+        yield session_factory
+    keyword_matchers.remove_prefix(USER_MATCHER_PREFIX)
+
+
+class TestUserContentFilters:
+    """测试按用户编译的家长过滤规则"""
+
+    def test_parse_blocked_keywords(self):
+        """测试屏蔽词支持列表和逗号分隔字符串"""
+        assert parse_blocked_keywords({"blocked_keywords": [" 奥特曼 ", "奥特曼", "", 3]}) == ["奥特曼"]
+        assert parse_blocked_keywords({"blocked_keywords": "奥特曼，游戏, 手机"}) == ["奥特曼", "游戏", "手机"]
+        assert parse_blocked_keywords({"violence_filter": True}) == []
+        assert parse_blocked_keywords(None) == []
+
+    def test_layered_over_global_lexicon(self, session_factory):
+        """测试用户匹配器同时包含全局词表和屏蔽词，其他用户不受影响"""
+        matcher = compile_user_content_filters(7, {"blocked_keywords": ["游戏"]})
+        categories = {m.category for m in matcher.find_all("玩游戏时拿刀")}
+        assert categories == {PARENTAL_CATEGORY, "violence"}
+        assert get_user_safety_matcher(8) is get_safety_matcher()
+        assert get_user_safety_matcher(None) is get_safety_matcher()
+
+    def test_loaded_from_database_and_cached(self, session_factory):
+        """测试首次使用时从数据库加载，之后使用缓存"""
+        db = session_factory()
+        DatabaseService.update_content_filters(db, 5, {"blocked_keywords": ["游戏"]})
+        db.close()
+
+        matcher = get_user_safety_matcher("5")
+        assert matcher.search("我想玩游戏").category == PARENTAL_CATEGORY
+        with patch.object(DatabaseService, "get_content_filters") as query:
+            assert get_user_safety_matcher(5) is matcher
+        query.assert_not_called()
+
+        invalidate_user_content_filters(5)
+        assert get_user_safety_matcher(5) is not matcher
+
+    def test_recheck_picks_up_other_worker_update(self, session_factory):
+        """测试缓存过期后与数据库核对：设置未变时沿用，其他进程修改后重新编译"""
+        db = session_factory()
+        DatabaseService.update_content_filters(db, 6, {"blocked_keywords": ["游戏"]})
+        db.close()
+        matcher = get_user_safety_matcher(6)
+
+        with patch("agents.safety_agent.settings.content_filter_recheck_seconds", 0):
+            assert get_user_safety_matcher(6) is matcher
+            db = session_factory()
+            DatabaseService.update_content_filters(db, 6, {"blocked_keywords": ["手机"]})
+            db.close()
+            updated = get_user_safety_matcher(6)
+        assert updated is not matcher
+        assert updated.search("我想玩手机").category == PARENTAL_CATEGORY
+        assert updated.search("我想玩游戏") is None
+
+    def test_global_update_invalidates_user_matchers(self, session_factory):
+        """测试全局词表更新后用户匹配器重新编译"""
+        compile_user_content_filters(5, {"blocked_keywords": ["游戏"]})
+        try:
+            update_safety_keywords({"custom": ["奥特曼"]})
+            assert keyword_matchers.get(f"{USER_MATCHER_PREFIX}5") is None
+        finally:
+            update_safety_keywords()
+
+    def test_safety_agent_pre_filter(self, session_factory):
+        """测试SafetyAgent预过滤和单独的家长规则检查"""
+        compile_user_content_filters(5, {"blocked_keywords": ["游戏"]})
+        agent = SafetyAgent()
+        result = agent._pre_filter_content("我想玩游戏", 5)
+        assert result == {"is_safe": False, "issues": ["检测到家长设置的屏蔽词: 游戏"]}
+        assert agent._pre_filter_content("我想玩游戏")["is_safe"] is True
+        assert agent.check_parental_filters("我想玩游戏", 5)["is_safe"] is False
+        assert agent.check_parental_filters("拿刀削苹果", 5) is None
+
+    def test_workflow_filter(self, session_factory):
+        """测试工作流预过滤中家长屏蔽词优先于放行词"""
+        from agents.langgraph_workflow import HappyPartnerGraph
+
+        compile_user_content_filters(5, {"blocked_keywords": ["游戏"]})
+        graph = HappyPartnerGraph.__new__(HappyPartnerGraph)
+        assert graph._quick_keyword_filter("学习玩游戏", "5") == (False, ["检测到家长设置的屏蔽词: 游戏"])
+        assert graph._quick_keyword_filter("学习玩游戏", "6") == (True, [])
+
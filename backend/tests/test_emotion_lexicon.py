@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import patch
+from agents.emotion_agent import EmotionAgent
+from utils.emotion_lexicon import EmotionLexiconClassifier, EMOTION_CUES
+
+
+class TestEmotionLexiconClassifier:
+    """测试情绪词典预判"""
+
+    def test_categories_match_agent(self):
+        """测试词典的情绪类别与EmotionAgent一致"""
+        assert set(EMOTION_CUES) == set(EmotionAgent().emotions)
+
+    def test_clear_cut_messages(self):
+        """测试情绪明确的表达得到高置信度"""
+        classifier = EmotionLexiconClassifier()
+        prediction = classifier.predict("我好难过")
+        assert prediction.emotion == "难过"
+        assert prediction.confidence == 1.0
+        assert prediction.intensity == "高"
+        assert classifier.predict("没人陪我玩，好孤单").emotion == "孤独"
+
+    def test_longer_cue_counted_once(self):
+        """测试被较长提示词包含的较短提示词不重复计分"""
+        prediction = EmotionLexiconClassifier().predict("我想哭")
+        assert prediction.cues == ["想哭"]
+
+    def test_negation(self):
+        """测试否定词：不开心计为难过，不害怕不计分"""
+        classifier = EmotionLexiconClassifier()
+        assert classifier.predict("我不开心").emotion == "难过"
+        assert classifier.predict("我一点也不害怕").emotion is None
+        assert classifier.predict("我不喜欢他").cues == ["不喜欢"]
+
+    def test_intensity(self):
+        """测试程度词和感叹号决定强度"""
+        classifier = EmotionLexiconClassifier()
+        assert classifier.predict("我有点紧张，还有点担心").intensity == "低"
+        assert classifier.predict("气死我了！！").intensity == "高"
+        assert classifier.predict("我很紧张").intensity == "高"
+
+    def test_weak_or_mixed_not_confident(self):
+        """测试弱提示词或混合情绪达不到阈值"""
+        classifier = EmotionLexiconClassifier()
+        assert classifier.predict("为什么天是蓝的").confidence < 0.75
+        assert classifier.predict("我好兴奋又有点紧张").confidence < 0.75
+        assert classifier.predict("今天吃了面条").emotion is None
+
+    def test_stats(self):
+        """测试命中率和一致率统计"""
+        classifier = EmotionLexiconClassifier()
+        classifier.predict("我好难过")
+        classifier.predict("今天吃了面条")
+        classifier.record_comparison("难过", "难过")
+        classifier.record_comparison("难过", "孤独")
+        classifier.record_comparison("难过", "未知")
+        stats = classifier.get_stats()
+        assert stats["confident_rate"] == 0.5
+        assert stats["comparisons"] == 2
+        assert stats["agreement_rate"] == 0.5
+        assert stats["top_disagreements"] == {"难过->孤独": 1}
+
+
+class TestEmotionAgentLexicon:
+    """测试EmotionAgent使用情绪词典预判"""
+
+    def test_confident_skips_llm_analysis(self):
+        """测试本地判断有把握时不调用模型分析情绪，直接生成回复"""
+        with patch("agents.emotion_agent.settings.emotion_lexicon_audit_rate", 0.0), \
+             patch.object(EmotionAgent, "analyze_and_support") as combined, \
+             patch.object(EmotionAgent, "analyze_emotion") as analyze, \
+             patch.object(EmotionAgent, "provide_emotional_support", return_value="抱抱你") as support:
+            result = EmotionAgent().process_request({"content": "我好难过"})
+        combined.assert_not_called()
+        analyze.assert_not_called()
+        assert result["response"] == "抱抱你"
+        analysis = support.call_args.args[1]
+        assert analysis["emotion"] == "难过"
+        assert analysis["reason"] == "命中情绪词: 难过"
+        assert analysis["suggestion"] == EmotionAgent().emotions["难过"]["response_strategy"]
+
+    def test_uncertain_falls_back_to_llm(self):
+        """测试本地判断没有把握时仍由模型分析，并记录对比"""
+        from utils.emotion_lexicon import emotion_lexicon
+        comparisons = emotion_lexicon.comparisons
+        with patch.object(EmotionAgent, "analyze_and_support",
+                          return_value=({"emotion": "焦虑"}, "别担心")) as combined:
+            result = EmotionAgent().process_request({"content": "我有点紧张"})
+        combined.assert_called_once()
+        assert result["response"] == "别担心"
+        assert emotion_lexicon.comparisons == comparisons + 1
+
+    def test_disabled(self):
+        """测试关闭情绪词典时始终调用模型"""
+        with patch("agents.emotion_agent.settings.emotion_lexicon_enabled", False), \
+             patch.object(EmotionAgent, "analyze_and_support",
+                          return_value=({"emotion": "难过"}, "抱抱你")) as combined:
+            EmotionAgent().process_request({"content": "我好难过"})
+        combined.assert_called_once()
@@ -0,0 +1,119 @@
+import pytest
+from unittest.mock import patch
+from agents.emotion_agent import EmotionAgent, _ReplySplitter
+from tools.fake_llm_server import detect_scenario, canned_response
+
+
+COMBINED_REPLY = "情绪类型: 难过\n情绪强度: 高\n回复: 抱抱你，考试没考好真的会难过。\n我们一起想想办法吧！"
+
+
+def _stream(reply, chunk_size=3):
+    """按固定长度切块流式回调的模拟模型"""
+    def fake_chat_completion(messages, on_token=None, **kwargs):
+        if on_token is not None:
+            for index in range(0, len(reply), chunk_size):
+                on_token(reply[index:index + chunk_size])
+        return reply
+    return fake_chat_completion
+
+
+class TestReplySplitter:
+    """测试单次调用回复的拆分"""
+
+    def test_marker_split_across_chunks(self):
+        """测试"回复:"被拆在两块中时仍能识别，只转发回复部分"""
+        forwarded = []
+        splitter = _ReplySplitter(forwarded.append)
+        for chunk in ["情绪类型: 难过\n情绪强度: 高\n回", "复:", " 抱抱", "你"]:
+            splitter.feed(chunk)
+        assert splitter.finish() == "抱抱你"
+        assert "".join(forwarded) == "抱抱你"
+        assert EmotionAgent._parse_emotion_analysis(splitter.header)["emotion"] == "难过"
+
+    def test_missing_marker(self):
+        """测试模型未输出"回复:"时分析行以外的内容作为回复"""
+        forwarded = []
+        splitter = _ReplySplitter(forwarded.append)
+        splitter.feed("情绪类型: 开心\n真为你高兴！")
+        assert splitter.finish() == "真为你高兴！"
+        assert forwarded == ["真为你高兴！"]
+        assert EmotionAgent._parse_emotion_analysis(splitter.header)["emotion"] == "开心"
+
+    def test_full_width_colons(self):
+        """测试全角冒号的分析行和"回复："同样能识别，回复在生成结束前就开始转发"""
+        forwarded = []
+        splitter = _ReplySplitter(forwarded.append)
+        for chunk in ["情绪类型：难过\n情绪强度：中\n回", "复：", "别难过，", "我陪着你。"]:
+            splitter.feed(chunk)
+            if chunk == "别难过，":
+                assert forwarded == ["别难过，"]
+        assert splitter.finish() == "别难过，我陪着你。"
+        analysis = EmotionAgent._parse_emotion_analysis(splitter.header)
+        assert analysis["emotion"] == "难过"
+        assert analysis["intensity"] == "中"
+
+        splitter = _ReplySplitter()
+        splitter.feed("情绪类型：开心\n真为你高兴！")
+        assert splitter.finish() == "真为你高兴！"
+
+
+class TestEmotionSingleCall:
+    """测试EmotionAgent单次调用模式"""
+
+    def test_one_call_returns_analysis_and_reply(self):
+        """测试一次调用得到情绪分析和回复"""
+        with patch("agents.emotion_agent.settings.use_ollama", False), \
+             patch("agents.emotion_agent.openai_client.chat_completion", return_value=COMBINED_REPLY) as llm:
+            result = EmotionAgent().process_request({"content": "我考试没考好"})
+        llm.assert_called_once()
+        assert llm.call_args.kwargs["on_token"] is None
+        assert result["emotion_analysis"]["emotion"] == "难过"
+        assert result["emotion_analysis"]["intensity"] == "高"
+        assert result["response"] == "抱抱你，考试没考好真的会难过。\n我们一起想想办法吧！"
+
+    def test_stream_forwards_only_reply(self):
+        """测试流式输出时只回调回复部分"""
+        tokens = []
+        with patch("agents.emotion_agent.settings.use_ollama", False), \
+             patch("agents.emotion_agent.openai_client.chat_completion", side_effect=_stream(COMBINED_REPLY)):
+            result = EmotionAgent().process_request({"content": "我考试没考好"}, on_token=tokens.append)
+        assert "".join(tokens) == result["response"]
+        assert "情绪类型" not in "".join(tokens)
+
+    def test_error_reply(self):
+        """测试调用出错时错误信息作为回复，情绪分析使用默认值"""
+        with patch("agents.emotion_agent.settings.use_ollama", False), \
+             patch("agents.emotion_agent.openai_client.chat_completion", return_value="调用OpenAI API时出错: timeout"):
+            result = EmotionAgent().process_request({"content": "我考试没考好"})
+        assert result["response"] == "调用OpenAI API时出错: timeout"
+        assert result["emotion_analysis"]["emotion"] == "未知"
+
+    def test_existing_analysis_uses_support_call(self):
+        """测试已有情绪分析时只调用情感支持"""
+        with patch.object(EmotionAgent, "analyze_and_support") as combined, \
+             patch.object(EmotionAgent, "provide_emotional_support", return_value="抱抱你"):
+            result = EmotionAgent().process_request({"content": "我好难过", "emotion_type": "难过"})
+        combined.assert_not_called()
+        assert result["response"] == "抱抱你"
+
+    def test_disabled_uses_two_calls(self):
+        """测试关闭单次调用时先分析再回复"""
+        with patch("agents.emotion_agent.settings.emotion_single_call_enabled", False), \
+             patch("agents.emotion_agent.settings.emotion_lexicon_enabled", False), \
+             patch.object(EmotionAgent, "analyze_and_support") as combined, \
+             patch.object(EmotionAgent, "analyze_emotion", return_value={"emotion": "难过"}) as analyze, \
+             patch.object(EmotionAgent, "provide_emotional_support", return_value="抱抱你"):
+            result = EmotionAgent().process_request({"content": "我好难过"})
+        combined.assert_not_called()
+        analyze.assert_called_once()
+        assert result["response"] == "抱抱你"
+
+    def test_fake_server_scenario(self):
+        """测试模拟服务能识别单次调用的提示并给出可解析的回复"""
+        agent = EmotionAgent()
+        assert detect_scenario(agent.combined_system_prompt) == "emotion_combined"
+        assert detect_scenario(agent.system_prompt) == "emotion_support"
+        splitter = _ReplySplitter()
+        splitter.feed(canned_response("emotion_combined", '孩子表达的内容: "我好难过"'))
+        assert splitter.finish().startswith("我听到你的感受啦")
+        assert EmotionAgent._parse_emotion_analysis(splitter.header)["emotion"] == "难过"
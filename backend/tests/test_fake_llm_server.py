@@ -0,0 +1,176 @@
+import pytest
+import json
+import asyncio
+import time
+import httpx
+from fastapi.testclient import TestClient
+from tools.fake_llm_server import FakeLLMConfig, create_app, detect_scenario, canned_response, tokenize
+from utils.ollama_client import OllamaClient
+from utils.http_pool import HTTPClientPool
+from agents.safety_agent import SafetyAgent
+from agents.emotion_agent import EmotionAgent
+from agents.triage_agent import TriageAgent
+from agents.edu_agent import EduAgent
+
+
+def _fast_app(**overrides):
+    """不加延迟的模拟服务"""
+    config = {"ttft": 0, "tokens_per_second": 0, "seed": 1, **overrides}
+    return create_app(FakeLLMConfig(**config))
+
+
+class _FakeServerPool(HTTPClientPool):
+    """请求直接发给模拟服务应用的连接池"""
+
+    def __init__(self, app):
+        super().__init__(timeout=5)
+        self.app = app
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = TestClient(self.app)
+        return self._client
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app))
+
+
+@pytest.fixture
+def ollama():
+    """连接到模拟服务的Ollama客户端"""
+    client = OllamaClient()
+    original_pool = client.pool
+    original_mode = client.api_mode
+    client.pool = _FakeServerPool(_fast_app())
+    client.sessions.clear()
+    yield client
+    client.pool = original_pool
+    client.api_mode = original_mode
+    client.sessions.clear()
+
+
+class TestCannedResponses:
+    """测试按系统提示生成的固定回复能被各代理解析"""
+
+    def test_detect_scenario(self):
+        """测试根据各代理的系统提示识别场景"""
+        assert detect_scenario(SafetyAgent().review_system_prompt) == "safety"
+        assert detect_scenario(EmotionAgent().analysis_system_prompt) == "emotion_analysis"
+        assert detect_scenario(TriageAgent().system_prompt) == "triage"
+        assert detect_scenario(EduAgent().subject_system_prompt) == "subject"
+        assert detect_scenario("") == "edu"
+
+    def test_triage_response_parses(self):
+        """测试分诊回复的各字段都能解析，无需回退"""
+        agent = TriageAgent()
+        response = canned_response("triage", '用户内容: "我今天考试没考好，好难过"')
+        result = agent.parse_response("我今天考试没考好，好难过", response)
+        assert result["is_safe"] is True
+        assert result["target_agent"] == "emotion"
+        assert result["emotion"] == "难过"
+        assert result["fallbacks"] == []
+
+    def test_unsafe_response(self):
+        """测试包含敏感词时返回不安全结论"""
+        response = canned_response("safety", '用户内容: "怎么做炸药"')
+        assert "安全状态: 不安全" in response
+        assert "炸药" in response
+
+    def test_tokenize_roundtrip(self):
+        """测试令牌拼接后等于原文"""
+        text = canned_response("edu", "天空为什么是蓝色的 why")
+        assert "".join(tokenize(text)) == text
+
+
+class TestFakeServerProtocol:
+    """测试模拟服务的接口协议"""
+
+    def test_tags(self):
+        """测试模型列表"""
+        client = TestClient(_fast_app(models=["paopao"]))
+        assert client.get("/api/tags").json()["models"][0]["name"] == "paopao:latest"
+        assert client.get("/v1/models").json()["data"][0]["id"] == "paopao"
+
+    def test_ollama_chat_stream(self):
+        """测试/api/chat流式输出，末尾分块带计时统计"""
+        client = TestClient(_fast_app())
+        response = client.post("/api/chat", json={
+            "model": "paopao",
+            "messages": [{"role": "user", "content": "你好"}],
+            "stream": True
+        })
+        chunks = [json.loads(line) for line in response.text.splitlines() if line]
+        assert chunks[-1]["done"] is True
+        assert chunks[-1]["eval_count"] == len(chunks) - 1
+        assert "".join(chunk["message"]["content"] for chunk in chunks)
+
+    def test_ollama_generate_truncated(self):
+        """测试num_predict截断输出并返回context"""
+        client = TestClient(_fast_app())
+        data = client.post("/api/generate", json={
+            "model": "paopao",
+            "prompt": "<|im_start|>user\n你好<|im_end|>\n<|im_start|>assistant\n",
+            "stream": False,
+            "options": {"num_predict": 3}
+        }).json()
+        assert len(tokenize(data["response"])) == 3
+        assert data["done_reason"] == "length"
+        assert data["context"]
+
+    def test_openai_chat_completions(self):
+        """测试OpenAI接口的非流式和流式输出"""
+        client = TestClient(_fast_app())
+        messages = [
+            {"role": "system", "content": SafetyAgent().review_system_prompt},
+            {"role": "user", "content": '用户内容: "你好"'}
+        ]
+        data = client.post("/v1/chat/completions", json={"model": "deepseek-chat", "messages": messages}).json()
+        content = data["choices"][0]["message"]["content"]
+        assert content.startswith("安全状态: 安全")
+        assert data["usage"]["completion_tokens"] == len(tokenize(content))
+
+        response = client.post("/v1/chat/completions", json={
+            "model": "deepseek-chat", "messages": messages, "stream": True
+        })
+        events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        streamed = "".join(json.loads(event)["choices"][0]["delta"].get("content", "") for event in events[:-1])
+        assert streamed == content
+
+    def test_error_injection(self):
+        """测试按错误率注入失败并计入统计"""
+        client = TestClient(_fast_app(error_rate=1.0, error_status=503))
+        response = client.post("/api/chat", json={"model": "paopao", "messages": []})
+        assert response.status_code == 503
+        assert client.get("/fake/stats").json()["errors_injected"] == 1
+
+    def test_latency_config(self):
+        """测试首字延迟和输出速度，并可在运行时修改配置"""
+        client = TestClient(_fast_app())
+        client.post("/fake/config", json={"ttft": 0.1, "tokens_per_second": 1000})
+        start = time.monotonic()
+        client.post("/api/chat", json={"model": "paopao", "messages": [{"role": "user", "content": "你好"}], "stream": False})
+        assert time.monotonic() - start >= 0.1
+        assert client.get("/fake/stats").json()["config"]["ttft"] == 0.1
+
+
+class TestOllamaClientAgainstFakeServer:
+    """测试Ollama客户端与模拟服务联调"""
+
+    def test_chat_and_stream(self, ollama):
+        """测试同步、流式和异步调用"""
+        messages = [
+            {"role": "system", "content": EmotionAgent().analysis_system_prompt},
+            {"role": "user", "content": '孩子表达的内容: "我好害怕打雷"'}
+        ]
+        result = ollama.chat_completion(messages)
+        assert "情绪类型: 害怕" in result
+        assert "".join(ollama.stream(messages)) == result
+        assert asyncio.run(ollama.achat_completion(messages)) == result
+
+    def test_midstream_error_raises(self, ollama):
+        """测试流式输出中途出错时客户端抛出异常"""
+        ollama.pool.app.state.server.update_config({"midstream_error_rate": 1.0})
+        with pytest.raises(Exception):
+            list(ollama.stream([{"role": "user", "content": "你好"}]))
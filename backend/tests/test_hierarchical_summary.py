@@ -0,0 +1,173 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from agents.memory_agent import MemoryAgent
+from agents.langgraph_workflow import HappyPartnerGraph
+from utils.memory_store import user_memory_store
+from utils.hierarchical_summary import HierarchicalSummarizer, estimate_tokens, clip_tokens
+
+
+class RecordingSummarizer:
+    """记录每次调用输入长度的模拟摘要模型"""
+
+    def __init__(self, reply="孩子喜欢恐龙和画画"):
+        self.reply = reply
+        self.inputs = []
+
+    def __call__(self, system_prompt, content, limit):
+        self.inputs.append((system_prompt, content))
+        return self.reply
+
+
+class TestTokenBudget:
+    """测试token估算和截断"""
+
+    def test_estimate_and_clip(self):
+        """测试中文每字计1，截断后不超过上限"""
+        assert estimate_tokens("恐龙") == 2
+        assert estimate_tokens("abcd") == 1
+        assert clip_tokens("一二三四五", 3) == "一二三"
+        assert clip_tokens("一二三四五", 3, keep_tail=True) == "三四五"
+
+
+class TestHierarchicalSummarizer:
+    """测试分层增量摘要"""
+
+    def test_batches_roll_up(self):
+        """测试攒够一批才合并会话摘要，若干批后并入长期摘要"""
+        model = RecordingSummarizer()
+        summarizer = HierarchicalSummarizer(summarize=model, batch_turns=2, session_batches=2)
+        state = summarizer.new_state()
+        summarizer.add_turn(state, "我喜欢恐龙", "恐龙很酷", "edu")
+        assert not summarizer.needs_update(state)
+        summarizer.add_turn(state, "霸王龙有多大", "很大", "edu")
+        assert summarizer.update(state)
+        assert state["session"] == "孩子喜欢恐龙和画画"
+        assert state["pending"] == []
+        assert len(model.inputs) == 1
+
+        summarizer.add_turn(state, "我想画恐龙", "好呀", "edu")
+        summarizer.add_turn(state, "怎么画", "先画身体", "edu")
+        summarizer.update(state)
+        assert len(model.inputs) == 3
+        assert state["long_term"] == "孩子喜欢恐龙和画画"
+        assert state["session"] == ""
+
+    def test_cost_per_turn_constant(self):
+        """测试对话越来越多时每次调用的输入大小不增长"""
+        model = RecordingSummarizer(reply="摘" * 500)
+        summarizer = HierarchicalSummarizer(summarize=model, batch_turns=5)
+        state = summarizer.new_state()
+        for i in range(200):
+            summarizer.add_turn(state, "我今天学了很多关于恐龙的知识" * 5, "你真棒" * 50, "edu")
+            if summarizer.needs_update(state):
+                summarizer.update(state)
+        sizes = [len(content) for _, content in model.inputs]
+        assert len(model.inputs) == 50
+        assert max(sizes[-10:]) <= max(sizes[:10])
+        assert estimate_tokens(state["long_term"]) <= summarizer.long_term_tokens
+        assert estimate_tokens(summarizer.render(state)) < 1000
+
+    def test_session_change_folds(self):
+        """测试会话切换时只做标记，下一次update把上一个会话并入长期摘要"""
+        model = RecordingSummarizer()
+        summarizer = HierarchicalSummarizer(summarize=model)
+        state = summarizer.new_state()
+        summarizer.add_turn(state, "你好", "你好呀", "edu", session_id="s1")
+        summarizer.add_turn(state, "今天开心", "太好了", "emotion", session_id="s2")
+        assert model.inputs == []
+        assert summarizer.needs_update(state)
+        assert summarizer.update(state)
+        assert len(model.inputs) == 2
+        assert "你好呀" in model.inputs[0][1]
+        assert "太好了" not in model.inputs[0][1]
+        assert state["long_term"] == "孩子喜欢恐龙和画画"
+        assert state["session"] == ""
+        assert state["session_id"] == "s2"
+        assert len(state["pending"]) == 1
+
+    def test_llm_failure_stays_bounded(self):
+        """测试模型调用失败时退化为截断拼接，摘要仍有上限"""
+        summarizer = HierarchicalSummarizer(
+            summarize=lambda *args: "调用OpenAI API时出错: timeout", batch_turns=1, session_tokens=50
+        )
+        state = summarizer.new_state()
+        for i in range(20):
+            summarizer.add_turn(state, f"问题{i}" * 10, "回答" * 10, "edu")
+            summarizer.update(state)
+        assert estimate_tokens(state["session"]) <= 50
+        assert "调用OpenAI" not in summarizer.render(state)
+        assert summarizer.get_stats()["llm_failures"] > 0
+
+
+class TestSummaryIntegration:
+    """测试MemoryAgent和工作流使用分层摘要"""
+
+    def test_memory_agent_summary(self):
+        """测试MemoryAgent按用户增量摘要"""
+        model = RecordingSummarizer()
+        agent = MemoryAgent(summarizer=HierarchicalSummarizer(summarize=model))
+        assert agent.summarize_conversation_history("1") == "暂无对话历史"
+        agent.store_conversation({"content": "我喜欢恐龙", "response": "恐龙很酷"}, user_id=1)
+        summary = agent.summarize_conversation_history("1")
+        assert "孩子喜欢恐龙和画画" in summary
+        assert len(model.inputs) == 1
+        agent.summarize_conversation_history("1")
+        assert len(model.inputs) == 1
+
+    def test_workflow_summary_not_accumulated(self):
+        """测试工作流的对话摘要由分层摘要渲染，不再无限拼接"""
+        graph = HappyPartnerGraph()
+        graph.memory_agent = MemoryAgent()
+        model = RecordingSummarizer()
+        summarizer = HierarchicalSummarizer(summarize=model, batch_turns=1, session_batches=100)
+        state = graph._build_initial_state("1", "你好", "s1")
+        state["agent_results"] = {"edu": {"answer": "你好呀"}}
+        state["target_agent"] = "edu"
+        with patch("agents.langgraph_workflow.hierarchical_summarizer", summarizer), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            for i in range(6):
+                state["original_content"] = f"问题{i}"
+                graph._update_memory(state)
+                assert graph._should_summarize(state) == "summarize"
+                asyncio.run(graph._summarize_context(state))
+        assert "最新摘要" not in state["conversation_summary"]
+        assert state["conversation_summary"] == "本次会话: 孩子喜欢恐龙和画画"
+        assert len(model.inputs) == 6
+
+    def test_workflow_state_carried_across_messages(self):
+        """测试同一用户的多次消息共用分层摘要状态，攒够一批后总结节点生效"""
+        assert HappyPartnerGraph().memory_agent.store is user_memory_store
+        graph = HappyPartnerGraph()
+        graph.memory_agent = MemoryAgent()
+        with patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            for i in range(5):
+                state = graph._build_initial_state("7", f"问题{i}", "s1")
+                state["original_content"] = f"问题{i}"
+                state["agent_results"] = {"edu": {"answer": f"回答{i}"}}
+                state["target_agent"] = "edu"
+                graph._update_memory(state)
+        assert len(state["conversation_history"]) == 5
+        assert graph._should_summarize(state) == "summarize"
+        assert graph._build_initial_state("8", "你好")["summary_state"]["pending"] == []
+
+    def test_workflow_record_size_flat(self):
+        """测试保存的对话记录不嵌入之前的记录，大小不随轮次增长"""
+        graph = HappyPartnerGraph()
+        graph.memory_agent = MemoryAgent()
+        sizes = []
+        with patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            for _ in range(8):
+                state = graph._build_initial_state("9", "恐龙 为什么 灭绝", "s1")
+                state["original_content"] = state["content"]
+                graph._enrich_context(state)
+                state["agent_results"] = {"edu": {"answer": "因为小行星撞击"}}
+                state["target_agent"] = "edu"
+                graph._update_memory(state)
+                sizes.append(len(str(state["conversation_history"][-1])))
+        stored = graph.memory_agent.get_conversation_history(10, "9")
+        assert len(stored) == 8
+        assert "relevant_context" not in stored[-1] and "agent_results" not in stored[-1]
+        assert stored[-1]["content"] == "恐龙 为什么 灭绝"
+        assert stored[-1]["response"] == "因为小行星撞击"
+        assert max(sizes) - min(sizes) < 10
@@ -0,0 +1,43 @@
+import pytest
+import asyncio
+import gc
+import threading
+from utils.http_pool import HTTPClientPool
+
+
+class TestHTTPClientPool:
+    """测试共享连接池的异步客户端管理"""
+
+    def test_one_client_per_loop(self):
+        """测试同一事件循环复用一个客户端，并发的不同事件循环各用各的"""
+        pool = HTTPClientPool()
+        clients = {}
+        ready = threading.Barrier(2)
+
+        async def fetch(name):
+            first = pool.async_client
+            ready.wait(1)
+            clients[name] = (first, pool.async_client)
+            await pool.aclose()
+
+        threads = [threading.Thread(target=asyncio.run, args=(fetch(name),)) for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert clients["a"][0] is clients["a"][1]
+        assert clients["b"][0] is clients["b"][1]
+        assert clients["a"][0] is not clients["b"][0]
+        assert clients["a"][0].is_closed and clients["b"][0].is_closed
+
+    def test_closed_loop_clients_released(self):
+        """测试事件循环结束后留下的客户端不会越积越多"""
+        pool = HTTPClientPool()
+
+        async def fetch():
+            return pool.async_client
+
+        for _ in range(5):
+            asyncio.run(fetch())
+        gc.collect()
+        assert len(pool._async_clients) <= 1
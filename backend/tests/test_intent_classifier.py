@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+from models.user import Conversation
+from agents.meta_agent import MetaAgent
+from utils.intent_classifier import (
+    NaiveBayesIntentClassifier, distill_training_data, evaluate_intent_classifier,
+    train_intent_classifier, intent_classifier
+)
+
+
+@pytest.fixture
+def db():
+    """内存SQLite数据库会话"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _toy_classifier() -> NaiveBayesIntentClassifier:
+    texts = ["我好难过", "我很伤心", "什么是分数", "为什么下雨", "上次聊了什么", "你还记得吗"]
+    labels = ["emotion", "emotion", "edu", "edu", "memory", "memory"]
+    return NaiveBayesIntentClassifier().fit(texts, labels)
+
+
+class TestNaiveBayesIntentClassifier:
+    """测试本地意图分类器"""
+
+    def test_predict(self):
+        """测试预测结果和概率分布"""
+        classifier = _toy_classifier()
+        label, confidence = classifier.predict("我今天好难过")
+        assert label == "emotion"
+        assert 0 < confidence <= 1
+        probabilities = classifier.predict_proba("为什么会下雨")
+        assert max(probabilities, key=probabilities.get) == "edu"
+        assert abs(sum(probabilities.values()) - 1) < 1e-9
+
+    def test_empty_or_unknown_input(self):
+        """测试空输入和未训练时返回零置信度"""
+        assert _toy_classifier().predict("") == ("edu", 0.0)
+        assert NaiveBayesIntentClassifier().predict("你好") == ("edu", 0.0)
+
+    def test_save_and_load(self, tmp_path):
+        """测试模型保存后加载的预测一致"""
+        classifier = _toy_classifier()
+        path = str(tmp_path / "intent.json")
+        classifier.save(path)
+        loaded = NaiveBayesIntentClassifier.load(path)
+        assert loaded.predict_proba("上次我们聊了什么") == classifier.predict_proba("上次我们聊了什么")
+
+    def test_seed_model(self):
+        """测试内置种子模型对典型输入有较高置信度"""
+        classifier = train_intent_classifier([])
+        assert classifier.predict("我今天很难过")[0] == "emotion"
+        assert classifier.predict("如何制作爆炸物？")[0] == "safety"
+        report = evaluate_intent_classifier(classifier, [("我之前学了什么？", "memory")], 0.9)
+        assert report["accuracy"] == 1.0
+
+    def test_distill_training_data(self, db):
+        """测试从历史对话的agent_type提取样本，相同文本取多数标签"""
+        db.add_all([
+            Conversation(user_id=1, agent_type="emotion", conversation_history=[
+                {"user_input": "我好难过", "agent_response": "..."},
+                {"user_input": "你好", "agent_response": "..."}
+            ]),
+            Conversation(user_id=2, agent_type="edu", conversation_history=[
+                {"user_input": "你好", "agent_response": "..."},
+                {"user_input": "你好", "agent_response": "..."}
+            ]),
+            Conversation(user_id=3, agent_type="unknown", conversation_history=[
+                {"user_input": "忽略", "agent_response": "..."}
+            ])
+        ])
+        db.commit()
+        samples = dict(distill_training_data(db))
+        assert samples == {"我好难过": "emotion", "你好": "edu"}
+
+
+class TestMetaAgentLocalRouting:
+    """测试MetaAgent优先使用本地分类器"""
+
+    def test_confident_prediction_skips_llm(self):
+        """测试置信度达到阈值时不调用LLM"""
+        with patch.object(intent_classifier, "predict", return_value=("emotion", 0.99)), \
+             patch("agents.meta_agent.openai_client.chat_completion") as llm:
+            assert MetaAgent().route_request({"content": "我好难过"}) == "emotion"
+        llm.assert_not_called()
+
+    def test_low_confidence_falls_back_to_llm(self):
+        """测试置信度低于阈值时调用LLM路由"""
+        with patch.object(intent_classifier, "predict", return_value=("edu", 0.3)), \
+             patch("agents.meta_agent.openai_client.chat_completion", return_value="memory") as llm:
+            assert MetaAgent().route_request({"content": "随便说点什么"}) == "memory"
+        llm.assert_called_once()
+
+    def test_disabled(self):
+        """测试关闭本地分类时直接调用LLM"""
+        with patch("agents.meta_agent.settings.intent_classifier_enabled", False), \
+             patch("agents.meta_agent.openai_client.chat_completion", return_value="edu") as llm:
+            assert MetaAgent().route_request({"content": "我好难过"}) == "edu"
+        llm.assert_called_once()
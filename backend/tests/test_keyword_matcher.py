@@ -0,0 +1,110 @@
+import pytest
+import threading
+from utils.keyword_matcher import KeywordMatcher, KeywordMatcherRegistry, KeywordMatch
+from agents.safety_agent import SafetyAgent, SENSITIVE_KEYWORDS, update_safety_keywords, get_safety_matcher
+from tools.benchmark_keyword_matcher import build_keywords, naive_match, SAMPLE_TEXTS
+
+
+class TestKeywordMatcher:
+    """测试多模式关键词匹配器"""
+
+    def test_find_all_with_offsets(self):
+        """测试返回全部命中及其分类和偏移"""
+        matcher = KeywordMatcher({"violence": ["刀", "打架"], "privacy": ["密码"]})
+        matches = matcher.find_all("他拿刀打架，还问我密码")
+        assert matches == [
+            KeywordMatch("刀", "violence", 2, 3),
+            KeywordMatch("打架", "violence", 3, 5),
+            KeywordMatch("密码", "privacy", 9, 11),
+        ]
+
+    def test_overlapping_and_nested(self):
+        """测试重叠和嵌套的关键词都能命中"""
+        matcher = KeywordMatcher({"a": ["身份证", "身份证号", "证号"], "b": ["he", "she", "hers"]})
+        found = {(m.keyword, m.start) for m in matcher.find_all("身份证号 ushers")}
+        assert found == {("身份证", 0), ("身份证号", 0), ("证号", 2), ("she", 6), ("he", 7), ("hers", 7)}
+
+    def test_same_keyword_in_multiple_categories(self):
+        """测试同一关键词属于多个分类"""
+        matcher = KeywordMatcher({"a": ["刀"], "b": ["刀"]})
+        assert {m.category for m in matcher.find_all("刀")} == {"a", "b"}
+        assert len(matcher) == 2
+
+    def test_ignore_case_and_category_filter(self):
+        """测试忽略大小写和按分类过滤"""
+        matcher = KeywordMatcher({"bad": ["Gun"], "ok": ["math"]})
+        assert matcher.find_all("a GUN and MATH", categories={"bad"}) == [KeywordMatch("Gun", "bad", 2, 5)]
+        assert matcher.search("MATH gun").keyword == "math"
+        assert KeywordMatcher({"bad": ["Gun"]}, ignore_case=False).find_all("gun") == []
+
+    def test_empty(self):
+        """测试空词表和空文本"""
+        assert KeywordMatcher({}).find_all("任何内容") == []
+        assert KeywordMatcher({"a": ["刀"]}).find_all("") == []
+        assert KeywordMatcher({"a": ["刀"]}).search("没有") is None
+
+    def test_matches_naive_scan(self):
+        """测试在大词表上与逐词包含检查的结果一致"""
+        keywords = build_keywords(2000)
+        matcher = KeywordMatcher(keywords)
+        for text in SAMPLE_TEXTS:
+            found = {(m.category, m.keyword) for m in matcher.find_all(text)}
+            assert found == naive_match(keywords, text)
+
+
+class TestKeywordMatcherRegistry:
+    """测试匹配器注册表"""
+
+    def test_atomic_rebuild(self):
+        """测试重建时读取方始终拿到完整的匹配器"""
+        registry = KeywordMatcherRegistry()
+        registry.register("safety", {"a": ["刀"]})
+        old = registry.get("safety")
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                matcher = registry.get("safety")
+                if matcher.search("刀枪") is None:
+                    errors.append("missing")
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for i in range(20):
+            registry.register("safety", {"a": ["刀", "枪"] + [f"词{j}" for j in range(i * 10)]})
+        stop.set()
+        thread.join(5)
+
+        assert errors == []
+        assert registry.version("safety") == 21
+        assert registry.get("safety") is not old
+        # 旧的匹配器仍然可用
+        assert old.find_all("刀枪") == [KeywordMatch("刀", "a", 0, 1)]
+
+
+class TestSafetyKeywordSharing:
+    """测试SafetyAgent和工作流预过滤共用匹配器"""
+
+    def test_safety_agent_uses_shared_matcher(self):
+        """测试更新共享词表后SafetyAgent立即生效"""
+        agent = SafetyAgent()
+        try:
+            update_safety_keywords({"custom": ["奥特曼"]})
+            result = agent._pre_filter_content("我喜欢奥特曼")
+            assert result == {"is_safe": False, "issues": ["检测到custom相关敏感内容: 奥特曼"]}
+            assert agent.sensitive_keywords == {"custom": ["奥特曼"]}
+        finally:
+            update_safety_keywords()
+        assert agent._pre_filter_content("我喜欢奥特曼")["is_safe"] is True
+        assert agent.sensitive_keywords == SENSITIVE_KEYWORDS
+
+    def test_workflow_filter(self):
+        """测试工作流预过滤：命中敏感词需复核，命中放行词直接通过"""
+        from agents.langgraph_workflow import HappyPartnerGraph
+
+        graph = HappyPartnerGraph.__new__(HappyPartnerGraph)
+        assert graph._quick_keyword_filter("他拿着刀") == (False, ["检测到敏感词: 刀"])
+        assert graph._quick_keyword_filter("学习用刀削苹果") == (True, [])
+        assert graph._quick_keyword_filter("今天天气很好") == (True, [])
+        assert get_safety_matcher().search("他妈的").category == "hate"
@@ -0,0 +1,216 @@
+import pytest
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+from agents.langgraph_workflow import happy_partner_graph, HappyPartnerGraph
+from agents.triage_agent import TriageAgent
+from agents.edu_agent import EduAgent
+from agents.meta_agent import MetaAgent
+from agents.safety_agent import SafetyAgent, PARENTAL_ISSUE_PREFIX
+from config.settings import settings
+from utils.ollama_client import ollama_client
+from utils.intent_classifier import intent_classifier
+
+
+def _fake_request(endpoint, method='GET', data=None, timeout=None, base_url=None, affinity=None):
+    """模拟非流式的Ollama调用：分类类请求返回固定结果"""
+    return {"response": "数学"}
+
+
+def _fake_stream(endpoint, data, timeout=None, final_chunk=None, affinity=None):
+    """模拟逐块返回的Ollama流式响应"""
+    for token in ["一加一", "等于", "二"]:
+        yield token
+
+
+class TestLangGraphStreaming:
+    """测试LangGraph工作流的流式事件"""
+
+    def test_stream_message_events(self):
+        """测试流式处理产出节点进度、增量文本和完整结果"""
+        async def collect():
+            return [event async for event in happy_partner_graph.stream_message("1", "1+1等于多少？")]
+
+        with patch.object(ollama_client, "_make_request", side_effect=_fake_request), \
+             patch.object(ollama_client, "_iter_stream", side_effect=_fake_stream):
+            events = asyncio.run(collect())
+
+        types = [event["type"] for event in events]
+        nodes = [event["node"] for event in events if event["type"] == "node"]
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+
+        assert types[-1] == "complete"
+        assert "safety_check" in nodes
+        assert "route_agent" in nodes
+        assert tokens == ["一加一", "等于", "二"]
+        # 增量文本应在agent节点完成之前到达
+        assert types.index("token") < events.index({"type": "node", "node": "edu_agent"})
+        assert events[-1]["data"]["response"] == "一加一等于二"
+
+
+async def _slow_triage(content):
+    """模拟耗时0.1秒的异步分诊调用"""
+    await asyncio.sleep(0.1)
+    return {
+        "original_content": content, "is_safe": True, "issues": [], "filtered_content": content,
+        "target_agent": "edu", "subject": "数学", "emotion": None, "intensity": "中", "fallbacks": []
+    }
+
+
+def _slow_edu(request, on_token=None):
+    """模拟耗时0.2秒的同步回答生成"""
+    time.sleep(0.2)
+    return {"answer": "一加一等于二", "subject": "数学"}
+
+
+class TestLangGraphConcurrency:
+    """测试工作流异步执行时不阻塞事件循环"""
+
+    def test_concurrent_sessions_overlap(self):
+        """测试多个会话并发处理时总耗时接近单个会话，而不是逐个累加"""
+        async def run_all():
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                happy_partner_graph.process_message(str(i), "1+1等于多少？", f"s{i}") for i in range(8)
+            ])
+            return results, time.perf_counter() - start
+
+        with patch.object(TriageAgent, "atriage", side_effect=_slow_triage), \
+             patch.object(EduAgent, "process_request", side_effect=_slow_edu), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            results, elapsed = asyncio.run(run_all())
+
+        assert [result["response"] for result in results] == ["一加一等于二"] * 8
+        assert elapsed < 8 * 0.3 / 2
+
+    def test_event_loop_responsive(self):
+        """测试处理消息期间事件循环仍能调度其他协程"""
+        async def run():
+            ticks = 0
+            finished = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not finished.is_set():
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            tick_task = asyncio.create_task(ticker())
+            await happy_partner_graph.process_message("1", "1+1等于多少？")
+            finished.set()
+            await tick_task
+            return ticks
+
+        with patch.object(TriageAgent, "atriage", side_effect=_slow_triage), \
+             patch.object(EduAgent, "process_request", side_effect=_slow_edu), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            ticks = asyncio.run(run())
+
+        assert ticks >= 10
+
+    def test_matcher_lookup_off_loop(self):
+        """测试安全检查加载用户匹配器（可能查询数据库）不在事件循环线程中执行"""
+        from agents.safety_agent import get_safety_matcher
+
+        threads = []
+
+        def lookup(user_id):
+            threads.append(threading.current_thread())
+            return get_safety_matcher()
+
+        with patch("agents.safety_agent.get_user_safety_matcher", side_effect=lookup), \
+             patch.object(TriageAgent, "atriage", side_effect=_slow_triage), \
+             patch.object(EduAgent, "process_request", side_effect=_slow_edu), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            asyncio.run(happy_partner_graph.process_message("5", "1+1等于多少？"))
+
+        assert threads and threading.main_thread() not in threads
+
+
+class TestParallelSafetyIntent:
+    """测试安全检查和意图分析并行执行"""
+
+    def test_branches_fan_out_and_join(self):
+        """测试安全检查和意图分析都从上下文增强分出，并在路由前汇合"""
+        edges = {(edge.source, edge.target) for edge in happy_partner_graph.compiled_graph.get_graph().edges}
+        assert ("context_enrichment", "safety_check") in edges
+        assert ("context_enrichment", "intent_analysis") in edges
+        assert ("safety_check", "route_agent") in edges
+        assert ("intent_analysis", "route_agent") in edges
+        assert ("safety_check", "intent_analysis") not in edges
+
+    def test_keyword_hit_blocked_without_review(self):
+        """测试关闭分诊时命中敏感词直接屏蔽，不调用模型审查，也不等待路由"""
+        def slow_route(request):
+            time.sleep(0.2)
+            return "edu"
+
+        async def run():
+            start = time.perf_counter()
+            result = await happy_partner_graph.process_message("1", "他拿着刀削苹果")
+            return result, time.perf_counter() - start
+
+        with patch.object(settings, "llm_triage_enabled", False), \
+             patch.object(settings, "intent_classifier_enabled", False), \
+             patch.object(SafetyAgent, "filter_content") as review, \
+             patch.object(MetaAgent, "route_request", side_effect=slow_route), \
+             patch.object(EduAgent, "process_request") as edu, \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            result, elapsed = asyncio.run(run())
+
+        review.assert_not_called()
+        edu.assert_not_called()
+        assert result["safety_info"]["passed"] is False
+        assert elapsed < 0.15
+
+    def test_safe_triage_does_not_override_keywords(self):
+        """测试分诊回复安全时命中敏感词的内容仍被屏蔽，与SafetyAgent.filter_content一致"""
+        with patch.object(TriageAgent, "atriage", side_effect=_slow_triage), \
+             patch.object(EduAgent, "process_request") as edu, \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            result = asyncio.run(happy_partner_graph.process_message("1", "我想自杀"))
+
+        assert SafetyAgent().filter_content("我想自杀")["is_safe"] is False
+        edu.assert_not_called()
+        assert result["safety_info"]["passed"] is False
+        assert result["response"] == "抱歉，我无法处理包含不当内容的请求。"
+
+    def test_confident_classifier_skips_triage(self):
+        """测试本地意图分类器有把握且预过滤通过时直接路由，不调用分诊"""
+        with patch.object(intent_classifier, "predict", return_value=("emotion", 0.99)), \
+             patch.object(TriageAgent, "atriage") as triage, \
+             patch("agents.emotion_agent.EmotionAgent.process_request", return_value={"response": "抱抱你"}), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            result = asyncio.run(happy_partner_graph.process_message("1", "我今天好难过"))
+
+        triage.assert_not_called()
+        assert result["response"] == "抱抱你"
+
+    def test_blocked_content_cancels_intent(self):
+        """测试命中家长屏蔽词时取消进行中的意图分析，直接返回安全提示"""
+        cancelled = []
+
+        async def hanging_triage(content):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(content)
+                raise
+
+        async def run():
+            start = time.perf_counter()
+            result = await happy_partner_graph.process_message("1", "我想玩游戏")
+            return result, time.perf_counter() - start
+
+        blocked = (False, [f"{PARENTAL_ISSUE_PREFIX}游戏"])
+        with patch.object(HappyPartnerGraph, "_quick_keyword_filter", return_value=blocked), \
+             patch.object(TriageAgent, "atriage", side_effect=hanging_triage), \
+             patch.object(EduAgent, "process_request") as edu:
+            result, elapsed = asyncio.run(run())
+
+        assert cancelled == ["我想玩游戏"]
+        assert elapsed < 1
+        edu.assert_not_called()
+        assert result["metadata"]["agent"] == "error_handler"
+        assert result["response"] == "抱歉，我无法处理包含不当内容的请求。"
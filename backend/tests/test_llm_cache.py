@@ -0,0 +1,93 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from utils.llm_cache import LLMResultCache
+from utils.ollama_client import ollama_client
+
+
+class TestLLMResultCache:
+    """测试确定性LLM调用结果缓存"""
+
+    def test_make_key_normalizes_whitespace(self):
+        """测试缓存键忽略提示词中的缩进和空白差异"""
+        key1 = LLMResultCache.make_key("ollama", "paopao", [{"role": "user", "content": "  你好\n  世界 "}], 0.1, 10)
+        key2 = LLMResultCache.make_key("ollama", "paopao", [{"role": "user", "content": "你好 世界"}], 0.1, 10)
+        assert key1 == key2
+
+    def test_make_key_includes_sampling_params(self):
+        """测试采样参数不同则缓存键不同"""
+        messages = [{"role": "user", "content": "你好"}]
+        assert LLMResultCache.make_key("ollama", "paopao", messages, 0.1, 10) != \
+            LLMResultCache.make_key("ollama", "paopao", messages, 0.7, 10)
+        assert LLMResultCache.make_key("ollama", "paopao", messages, 0.1, 10) != \
+            LLMResultCache.make_key("openai", "paopao", messages, 0.1, 10)
+
+    def test_get_or_call_hit_and_miss(self):
+        """测试命中后不再调用"""
+        cache = LLMResultCache(max_entries=10, ttl=60)
+        calls = []
+
+        def call():
+            calls.append(1)
+            return "edu"
+
+        assert cache.get_or_call("k", call) == "edu"
+        assert cache.get_or_call("k", call) == "edu"
+        assert len(calls) == 1
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = LLMResultCache(max_entries=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_ttl_expiration(self):
+        """测试过期条目不会命中"""
+        cache = LLMResultCache(max_entries=10, ttl=0.01)
+        cache.set("a", "1")
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.get_stats()["expirations"] == 1
+
+    def test_errors_not_cached(self):
+        """测试调用异常不会写入缓存"""
+        cache = LLMResultCache(max_entries=10, ttl=60)
+
+        def failing_call():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_call("k", failing_call)
+        assert cache.get("k") is None
+
+    def test_aget_or_call(self):
+        """测试异步版本"""
+        cache = LLMResultCache(max_entries=10, ttl=60)
+
+        async def call():
+            return "emotion"
+
+        async def run():
+            return [await cache.aget_or_call("k", call), await cache.aget_or_call("k", call)]
+
+        assert asyncio.run(run()) == ["emotion", "emotion"]
+        assert cache.get_stats()["hits"] == 1
+
+    def test_ollama_client_opt_in(self):
+        """测试Ollama客户端仅在调用方开启时使用缓存"""
+        messages = [{"role": "user", "content": "缓存测试问题"}]
+        with patch.object(ollama_client, "_make_request", return_value={"response": "数学"}) as mock_request:
+            ollama_client.chat_completion(messages, temperature=0.1, max_tokens=10, cache=True)
+            ollama_client.chat_completion(messages, temperature=0.1, max_tokens=10, cache=True)
+            assert mock_request.call_count == 1
+            ollama_client.chat_completion(messages, temperature=0.1, max_tokens=10)
+            assert mock_request.call_count == 2
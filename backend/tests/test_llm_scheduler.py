@@ -0,0 +1,137 @@
+import pytest
+import asyncio
+import threading
+import time
+from utils.llm_scheduler import (
+    LLMScheduler, LLMOverloadedError, Priority, current_priority, priority_for_input_mode
+)
+
+
+class TestLLMScheduler:
+    """测试LLM调度的准入控制和优先级"""
+
+    def test_unlimited_backend(self):
+        """测试未设置上限的后端直接执行"""
+        scheduler = LLMScheduler(limits={})
+        with scheduler.slot("ollama"):
+            pass
+        assert scheduler.get_stats()["backends"] == {}
+
+    def test_priority_context(self):
+        """测试在上下文中设置优先级"""
+        scheduler = LLMScheduler()
+        assert current_priority.get() == Priority.INTERACTIVE_TEXT
+        with scheduler.priority(Priority.BACKGROUND):
+            assert current_priority.get() == Priority.BACKGROUND
+        assert current_priority.get() == Priority.INTERACTIVE_TEXT
+        assert priority_for_input_mode("voice") == Priority.INTERACTIVE_VOICE
+        assert priority_for_input_mode(None) == Priority.INTERACTIVE_TEXT
+
+    def test_concurrency_limit_and_priority_order(self):
+        """测试并发上限内执行，排队的调用按优先级获得槽位"""
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        order = []
+        holder_entered = threading.Event()
+        release_holder = threading.Event()
+
+        def holder():
+            with scheduler.slot("ollama"):
+                holder_entered.set()
+                release_holder.wait(5)
+
+        def waiter(name, priority):
+            with scheduler.slot("ollama", priority=priority):
+                order.append(name)
+
+        first = threading.Thread(target=holder)
+        first.start()
+        holder_entered.wait(5)
+
+        threads = [
+            threading.Thread(target=waiter, args=("background", Priority.BACKGROUND)),
+            threading.Thread(target=waiter, args=("text", Priority.INTERACTIVE_TEXT)),
+            threading.Thread(target=waiter, args=("voice", Priority.INTERACTIVE_VOICE)),
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+
+        stats = scheduler.get_stats()["backends"]["ollama"]
+        assert stats["in_flight"] == 1
+        assert sum(stats["queued"].values()) == 3
+
+        release_holder.set()
+        first.join(5)
+        for thread in threads:
+            thread.join(5)
+
+        assert order == ["voice", "text", "background"]
+        stats = scheduler.get_stats()["backends"]["ollama"]
+        assert stats["in_flight"] == 0
+        assert stats["priorities"]["background"]["max_wait_ms"] > 0
+
+    def test_queue_timeout(self):
+        """测试排队超过期限时拒绝"""
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        with scheduler.slot("ollama"):
+            with pytest.raises(LLMOverloadedError):
+                with scheduler.slot("ollama", deadline=0.05):
+                    pass
+        stats = scheduler.get_stats()["backends"]["ollama"]
+        assert stats["priorities"]["interactive_text"]["timed_out"] == 1
+        assert stats["in_flight"] == 0
+        assert sum(stats["queued"].values()) == 0
+
+    def test_fast_rejection(self):
+        """测试预计排队时间超过期限时立即拒绝"""
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        with scheduler.slot("ollama"):
+            time.sleep(0.05)
+        with scheduler.slot("ollama"):
+            start = time.monotonic()
+            with pytest.raises(LLMOverloadedError):
+                with scheduler.slot("ollama", deadline=0.01):
+                    pass
+            assert time.monotonic() - start < 0.01
+        stats = scheduler.get_stats()["backends"]["ollama"]
+        assert stats["priorities"]["interactive_text"]["rejected"] == 1
+
+    def test_async_slot(self):
+        """测试异步调用排队时不阻塞事件循环，且与同步调用共享槽位"""
+        scheduler = LLMScheduler(limits={"ollama": 1})
+        order = []
+
+        async def call(name, priority, hold):
+            async with scheduler.aslot("ollama", priority=priority):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        async def run():
+            first = asyncio.create_task(call("first", Priority.INTERACTIVE_TEXT, 0.05))
+            await asyncio.sleep(0.01)
+            background = asyncio.create_task(call("background", Priority.BACKGROUND, 0))
+            voice = asyncio.create_task(call("voice", Priority.INTERACTIVE_VOICE, 0))
+            await asyncio.gather(first, background, voice)
+
+        asyncio.run(run())
+        assert order == ["first", "voice", "background"]
+        assert scheduler.get_stats()["backends"]["ollama"]["in_flight"] == 0
+
+    def test_async_cancel_while_queued(self):
+        """测试排队中的异步调用被取消后槽位不会泄漏"""
+        scheduler = LLMScheduler(limits={"ollama": 1})
+
+        async def run():
+            async with scheduler.aslot("ollama"):
+                queued = asyncio.create_task(scheduler.aslot("ollama").__aenter__())
+                await asyncio.sleep(0.01)
+                queued.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await queued
+            async with scheduler.aslot("ollama", deadline=0.1):
+                pass
+
+        asyncio.run(run())
+        stats = scheduler.get_stats()["backends"]["ollama"]
+        assert stats["in_flight"] == 0
+        assert sum(stats["queued"].values()) == 0
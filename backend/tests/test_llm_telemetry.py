@@ -0,0 +1,151 @@
+import pytest
+import asyncio
+import httpx
+from utils.llm_telemetry import Histogram, LLMTelemetry, llm_call_site, current_call_site, llm_telemetry
+from utils.ollama_client import OllamaClient
+from utils.http_pool import HTTPClientPool
+
+
+# 模拟Ollama响应中的计时字段（纳秒）
+_METRICS = {
+    "prompt_eval_count": 120,
+    "prompt_eval_duration": 300_000_000,
+    "eval_count": 40,
+    "eval_duration": 2_000_000_000,
+    "load_duration": 1_500_000_000
+}
+
+
+def _ollama_handler(request: httpx.Request) -> httpx.Response:
+    """返回带计时字段的模拟Ollama响应"""
+    if request.url.path == "/api/tags":
+        return httpx.Response(200, json={"models": [{"name": "paopao"}]})
+    if request.url.path == "/api/chat":
+        return httpx.Response(200, json={
+            "model": "paopao", "message": {"role": "assistant", "content": "你好"}, "done": True, **_METRICS
+        })
+    return httpx.Response(500)
+
+
+class _MockPool(HTTPClientPool):
+    """使用MockTransport的连接池"""
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(transport=httpx.MockTransport(_ollama_handler))
+        return self._client
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_ollama_handler))
+
+
+@pytest.fixture
+def ollama():
+    """替换为模拟连接池的Ollama客户端，遥测数据每个测试清空"""
+    client = OllamaClient()
+    original_pool = client.pool
+    original_mode = client.api_mode
+    client.pool = _MockPool(timeout=5)
+    client.api_mode = "chat"
+    llm_telemetry.reset()
+    yield client
+    client.pool = original_pool
+    client.api_mode = original_mode
+    llm_telemetry.reset()
+
+
+class TestHistogram:
+    """测试直方图"""
+
+    def test_buckets_and_percentile(self):
+        """测试累计分桶和分位数估算"""
+        hist = Histogram([10, 100, 1000])
+        for value in (5, 50, 60, 500, 5000):
+            hist.observe(value)
+        assert hist.cumulative() == [("10", 1), ("100", 3), ("1000", 4), ("+Inf", 5)]
+        assert hist.percentile(0.5) == 100
+        assert hist.percentile(1.0) == 5000
+        assert hist.to_dict()["max"] == 5000
+
+
+class TestLLMTelemetry:
+    """测试LLM调用遥测"""
+
+    def test_record_ollama(self):
+        """测试从Ollama计时字段换算耗时、生成速度和模型换入"""
+        telemetry = LLMTelemetry(load_threshold_ms=1000)
+        with llm_call_site("safety"):
+            telemetry.record_ollama("paopao", _METRICS, latency=4.0, queue_time=0.5)
+        stats = telemetry.get_stats()
+        series = stats["series"][0]
+        assert series["call_site"] == "safety"
+        assert series["model_loads"] == 1
+        histograms = series["histograms"]
+        assert histograms["prompt_tokens"]["sum"] == 120
+        assert histograms["prefill_ms"]["sum"] == 300
+        assert histograms["decode_ms"]["sum"] == 2000
+        assert histograms["tokens_per_second"]["sum"] == 20
+        assert histograms["queue_ms"]["sum"] == 500
+        assert stats["sites"]["safety"]["output_tokens"] == 40
+        assert stats["model_load_events"][0]["load_ms"] == 1500
+
+    def test_call_site_context(self):
+        """测试调用点上下文和装饰器用法"""
+        assert current_call_site.get() == "other"
+
+        @llm_call_site("router")
+        def route():
+            return current_call_site.get()
+
+        assert route() == "router"
+        with llm_call_site("edu"):
+            assert route() == "router"
+            assert current_call_site.get() == "edu"
+        assert current_call_site.get() == "other"
+
+    def test_disabled(self):
+        """测试关闭时不记录"""
+        telemetry = LLMTelemetry(enabled=False)
+        telemetry.record("ollama", "paopao", latency=1.0)
+        assert telemetry.get_stats()["series"] == []
+
+    def test_export_prometheus(self):
+        """测试Prometheus文本格式导出"""
+        telemetry = LLMTelemetry()
+        telemetry.record("openai", "deepseek-chat", latency=0.2, output_tokens=10, call_site="edu")
+        telemetry.record("openai", "deepseek-chat", error=True, call_site="edu")
+        text = telemetry.export_prometheus()
+        labels = 'call_site="edu",backend="openai",model="deepseek-chat"'
+        assert f"llm_calls_total{{{labels}}} 2" in text
+        assert f"llm_errors_total{{{labels}}} 1" in text
+        assert f'llm_latency_ms_bucket{{{labels},le="250"}} 1' in text
+        assert f"llm_output_tokens_count{{{labels}}} 1" in text
+
+
+class TestOllamaClientTelemetry:
+    """测试Ollama客户端记录遥测"""
+
+    def test_sync_and_async_calls_recorded(self, ollama):
+        """测试同步和异步调用按调用点记录"""
+        messages = [{"role": "user", "content": "你好"}]
+        with llm_call_site("emotion"):
+            assert ollama.chat_completion(messages) == "你好"
+            assert asyncio.run(ollama.achat_completion(messages)) == "你好"
+        series = llm_telemetry.get_stats()["series"]
+        assert len(series) == 1
+        assert series[0]["call_site"] == "emotion"
+        assert series[0]["backend"] == "ollama"
+        assert series[0]["calls"] == 2
+        assert series[0]["histograms"]["output_tokens"]["sum"] == 80
+        assert series[0]["histograms"]["queue_ms"]["count"] == 2
+
+    def test_error_recorded(self, ollama):
+        """测试失败的调用计入失败数"""
+        ollama.api_mode = "generate"
+        with llm_call_site("summary"):
+            result = ollama.chat_completion([{"role": "user", "content": "你好"}])
+        assert "出错" in result
+        series = llm_telemetry.get_stats()["series"]
+        assert series[0]["call_site"] == "summary"
+        assert series[0]["errors"] >= 1
@@ -0,0 +1,134 @@
+import pytest
+import threading
+import time
+from unittest.mock import patch
+from models.user import UserMemory
+from agents.memory_agent import MemoryAgent
+from utils.memory_store import UserMemoryStore
+
+
+class TestUserMemoryStore:
+    """测试按用户隔离的对话记忆存储"""
+
+    def test_ring_buffer(self):
+        """测试每个用户只保留最近capacity条，字节数随之更新"""
+        store = UserMemoryStore(capacity=3)
+        for i in range(5):
+            store.append(1, {"content": f"问题{i}"})
+        assert [entry["content"] for entry in store.get(1)] == ["问题2", "问题3", "问题4"]
+        assert store.get(1, 2) == [{"content": "问题3"}, {"content": "问题4"}]
+        stats = store.get_stats()
+        assert stats["total_entries"] == 3
+        assert stats["largest_users"]["1"]["bytes"] == stats["total_bytes"]
+
+    def test_users_isolated(self):
+        """测试不同用户的记录互不影响，清空只影响本人"""
+        store = UserMemoryStore()
+        store.append(1, {"content": "A"})
+        store.append("2", {"content": "B"})
+        store.clear(1)
+        assert store.get(1) == []
+        assert store.get(2) == [{"content": "B"}]
+
+    def test_lru_eviction_under_cap(self):
+        """测试总字节数超过上限时淘汰最久未访问的用户"""
+        entry = {"content": "x" * 100}
+        store = UserMemoryStore(max_total_bytes=350)
+        store.append(1, entry)
+        store.append(2, entry)
+        store.get(1)
+        store.append(3, entry)
+        store.append(3, entry)
+        assert store.get(2) == []
+        assert store.get(1) == [entry]
+        stats = store.get_stats()
+        assert stats["evicted_users"] == 1
+        assert stats["total_bytes"] <= 350
+
+    def test_persistence_survives_restart(self, session_factory):
+        """测试写入数据库后新实例可载入，数据库只保留最近capacity条"""
+        store = UserMemoryStore(capacity=2, persistent=True, session_factory=session_factory)
+        for i in range(4):
+            store.append(7, {"content": f"问题{i}"})
+        restarted = UserMemoryStore(capacity=2, persistent=True, session_factory=session_factory)
+        assert [entry["content"] for entry in restarted.get(7)] == ["问题2", "问题3"]
+        db = session_factory()
+        assert db.query(UserMemory).count() == 2
+        db.close()
+
+    def test_evicted_user_reloaded(self, session_factory):
+        """测试持久化时被淘汰的用户再次访问会从数据库载入"""
+        entry = {"content": "x" * 100}
+        store = UserMemoryStore(max_total_bytes=150, persistent=True, session_factory=session_factory)
+        store.append(1, entry)
+        store.append(2, entry)
+        assert store.get_stats()["active_users"] == 1
+        assert store.get(1) == [entry]
+
+    def test_consistent_across_workers(self, session_factory):
+        """测试一个进程写入或清空后，另一个进程读到一致的结果"""
+        worker_a = UserMemoryStore(persistent=True, session_factory=session_factory, recheck_seconds=0)
+        worker_b = UserMemoryStore(persistent=True, session_factory=session_factory, recheck_seconds=0)
+        worker_a.append(1, {"content": "A"})
+        assert worker_b.get(1) == [{"content": "A"}]
+        worker_b.append(1, {"content": "B"})
+        assert worker_a.get(1) == [{"content": "A"}, {"content": "B"}]
+        worker_a.clear(1)
+        assert worker_b.get(1) == []
+        assert worker_b.count(1) == 0
+
+    def test_recheck_interval(self, session_factory):
+        """测试核对间隔内的读取不查询数据库，写入时发现其他进程的改动"""
+        worker_a = UserMemoryStore(persistent=True, session_factory=session_factory, recheck_seconds=60)
+        worker_b = UserMemoryStore(persistent=True, session_factory=session_factory, recheck_seconds=60)
+        worker_a.append(1, {"content": "A"})
+        worker_b.append(1, {"content": "B"})
+        with patch.object(worker_a, "_latest_id", wraps=worker_a._latest_id) as latest:
+            for _ in range(10):
+                assert worker_a.get(1) == [{"content": "A"}]
+                assert worker_a.count(1) == 1
+        assert latest.call_count == 0
+        worker_a.append(1, {"content": "C"})
+        assert worker_a.get(1) == [{"content": "A"}, {"content": "B"}, {"content": "C"}]
+
+    def test_db_io_outside_global_lock(self, session_factory):
+        """测试一个用户的数据库查询进行中时，其他用户的读取不被阻塞"""
+        store = UserMemoryStore(persistent=True, session_factory=session_factory, recheck_seconds=60)
+        other = next(key for key in map(str, range(2, 200)) if store._user_lock(key) is not store._user_lock("1"))
+        store.append(other, {"content": "B"})
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_session():
+            entered.set()
+            release.wait(2)
+            return session_factory()
+
+        store.session_factory = slow_session
+        reader = threading.Thread(target=store.get, args=(1,))
+        reader.start()
+        assert entered.wait(1)
+        start = time.monotonic()
+        assert store.get(other) == [{"content": "B"}]
+        assert time.monotonic() - start < 0.5
+        release.set()
+        reader.join()
+
+
+class TestMemoryAgentPerUser:
+    """测试MemoryAgent按用户存取对话"""
+
+    def test_process_request_per_user(self):
+        """测试存储、读取和清空都只作用于请求中的用户"""
+        agent = MemoryAgent()
+        agent.process_request({"action": "store", "user_id": 1, "conversation": {"content": "我喜欢恐龙"}})
+        agent.process_request({"action": "store", "user_id": 2, "conversation": {"content": "我喜欢画画"}})
+        history = agent.process_request({"action": "get_history", "user_id": 1})["history"]
+        assert [entry["content"] for entry in history] == ["我喜欢恐龙"]
+        agent.process_request({"action": "clear", "user_id": 1})
+        assert agent.process_request({"action": "get_context", "user_id": 1})["context"]["history_count"] == 0
+        assert agent.process_request({"action": "get_context", "user_id": 2})["context"]["history_count"] == 1
+
+    def test_instances_isolated_by_default(self):
+        """测试未传入存储时各实例互不共享"""
+        MemoryAgent().store_conversation({"content": "你好"})
+        assert MemoryAgent().conversation_history == []
@@ -0,0 +1,255 @@
+import pytest
+import json
+import asyncio
+import httpx
+from unittest.mock import patch
+from utils.ollama_client import OllamaClient
+from utils.http_pool import HTTPClientPool
+
+
+# 记录收到的请求，便于检查请求内容
+_requests = []
+
+
+def _ollama_handler(request: httpx.Request) -> httpx.Response:
+    """模拟Ollama服务的请求处理"""
+    if request.url.path == "/api/tags":
+        return httpx.Response(200, json={"models": [{"name": "paopao"}]})
+    if request.url.path in ("/api/generate", "/api/chat"):
+        data = json.loads(request.content)
+        _requests.append((request.url.path, data))
+        if request.url.path == "/api/chat":
+            chunks = [{"message": {"role": "assistant", "content": "你"}, "done": False},
+                      {"message": {"role": "assistant", "content": "好"}, "done": False},
+                      {"message": {"role": "assistant", "content": ""}, "done": True}]
+            final = {"message": {"role": "assistant", "content": "你好"}, "done": True}
+        else:
+            context = data.get("context", []) + [1, 2]
+            chunks = [{"response": "你", "done": False},
+                      {"response": "好", "done": False},
+                      {"response": "", "done": True, "context": context}]
+            final = {"response": "你好", "done": True, "context": context}
+        if data.get("stream"):
+            lines = [json.dumps(chunk) for chunk in chunks]
+            return httpx.Response(200, content="\n".join(lines).encode("utf-8"))
+        return httpx.Response(200, json=final)
+    return httpx.Response(404)
+
+
+class _MockPool(HTTPClientPool):
+    """使用MockTransport的连接池"""
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(transport=httpx.MockTransport(_ollama_handler))
+        return self._client
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_ollama_handler))
+
+
+@pytest.fixture
+def client():
+    """替换为模拟连接池的Ollama客户端"""
+    ollama = OllamaClient()
+    original_pool = ollama.pool
+    original_mode = ollama.api_mode
+    ollama.pool = _MockPool(timeout=5)
+    ollama.sessions.clear()
+    _requests.clear()
+    yield ollama
+    ollama.pool = original_pool
+    ollama.api_mode = original_mode
+    ollama.sessions.clear()
+
+
+class TestOllamaClient:
+    """测试Ollama客户端"""
+
+    def test_singleton(self):
+        """测试单例模式"""
+        assert OllamaClient() is OllamaClient()
+
+    def test_check_service(self, client):
+        """测试服务检查"""
+        assert client.check_service() is True
+        assert client.list_models() == ["paopao"]
+
+    def test_chat_completion(self, client):
+        """测试同步聊天接口"""
+        result = client.chat_completion([{"role": "user", "content": "你好"}])
+        assert result == "你好"
+
+    def test_chat_completion_stream_joined(self, client):
+        """测试stream=True时仍返回完整字符串"""
+        result = client.chat_completion([{"role": "user", "content": "你好"}], stream=True)
+        assert result == "你好"
+
+    def test_stream(self, client):
+        """测试逐块产出的流式接口"""
+        tokens = list(client.stream([{"role": "user", "content": "你好"}]))
+        assert tokens == ["你", "好"]
+
+    def test_achat_completion(self, client):
+        """测试异步聊天接口"""
+        result = asyncio.run(client.achat_completion([{"role": "user", "content": "你好"}]))
+        assert result == "你好"
+
+    def test_astream(self, client):
+        """测试异步流式接口"""
+        async def collect():
+            return [token async for token in client.astream([{"role": "user", "content": "你好"}])]
+
+        assert asyncio.run(collect()) == ["你", "好"]
+
+    def test_error_returns_message(self, client):
+        """测试请求失败时返回错误信息而不是抛出异常"""
+        client.pool._client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+        result = client.chat_completion([{"role": "user", "content": "你好"}])
+        assert result.startswith("调用Ollama API时出错")
+
+
+    def test_only_generation_scheduled(self, client):
+        """测试只有生成请求经调度器排队并记录遥测，模型管理请求不占用生成并发"""
+        with patch("utils.ollama_client.llm_scheduler.slot") as slot, \
+             patch("utils.ollama_client.llm_telemetry.record_ollama") as record:
+            client.get_model_info("paopao")
+            client.pull_model("paopao")
+            slot.assert_not_called()
+            record.assert_not_called()
+            client.chat_completion([{"role": "user", "content": "你好"}])
+        assert slot.call_count == 1
+        assert record.call_count == 1
+
+
+class TestOllamaSessionReuse:
+    """测试按会话复用上下文"""
+
+    messages = [
+        {"role": "system", "content": "你是儿童助手"},
+        {"role": "user", "content": "你好"}
+    ]
+
+    def test_chat_mode_uses_chat_endpoint(self, client):
+        """测试chat模式调用/api/chat，并携带keep_alive"""
+        client.api_mode = "chat"
+        client.chat_completion(self.messages)
+        path, data = _requests[-1]
+        assert path == "/api/chat"
+        assert data["messages"] == self.messages
+        assert data["keep_alive"] == client.keep_alive
+
+    def test_chat_mode_session_prefix(self, client):
+        """测试同一会话的后续请求以之前的请求为前缀"""
+        client.api_mode = "chat"
+        client.chat_completion(self.messages, session_id="s1")
+        first = _requests[-1][1]["messages"]
+        client.chat_completion(self.messages, session_id="s1")
+        second = _requests[-1][1]["messages"]
+        assert second[:len(first)] == first
+        assert second[len(first)] == {"role": "assistant", "content": "你好"}
+        assert len(second) == len(first) + 2
+
+    def test_chat_mode_session_isolated(self, client):
+        """测试不同会话、不同系统提示互不共享上下文"""
+        client.api_mode = "chat"
+        client.chat_completion(self.messages, session_id="s1")
+        client.chat_completion(self.messages, session_id="s2")
+        assert _requests[-1][1]["messages"] == self.messages
+        other = [{"role": "system", "content": "你是路由系统"}, {"role": "user", "content": "你好"}]
+        client.chat_completion(other, session_id="s1")
+        assert _requests[-1][1]["messages"] == other
+
+    def test_chat_mode_stream_records_turn(self, client):
+        """测试流式生成也会记录会话轮次"""
+        client.api_mode = "chat"
+        tokens = list(client.stream(self.messages, session_id="s1"))
+        assert tokens == ["你", "好"]
+        client.chat_completion(self.messages, session_id="s1")
+        assert len(_requests[-1][1]["messages"]) == 4
+
+    def test_chat_mode_history_trimmed(self, client):
+        """测试超过轮数上限后丢弃较早的一半轮次"""
+        client.api_mode = "chat"
+        for _ in range(client.sessions.max_turns + 1):
+            client.chat_completion(self.messages, session_id="s1")
+        history = client.sessions.get_history(client.sessions.make_key("s1", client.default_model, self.messages))
+        turns = [m for m in history if m["role"] == "assistant"]
+        assert len(turns) <= client.sessions.max_turns
+        assert history[0]["role"] == "user"
+
+    def test_generate_mode_reuses_context(self, client):
+        """测试generate模式复用返回的context，只发送最新的用户消息"""
+        client.api_mode = "generate"
+        client.chat_completion(self.messages, session_id="s1")
+        first = _requests[-1][1]
+        assert "context" not in first
+        assert "<|im_start|>system" in first["prompt"]
+        client.chat_completion(self.messages, session_id="s1")
+        second = _requests[-1][1]
+        assert second["context"] == [1, 2]
+        assert second["prompt"] == "你好"
+
+    def test_generate_mode_context_budget(self, client):
+        """测试context超出预算后重新开始"""
+        client.api_mode = "generate"
+        key = client.sessions.make_key("s1", client.default_model, self.messages)
+        client.sessions.set_context(key, list(range(client.sessions.max_context_tokens + 1)))
+        assert client.sessions.get_context(key) is None
+
+
+class TestOllamaMultiHost:
+    """测试多节点路由"""
+
+    def test_routes_by_model_and_probe(self, client):
+        """测试按探测结果把请求发往拥有模型的节点"""
+        from utils.ollama_pool import OllamaHostPool
+
+        seen = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request.url.host)
+            if request.url.path == "/api/tags":
+                name = "paopao:latest" if request.url.host == "b" else "other:latest"
+                return httpx.Response(200, json={"models": [{"name": name}]})
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": "你好"}, "done": True})
+
+        original = client.host_pool
+        client.pool._client = httpx.Client(transport=httpx.MockTransport(handler))
+        client.host_pool = OllamaHostPool(["http://a", "http://b"], probe=client._probe_host, health_check_interval=0)
+        try:
+            client.host_pool.check_hosts()
+            seen.clear()
+            assert client.chat_completion([{"role": "user", "content": "你好"}], model="paopao") == "你好"
+            assert seen == ["b"]
+            stats = client.get_host_stats()["hosts"]
+            assert [h["models"] for h in stats] == [["other:latest"], ["paopao:latest"]]
+        finally:
+            client.host_pool = original
+
+    def test_pull_fans_out_to_every_host(self, client):
+        """测试拉取模型发往每个节点，任一节点失败时返回False"""
+        from utils.ollama_pool import OllamaHostPool
+
+        pulled = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/pull":
+                pulled.append(request.url.host)
+                if request.url.host == "c":
+                    return httpx.Response(500)
+                return httpx.Response(200, json={"status": "success"})
+            return httpx.Response(200, json={"models": []})
+
+        original_hosts, original_pool = client.hosts, client.host_pool
+        client.pool._client = httpx.Client(transport=httpx.MockTransport(handler))
+        client.hosts = ["http://a", "http://b"]
+        client.host_pool = OllamaHostPool(client.hosts, probe=client._probe_host, health_check_interval=0)
+        try:
+            assert client.pull_model("paopao") is True
+            assert pulled == ["a", "b"]
+            client.hosts = ["http://a", "http://c"]
+            assert client.pull_model("paopao") is False
+        finally:
+            client.hosts, client.host_pool = original_hosts, original_pool
@@ -0,0 +1,82 @@
+import pytest
+from utils.ollama_pool import OllamaHostPool, normalize_model_name
+
+
+def _make_pool(probe_result=None, **kwargs):
+    """创建两个节点的负载均衡，探测结果由probe_result指定"""
+    probe_result = probe_result or {}
+
+    def probe(url):
+        return probe_result.get(url, (True, ["paopao:latest"]))
+
+    return OllamaHostPool(["http://a", "http://b"], probe=probe, health_check_interval=0, **kwargs)
+
+
+class TestOllamaHostPool:
+    """测试多节点负载均衡"""
+
+    def test_requires_hosts(self):
+        """测试节点列表不能为空"""
+        with pytest.raises(ValueError):
+            OllamaHostPool([])
+
+    def test_normalize_model_name(self):
+        """测试模型名称补全标签"""
+        assert normalize_model_name("paopao") == "paopao:latest"
+        assert normalize_model_name("qwen2.5:7b") == "qwen2.5:7b"
+
+    def test_least_outstanding(self):
+        """测试选择进行中请求最少的节点"""
+        pool = _make_pool()
+        with pool.lease("paopao") as first:
+            second = pool.select("paopao")
+            assert second is not first
+        assert first.outstanding == 0
+
+    def test_skip_unhealthy_and_missing_model(self):
+        """测试跳过不健康节点和没有所需模型的节点"""
+        pool = _make_pool({"http://a": (False, [])})
+        pool.check_hosts()
+        assert pool.select("paopao").url == "http://b"
+
+        pool = _make_pool({"http://a": (True, ["other:latest"])})
+        pool.check_hosts()
+        assert pool.select("paopao").url == "http://b"
+        # 没有节点有该模型时退回任一健康节点
+        assert pool.select("missing") is not None
+
+    def test_failures_mark_unhealthy(self):
+        """测试连续失败后节点被标记为不健康，探测成功后恢复"""
+        pool = _make_pool(max_failures=1)
+        with pytest.raises(RuntimeError):
+            with pool.lease() as leased:
+                raise RuntimeError("boom")
+        assert leased.healthy is False
+        assert pool.select().url != leased.url
+        pool.check_hosts()
+        assert leased.healthy is True
+
+    def test_latency_recorded(self):
+        """测试记录延迟并在统计中返回"""
+        pool = _make_pool()
+        with pool.lease() as host:
+            pass
+        stats = pool.get_stats()
+        entry = next(h for h in stats["hosts"] if h["url"] == host.url)
+        assert entry["requests"] == 1
+        assert entry["latency_ewma_ms"] is not None
+        assert entry["queue_depth"] == 0
+
+    def test_session_affinity(self):
+        """测试同一会话优先回到上次的节点"""
+        pool = _make_pool()
+        with pool.lease(affinity="s1") as first:
+            pass
+        # 让另一个节点的延迟更低，没有亲和时会选择它
+        other = next(h for h in pool.hosts if h is not first)
+        first.latency_ewma, other.latency_ewma = 1.0, 0.1
+        assert pool.select() is other
+        assert pool.select(affinity="s1") is first
+        # 亲和节点明显更忙时改选其他节点
+        first.outstanding = 3
+        assert pool.select(affinity="s1") is other
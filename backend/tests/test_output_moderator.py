@@ -0,0 +1,147 @@
+import pytest
+from unittest.mock import patch
+from utils.keyword_matcher import KeywordMatcher, KeywordMatch
+from utils.output_moderator import OutputModerator, OutputBlocked, moderate_text
+from agents.edu_agent import EduAgent
+from agents.emotion_agent import EmotionAgent
+from utils.openai_client import openai_client
+from utils.circuit_breaker import CircuitBreaker
+
+
+MATCHER = KeywordMatcher({"hate": ["笨蛋", "去死"], "adult": ["色情"], "safe_context": ["学习"]})
+
+
+def _feed_all(moderator: OutputModerator, tokens):
+    for token in tokens:
+        moderator.feed(token)
+
+
+class TestKeywordStream:
+    """测试增量关键词匹配"""
+
+    def test_match_across_chunks(self):
+        """测试跨块的关键词能命中，偏移相对于整个流"""
+        stream = MATCHER.stream()
+        assert stream.feed("你真是个笨") == []
+        assert stream.pending == 1
+        assert stream.feed("蛋啊") == [KeywordMatch("笨蛋", "hate", 4, 6)]
+        assert stream.pending == 0
+
+    def test_categories(self):
+        """测试只返回指定分类的命中"""
+        stream = MATCHER.stream({"adult"})
+        assert stream.feed("学习不是笨蛋") == []
+
+
+class TestOutputModerator:
+    """测试流式输出审查"""
+
+    def test_clean_stream_passes_through(self):
+        """测试无敏感词时逐块转发，结束后下发暂缓字符"""
+        emitted = []
+        moderator = OutputModerator(MATCHER, on_token=emitted.append, categories={"hate", "adult"})
+        _feed_all(moderator, ["今天", "我们学", "习加法，笨"])
+        assert "".join(emitted) == "今天我们学习加法，"
+        assert moderator.finish("今天我们学习加法，笨") == "今天我们学习加法，笨"
+        assert "".join(emitted) == "今天我们学习加法，笨"
+
+    def test_redact_before_emission(self):
+        """测试跨块的敏感词在下发前被打码"""
+        emitted = []
+        moderator = OutputModerator(MATCHER, on_token=emitted.append, categories={"hate"})
+        _feed_all(moderator, ["你不是笨", "蛋", "，你很棒"])
+        result = moderator.finish("你不是笨蛋，你很棒")
+        assert result == "你不是**，你很棒"
+        assert "".join(emitted) == result
+        assert all("笨" not in token for token in emitted)
+        assert moderator.matches == [KeywordMatch("笨蛋", "hate", 3, 5)]
+
+    def test_cutoff_stops_generation(self):
+        """测试截断模式在命中处停止并追加提示"""
+        emitted = []
+        moderator = OutputModerator(MATCHER, on_token=emitted.append, mode="cutoff", notice="[已截断]")
+        with pytest.raises(OutputBlocked):
+            _feed_all(moderator, ["好的，", "色", "情内容", "不会再输出"])
+        assert moderator.blocked
+        assert moderator.finish("") == "好的，[已截断]"
+        assert "".join(emitted) == "好的，[已截断]"
+
+    def test_response_differs_from_stream(self):
+        """测试客户端返回的内容与流不一致时单独审查返回内容"""
+        moderator = OutputModerator(MATCHER, on_token=lambda token: None)
+        moderator.feed("你好")
+        assert moderator.finish("调用出错: 去死") == "调用出错: **"
+
+    def test_moderate_text(self):
+        """测试审查完整文本"""
+        assert moderate_text(MATCHER, "") == ""
+        assert moderate_text(MATCHER, "笨蛋笨蛋") == "****"
+        assert moderate_text(MATCHER, "你好笨蛋", mode="cutoff", notice="!") == "你好!"
+
+
+class TestAgentOutputModeration:
+    """测试EduAgent和EmotionAgent的回复经过输出审查"""
+
+    @staticmethod
+    def _streaming_reply(reply, calls):
+        def fake_chat_completion(messages, on_token=None, **kwargs):
+            if on_token is None:
+                return reply
+            for index, ch in enumerate(reply):
+                calls.append(index)
+                on_token(ch)
+            return reply
+        return fake_chat_completion
+
+    def test_edu_stream_redacted(self):
+        """测试EduAgent流式回答中的敏感词被打码"""
+        emitted = []
+        with patch("agents.edu_agent.settings.use_ollama", False), \
+             patch("agents.edu_agent.openai_client.chat_completion",
+                   side_effect=self._streaming_reply("这不是色情内容", [])):
+            answer = EduAgent().answer_question("问题", {}, on_token=emitted.append, subject="通用")
+        assert answer == "这不是**内容"
+        assert "".join(emitted) == answer
+
+    def test_emotion_non_stream_redacted(self):
+        """测试EmotionAgent非流式回复同样经过审查"""
+        with patch("agents.emotion_agent.settings.use_ollama", False), \
+             patch("agents.emotion_agent.openai_client.chat_completion", return_value="你不是废物！") as llm:
+            response = EmotionAgent().provide_emotional_support("我好难过", {"emotion": "伤心"})
+        assert llm.call_args.kwargs["on_token"] is None
+        assert response == "你不是**！"
+
+    def test_cutoff_aborts_generation(self):
+        """测试截断模式命中后不再继续生成"""
+        calls = []
+        emitted = []
+        with patch("agents.safety_agent.settings.output_moderation_mode", "cutoff"), \
+             patch("agents.edu_agent.settings.use_ollama", False), \
+             patch("agents.edu_agent.openai_client.chat_completion",
+                   side_effect=self._streaming_reply("你好傻逼后面还有很多字", calls)):
+            answer = EduAgent().answer_question("问题", {}, on_token=emitted.append, subject="通用")
+        assert len(calls) == 4
+        assert answer.startswith("你好") and "傻" not in answer
+        assert "".join(emitted) == answer
+
+    def test_blocked_not_counted_as_backend_failure(self):
+        """测试中止生成不被客户端当作调用出错，也不计入熔断失败"""
+        # 使用独立的熔断器，避免其他用例已把全局熔断器打开
+        breaker = CircuitBreaker(openai_client.primary)
+        blocked = OutputBlocked(KeywordMatch("色情", "adult", 0, 2))
+        with patch("utils.openai_client.get_circuit_breaker", return_value=breaker), \
+             patch.object(openai_client, "breaker_enabled", True), \
+             patch.object(openai_client, "hedge_enabled", False), \
+             patch.object(openai_client, "_complete", side_effect=blocked):
+            with pytest.raises(OutputBlocked):
+                openai_client.chat_completion([{"role": "user", "content": "你好"}], on_token=lambda token: None)
+        assert breaker.failures == 0
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_disabled(self):
+        """测试关闭输出审查时原样返回"""
+        with patch("agents.safety_agent.settings.output_moderation_enabled", False), \
+             patch("agents.emotion_agent.settings.use_ollama", False), \
+             patch("agents.emotion_agent.openai_client.chat_completion", return_value="你不是废物！"):
+            response = EmotionAgent().provide_emotional_support("我好难过", {"emotion": "伤心"})
+        assert response == "你不是废物！"
@@ -1,6 +1,10 @@
 import pytest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
+from db.database import get_db
 from main import app
+from agents.safety_agent import PARENTAL_CATEGORY, USER_MATCHER_PREFIX, get_user_safety_matcher
+from utils.keyword_matcher import keyword_matchers
 
 
 client = TestClient(app)
@@ -125,5 +129,50 @@ class TestParentalControl:
         assert "message" in data
 
 
+class TestContentFiltersEndpoint:
+    """测试内容过滤设置接口"""
+
+    @pytest.fixture
+    def client(self, session_factory):
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        with patch("db.database.SessionLocal", session_factory):
+            yield TestClient(app)
+        app.dependency_overrides.pop(get_db, None)
+        keyword_matchers.remove_prefix(USER_MATCHER_PREFIX)
+
+    def test_update_persists_and_recompiles(self, client):
+        """测试保存设置后可读取，且匹配器立即更新"""
+        response = client.post("/api/users/11/content-filters", json={"blocked_keywords": ["游戏"]})
+        assert response.status_code == 200
+        assert response.json()["blocked_keywords"] == ["游戏"]
+        assert client.get("/api/users/11/content-filters").json()["filters"] == {"blocked_keywords": ["游戏"]}
+        assert get_user_safety_matcher(11).search("玩游戏").category == PARENTAL_CATEGORY
+
+        client.post("/api/users/11/content-filters", json={"blocked_keywords": ["手机"]})
+        matcher = get_user_safety_matcher(11)
+        assert matcher.search("玩游戏") is None
+        assert matcher.search("玩手机").keyword == "手机"
+
+    def test_chat_blocked_without_llm(self, client):
+        """测试聊天内容命中屏蔽词时不调用模型"""
+        client.post("/api/users/12/content-filters", json={"blocked_keywords": ["游戏"]})
+        with patch("agents.triage_agent.openai_client.chat_completion") as triage_llm, \
+             patch("agents.safety_agent.openai_client.chat_completion") as safety_llm:
+            response = client.post("/api/chat", json={"user_id": 12, "content": "我想玩游戏"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["agent"] == "safety"
+        assert data["result"]["is_safe"] is False
+        triage_llm.assert_not_called()
+        safety_llm.assert_not_called()
+
+
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,150 @@
+import pytest
+from unittest.mock import patch
+from models.user import SafetyVerdict
+from agents.safety_agent import SafetyAgent
+from utils.safety_verdict_cache import SafetyVerdictCache, normalize_content
+
+
+SAFE_VERDICT = {"is_safe": True, "issues": [], "filtered_content": None}
+
+
+class TestNormalizeContent:
+    """测试内容归一化"""
+
+    def test_width_case_whitespace_and_punctuation(self):
+        """测试全角、大小写、空白和标点差异被折叠"""
+        assert normalize_content("ＡＢＣ１２３！ 你好，世界。") == normalize_content("abc123 你好世界")
+        assert normalize_content("  hello\tworld ") == "helloworld"
+
+    def test_only_punctuation(self):
+        """测试只有标点时保留标点"""
+        assert normalize_content("？？？") == "???"
+
+    def test_traditional_to_simplified(self):
+        """测试安装opencc时繁体转为简体"""
+        pytest.importorskip("opencc")
+        assert normalize_content("學習") == normalize_content("学习")
+
+
+class TestSafetyVerdictCache:
+    """测试安全结论缓存"""
+
+    def test_memory_and_database_hits(self, session_factory):
+        """测试写入后内存命中，新实例从数据库命中"""
+        cache = SafetyVerdictCache(session_factory=session_factory)
+        assert cache.get("你好", "v1") is None
+        cache.set("你好！", "v1", SAFE_VERDICT)
+        assert cache.get("你 好", "v1") == SAFE_VERDICT
+        assert cache.get("你好", "v2") is None
+
+        restarted = SafetyVerdictCache(session_factory=session_factory)
+        assert restarted.get("你好", "v1") == SAFE_VERDICT
+        assert restarted.get("你好", "v1") == SAFE_VERDICT
+        stats = restarted.get_stats()
+        assert stats["db_hits"] == 1
+        assert stats["memory_hits"] == 1
+
+    def test_ttl(self, session_factory):
+        """测试过期结论不再命中，并从数据库删除"""
+        cache = SafetyVerdictCache(ttl=60, session_factory=session_factory)
+        with patch("utils.safety_verdict_cache.time.time", return_value=0):
+            cache.set("你好", "v1", SAFE_VERDICT)
+        assert cache.get("你好", "v1") is None
+        assert cache.get_stats()["expirations"] == 2
+        db = session_factory()
+        assert db.query(SafetyVerdict).count() == 0
+        db.close()
+
+    def test_lru_eviction(self, session_factory):
+        """测试内存超出容量时淘汰最久未使用的结论，数据库中仍保留"""
+        cache = SafetyVerdictCache(max_entries=2, session_factory=session_factory)
+        cache.set("一", "v1", SAFE_VERDICT)
+        cache.set("二", "v1", SAFE_VERDICT)
+        cache.get("一", "v1")
+        cache.set("三", "v1", SAFE_VERDICT)
+        stats = cache.get_stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 1
+        assert cache.get("二", "v1") == SAFE_VERDICT
+        assert cache.get_stats()["db_hits"] == 1
+
+    def test_invalidate(self, session_factory):
+        """测试按指纹清除和全部清除"""
+        cache = SafetyVerdictCache(session_factory=session_factory)
+        cache.set("你好", "v1", SAFE_VERDICT)
+        cache.set("你好", "v2", SAFE_VERDICT)
+        assert cache.invalidate(keep_namespace="v2") == 1
+        assert cache.get("你好", "v1") is None
+        assert cache.get("你好", "v2") == SAFE_VERDICT
+        assert cache.invalidate() == 1
+        assert cache.get("你好", "v2") is None
+
+    def test_database_unavailable(self):
+        """测试数据库不可用时仍使用内存缓存"""
+        def broken():
+            raise RuntimeError("db down")
+
+        cache = SafetyVerdictCache(session_factory=broken)
+        cache.set("你好", "v1", SAFE_VERDICT)
+        assert cache.get("你好", "v1") == SAFE_VERDICT
+        assert cache.get("再见", "v1") is None
+        assert cache.get_stats()["db_errors"] == 2
+
+
+class TestSafetyAgentVerdictCache:
+    """测试SafetyAgent使用安全结论缓存"""
+
+    @pytest.fixture
+    def cache(self, session_factory):
+        cache = SafetyVerdictCache(session_factory=session_factory)
+        with patch("agents.safety_agent.safety_verdict_cache", cache):
+            yield cache
+
+    def test_repeated_content_skips_llm(self, cache):
+        """测试相同内容只调用一次模型"""
+        reply = "安全状态: 不安全\n检测到的问题: 危险行为\n过滤后内容: 我们聊聊安全的烟花表演吧"
+        with patch("agents.safety_agent.openai_client.chat_completion", return_value=reply) as llm:
+            first = SafetyAgent().filter_content("怎么做烟花？")
+            second = SafetyAgent().filter_content("怎么做烟花")
+        llm.assert_called_once()
+        assert first["is_safe"] is False
+        assert second == {
+            "original_content": "怎么做烟花",
+            "is_safe": False,
+            "issues": ["危险行为"],
+            "filtered_content": "我们聊聊安全的烟花表演吧"
+        }
+
+    def test_safe_verdict_keeps_current_content(self, cache):
+        """测试命中安全结论时过滤后内容为本次的原文"""
+        reply = "安全状态: 安全\n检测到的问题: 无\n过滤后内容: 保持原样"
+        with patch("agents.safety_agent.openai_client.chat_completion", return_value=reply):
+            SafetyAgent().filter_content("天空为什么是蓝色的？")
+            result = SafetyAgent().filter_content("天空为什么是蓝色的")
+        assert result["filtered_content"] == "天空为什么是蓝色的"
+
+    def test_error_reply_not_cached(self, cache):
+        """测试调用失败时不缓存结论"""
+        with patch("agents.safety_agent.openai_client.chat_completion", return_value="调用OpenAI API时出错: timeout") as llm:
+            SafetyAgent().filter_content("天空为什么是蓝色的")
+            SafetyAgent().filter_content("天空为什么是蓝色的")
+        assert llm.call_count == 2
+
+    def test_prompt_change_misses(self, cache):
+        """测试审查提示词变化后不再命中旧结论"""
+        reply = "安全状态: 安全\n检测到的问题: 无\n过滤后内容: 保持原样"
+        with patch("agents.safety_agent.openai_client.chat_completion", return_value=reply) as llm:
+            SafetyAgent().filter_content("天空为什么是蓝色的")
+            agent = SafetyAgent()
+            agent.review_system_prompt += "\n9. 禁止讨论考试作弊"
+            agent.filter_content("天空为什么是蓝色的")
+        assert llm.call_count == 2
+
+    def test_disabled(self, cache):
+        """测试关闭缓存时每次都调用模型"""
+        reply = "安全状态: 安全\n检测到的问题: 无\n过滤后内容: 保持原样"
+        with patch("agents.safety_agent.settings.safety_verdict_cache_enabled", False), \
+             patch("agents.safety_agent.openai_client.chat_completion", return_value=reply) as llm:
+            SafetyAgent().filter_content("天空为什么是蓝色的")
+            SafetyAgent().filter_content("天空为什么是蓝色的")
+        assert llm.call_count == 2
@@ -0,0 +1,138 @@
+import pytest
+import asyncio
+import threading
+import time
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """测试相同请求合并"""
+
+    def test_concurrent_sync_calls_share_one_execution(self):
+        """测试并发的相同同步调用只执行一次"""
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def upstream():
+            calls.append(1)
+            time.sleep(0.1)
+            return "edu"
+
+        def worker():
+            results.append(flight.do("k", upstream))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ["edu"] * 5
+        assert flight.get_stats()["coalesced"] == 4
+        assert flight.get_stats()["in_flight"] == 0
+
+    def test_sync_error_propagates_to_all_waiters(self):
+        """测试上游异常传递给所有等待者，且不会被记住"""
+        flight = SingleFlight()
+        errors = []
+
+        def upstream():
+            time.sleep(0.05)
+            raise RuntimeError("boom")
+
+        def worker():
+            try:
+                flight.do("k", upstream)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == ["boom"] * 3
+        assert flight.do("k", lambda: "ok") == "ok"
+
+    def test_async_calls_share_one_execution(self):
+        """测试并发的相同异步调用只执行一次"""
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "emotion"
+
+        async def run():
+            return await asyncio.gather(*[flight.ado("k", upstream) for _ in range(4)])
+
+        assert asyncio.run(run()) == ["emotion"] * 4
+        assert len(calls) == 1
+
+    def test_async_error_propagates(self):
+        """测试异步上游异常传递给所有等待者"""
+        flight = SingleFlight()
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad")
+
+        async def run():
+            return await asyncio.gather(*[flight.ado("k", upstream) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        """测试单个等待者取消不影响共享请求"""
+        flight = SingleFlight()
+        upstream_cancelled = []
+
+        async def upstream():
+            try:
+                await asyncio.sleep(0.05)
+                return "ok"
+            except asyncio.CancelledError:
+                upstream_cancelled.append(1)
+                raise
+
+        async def run():
+            first = asyncio.create_task(flight.ado("k", upstream))
+            second = asyncio.create_task(flight.ado("k", upstream))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(run()) == "ok"
+        assert upstream_cancelled == []
+
+    def test_all_waiters_cancelled_cancels_upstream(self):
+        """测试所有等待者都取消时取消上游请求"""
+        flight = SingleFlight()
+        upstream_cancelled = []
+
+        async def upstream():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                upstream_cancelled.append(1)
+                raise
+
+        async def run():
+            tasks = [asyncio.create_task(flight.ado("k", upstream)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        assert upstream_cancelled == [1]
+        assert flight.get_stats()["cancelled"] == 1
+        assert flight.get_stats()["in_flight"] == 0
@@ -0,0 +1,157 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from agents.langgraph_workflow import happy_partner_graph, HappyPartnerGraph
+from agents.triage_agent import TriageAgent
+from agents.edu_agent import EduAgent
+from agents.emotion_agent import EmotionAgent
+from config.settings import settings
+from utils.intent_classifier import intent_classifier
+from utils.speculation import SpeculativeRun, SpeculationStats, SpeculationCancelled, speculation_stats
+
+
+def _triage_to(agent):
+    """模拟耗时0.2秒、路由到指定代理的分诊调用"""
+    async def triage(content):
+        await asyncio.sleep(0.2)
+        return {
+            "original_content": content, "is_safe": True, "issues": [], "filtered_content": content,
+            "target_agent": agent, "subject": "数学", "emotion": None, "intensity": "中", "fallbacks": []
+        }
+    return triage
+
+
+def _edu(request, on_token=None):
+    """模拟耗时0.2秒、逐块输出的教育回答"""
+    for token in ["一加一", "等于", "二"]:
+        time.sleep(0.07)
+        if on_token:
+            on_token(token)
+    return {"answer": "一加一等于二", "subject": "数学"}
+
+
+class TestSpeculativeRun:
+    """测试推测执行的文本缓存、采用和取消"""
+
+    def test_commit_flushes_buffer(self):
+        """测试采用前的文本先缓存，采用时按顺序补发，之后直接转发"""
+        stats = SpeculationStats()
+        received = []
+
+        async def run():
+            proceed = asyncio.Event()
+
+            async def call(on_token):
+                on_token("你")
+                on_token("好")
+                await proceed.wait()
+                on_token("呀")
+                return "你好呀"
+
+            speculative = SpeculativeRun("edu", "你好", stats=stats)
+            speculative.start(call)
+            await asyncio.sleep(0)
+            assert received == []
+            proceed.set()
+            return await speculative.commit(received.append)
+
+        assert asyncio.run(run()) == "你好呀"
+        assert received == ["你", "好", "呀"]
+        assert stats.get_stats()["hits"] == 1
+
+    def test_cancel_stops_generation(self):
+        """测试取消后下一次回调抛出SpeculationCancelled，已生成的令牌计入浪费"""
+        stats = SpeculationStats()
+        speculative = SpeculativeRun("emotion", "你好", stats=stats)
+        speculative.on_token("别")
+        speculative.on_token("难过")
+        speculative.cancel()
+        speculative.cancel()
+        with pytest.raises(SpeculationCancelled):
+            speculative.on_token("了")
+        result = stats.get_stats()
+        assert result["misses"] == 1
+        assert result["wasted_tokens"] == 2
+        assert result["hit_rate"] == 0.0
+
+
+class TestWorkflowSpeculation:
+    """测试工作流在路由完成前推测执行代理"""
+
+    @pytest.fixture(autouse=True)
+    def route_by_triage(self):
+        """由分诊决定路由，本地意图分类器有把握时会直接路由，推测执行就没有意义了"""
+        with patch.object(settings, "intent_classifier_enabled", False):
+            yield
+
+    def test_guess_from_profile(self):
+        """测试分类器把握不足时按用户的代理使用偏好猜测"""
+        graph = HappyPartnerGraph.__new__(HappyPartnerGraph)
+        with patch.object(intent_classifier, "predict_proba", return_value={"edu": 0.5, "emotion": 0.5}):
+            assert graph._guess_agent("今天", {"preferred_agents": {"emotion": 9, "edu": 1}}) == "emotion"
+            assert graph._guess_agent("今天", {"preferred_agents": {"emotion": 5, "edu": 5}}) is None
+            assert graph._guess_agent("今天", {}) is None
+
+    def test_hit_overlaps_routing(self):
+        """测试猜中时代理与路由同时进行，增量文本在路由确认后按顺序下发"""
+        async def run():
+            start = time.perf_counter()
+            events = [event async for event in happy_partner_graph.stream_message("1", "1+1等于多少？")]
+            return events, time.perf_counter() - start
+
+        with patch.object(HappyPartnerGraph, "_guess_agent", return_value="edu"), \
+             patch.object(TriageAgent, "atriage", side_effect=_triage_to("edu")), \
+             patch.object(EduAgent, "process_request", side_effect=_edu) as edu, \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            _, sequential = asyncio.run(run())
+            speculation_stats.reset()
+            with patch.object(settings, "speculative_agent_enabled", True):
+                events, speculative = asyncio.run(run())
+
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+        assert tokens == ["一加一", "等于", "二"]
+        assert events[-1]["data"]["response"] == "一加一等于二"
+        assert edu.call_count == 2
+        assert speculative < sequential - 0.1
+        stats = speculation_stats.get_stats()
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1.0
+
+    def test_miss_cancels_loser(self):
+        """测试猜错时中止推测的代理，改为调用路由到的代理"""
+        speculation_stats.reset()
+        aborted = []
+
+        def endless_emotion(request, on_token=None):
+            try:
+                while True:
+                    time.sleep(0.01)
+                    on_token("别")
+            except SpeculationCancelled:
+                aborted.append(request["content"])
+                raise
+
+        with patch.object(settings, "speculative_agent_enabled", True), \
+             patch.object(HappyPartnerGraph, "_guess_agent", return_value="emotion"), \
+             patch.object(TriageAgent, "atriage", side_effect=_triage_to("edu")), \
+             patch.object(EmotionAgent, "process_request", side_effect=endless_emotion), \
+             patch.object(EduAgent, "process_request", side_effect=_edu), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            result = asyncio.run(happy_partner_graph.process_message("1", "1+1等于多少？"))
+            time.sleep(0.05)
+
+        assert result["response"] == "一加一等于二"
+        assert aborted == ["1+1等于多少？"]
+        stats = speculation_stats.get_stats()
+        assert stats["misses"] == 1
+        assert stats["wasted_tokens"] > 0
+
+    def test_disabled_by_default(self):
+        """测试默认不推测执行"""
+        speculation_stats.reset()
+        with patch.object(TriageAgent, "atriage", side_effect=_triage_to("edu")), \
+             patch.object(EduAgent, "process_request", side_effect=_edu), \
+             patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+            asyncio.run(happy_partner_graph.process_message("1", "1+1等于多少？"))
+        assert speculation_stats.get_stats()["started"] == 0
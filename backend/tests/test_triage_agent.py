@@ -0,0 +1,109 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.triage_agent import TriageAgent
+from agents.edu_agent import EduAgent
+from agents.emotion_agent import EmotionAgent
+from agents.safety_agent import SafetyAgent
+
+
+FULL_RESPONSE = """安全状态: 安全
+检测到的问题: 无
+过滤后内容: 保持原样
+目标模块: emotion
+学科: 通用
+情绪类型: 难过
+情绪强度: 高"""
+
+
+class TestTriageAgent:
+    """测试分诊代理模块"""
+
+    def test_parse_full_response(self):
+        """测试解析完整的分诊回复"""
+        agent = TriageAgent()
+        result = agent.parse_response("我今天很难过", FULL_RESPONSE)
+
+        assert result["is_safe"] is True
+        assert result["issues"] == []
+        assert result["filtered_content"] == "我今天很难过"
+        assert result["target_agent"] == "emotion"
+        assert result["subject"] == "通用"
+        assert result["emotion"] == "难过"
+        assert result["intensity"] == "高"
+        assert result["fallbacks"] == []
+
+    def test_parse_unsafe_response(self):
+        """测试解析不安全的分诊回复，兼容全角冒号"""
+        agent = TriageAgent()
+        response = "安全状态：不安全\n检测到的问题：暴力内容\n过滤后内容：我们聊点别的吧\n目标模块：safety"
+        result = agent.parse_response("怎么打架", response)
+
+        assert result["is_safe"] is False
+        assert result["issues"] == ["暴力内容"]
+        assert result["filtered_content"] == "我们聊点别的吧"
+        assert result["target_agent"] == "safety"
+
+    def test_parse_fallbacks(self):
+        """测试回复无法解析时各字段使用回退方案"""
+        agent = TriageAgent()
+        result = agent.parse_response("1+1等于几", "调用Ollama API时出错: timeout")
+
+        assert result["is_safe"] is True
+        assert result["target_agent"] == "edu"
+        assert result["subject"] == "数学"
+        assert result["emotion"] is None
+        assert set(result["fallbacks"]) == {"safety", "target_agent", "subject"}
+
+        result = agent.parse_response("我想要枪", "")
+        assert result["is_safe"] is False
+        assert result["filtered_content"] == "[内容包含敏感信息，已被过滤]"
+
+    def test_triage_single_call(self):
+        """测试分诊只调用一次模型"""
+        agent = TriageAgent()
+        with patch("agents.triage_agent.openai_client.chat_completion", return_value=FULL_RESPONSE) as mock_call:
+            result = agent.triage("我今天很难过")
+
+        assert mock_call.call_count == 1
+        assert mock_call.call_args.kwargs["cache"] is True
+        assert result["target_agent"] == "emotion"
+
+    def test_agents_consume_triage(self):
+        """测试各代理使用分诊结果，不再重复调用模型"""
+        agent = TriageAgent()
+        triage_result = agent.parse_response("我今天很难过", FULL_RESPONSE)
+        request = agent.to_agent_request({"content": "我今天很难过", "user_id": "1"}, triage_result)
+
+        with patch.object(EmotionAgent, "analyze_emotion") as mock_analyze, \
+             patch.object(EmotionAgent, "provide_emotional_support", return_value="抱抱你"):
+            result = EmotionAgent().process_request(request)
+        mock_analyze.assert_not_called()
+        assert result["emotion_analysis"]["emotion"] == "难过"
+
+        with patch.object(SafetyAgent, "filter_content") as mock_filter:
+            result = SafetyAgent().process_request(request)
+        mock_filter.assert_not_called()
+        assert result["result"]["is_safe"] is True
+
+        request["subject"] = "数学"
+        with patch.object(EduAgent, "_get_subject_context") as mock_subject, \
+             patch("agents.edu_agent.ollama_client.chat_completion", return_value="答案"), \
+             patch("agents.edu_agent.openai_client.chat_completion", return_value="答案"):
+            result = EduAgent().process_request(request)
+        mock_subject.assert_not_called()
+        assert result["subject"] == "数学"
+
+    def test_edu_subject_detected_once(self):
+        """测试没有分诊结果时学科只判断一次"""
+        with patch.object(EduAgent, "_get_subject_context", return_value="数学") as mock_subject, \
+             patch("agents.edu_agent.ollama_client.chat_completion", return_value="答案"), \
+             patch("agents.edu_agent.openai_client.chat_completion", return_value="答案"):
+            result = EduAgent().process_request({"content": "1+1等于几"})
+        assert mock_subject.call_count == 1
+        assert result["subject"] == "数学"
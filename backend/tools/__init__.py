@@ -0,0 +1 @@
+# Tools模块初始化文件
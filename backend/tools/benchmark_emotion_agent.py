@@ -0,0 +1,95 @@
+"""
+对比EmotionAgent两次调用（先分析情绪再回复）和单次调用模式的延迟
+
+对每条样本分别以两种模式流式调用EmotionAgent.process_request，记录首个回复字到达的时间
+（孩子看到回应的等待时间）和完整回复的时间。可先启动tools.fake_llm_server离线运行，
+也可直接连接真实模型。
+
+运行示例：
+    python -m tools.fake_llm_server --port 11434 --ttft 0.3 --tokens-per-second 25
+    python -m tools.benchmark_emotion_agent --repeat 3
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+
+
+SAMPLE_MESSAGES = [
+    "我今天考试没考好，好难过",
+    "同桌抢了我的橡皮，我好生气",
+    "晚上一个人睡觉有点害怕",
+    "明天要上台表演，我好紧张",
+    "没人陪我玩，我觉得好孤单",
+    "我今天被老师表扬了，太开心了！",
+]
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))] if ordered else 0.0
+
+
+def run_mode(single_call: bool, messages: List[str], repeat: int) -> Tuple[List[float], List[float], Dict[str, int]]:
+    """
+    以指定模式处理全部样本
+
+    Args:
+        single_call: 是否使用单次调用模式
+        messages: 样本
+        repeat: 每条样本的重复次数
+
+    Returns:
+        (首字延迟列表, 完整回复延迟列表, 识别出的情绪计数)
+    """
+    from agents.emotion_agent import EmotionAgent
+
+    agent = EmotionAgent()
+    previous = settings.emotion_single_call_enabled
+    settings.emotion_single_call_enabled = single_call
+    first_token: List[float] = []
+    total: List[float] = []
+    emotions: Dict[str, int] = {}
+    try:
+        for _ in range(repeat):
+            for content in messages:
+                start = time.perf_counter()
+                first: List[Optional[float]] = [None]
+
+                def on_token(token: str) -> None:
+                    if first[0] is None:
+                        first[0] = time.perf_counter() - start
+
+                result = agent.process_request({"content": content}, on_token=on_token)
+                elapsed = time.perf_counter() - start
+                total.append(elapsed)
+                first_token.append(first[0] if first[0] is not None else elapsed)
+                emotion = result["emotion_analysis"].get("emotion", "未知")
+                emotions[emotion] = emotions.get(emotion, 0) + 1
+    finally:
+        settings.emotion_single_call_enabled = previous
+    return first_token, total, emotions
+
+
+def _summary(name: str, first_token: List[float], total: List[float]) -> str:
+    return (
+        f"{name:<8}{_percentile(first_token, 0.5) * 1000:>12.1f}{_percentile(first_token, 0.95) * 1000:>12.1f}"
+        f"{_percentile(total, 0.5) * 1000:>12.1f}{_percentile(total, 0.95) * 1000:>12.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比EmotionAgent两次调用和单次调用模式的延迟")
+    parser.add_argument("--repeat", type=int, default=3, help="每条样本的重复次数")
+    args = parser.parse_args()
+
+    print(f"样本 {len(SAMPLE_MESSAGES)} 条，每条重复 {args.repeat} 次")
+    print(f"{'模式':<6}{'首字P50(ms)':>12}{'首字P95(ms)':>12}{'完整P50(ms)':>12}{'完整P95(ms)':>12}")
+    for name, single_call in (("two", False), ("single", True)):
+        first_token, total, emotions = run_mode(single_call, SAMPLE_MESSAGES, args.repeat)
+        print(_summary(name, first_token, total))
+        print(f"{'':<8}识别的情绪: {emotions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+对比本地意图分类器与LLM路由的准确率和延迟
+
+在带标签的样本上分别运行本地分类器和MetaAgent的LLM路由，并计算两者组合
+（置信度达到阈值时用本地结果，否则用LLM结果）的准确率、LLM调用比例和平均延迟。
+可先启动tools.fake_llm_server离线运行，也可直接连接真实模型。
+
+运行示例：
+    python -m tools.benchmark_intent_router --source db --threshold 0.9
+    python -m tools.benchmark_intent_router --source seed --skip-llm
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+from utils.intent_classifier import (
+    NaiveBayesIntentClassifier, distill_training_data, seed_training_data, split_samples, train_intent_classifier
+)
+from utils.llm_cache import llm_result_cache
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))] if ordered else 0.0
+
+
+def _summary(name: str, correct: int, total: int, latencies: List[float], llm_calls: Optional[int] = None) -> str:
+    accuracy = correct / total if total else 0.0
+    mean = sum(latencies) / len(latencies) if latencies else 0.0
+    calls = f"{llm_calls / total:>9.1%}" if llm_calls is not None and total else f"{'-':>9}"
+    return (
+        f"{name:<10}{accuracy:>9.1%}{mean * 1000:>12.3f}{_percentile(latencies, 0.5) * 1000:>12.3f}"
+        f"{_percentile(latencies, 0.95) * 1000:>12.3f}{calls}"
+    )
+
+
+def load_samples(source: str, test_ratio: float, limit: Optional[int]) -> Tuple[NaiveBayesIntentClassifier, List[Tuple[str, str]]]:
+    """
+    准备分类器和测试样本；db来源用历史对话蒸馏的样本，seed来源只用内置种子样本
+
+    Returns:
+        (在训练集上训练的分类器, 测试集)
+    """
+    if source == "db":
+        from db.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            samples = distill_training_data(db, limit=limit)
+        finally:
+            db.close()
+        train, test = split_samples(samples, test_ratio)
+        return train_intent_classifier(train), test
+    train, test = split_samples(seed_training_data(), test_ratio)
+    return train_intent_classifier(train, include_seed=False), test
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比本地意图分类器与LLM路由")
+    parser.add_argument("--source", choices=["db", "seed"], default="db", help="样本来源")
+    parser.add_argument("--threshold", type=float, default=settings.intent_confidence_threshold, help="置信度阈值")
+    parser.add_argument("--test-ratio", type=float, default=0.3, help="测试集比例")
+    parser.add_argument("--limit", type=int, default=None, help="最多读取的对话记录数")
+    parser.add_argument("--skip-llm", action="store_true", help="只测本地分类器")
+    args = parser.parse_args()
+
+    classifier, test = load_samples(args.source, args.test_ratio, args.limit)
+    if not test:
+        print("没有可用的测试样本")
+        return
+    print(f"测试样本 {len(test)} 条，置信度阈值 {args.threshold}")
+
+    local: List[Tuple[str, float, float]] = []
+    for text, _ in test:
+        start = time.perf_counter()
+        label, confidence = classifier.predict(text)
+        local.append((label, confidence, time.perf_counter() - start))
+
+    llm: List[Tuple[str, float]] = []
+    if not args.skip_llm:
+        from agents.meta_agent import MetaAgent
+
+        agent = MetaAgent()
+        # 清空结果缓存，避免命中缓存的调用拉低LLM路由的延迟
+        llm_result_cache.clear()
+        for text, _ in test:
+            start = time.perf_counter()
+            label = agent._route_with_llm(text)
+            llm.append((label, time.perf_counter() - start))
+
+    labels = [label for _, label in test]
+    print(f"{'路由方式':<8}{'准确率':>7}{'平均(ms)':>10}{'P50(ms)':>11}{'P95(ms)':>11}{'LLM调用':>7}")
+    print(_summary(
+        "local",
+        sum(predicted == label for (predicted, _, _), label in zip(local, labels)),
+        len(test),
+        [elapsed for _, _, elapsed in local],
+        llm_calls=0
+    ))
+    if llm:
+        print(_summary(
+            "llm",
+            sum(predicted == label for (predicted, _), label in zip(llm, labels)),
+            len(test),
+            [elapsed for _, elapsed in llm],
+            llm_calls=len(test)
+        ))
+        correct = calls = 0
+        latencies = []
+        for (local_label, confidence, local_elapsed), (llm_label, llm_elapsed), label in zip(local, llm, labels):
+            if confidence >= args.threshold:
+                correct += local_label == label
+                latencies.append(local_elapsed)
+            else:
+                calls += 1
+                correct += llm_label == label
+                latencies.append(local_elapsed + llm_elapsed)
+        print(_summary("hybrid", correct, len(test), latencies, llm_calls=calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+关键词匹配微基准：逐词包含检查与编译后的Aho-Corasick匹配器对比
+
+按不同的词表规模（默认100/1000/5000个词，在真实敏感词之外补充随机生成的2-4字中文词）
+和文本长度，分别测量原来按分类逐个`keyword in content`的做法和KeywordMatcher.find_all
+的单次耗时，并校验两者找到的关键词一致。
+
+运行示例：
+    python -m tools.benchmark_keyword_matcher --sizes 100 1000 5000 --repeat 200
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Set, Tuple
+from agents.safety_agent import SENSITIVE_KEYWORDS
+from utils.keyword_matcher import KeywordMatcher
+
+
+SAMPLE_TEXTS = [
+    "我想知道为什么天空是蓝色的",
+    "今天在学校和同学打架了，老师批评了我，我好难过，不知道该怎么办才好",
+    "妈妈说不能把家里的地址和手机号告诉陌生人，可是网上有个人一直问我要，还说要送我礼物。"
+    "他还让我不要告诉爸爸妈妈，我有点害怕，但是又很想要那个礼物，你说我应该怎么做呢？"
+    "我们班上有同学说他哥哥在玩一个很暴力的游戏，里面有各种武器，我也想玩。",
+]
+
+
+def build_keywords(size: int, seed: int = 42) -> Dict[str, List[str]]:
+    """在真实敏感词基础上补充随机中文词，使总数达到size"""
+    rng = random.Random(seed)
+    keywords = {category: list(words) for category, words in SENSITIVE_KEYWORDS.items()}
+    categories = list(keywords)
+    total = sum(len(words) for words in keywords.values())
+    existing = {word for words in keywords.values() for word in words}
+    while total < size:
+        word = "".join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.randint(2, 4)))
+        if word in existing:
+            continue
+        existing.add(word)
+        keywords[categories[total % len(categories)]].append(word)
+        total += 1
+    return keywords
+
+
+def naive_match(keywords: Dict[str, List[str]], content: str) -> Set[Tuple[str, str]]:
+    """原来的做法：按分类逐个做包含检查"""
+    found = set()
+    for category, words in keywords.items():
+        for word in words:
+            if word in content:
+                found.add((category, word))
+    return found
+
+
+def _time(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="关键词匹配微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="词表规模")
+    parser.add_argument("--repeat", type=int, default=200, help="每组重复次数")
+    args = parser.parse_args()
+
+    print(f"{'词数':>6}{'文本长度':>8}{'逐词检查(us)':>14}{'自动机(us)':>12}{'加速比':>8}{'构建(ms)':>10}")
+    for size in args.sizes:
+        keywords = build_keywords(size)
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_ms = (time.perf_counter() - start) * 1000
+        for text in SAMPLE_TEXTS:
+            expected = naive_match(keywords, text)
+            actual = {(match.category, match.keyword) for match in matcher.find_all(text)}
+            assert actual == expected, f"结果不一致: {actual ^ expected}"
+            naive = _time(lambda: naive_match(keywords, text), args.repeat)
+            compiled = _time(lambda: matcher.find_all(text), args.repeat)
+            print(
+                f"{size:>8}{len(text):>10}{naive * 1e6:>16.1f}{compiled * 1e6:>14.1f}"
+                f"{naive / compiled:>10.1f}x{build_ms:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+测量LangGraph工作流在不同并发会话数下的吞吐量
+
+对每个并发级别同时启动若干会话，每个会话依次发送若干条消息（通过HappyPartnerGraph.process_message），
+记录每轮对话的延迟和整体吞吐量。工作流异步执行时，吞吐量应随并发会话数近似线性增长，
+直到受模型后端并发上限（LLM_MAX_CONCURRENCY_*）或线程池大小（WORKFLOW_MAX_WORKERS）限制。
+可先启动tools.fake_llm_server离线运行，也可直接连接真实模型。
+
+运行示例：
+    python -m tools.fake_llm_server --port 11434 --ttft 0.3 --tokens-per-second 25
+    python -m tools.benchmark_workflow_concurrency --levels 1,2,4,8,16 --turns 3
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+from unittest.mock import patch
+
+
+SAMPLE_MESSAGES = [
+    "1+1等于多少？",
+    "为什么天空是蓝色的？",
+    "我今天考试没考好，好难过",
+    "恐龙是怎么灭绝的？",
+    "明天要上台表演，我好紧张",
+    "英语的苹果怎么说？",
+]
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))] if ordered else 0.0
+
+
+async def run_level(concurrency: int, turns: int) -> Tuple[float, List[float], int]:
+    """
+    以指定并发会话数运行一轮压测
+
+    Args:
+        concurrency: 同时进行的会话数
+        turns: 每个会话发送的消息数
+
+    Returns:
+        (总耗时, 每轮对话延迟列表, 出错的轮数)
+    """
+    from agents.langgraph_workflow import happy_partner_graph
+
+    latencies: List[float] = []
+    errors = [0]
+
+    async def session(index: int) -> None:
+        for turn in range(turns):
+            content = SAMPLE_MESSAGES[(index + turn) % len(SAMPLE_MESSAGES)]
+            start = time.perf_counter()
+            result = await happy_partner_graph.process_message(str(index + 1), content, f"bench-{concurrency}-{index}")
+            latencies.append(time.perf_counter() - start)
+            if result.get("metadata", {}).get("type") == "error":
+                errors[0] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[session(index) for index in range(concurrency)])
+    return time.perf_counter() - start, latencies, errors[0]
+
+
+def _summary(concurrency: int, elapsed: float, latencies: List[float], errors: int, baseline: float) -> str:
+    throughput = len(latencies) / elapsed if elapsed > 0 else 0.0
+    return (
+        f"{concurrency:>6}{len(latencies):>8}{throughput:>12.2f}{throughput / baseline if baseline else 0.0:>10.2f}"
+        f"{_percentile(latencies, 0.5) * 1000:>12.1f}{_percentile(latencies, 0.95) * 1000:>12.1f}{errors:>8}"
+    )
+
+
+async def run(levels: List[int], turns: int) -> None:
+    print(f"每个会话 {turns} 轮对话")
+    print(f"{'并发':>4}{'轮数':>6}{'吞吐(轮/秒)':>9}{'加速比':>7}{'P50(ms)':>12}{'P95(ms)':>12}{'出错':>6}")
+    # 预热：首轮对话会载入模型客户端、关键词匹配器等，不计入结果
+    await run_level(1, 1)
+    baseline = 0.0
+    for concurrency in levels:
+        elapsed, latencies, errors = await run_level(concurrency, turns)
+        if not baseline:
+            baseline = len(latencies) / elapsed if elapsed > 0 else 0.0
+        print(_summary(concurrency, elapsed, latencies, errors, baseline))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="测量LangGraph工作流吞吐量随并发会话数的变化")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="逗号分隔的并发会话数")
+    parser.add_argument("--turns", type=int, default=3, help="每个会话发送的消息数")
+    parser.add_argument("--persist", action="store_true", help="写入对话记录到数据库（默认不写，避免压测数据进入数据库）")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    if args.persist:
+        asyncio.run(run(levels, args.turns))
+        return
+
+    from agents.langgraph_workflow import HappyPartnerGraph
+
+    with patch.object(HappyPartnerGraph, "_async_persist_to_db"):
+        asyncio.run(run(levels, args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+低峰期批量预生成高频课程问题的回答
+
+读取按学科组织的问题列表，对每个问题 × 每个年龄段使用EduAgent的回答提示词生成回答，
+写入answer_bank表；EduAgent回答前会先查这张表。已生成的问题会被跳过，任务中断或到达
+--until指定的时间后停止，再次运行即从未完成的问题继续。生成调用使用后台优先级，
+不与交互请求争抢并发。
+
+问题列表为JSON：{"科学": ["什么是光合作用", ...], "数学": [...]}，学科需在EduAgent.subjects中
+（或为"通用"）。
+
+运行示例：
+    python -m tools.build_answer_bank --questions tools/answer_bank_questions.json --workers 2 --until 06:30
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from utils.answer_bank import AnswerBank, answer_bank
+from utils.llm_scheduler import llm_scheduler, Priority
+
+
+def load_questions(path: str) -> Dict[str, List[str]]:
+    """
+    读取问题列表
+
+    Args:
+        path: JSON文件路径
+
+    Returns:
+        {学科: [问题]}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _deadline(until: Optional[str]) -> Optional[float]:
+    """将HH:MM转换为今天（已过则为明天）该时刻的时间戳"""
+    if not until:
+        return None
+    hour, minute = (int(part) for part in until.split(":"))
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def build_answer_bank(
+    questions: Dict[str, List[str]],
+    ages: Optional[List[str]] = None,
+    workers: int = 2,
+    limit: Optional[int] = None,
+    deadline: Optional[float] = None,
+    bank: Optional[AnswerBank] = None,
+    agent: Any = None,
+    progress_every: int = 20
+) -> Dict[str, Any]:
+    """
+    批量生成并保存回答
+
+    Args:
+        questions: {学科: [问题]}
+        ages: 年龄段，为空时使用EduAgent.age_groups的全部年龄段
+        workers: 并发生成的线程数
+        limit: 本次最多生成的回答数
+        deadline: 到达该时间戳后不再开始新的生成
+        bank: 回答库，为空时使用全局回答库
+        agent: EduAgent实例，为空时新建
+        progress_every: 每生成多少条打印一次进度
+
+    Returns:
+        生成、跳过、失败的数量，耗时和吞吐
+    """
+    from agents.edu_agent import EduAgent, DEFAULT_GRADE
+
+    if agent is None:
+        agent = EduAgent()
+    bank = bank or answer_bank
+    ages = ages or list(agent.age_groups)
+    unknown_ages = [age for age in ages if age not in agent.age_groups]
+    if unknown_ages:
+        raise ValueError(f"未知年龄段: {unknown_ages}")
+    namespace = agent.answer_namespace
+
+    tasks: List[Tuple[str, str, str]] = []
+    report: Dict[str, Any] = {"total": 0, "skipped": 0, "generated": 0, "failed": 0, "unknown_subjects": []}
+    for subject, subject_questions in questions.items():
+        if subject not in agent.subjects and subject != "通用":
+            report["unknown_subjects"].append(subject)
+            continue
+        for question in subject_questions:
+            for age in ages:
+                report["total"] += 1
+                if bank.contains(age, question, namespace):
+                    report["skipped"] += 1
+                else:
+                    tasks.append((subject, question, age))
+    if limit is not None:
+        tasks = tasks[:limit]
+
+    lock = threading.Lock()
+    generation_seconds = [0.0]
+    answer_chars = [0]
+    start = time.perf_counter()
+
+    def run(task: Tuple[str, str, str]) -> None:
+        subject, question, age = task
+        if deadline is not None and time.time() >= deadline:
+            return
+        # 与EduAgent处理未提供年级的请求时一致，命中回答库的回答与实时生成的相同
+        messages = agent.build_answer_messages(question, age, DEFAULT_GRADE, subject)
+        began = time.perf_counter()
+        with llm_scheduler.priority(Priority.BACKGROUND):
+            try:
+                answer = agent.generate_answer(messages)
+            except Exception as e:
+                print(f"生成失败 [{age}] {question}: {e}")
+                answer = ""
+        elapsed = time.perf_counter() - began
+        saved = bank.save(age, subject, question, answer, namespace, elapsed)
+        with lock:
+            if saved:
+                report["generated"] += 1
+                generation_seconds[0] += elapsed
+                answer_chars[0] += len(answer)
+                if progress_every and report["generated"] % progress_every == 0:
+                    print(f"已生成 {report['generated']}/{len(tasks)}")
+            else:
+                report["failed"] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(run, tasks))
+
+    wall = time.perf_counter() - start
+    report["remaining"] = len(tasks) - report["generated"] - report["failed"]
+    report["wall_seconds"] = round(wall, 3)
+    report["answers_per_minute"] = round(report["generated"] / wall * 60, 2) if wall > 0 else 0.0
+    report["chars_per_second"] = round(answer_chars[0] / wall, 1) if wall > 0 else 0.0
+    report["avg_generation_seconds"] = round(generation_seconds[0] / report["generated"], 3) if report["generated"] else 0.0
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="低峰期批量预生成高频课程问题的回答")
+    parser.add_argument("--questions", default="tools/answer_bank_questions.json", help="问题列表JSON文件")
+    parser.add_argument("--ages", default=None, help="逗号分隔的年龄段，默认全部")
+    parser.add_argument("--workers", type=int, default=2, help="并发生成的线程数")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多生成的回答数")
+    parser.add_argument("--until", default=None, help="到达该时刻（HH:MM）后停止，未完成的问题下次继续")
+    args = parser.parse_args()
+
+    # 首次运行时建表，已存在时不做改动
+    from db.database import Base, engine
+    from models.user import AnswerBankEntry
+    Base.metadata.create_all(bind=engine, tables=[AnswerBankEntry.__table__])
+
+    ages = [age.strip() for age in args.ages.split(",")] if args.ages else None
+    report = build_answer_bank(
+        load_questions(args.questions), ages=ages, workers=args.workers,
+        limit=args.limit, deadline=_deadline(args.until)
+    )
+    if report["unknown_subjects"]:
+        print(f"忽略未知学科: {report['unknown_subjects']}")
+    print(
+        f"问题×年龄段 {report['total']} 个：已有 {report['skipped']}，本次生成 {report['generated']}，"
+        f"失败 {report['failed']}，未完成 {report['remaining']}"
+    )
+    print(
+        f"耗时 {report['wall_seconds']:.1f}s，吞吐 {report['answers_per_minute']:.1f} 条/分钟、"
+        f"{report['chars_per_second']:.1f} 字/秒，单条平均 {report['avg_generation_seconds']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,587 @@
+"""
+本地模拟LLM服务，用于离线压测和延迟测试
+
+同时实现Ollama的/api/generate、/api/chat、/api/tags和OpenAI的/v1/chat/completions接口，
+首字延迟、输出速度、错误率均可配置；回复内容按系统提示识别调用方，返回各代理能解析的固定格式
+（如"安全状态:"、"情绪类型:"），无需网络即可压测完整链路。
+
+启动示例：
+    python -m tools.fake_llm_server --port 11434 --ttft 0.3 --tokens-per-second 25 --error-rate 0.02
+
+然后设置OLLAMA_BASE_URL=http://127.0.0.1:11434、OPENAI_BASE_URL=http://127.0.0.1:11434/v1 启动后端。
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from config.settings import settings
+
+
+class FakeLLMConfig(BaseModel):
+    """模拟服务的延迟和故障配置"""
+    ttft: float = Field(0.2, description="首字延迟（秒）")
+    tokens_per_second: float = Field(30.0, description="输出速度（令牌/秒），0表示不限速")
+    jitter: float = Field(0.0, description="延迟的随机波动比例，如0.2表示±20%")
+    error_rate: float = Field(0.0, description="请求直接失败的概率")
+    error_status: int = Field(500, description="注入失败时返回的HTTP状态码")
+    midstream_error_rate: float = Field(0.0, description="流式输出首个令牌后中断的概率")
+    models: List[str] = Field(
+        default_factory=lambda: [settings.ollama_default_model, "deepseek-chat"],
+        description="/api/tags和/v1/models列出的模型"
+    )
+    seed: Optional[int] = Field(None, description="随机数种子，便于复现")
+
+
+# 代理系统提示中的特征文本，用于判断调用方
+_SCENARIOS = [
+    ("triage", "分诊"),
+    ("safety", "内容安全审查员"),
+    ("emotion_analysis", "情绪识别专家"),
+    ("router", "请求路由系统"),
+    ("subject", "判断问题所属的学科"),
+    ("summary", "总结助手"),
+    ("emotion_combined", "情绪识别和情感回复"),
+    ("emotion_support", "情感陪伴"),
+    ("edu", "教育AI助手"),
+]
+_SCENARIO_INDEX = {scenario: index for index, (scenario, _) in enumerate(_SCENARIOS)}
+
+_UNSAFE_KEYWORDS = ["暴力", "武器", "血腥", "杀", "色情", "自杀", "自残", "毒品", "炸药", "身份证", "密码", "骂人"]
+
+_EMOTION_KEYWORDS = [
+    ("难过", ["难过", "伤心", "哭", "失望"]),
+    ("愤怒", ["生气", "气死", "讨厌他", "愤怒"]),
+    ("害怕", ["害怕", "怕", "恐怖", "噩梦"]),
+    ("焦虑", ["紧张", "担心", "考试", "焦虑"]),
+    ("孤独", ["孤单", "一个人", "没人陪", "孤独"]),
+    ("开心", ["开心", "高兴", "快乐", "太好了"]),
+    ("兴奋", ["兴奋", "激动", "明天去"]),
+    ("困惑", ["为什么", "不懂", "不明白"]),
+]
+
+_SUBJECT_KEYWORDS = [
+    ("数学", ["加", "减", "乘", "除", "等于", "数学", "几何", "分数"]),
+    ("英语", ["英语", "单词", "english", "怎么说"]),
+    ("科学", ["为什么", "天空", "植物", "动物", "星星", "科学", "水", "太阳"]),
+    ("历史", ["历史", "朝代", "古代", "皇帝"]),
+    ("地理", ["地理", "国家", "山", "河", "地图"]),
+    ("语文", ["古诗", "作文", "成语", "汉字", "语文"]),
+    ("音乐", ["唱歌", "音乐", "乐器"]),
+    ("艺术", ["画画", "美术", "颜色"]),
+    ("体育", ["跑步", "运动", "足球", "体育"]),
+]
+
+_MEMORY_KEYWORDS = ["上次", "之前说", "还记得", "我们聊过"]
+
+_TOKEN_PATTERN = re.compile(r"[一-鿿]|[A-Za-z0-9_]+|\s+|.", re.S)
+_IM_BLOCK = re.compile(r"<\|im_start\|>(system|user)\n(.*?)<\|im_end\|>", re.S)
+
+
+def _match(text: str, table: List[Tuple[str, List[str]]], default: str) -> str:
+    for label, keywords in table:
+        if any(keyword in text for keyword in keywords):
+            return label
+    return default
+
+
+def detect_scenario(system: str) -> str:
+    """
+    根据系统提示判断调用方
+
+    Args:
+        system: 系统提示文本
+
+    Returns:
+        场景名称，无法识别时为edu
+    """
+    for scenario, marker in _SCENARIOS:
+        if marker in system:
+            return scenario
+    return "edu"
+
+
+def canned_response(scenario: str, user: str) -> str:
+    """
+    生成与各代理解析格式一致的固定回复
+
+    Args:
+        scenario: 场景名称
+        user: 最后一条用户消息
+
+    Returns:
+        回复文本
+    """
+    unsafe = [keyword for keyword in _UNSAFE_KEYWORDS if keyword in user]
+    emotion = _match(user, _EMOTION_KEYWORDS, "无")
+    subject = _match(user, _SUBJECT_KEYWORDS, "通用")
+
+    safety_lines = (
+        f"安全状态: 不安全\n检测到的问题: 包含不适合儿童的内容（{'、'.join(unsafe)}）\n"
+        f"过滤后内容: 我们换个话题聊聊吧"
+        if unsafe else
+        "安全状态: 安全\n检测到的问题: 无\n过滤后内容: 保持原样"
+    )
+
+    if scenario == "triage":
+        if unsafe:
+            target = "safety"
+        elif any(keyword in user for keyword in _MEMORY_KEYWORDS):
+            target = "memory"
+        elif emotion not in ("无", "困惑"):
+            target = "emotion"
+        else:
+            target = "edu"
+        intensity = "中" if emotion != "无" else "低"
+        return f"{safety_lines}\n目标模块: {target}\n学科: {subject}\n情绪类型: {emotion}\n情绪强度: {intensity}"
+    if scenario == "safety":
+        return safety_lines
+    if scenario == "emotion_analysis":
+        label = "开心" if emotion == "无" else emotion
+        return (
+            f"情绪类型: {label}\n情绪强度: 中\n"
+            f"分析理由: 孩子的表达中体现出{label}的情绪\n"
+            f"应对建议: 先认真倾听，再给予理解和鼓励"
+        )
+    if scenario == "router":
+        if unsafe:
+            return "safety"
+        if any(keyword in user for keyword in _MEMORY_KEYWORDS):
+            return "memory"
+        return "emotion" if emotion not in ("无", "困惑") else "edu"
+    if scenario == "subject":
+        return subject
+    if scenario == "summary":
+        return "孩子最近主要在问学习上的问题，对科学和数学很感兴趣，整体情绪积极，愿意主动提问和分享。"
+    support = (
+        "我听到你的感受啦，有这样的心情是很正常的。"
+        "你愿意和我多说一说发生了什么吗？不管怎样，我都会一直陪着你。"
+    )
+    if scenario == "emotion_combined":
+        label = "开心" if emotion == "无" else emotion
+        return (
+            f"情绪类型: {label}\n情绪强度: 中\n"
+            f"回复: {support}"
+        )
+    if scenario == "emotion_support":
+        return support
+    return (
+        f"这是一个很棒的{subject if subject != '通用' else ''}问题！"
+        "我们可以一步一步来想：先看看身边能观察到的现象，再想想它背后的原因。"
+        "你也可以动手试一试，把发现告诉我，我们一起继续探索吧！"
+    )
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    按汉字、英文单词、空白和标点切分为模拟令牌
+
+    Args:
+        text: 文本
+
+    Returns:
+        令牌列表，拼接后等于原文
+    """
+    return _TOKEN_PATTERN.findall(text)
+
+
+def split_messages(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    从消息列表中取出系统提示和最后一条用户消息
+
+    Returns:
+        (系统提示, 用户消息)
+    """
+    system = "\n".join(m.get("content", "") or "" for m in messages if m.get("role") == "system")
+    users = [m.get("content", "") or "" for m in messages if m.get("role") == "user"]
+    return system, users[-1] if users else ""
+
+
+def split_prompt(prompt: str, system: Optional[str] = None) -> Tuple[str, str]:
+    """
+    从/api/generate的qwen模板prompt中取出系统提示和最后一条用户消息
+
+    Returns:
+        (系统提示, 用户消息)
+    """
+    blocks = _IM_BLOCK.findall(prompt or "")
+    if not blocks:
+        return system or "", prompt or ""
+    systems = [content for role, content in blocks if role == "system"]
+    users = [content for role, content in blocks if role == "user"]
+    return system or "\n".join(systems), users[-1] if users else ""
+
+
+class FakeLLMServer:
+    """
+    模拟LLM服务的状态：延迟和故障配置、随机数和请求统计
+    """
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "errors_injected": 0,
+            "midstream_errors": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "tokens_generated": 0,
+            "by_scenario": {}
+        }
+
+    def update_config(self, changes: Dict[str, Any]) -> FakeLLMConfig:
+        """
+        部分更新配置
+
+        Args:
+            changes: 要修改的配置项
+
+        Returns:
+            更新后的配置
+        """
+        merged = {**self.config.model_dump(), **changes}
+        self.config = FakeLLMConfig(**merged)
+        if "seed" in changes:
+            self._random = random.Random(self.config.seed)
+        return self.config
+
+    def roll(self, probability: float) -> bool:
+        with self._lock:
+            return probability > 0 and self._random.random() < probability
+
+    def delay(self, seconds: float) -> float:
+        """按配置的波动比例对延迟加随机扰动"""
+        if seconds <= 0:
+            return 0.0
+        jitter = self.config.jitter
+        if jitter <= 0:
+            return seconds
+        with self._lock:
+            factor = 1 + self._random.uniform(-jitter, jitter)
+        return max(0.0, seconds * factor)
+
+    def token_interval(self) -> float:
+        tps = self.config.tokens_per_second
+        return self.delay(1.0 / tps) if tps > 0 else 0.0
+
+    def begin(self, scenario: str) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            by_scenario = self.stats["by_scenario"]
+            by_scenario[scenario] = by_scenario.get(scenario, 0) + 1
+
+    def end(self, tokens: int = 0) -> None:
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["tokens_generated"] += tokens
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def plan(self, system: str, user: str, max_tokens: Optional[int]) -> Tuple[str, List[str], bool]:
+        """
+        生成本次回复的令牌
+
+        Returns:
+            (场景, 令牌列表, 是否因max_tokens截断)
+        """
+        scenario = detect_scenario(system)
+        tokens = tokenize(canned_response(scenario, user))
+        truncated = bool(max_tokens) and len(tokens) > max_tokens
+        if truncated:
+            tokens = tokens[:max_tokens]
+        return scenario, tokens, truncated
+
+    async def generate_tokens(self, tokens: List[str]) -> AsyncIterator[str]:
+        """
+        按首字延迟和输出速度逐个产出令牌，可能按配置在首个令牌后中断
+
+        Raises:
+            RuntimeError: 注入的流式中断
+        """
+        await asyncio.sleep(self.delay(self.config.ttft))
+        fail_midstream = self.roll(self.config.midstream_error_rate)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.token_interval())
+            yield token
+            if fail_midstream:
+                self.count("midstream_errors")
+                raise RuntimeError("injected midstream failure")
+
+    async def wait_full(self, tokens: List[str]) -> float:
+        """
+        非流式请求：一次性等待完整生成所需时间
+
+        Returns:
+            其中的首字延迟（秒）
+        """
+        ttft = self.delay(self.config.ttft)
+        total = ttft
+        if self.config.tokens_per_second > 0 and len(tokens) > 1:
+            total += self.delay((len(tokens) - 1) / self.config.tokens_per_second)
+        await asyncio.sleep(total)
+        return ttft
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["by_scenario"] = dict(self.stats["by_scenario"])
+        stats["config"] = self.config.model_dump()
+        return stats
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ollama_metrics(prompt_tokens: int, tokens: int, started: float, first_token: Optional[float]) -> Dict[str, Any]:
+    """Ollama响应末尾的计时字段（纳秒）"""
+    now = time.monotonic()
+    first_token = first_token or now
+    return {
+        "total_duration": int((now - started) * 1e9),
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int((first_token - started) * 1e9),
+        "eval_count": tokens,
+        "eval_duration": int((now - first_token) * 1e9)
+    }
+
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    """
+    创建模拟LLM服务应用
+
+    Args:
+        config: 延迟和故障配置
+
+    Returns:
+        FastAPI应用，server属性为FakeLLMServer实例
+    """
+    server = FakeLLMServer(config)
+    app = FastAPI(title="Fake LLM Server", description="离线压测用的Ollama/OpenAI模拟服务")
+    app.state.server = server
+
+    def ollama_error() -> JSONResponse:
+        server.count("errors_injected")
+        return JSONResponse({"error": "injected failure"}, status_code=server.config.error_status)
+
+    def openai_error() -> JSONResponse:
+        server.count("errors_injected")
+        return JSONResponse(
+            {"error": {"message": "injected failure", "type": "server_error", "code": None}},
+            status_code=server.config.error_status
+        )
+
+    async def ollama_reply(body: Dict[str, Any], system: str, user: str, prompt_text: str, chat: bool):
+        if server.roll(server.config.error_rate):
+            return ollama_error()
+        model = body.get("model") or server.config.models[0]
+        max_tokens = (body.get("options") or {}).get("num_predict")
+        scenario, tokens, truncated = server.plan(system, user, max_tokens)
+        prompt_tokens = len(tokenize(prompt_text))
+        # generate模式返回的context首位记录场景，复用context的后续请求只带用户消息
+        context = [_SCENARIO_INDEX[scenario]] + list(range(1, prompt_tokens + len(tokens) + 1))
+        done_reason = "length" if truncated else "stop"
+
+        def chunk(text: str, done: bool) -> Dict[str, Any]:
+            data = {"model": model, "created_at": _now(), "done": done}
+            if chat:
+                data["message"] = {"role": "assistant", "content": text}
+            else:
+                data["response"] = text
+            return data
+
+        server.begin(scenario)
+        started = time.monotonic()
+        if not body.get("stream", True):
+            try:
+                ttft = await server.wait_full(tokens)
+            finally:
+                server.end(len(tokens))
+            data = chunk("".join(tokens), True)
+            data.update(_ollama_metrics(prompt_tokens, len(tokens), started, started + ttft))
+            data["done_reason"] = done_reason
+            if not chat:
+                data["context"] = context
+            return data
+
+        async def lines() -> AsyncIterator[bytes]:
+            first_token = None
+            emitted = 0
+            try:
+                async for token in server.generate_tokens(tokens):
+                    first_token = first_token or time.monotonic()
+                    emitted += 1
+                    yield (json.dumps(chunk(token, False), ensure_ascii=False) + "\n").encode("utf-8")
+                final = chunk("", True)
+                final.update(_ollama_metrics(prompt_tokens, emitted, started, first_token))
+                final["done_reason"] = done_reason
+                if not chat:
+                    final["context"] = context
+                yield (json.dumps(final, ensure_ascii=False) + "\n").encode("utf-8")
+            except RuntimeError as e:
+                yield (json.dumps({"error": str(e)}) + "\n").encode("utf-8")
+            finally:
+                server.end(emitted)
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def tags() -> Dict[str, Any]:
+        return {
+            "models": [
+                {"name": name if ":" in name else f"{name}:latest", "model": name, "modified_at": _now(), "size": 0}
+                for name in server.config.models
+            ]
+        }
+
+    @app.get("/api/version")
+    async def version() -> Dict[str, Any]:
+        return {"version": "0.0.0-fake"}
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        system, user = split_messages(messages)
+        prompt_text = "".join(m.get("content", "") or "" for m in messages)
+        return await ollama_reply(body, system, user, prompt_text, chat=True)
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        system, user = split_prompt(prompt, body.get("system"))
+        context = body.get("context")
+        if context and not system:
+            system = _SCENARIOS[context[0]][1] if 0 <= context[0] < len(_SCENARIOS) else ""
+        return await ollama_reply(body, system, user, prompt, chat=False)
+
+    @app.get("/v1/models")
+    async def openai_models() -> Dict[str, Any]:
+        return {
+            "object": "list",
+            "data": [{"id": name, "object": "model", "owned_by": "fake"} for name in server.config.models]
+        }
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        if server.roll(server.config.error_rate):
+            return openai_error()
+        messages = body.get("messages") or []
+        system, user = split_messages(messages)
+        model = body.get("model") or server.config.models[0]
+        scenario, tokens, truncated = server.plan(system, user, body.get("max_tokens"))
+        finish_reason = "length" if truncated else "stop"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        prompt_tokens = len(tokenize("".join(m.get("content", "") or "" for m in messages)))
+
+        server.begin(scenario)
+        if not body.get("stream", False):
+            try:
+                await server.wait_full(tokens)
+            finally:
+                server.end(len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            }
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None) -> bytes:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        async def events() -> AsyncIterator[bytes]:
+            emitted = 0
+            try:
+                yield event({"role": "assistant", "content": ""})
+                async for token in server.generate_tokens(tokens):
+                    emitted += 1
+                    yield event({"content": token})
+                yield event({}, finish_reason)
+                yield b"data: [DONE]\n\n"
+            except RuntimeError as e:
+                error = {"error": {"message": str(e), "type": "server_error"}}
+                yield f"data: {json.dumps(error)}\n\n".encode("utf-8")
+            finally:
+                server.end(emitted)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/fake/stats")
+    async def fake_stats() -> Dict[str, Any]:
+        return server.get_stats()
+
+    @app.post("/fake/config")
+    async def fake_config(changes: Dict[str, Any]) -> Dict[str, Any]:
+        return server.update_config(changes).model_dump()
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线压测用的Ollama/OpenAI模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.2, help="首字延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0, help="输出速度，0表示不限速")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机波动比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求直接失败的概率")
+    parser.add_argument("--error-status", type=int, default=500, help="注入失败的HTTP状态码")
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="流式输出中断的概率")
+    parser.add_argument("--model", action="append", dest="models", help="列出的模型，可重复指定")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        midstream_error_rate=args.midstream_error_rate,
+        seed=args.seed,
+        **({"models": args.models} if args.models else {})
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+从历史路由结果蒸馏训练本地意图分类器
+
+读取conversations表中各对话记录的agent_type作为标签、每轮user_input作为文本，
+按比例划分训练集和测试集评估后，用全部样本训练并保存模型文件。
+
+运行示例：
+    python -m tools.train_intent_classifier --output ./intent_model.json --threshold 0.9
+"""
+import argparse
+from config.settings import settings
+from db.database import SessionLocal
+from utils.intent_classifier import (
+    distill_training_data, split_samples, train_intent_classifier, evaluate_intent_classifier
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="从历史路由结果训练本地意图分类器")
+    parser.add_argument("--output", default=settings.intent_model_path, help="模型文件路径")
+    parser.add_argument("--threshold", type=float, default=settings.intent_confidence_threshold, help="置信度阈值")
+    parser.add_argument("--test-ratio", type=float, default=0.2, help="测试集比例")
+    parser.add_argument("--limit", type=int, default=None, help="最多读取的对话记录数")
+    parser.add_argument("--no-seed", action="store_true", help="不加入内置种子样本")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        samples = distill_training_data(db, limit=args.limit)
+    finally:
+        db.close()
+
+    counts = {}
+    for _, label in samples:
+        counts[label] = counts.get(label, 0) + 1
+    print(f"从历史对话中提取样本 {len(samples)} 条: {counts}")
+
+    if samples:
+        train, test = split_samples(samples, args.test_ratio)
+        classifier = train_intent_classifier(train, include_seed=not args.no_seed)
+        if test:
+            report = evaluate_intent_classifier(classifier, test, args.threshold)
+            print(
+                f"测试集 {report['samples']} 条: 准确率 {report['accuracy']:.2%}，"
+                f"置信度≥{args.threshold} 的覆盖率 {report['coverage']:.2%}，"
+                f"其中准确率 {report['confident_accuracy']:.2%}"
+            )
+
+    classifier = train_intent_classifier(samples, include_seed=not args.no_seed)
+    classifier.save(args.output)
+    print(f"模型已保存到 {args.output}（词表 {len(classifier.vocabulary)}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from config.settings import settings
+from utils.answer_cache import NearDuplicateAnswerCache, CachedAnswer, normalize_question, ERROR_MARKER
+
+
+class AnswerBank:
+    """
+    预生成回答库
+
+    由tools.build_answer_bank在低峰期对高频课程问题（学科 × 年龄段）批量生成回答并写入
+    answer_bank表。EduAgent回答前先查这里：首次查询时把当前回答提示词指纹下的全部条目
+    载入内存中的MinHash/LSH索引，之后按年龄段做近似问题匹配，不再访问数据库。
+    提示词或模型变化后指纹随之变化，旧回答不再使用，重新运行批量任务即可补齐。
+    """
+
+    def __init__(self, threshold: float = 0.7, max_entries: int = 100000, session_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            threshold: 命中需要达到的问题相似度
+            max_entries: 内存索引最多容纳的回答数
+            session_factory: 数据库会话工厂，为空时使用db.database.SessionLocal
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._index: Optional[NearDuplicateAnswerCache] = None
+        self._namespace: Optional[str] = None
+        self._lock = threading.Lock()
+        self.db_errors = 0
+
+    @staticmethod
+    def make_key(age_group: str, question: str, namespace: str) -> str:
+        """
+        生成问题键
+
+        Args:
+            age_group: 年龄段
+            question: 问题
+            namespace: 回答提示词指纹
+
+        Returns:
+            问题键
+        """
+        raw = f"{namespace}\n{age_group}\n{normalize_question(question)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from db.database import SessionLocal
+        return SessionLocal()
+
+    def _new_index(self) -> NearDuplicateAnswerCache:
+        return NearDuplicateAnswerCache(max_entries=self.max_entries, threshold=self.threshold, ttl=float('inf'))
+
+    def _load(self, namespace: str) -> NearDuplicateAnswerCache:
+        """载入指定指纹下的全部回答，载入失败时使用空索引，调用reload后重新载入"""
+        with self._lock:
+            if self._index is not None and self._namespace == namespace:
+                return self._index
+        index = self._new_index()
+        try:
+            from models.user import AnswerBankEntry
+
+            db = self._session()
+            try:
+                rows = db.query(AnswerBankEntry).filter(AnswerBankEntry.namespace == namespace).all()
+                for row in rows:
+                    index.set(row.age_group, row.question, row.answer, row.generation_time or 0.0, row.subject)
+            finally:
+                db.close()
+        except Exception as e:
+            with self._lock:
+                self.db_errors += 1
+            print(f"载入预生成回答库失败: {e}")
+        with self._lock:
+            self._index, self._namespace = index, namespace
+        return index
+
+    def lookup(self, age_group: str, question: str, namespace: str) -> Optional[CachedAnswer]:
+        """
+        查找与问题足够相似的预生成回答
+
+        Args:
+            age_group: 年龄段
+            question: 问题
+            namespace: 回答提示词指纹
+
+        Returns:
+            最相似的预生成回答，未命中时返回None
+        """
+        return self._load(namespace).get(age_group, question)
+
+    def contains(self, age_group: str, question: str, namespace: str) -> bool:
+        """
+        判断问题是否已有预生成回答，批量任务据此跳过已完成的问题
+
+        Args:
+            age_group: 年龄段
+            question: 问题
+            namespace: 回答提示词指纹
+        """
+        from models.user import AnswerBankEntry
+
+        key = self.make_key(age_group, question, namespace)
+        db = self._session()
+        try:
+            return db.query(AnswerBankEntry.id).filter(AnswerBankEntry.question_key == key).first() is not None
+        finally:
+            db.close()
+
+    def save(
+        self,
+        age_group: str,
+        subject: str,
+        question: str,
+        answer: str,
+        namespace: str,
+        generation_time: float = 0.0
+    ) -> bool:
+        """
+        保存一条预生成回答，已载入的索引同步更新
+
+        Args:
+            age_group: 年龄段
+            subject: 学科
+            question: 问题
+            answer: 回答
+            namespace: 回答提示词指纹
+            generation_time: 生成用去的秒数
+
+        Returns:
+            是否保存，调用出错的回答不保存
+        """
+        if not answer or ERROR_MARKER in answer:
+            return False
+        from models.user import AnswerBankEntry
+
+        key = self.make_key(age_group, question, namespace)
+        db = self._session()
+        try:
+            row = db.query(AnswerBankEntry).filter(AnswerBankEntry.question_key == key).first()
+            if row is None:
+                db.add(AnswerBankEntry(
+                    question_key=key, namespace=namespace, age_group=age_group, subject=subject,
+                    question=question, answer=answer, generation_time=generation_time
+                ))
+            else:
+                row.answer = answer  # type: ignore
+                row.generation_time = generation_time  # type: ignore
+                row.created_at = datetime.now(timezone.utc)  # type: ignore
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            index = self._index if self._namespace == namespace else None
+        if index is not None:
+            index.set(age_group, question, answer, generation_time, subject)
+        return True
+
+    def reload(self) -> None:
+        """丢弃内存索引，下次查询时重新从数据库载入（批量任务在其他进程运行后调用）"""
+        with self._lock:
+            self._index, self._namespace = None, None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            已载入的回答数、命中率、平均命中相似度和节省的生成时间
+        """
+        with self._lock:
+            index, namespace = self._index, self._namespace
+        stats = index.get_stats() if index is not None else self._new_index().get_stats()
+        return {
+            "enabled": getattr(settings, 'answer_bank_enabled', True),
+            "loaded": index is not None,
+            "namespace": namespace,
+            "entries": stats["size"],
+            "threshold": self.threshold,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": stats["hit_rate"],
+            "avg_hit_similarity": stats["avg_hit_similarity"],
+            "saved_generation_seconds": stats["saved_generation_seconds"],
+            "db_errors": self.db_errors
+        }
+
+
+# 全局预生成回答库
+answer_bank = AnswerBank(
+    threshold=getattr(settings, 'answer_bank_threshold', 0.7),
+    max_entries=getattr(settings, 'answer_bank_max_entries', 100000)
+)
@@ -0,0 +1,321 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+from config.settings import settings
+from utils.safety_verdict_cache import normalize_content
+
+
+# 不影响问题含义的语气词和客套话，归一化时去掉
+FILLER_WORDS = ("请问", "请告诉我", "告诉我", "吗", "呢", "呀", "啊", "吧", "哦", "嘛")
+# 模型调用出错时客户端返回的文本中包含的标记，这类回答不缓存
+ERROR_MARKER = "API时出错"
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?|[零一二三四五六七八九十百千万两]+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    归一化问题文本：在内容归一化（全角、繁简、大小写、标点）基础上去掉语气词
+
+    Args:
+        question: 原始问题
+
+    Returns:
+        归一化后的问题
+    """
+    normalized = normalize_content(question)
+    for word in FILLER_WORDS:
+        normalized = normalized.replace(word, "")
+    return normalized
+
+
+def shingles(text: str, size: int = 2) -> FrozenSet[str]:
+    """
+    生成字符n-gram集合，文本短于n时整体作为一个元素
+
+    Args:
+        text: 归一化后的文本
+        size: n-gram长度
+
+    Returns:
+        n-gram集合
+    """
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[index:index + size] for index in range(len(text) - size + 1))
+
+
+def jaccard(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    """计算两个集合的Jaccard相似度"""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class MinHasher:
+    """
+    MinHash签名生成器
+
+    每个n-gram先哈希为64位整数，再经num_perm个随机线性哈希 (a*x+b) mod p 取最小值，
+    两个集合签名相同位置的取值相等的比例是其Jaccard相似度的无偏估计。
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: FrozenSet[str]) -> Tuple[int, ...]:
+        """
+        计算集合的MinHash签名
+
+        Args:
+            items: n-gram集合
+
+        Returns:
+            长度为num_perm的签名
+        """
+        hashes = [
+            int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+            for item in items
+        ]
+        if not hashes:
+            return tuple([_MERSENNE_PRIME] * self.num_perm)
+        return tuple(
+            min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+            for a, b in self._coefficients
+        )
+
+
+class CachedAnswer(NamedTuple):
+    """近似问题缓存命中的结果"""
+    answer: str
+    question: str
+    similarity: float
+    subject: Optional[str] = None
+
+
+class _AnswerEntry(NamedTuple):
+    namespace: str
+    question: str
+    shingles: FrozenSet[str]
+    numbers: Tuple[str, ...]
+    signature: Tuple[int, ...]
+    answer: str
+    generation_time: float
+    stored_at: float
+    subject: Optional[str] = None
+
+
+class NearDuplicateAnswerCache:
+    """
+    近似问题回答缓存（MinHash + LSH）
+
+    问题归一化后取字符n-gram计算MinHash签名，签名分成若干段，每段作为LSH桶键，
+    查询时只与落在同一桶内的问题比较，无需遍历全部缓存。候选问题再用n-gram集合的
+    Jaccard相似度精确比对，达到阈值且问题中的数字完全一致时命中（"3加5"和"3加6"
+    字面相近但答案不同）。缓存按命名空间（年龄段）隔离，同一问题对不同年龄段的
+    回答不会混用。条目数超过上限时淘汰最久未使用的条目，超过TTL的条目在查询时移除。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        threshold: float = 0.7,
+        ttl: float = 86400,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 2,
+        min_length: int = 4
+    ):
+        """
+        Args:
+            max_entries: 最多缓存的回答数
+            threshold: 命中需要达到的Jaccard相似度
+            ttl: 回答有效秒数
+            num_perm: MinHash签名长度
+            bands: LSH分段数，需整除num_perm；段越多越容易成为候选
+            shingle_size: 字符n-gram长度
+            min_length: 归一化后短于此长度的问题不缓存（如"为什么"之类依赖上下文的追问）
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须能被bands整除")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_length = min_length
+        self.hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[int, _AnswerEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+        self.hit_similarity_total = 0.0
+
+    def _band_keys(self, namespace: str, signature: Tuple[int, ...]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+        return [
+            (namespace, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _prepare(self, question: str) -> Optional[Tuple[FrozenSet[str], Tuple[str, ...]]]:
+        normalized = normalize_question(question)
+        if len(normalized) < self.min_length:
+            return None
+        return shingles(normalized, self.shingle_size), tuple(sorted(_NUMBER_PATTERN.findall(normalized)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry.namespace, entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def get(self, namespace: str, question: str) -> Optional[CachedAnswer]:
+        """
+        查找与问题足够相似的已缓存回答
+
+        Args:
+            namespace: 命名空间（年龄段）
+            question: 问题
+
+        Returns:
+            最相似的缓存回答，未命中时返回None
+        """
+        prepared = self._prepare(question)
+        if prepared is None:
+            with self._lock:
+                self.skipped += 1
+            return None
+        items, numbers = prepared
+        signature = self.hasher.signature(items)
+        now = time.time()
+
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.stored_at > self.ttl:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                if entry.numbers != numbers:
+                    continue
+                similarity = jaccard(items, entry.shingles)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.saved_seconds += entry.generation_time
+            self.hit_similarity_total += best_similarity
+            return CachedAnswer(entry.answer, entry.question, round(best_similarity, 4), entry.subject)
+
+    def set(
+        self,
+        namespace: str,
+        question: str,
+        answer: str,
+        generation_time: float = 0.0,
+        subject: Optional[str] = None
+    ) -> bool:
+        """
+        缓存一个回答，超出容量时淘汰最久未使用的条目
+
+        Args:
+            namespace: 命名空间（年龄段）
+            question: 问题
+            answer: 回答
+            generation_time: 生成该回答用去的秒数，命中时计入节省的生成时间
+            subject: 回答所属的学科，命中时随回答返回
+
+        Returns:
+            是否写入了缓存
+        """
+        prepared = self._prepare(question)
+        if prepared is None or not answer or ERROR_MARKER in answer:
+            return False
+        items, numbers = prepared
+        signature = self.hasher.signature(items)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _AnswerEntry(
+                namespace, question, items, numbers, signature, answer, generation_time, time.time(), subject
+            )
+            for key in self._band_keys(namespace, signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        """清空缓存（计数器保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中、未命中、命中率、平均命中相似度、节省的生成时间、淘汰数及当前条目数
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": getattr(settings, 'edu_answer_cache_enabled', True),
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "buckets": len(self._buckets),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "avg_hit_similarity": round(self.hit_similarity_total / self.hits, 4) if self.hits else 0.0,
+                "saved_generation_seconds": round(self.saved_seconds, 3),
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# 全局EduAgent回答缓存
+edu_answer_cache = NearDuplicateAnswerCache(
+    max_entries=getattr(settings, 'edu_answer_cache_max_entries', 2048),
+    threshold=getattr(settings, 'edu_answer_cache_threshold', 0.7),
+    ttl=getattr(settings, 'edu_answer_cache_ttl', 86400)
+)
@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from config.settings import settings
+
+
+class CircuitOpenError(Exception):
+    """后端熔断中，调用未发出"""
+
+
+class CircuitBreaker:
+    """
+    单个LLM后端的熔断器
+
+    在最近window次调用中，失败率或慢调用率达到阈值时熔断（open），熔断期间调用直接拒绝；
+    open_seconds后进入半开（half_open），放行一次试探调用，成功且不慢则恢复（closed），
+    否则重新熔断。同时记录成功调用的延迟，用于计算对冲请求的发起时机。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20,
+        slow_call_rate: float = 0.5,
+        open_seconds: float = 30
+    ):
+        """
+        Args:
+            name: 后端名称
+            window: 统计的最近调用次数
+            min_calls: 达到该调用次数后才计算失败率
+            failure_rate: 熔断的失败率阈值
+            slow_call_seconds: 超过该秒数的调用视为慢调用
+            slow_call_rate: 熔断的慢调用率阈值
+            open_seconds: 熔断持续秒数，之后进入半开
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """
+        判断是否放行一次调用；放行的调用必须随后调用record或release
+
+        Returns:
+            是否放行
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, success: bool, latency: float) -> None:
+        """
+        记录一次放行调用的结果
+
+        Args:
+            success: 是否成功
+            latency: 耗时秒数
+        """
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            self.calls += 1
+            if success:
+                self._latencies.append(latency)
+            else:
+                self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if success and not slow:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append((success, slow))
+            if len(self._outcomes) >= self.min_calls:
+                total = len(self._outcomes)
+                failed = sum(1 for ok, _ in self._outcomes if not ok)
+                slowed = sum(1 for _, is_slow in self._outcomes if is_slow)
+                if failed / total >= self.failure_rate or slowed / total >= self.slow_call_rate:
+                    self._open()
+
+    def release(self) -> None:
+        """放行的调用没有结果（如被取消或本地限流拒绝）时释放半开试探名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        成功调用延迟的分位数，样本不足min_calls时返回None
+
+        Args:
+            percentile: 分位数（0-1）
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_calls:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(percentile * len(ordered)))
+        return ordered[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态
+
+        Returns:
+            状态、窗口内失败率、累计调用/失败/拒绝/熔断次数和延迟分位数
+        """
+        p50 = self.latency_percentile(0.5)
+        p95 = self.latency_percentile(0.95)
+        with self._lock:
+            window = len(self._outcomes)
+            failed = sum(1 for ok, _ in self._outcomes if not ok)
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": self.state,
+                "window_calls": window,
+                "window_failure_rate": round(failed / window, 4) if window else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "retry_in_seconds": retry_in,
+                "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+            }
+
+
+# 各LLM后端的熔断器
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(backend: str) -> CircuitBreaker:
+    """
+    获取后端对应的熔断器，首次使用时按配置创建
+
+    Args:
+        backend: 后端名称（ollama/openai）
+
+    Returns:
+        熔断器
+    """
+    with _registry_lock:
+        breaker = circuit_breakers.get(backend)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                backend,
+                window=getattr(settings, 'llm_breaker_window', 20),
+                min_calls=getattr(settings, 'llm_breaker_min_calls', 5),
+                failure_rate=getattr(settings, 'llm_breaker_failure_rate', 0.5),
+                slow_call_seconds=getattr(settings, 'llm_breaker_slow_call_seconds', 20),
+                slow_call_rate=getattr(settings, 'llm_breaker_slow_call_rate', 0.5),
+                open_seconds=getattr(settings, 'llm_breaker_open_seconds', 30)
+            )
+            circuit_breakers[backend] = breaker
+        return breaker
@@ -0,0 +1,182 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from utils.keyword_matcher import KeywordMatcher
+
+
+# 各情绪的提示词及权重，情绪类别与EmotionAgent.emotions一致
+EMOTION_CUES: Dict[str, Dict[str, float]] = {
+    "开心": {"开心": 2, "高兴": 2, "快乐": 2, "太好了": 1.5, "哈哈": 1, "好棒": 1, "喜欢": 1, "满分": 1, "被表扬": 1.5},
+    "难过": {"难过": 2, "伤心": 2, "想哭": 2, "哭了": 2, "委屈": 2, "失望": 1.5, "心情不好": 2, "哭": 1},
+    "愤怒": {"生气": 2, "气死": 2, "愤怒": 2, "恼火": 2, "火大": 2, "好气": 2, "烦死": 1.5, "烦": 1},
+    "害怕": {"害怕": 2, "恐怖": 1.5, "吓人": 1.5, "吓死": 2, "噩梦": 1.5, "不敢": 1, "怕": 1},
+    "惊讶": {"惊讶": 2, "吃惊": 2, "没想到": 1.5, "竟然": 1, "居然": 1, "哇": 1},
+    "厌恶": {"恶心": 2, "嫌弃": 2, "反感": 2, "讨厌": 1.5, "不喜欢": 1.5},
+    "焦虑": {"紧张": 2, "担心": 2, "焦虑": 2, "不安": 1.5, "着急": 1.5, "压力": 1.5, "睡不着": 1},
+    "孤独": {"孤单": 2, "孤独": 2, "寂寞": 2, "没人陪": 2, "没有朋友": 2, "没人跟我玩": 2, "一个人": 1},
+    "兴奋": {"兴奋": 2, "激动": 2, "迫不及待": 2, "期待": 1.5},
+    "困惑": {"困惑": 2, "迷茫": 2, "不懂": 1.5, "不明白": 1.5, "搞不清": 1.5, "为什么": 0.5},
+}
+
+# 否定词：紧挨在提示词前（中间最多隔一个程度词）时该提示词不计分
+NEGATIONS = ("一点也不", "一点都不", "并不", "不是", "没有", "不", "没", "别")
+# 被否定时转为另一种情绪的提示词，如"不开心"计为难过
+NEGATION_FLIPS: Dict[str, str] = {"开心": "难过", "高兴": "难过", "快乐": "难过"}
+# 程度词：(词, 权重系数, 强度)
+INTENSIFIERS: Tuple[Tuple[str, float, str], ...] = (
+    ("非常", 1.5, "高"), ("特别", 1.5, "高"), ("超级", 1.5, "高"), ("太", 1.5, "高"),
+    ("好", 1.3, "高"), ("很", 1.3, "高"), ("真", 1.3, "高"), ("超", 1.3, "高"),
+    ("有点", 0.7, "低"), ("有些", 0.7, "低"), ("一点", 0.7, "低"), ("稍微", 0.7, "低"),
+)
+
+
+class EmotionPrediction(NamedTuple):
+    """本地情绪判断结果，emotion为空表示没有命中任何提示词"""
+    emotion: Optional[str]
+    intensity: str
+    confidence: float
+    cues: List[str]
+
+
+class EmotionLexiconClassifier:
+    """
+    基于情绪词典的本地情绪判断
+
+    用编译好的关键词自动机一次扫描找出各情绪的提示词，结合否定词和程度词计分，
+    得分最高的情绪占总分的比例作为置信度。置信度达到阈值时EmotionAgent直接使用该结果，
+    不再调用模型做情绪分析；同时统计命中率以及与模型结论的一致率。
+    """
+
+    def __init__(self, cues: Optional[Dict[str, Dict[str, float]]] = None, min_score: float = 2.0):
+        """
+        Args:
+            cues: {情绪: {提示词: 权重}}，为空时使用内置词典
+            min_score: 得分最高的情绪至少需要的分数，单个弱提示词不足以直接判断
+        """
+        self.cues = cues or EMOTION_CUES
+        self.min_score = min_score
+        self.matcher = KeywordMatcher({emotion: list(words) for emotion, words in self.cues.items()})
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.confident = 0
+        self.comparisons = 0
+        self.agreements = 0
+        self.disagreements: Counter = Counter()
+
+    @staticmethod
+    def _modifiers(prefix: str) -> Tuple[bool, float, Optional[str]]:
+        """
+        根据提示词前面的文本判断是否被否定以及程度
+
+        Returns:
+            (是否被否定, 权重系数, 强度)
+        """
+        weight, intensity = 1.0, None
+        for word, factor, level in INTENSIFIERS:
+            if prefix.endswith(word):
+                weight, intensity = factor, level
+                prefix = prefix[:-len(word)]
+                break
+        negated = any(prefix.endswith(word) for word in NEGATIONS)
+        if negated and intensity == "高":
+            # "不太开心"之类程度减弱
+            weight, intensity = 0.7, "低"
+        return negated, weight, intensity
+
+    def predict(self, text: str, threshold: float = 0.75) -> EmotionPrediction:
+        """
+        判断文本的情绪
+
+        Args:
+            text: 孩子表达的内容
+            threshold: 置信度阈值，只用于统计命中率
+
+        Returns:
+            得分最高的情绪、强度、置信度和命中的提示词
+        """
+        scores: Dict[str, float] = {}
+        levels: Dict[str, List[str]] = {}
+        cues: Dict[str, List[str]] = {}
+        text = text or ""
+        matches = self.matcher.find_all(text)
+        for match in matches:
+            # 较短的提示词被同一情绪的较长提示词包含时（如"哭"和"想哭"）只计较长的
+            if any(
+                other is not match and other.category == match.category
+                and other.start <= match.start and match.end <= other.end
+                for other in matches
+            ):
+                continue
+            negated, weight, intensity = self._modifiers(text[max(0, match.start - 6):match.start])
+            emotion = match.category
+            if negated and not match.keyword.startswith(NEGATIONS):
+                emotion = NEGATION_FLIPS.get(match.keyword)
+                if emotion is None:
+                    continue
+                intensity = intensity or "中"
+            scores[emotion] = scores.get(emotion, 0.0) + self.cues[match.category][match.keyword] * weight
+            cues.setdefault(emotion, []).append(match.keyword)
+            if intensity:
+                levels.setdefault(emotion, []).append(intensity)
+
+        with self._lock:
+            self.predictions += 1
+        if not scores:
+            return EmotionPrediction(None, "中", 0.0, [])
+
+        emotion = max(scores, key=scores.get)
+        top = scores[emotion]
+        confidence = top / sum(scores.values()) if top >= self.min_score else 0.0
+
+        exclamations = text.count("！") + text.count("!")
+        emotion_levels = levels.get(emotion, [])
+        if "高" in emotion_levels or exclamations >= 2:
+            intensity = "高"
+        elif emotion_levels and all(level == "低" for level in emotion_levels):
+            intensity = "低"
+        else:
+            intensity = "中"
+
+        if confidence >= threshold:
+            with self._lock:
+                self.confident += 1
+        return EmotionPrediction(emotion, intensity, round(confidence, 4), cues[emotion])
+
+    def record_comparison(self, predicted: Optional[str], llm_emotion: str) -> None:
+        """
+        记录本地判断与模型结论的一次对比
+
+        Args:
+            predicted: 本地判断的情绪
+            llm_emotion: 模型给出的情绪
+        """
+        if predicted is None or llm_emotion not in self.cues:
+            return
+        with self._lock:
+            self.comparisons += 1
+            if predicted == llm_emotion:
+                self.agreements += 1
+            else:
+                self.disagreements[f"{predicted}->{llm_emotion}"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            预测次数、达到阈值的比例、与模型结论的对比次数和一致率，以及最常见的不一致
+        """
+        with self._lock:
+            return {
+                "predictions": self.predictions,
+                "confident": self.confident,
+                "confident_rate": round(self.confident / self.predictions, 4) if self.predictions else 0.0,
+                "comparisons": self.comparisons,
+                "agreements": self.agreements,
+                "agreement_rate": round(self.agreements / self.comparisons, 4) if self.comparisons else 0.0,
+                "top_disagreements": dict(self.disagreements.most_common(10))
+            }
+
+
+# 全局情绪词典分类器
+emotion_lexicon = EmotionLexiconClassifier()
@@ -0,0 +1,310 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from utils.answer_cache import ERROR_MARKER
+
+
+SESSION_SUMMARY_PROMPT = """你是一个儿童对话总结助手。请把"已有会话摘要"和"新的几轮对话"合并成一份新的会话摘要。
+要求：
+1. 突出孩子关心的话题、兴趣点和情绪变化
+2. 旧摘要中仍然重要的信息要保留，重复或过时的信息可以删去
+3. 保持积极正面的语调，用简洁易懂的语言
+4. 不超过{limit}字，直接输出摘要"""
+
+LONG_TERM_SUMMARY_PROMPT = """你是一个儿童成长档案整理助手。请把"长期摘要"和"最近一次会话摘要"合并成新的长期摘要。
+要求：
+1. 记录孩子稳定的兴趣、学习情况、性格特点和反复出现的情绪
+2. 一次性的细节可以省略，长期摘要中仍然成立的内容要保留
+3. 不超过{limit}字，直接输出摘要"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数：中文等非ASCII字符每字计1，ASCII字符每4个计1
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    wide = sum(1 for ch in text if ord(ch) > 127)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def clip_tokens(text: str, limit: int, keep_tail: bool = False) -> str:
+    """
+    将文本截断到估算token数不超过limit
+
+    Args:
+        text: 文本
+        limit: token上限
+        keep_tail: 为True时保留末尾（较新的内容），否则保留开头
+
+    Returns:
+        截断后的文本
+    """
+    if estimate_tokens(text) <= limit:
+        return text
+    chars = list(reversed(text)) if keep_tail else list(text)
+    kept: List[str] = []
+    used = 0.0
+    for ch in chars:
+        used += 1 if ord(ch) > 127 else 0.25
+        if used > limit:
+            break
+        kept.append(ch)
+    return "".join(reversed(kept)) if keep_tail else "".join(kept)
+
+
+class HierarchicalSummarizer:
+    """
+    分层增量摘要：单轮 → 会话 → 长期
+
+    - 单轮：每轮对话在本地截断成一行（不调用模型），放入待合并列表
+    - 会话：待合并的轮数达到batch_turns时，用已有会话摘要和这几轮生成新的会话摘要
+    - 长期：会话摘要合并了session_batches批或会话切换时，把会话摘要并入长期摘要，会话摘要清空
+
+    add_turn只做本地处理，会话切换也只是记下待结束的会话；所有模型调用都在update中进行，
+    调用方可以把update放到后台线程，不阻塞记录对话。
+
+    每一级的输入只有上一级的摘要和下一级的一小批内容，各级都有token上限，
+    所以每次模型调用的输入大小与孩子累计使用了多久无关，平均到每轮的摘要开销是常数。
+    摘要状态是可序列化的字典，由调用方保存（工作流状态、MemoryAgent等）。
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str, str, int], str]] = None,
+        turn_tokens: int = 60,
+        batch_turns: int = 5,
+        session_tokens: int = 200,
+        long_term_tokens: int = 300,
+        session_batches: int = 4
+    ):
+        """
+        Args:
+            summarize: 以(系统提示, 内容, token上限)调用模型生成摘要的函数，为空时使用openai_client
+            turn_tokens: 单轮中孩子的话和回复各自保留的token数
+            batch_turns: 累积多少轮更新一次会话摘要
+            session_tokens: 会话摘要的token上限
+            long_term_tokens: 长期摘要的token上限
+            session_batches: 会话摘要合并多少批后并入长期摘要
+        """
+        self.summarize = summarize or self._summarize_with_llm
+        self.turn_tokens = turn_tokens
+        self.batch_turns = batch_turns
+        self.session_tokens = session_tokens
+        self.long_term_tokens = long_term_tokens
+        self.session_batches = session_batches
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.llm_failures = 0
+
+    @staticmethod
+    def new_state() -> Dict[str, Any]:
+        """创建空的摘要状态"""
+        return {
+            "pending": [],
+            "session": "",
+            "session_id": None,
+            "session_batches": 0,
+            "long_term": "",
+            "total_turns": 0,
+            "ended_turns": [],
+            "session_ended": False,
+            "merging": 0,
+            "updating": False
+        }
+
+    def add_turn(
+        self,
+        state: Dict[str, Any],
+        content: str,
+        response: str,
+        agent: str = "unknown",
+        session_id: Optional[str] = None
+    ) -> None:
+        """
+        记录一轮对话（单轮级别，只做本地截断）
+
+        会话ID变化时只记下上一个会话待结束，由下一次update把它并入长期摘要。
+
+        Args:
+            state: 摘要状态
+            content: 孩子说的话
+            response: 助手的回复
+            agent: 处理的代理
+            session_id: 会话ID
+        """
+        line = (
+            f"孩子: {clip_tokens(str(content or ''), self.turn_tokens)} / "
+            f"{agent}助手: {clip_tokens(str(response or ''), self.turn_tokens)}"
+        )
+        with self._lock:
+            if session_id is not None and state.get("session_id") not in (None, session_id):
+                self._end_session(state)
+            if session_id is not None:
+                state["session_id"] = session_id
+            state["pending"].append(line)
+            state["total_turns"] += 1
+
+    @staticmethod
+    def _end_session(state: Dict[str, Any]) -> None:
+        """标记当前会话待结束，尚未合并的轮次移到待结束列表（需持有锁）"""
+        # 正在合并的一批仍由进行中的update处理
+        merging = state.get("merging", 0)
+        state.setdefault("ended_turns", []).extend(state["pending"][merging:])
+        state["pending"] = state["pending"][:merging]
+        state["session_ended"] = True
+
+    def needs_update(self, state: Dict[str, Any]) -> bool:
+        """待合并的轮数是否已达到一批，或有待结束的会话"""
+        if state.get("updating"):
+            return False
+        return state.get("session_ended", False) or len(state.get("pending", [])) >= self.batch_turns
+
+    def _merge(self, prompt: str, previous_label: str, previous: str, new_label: str, new: str, limit: int) -> Optional[str]:
+        """调用模型合并两级摘要，失败时返回None"""
+        content = f"{previous_label}:\n{previous or '（暂无）'}\n\n{new_label}:\n{new}"
+        with self._lock:
+            self.llm_calls += 1
+        try:
+            merged = self.summarize(prompt.format(limit=limit), content, limit).strip()
+        except Exception as e:
+            print(f"生成摘要失败: {e}")
+            merged = ""
+        if not merged or ERROR_MARKER in merged:
+            with self._lock:
+                self.llm_failures += 1
+            return None
+        return clip_tokens(merged, limit)
+
+    def update(self, state: Dict[str, Any], force: bool = False, fold: bool = True) -> bool:
+        """
+        结束待结束的会话，把待合并的轮次并入会话摘要，必要时再并入长期摘要
+
+        模型调用失败时退化为把旧摘要和新内容拼接后截断，摘要大小仍然有上限。
+
+        Args:
+            state: 摘要状态
+            force: 不足一批时也合并
+            fold: 会话摘要合并的批数达到上限时是否并入长期摘要
+
+        Returns:
+            是否做了合并
+        """
+        with self._lock:
+            if state.get("updating"):
+                return False
+            ended = state.get("session_ended", False)
+            batch = list(state["pending"])
+            if not batch or (len(batch) < self.batch_turns and not force):
+                batch = []
+            if not ended and not batch:
+                return False
+            state["updating"] = True
+            state["merging"] = len(batch)
+            ended_turns = state.get("ended_turns", [])
+            state["ended_turns"] = []
+            state["session_ended"] = False
+        try:
+            if ended:
+                if ended_turns:
+                    self._merge_session(state, ended_turns)
+                self._fold_session(state)
+            if batch:
+                self._merge_session(state, batch)
+                with self._lock:
+                    state["pending"] = state["pending"][len(batch):]
+                    fold = fold and state["session_batches"] >= self.session_batches
+                if fold:
+                    self._fold_session(state)
+        finally:
+            with self._lock:
+                state["merging"] = 0
+                state["updating"] = False
+        return True
+
+    def close_session(self, state: Dict[str, Any]) -> None:
+        """
+        结束当前会话：剩余轮次先并入会话摘要，再把会话摘要并入长期摘要
+
+        正在另一个线程中合并时只做标记，由那边之后的update完成。
+
+        Args:
+            state: 摘要状态
+        """
+        with self._lock:
+            self._end_session(state)
+        self.update(state)
+
+    def _merge_session(self, state: Dict[str, Any], turns: List[str]) -> None:
+        """把若干轮并入会话摘要"""
+        with self._lock:
+            previous = state["session"]
+        text = "\n".join(turns)
+        merged = self._merge(SESSION_SUMMARY_PROMPT, "已有会话摘要", previous, "新的几轮对话", text, self.session_tokens)
+        if merged is None:
+            merged = clip_tokens(f"{previous}\n{text}".strip(), self.session_tokens, keep_tail=True)
+        with self._lock:
+            state["session"] = merged
+            state["session_batches"] += 1
+
+    def _fold_session(self, state: Dict[str, Any]) -> None:
+        """把会话摘要并入长期摘要，会话摘要清空"""
+        with self._lock:
+            session, previous = state["session"], state["long_term"]
+            if not session:
+                state["session_batches"] = 0
+                return
+        merged = self._merge(LONG_TERM_SUMMARY_PROMPT, "长期摘要", previous, "最近一次会话摘要", session, self.long_term_tokens)
+        if merged is None:
+            merged = clip_tokens(f"{previous}\n{session}".strip(), self.long_term_tokens, keep_tail=True)
+        with self._lock:
+            state["long_term"] = merged
+            state["session"] = ""
+            state["session_batches"] = 0
+
+    def render(self, state: Optional[Dict[str, Any]]) -> str:
+        """
+        组合各级摘要作为上下文，总长度有上限
+
+        Args:
+            state: 摘要状态
+
+        Returns:
+            长期摘要、本次会话摘要和尚未合并的最近几轮，均为空时返回空字符串
+        """
+        if not state:
+            return ""
+        with self._lock:
+            parts = []
+            if state.get("long_term"):
+                parts.append(f"长期摘要: {state['long_term']}")
+            if state.get("session"):
+                parts.append(f"本次会话: {state['session']}")
+            if state.get("pending"):
+                parts.append("最近对话:\n" + "\n".join(state["pending"][-self.batch_turns:]))
+        return "\n".join(parts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取模型调用次数和失败次数"""
+        return {"llm_calls": self.llm_calls, "llm_failures": self.llm_failures}
+
+    @staticmethod
+    def _summarize_with_llm(system_prompt: str, content: str, limit: int) -> str:
+        """使用openai_client以后台优先级生成摘要"""
+        from utils.openai_client import openai_client
+        from utils.llm_scheduler import llm_scheduler, Priority
+        from utils.llm_telemetry import llm_call_site
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ]
+        with llm_call_site("summary"), llm_scheduler.priority(Priority.BACKGROUND):
+            return openai_client.chat_completion(messages=messages, temperature=0.3, max_tokens=limit + 50)
+
+
+# 全局分层摘要器，摘要状态由各调用方保存
+hierarchical_summarizer = HierarchicalSummarizer()
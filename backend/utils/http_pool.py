@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import weakref
+from typing import Optional
+import httpx
+from config.settings import settings
+
+
+class HTTPClientPool:
+    """
+    按后端共享的HTTP连接池，提供同步和异步两种httpx客户端
+
+    同步客户端进程内共享一个；异步客户端与事件循环绑定，每个事件循环各一个，
+    避免跨事件循环复用连接导致的异常。事件循环被回收后对应的客户端随之释放，
+    已关闭的事件循环留下的客户端在下次创建客户端时清理。
+    """
+
+    def __init__(self, base_url: str = "", timeout: float = 60):
+        self.base_url = base_url
+        self.default_timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=getattr(settings, 'llm_pool_max_connections', 20),
+            max_keepalive_connections=getattr(settings, 'llm_pool_max_keepalive', 10),
+            keepalive_expiry=getattr(settings, 'llm_keepalive_expiry', 30)
+        )
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def timeout(self, seconds: Optional[float] = None) -> httpx.Timeout:
+        """
+        构建单次调用的超时配置
+
+        Args:
+            seconds: 读取超时秒数，为空时使用默认超时
+
+        Returns:
+            httpx超时配置
+        """
+        return httpx.Timeout(
+            seconds if seconds is not None else self.default_timeout,
+            connect=getattr(settings, 'llm_connect_timeout', 5)
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        """获取共享的同步客户端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        limits=self.limits,
+                        timeout=self.timeout()
+                    )
+        return self._client
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        """创建一个异步客户端"""
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=self.limits,
+            timeout=self.timeout()
+        )
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环对应的异步客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                # 已关闭的事件循环无法再执行aclose，丢弃引用让连接随客户端回收
+                for closed in [other for other in self._async_clients.keys() if other.is_closed()]:
+                    del self._async_clients[closed]
+                client = self._new_async_client()
+                self._async_clients[loop] = client
+            return client
+
+    def close(self) -> None:
+        """关闭同步客户端"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的异步客户端"""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
@@ -0,0 +1,367 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config.settings import settings
+
+
+# 路由的目标代理
+INTENT_LABELS = ["safety", "edu", "emotion", "memory"]
+
+# 内置的种子样本，没有训练好的模型文件时用于初始化分类器
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "edu": [
+        "什么是数学？", "1加1等于几", "为什么天空是蓝色的", "地球为什么会转", "恐龙是怎么灭绝的",
+        "这道应用题怎么做", "苹果用英语怎么说", "帮我解释一下光合作用", "月亮为什么会变形状",
+        "我想学习数学", "乘法口诀怎么背", "古诗静夜思是谁写的", "长江有多长", "分数怎么比较大小",
+        "彩虹是怎么形成的", "教我写一篇作文", "小数点后面的数字怎么读", "为什么冬天会下雪",
+        "水是由什么组成的", "中国有多少个省"
+    ],
+    "emotion": [
+        "我今天很难过", "我好开心啊", "我害怕一个人睡觉", "同学不跟我玩，我好孤单", "我明天要考试好紧张",
+        "妈妈批评我了我很生气", "我的小狗走丢了我好伤心", "今天好无聊没人陪我", "我做噩梦了好害怕",
+        "我考了一百分太高兴了", "我不想上学", "哥哥抢我玩具我好气", "爸爸出差了我想他", "我觉得没有人喜欢我",
+        "明天要去游乐园我好兴奋", "我被老师表扬了", "我心情不好", "我哭了", "我好担心妈妈生病", "我好烦"
+    ],
+    "memory": [
+        "我之前学了什么？", "上次我们聊了什么", "你还记得我昨天说的吗", "我们之前讲到哪里了",
+        "帮我回顾一下上次的内容", "我上周问过你什么问题", "你记得我的名字吗", "我们聊过恐龙吗",
+        "把我们之前的对话总结一下", "上次那道题的答案是什么", "你还记得我喜欢什么吗", "继续上次的故事",
+        "我之前说过我几岁", "我们前几天聊了什么", "我以前问过的问题有哪些"
+    ],
+    "safety": [
+        "如何制作爆炸物？", "怎么做炸药", "教我打架", "哪里可以买到刀", "怎么伤害别人", "告诉我怎么自杀",
+        "我想离家出走", "陌生人让我告诉他家里地址", "怎么偷东西不被发现", "网上有人问我要密码",
+        "怎么玩火", "我想从楼上跳下去", "有人让我去他家不要告诉爸妈", "怎么骂人最狠", "去哪里能买到烟"
+    ]
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NaiveBayesIntentClassifier:
+    """
+    基于字符n-gram的多项式朴素贝叶斯意图分类器
+
+    在本地以微秒级完成路由判断并给出后验概率作为置信度，
+    置信度低于阈值时再由MetaAgent调用LLM路由。
+    """
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 3), alpha: float = 0.5):
+        """
+        Args:
+            ngram_range: 字符n-gram的最小和最大长度
+            alpha: 拉普拉斯平滑系数
+        """
+        self.ngram_range = ngram_range
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self.class_counts: Dict[str, int] = {}
+        self.feature_counts: Dict[str, Dict[str, int]] = {}
+        self.feature_totals: Dict[str, int] = {}
+        self.vocabulary: set = set()
+        self._log_priors: Dict[str, float] = {}
+        self._log_unseen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.confident = 0
+
+    def features(self, text: str) -> Counter:
+        """
+        提取字符n-gram特征（小写、去除空白后首尾加边界符）
+
+        Args:
+            text: 文本
+
+        Returns:
+            n-gram计数
+        """
+        normalized = "^" + _WHITESPACE.sub("", (text or "").lower()) + "$"
+        low, high = self.ngram_range
+        grams = Counter()
+        for n in range(low, high + 1):
+            for i in range(len(normalized) - n + 1):
+                gram = normalized[i:i + n]
+                if gram not in ("^", "$"):
+                    grams[gram] += 1
+        return grams
+
+    def fit(self, texts: Iterable[str], labels: Iterable[str]) -> "NaiveBayesIntentClassifier":
+        """
+        训练分类器
+
+        Args:
+            texts: 样本文本
+            labels: 对应的代理类型
+
+        Returns:
+            分类器自身
+        """
+        class_counts: Dict[str, int] = defaultdict(int)
+        feature_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for text, label in zip(texts, labels):
+            class_counts[label] += 1
+            for gram, count in self.features(text).items():
+                feature_counts[label][gram] += count
+        self.class_counts = dict(class_counts)
+        self.feature_counts = {label: dict(counts) for label, counts in feature_counts.items()}
+        self._prepare()
+        return self
+
+    def _prepare(self) -> None:
+        """根据计数预先计算先验和平滑项"""
+        self.labels = sorted(self.class_counts)
+        self.vocabulary = set()
+        for counts in self.feature_counts.values():
+            self.vocabulary.update(counts)
+        self.feature_totals = {label: sum(self.feature_counts.get(label, {}).values()) for label in self.labels}
+        total = sum(self.class_counts.values())
+        size = len(self.vocabulary)
+        self._log_priors = {label: math.log(self.class_counts[label] / total) for label in self.labels}
+        self._log_unseen = {
+            label: math.log(self.alpha / (self.feature_totals[label] + self.alpha * size))
+            for label in self.labels
+        }
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """
+        计算各代理类型的后验概率
+
+        Args:
+            text: 用户输入
+
+        Returns:
+            {代理类型: 概率}，未训练时为空
+        """
+        if not self.labels:
+            return {}
+        grams = [(gram, count) for gram, count in self.features(text).items() if gram in self.vocabulary]
+        size = len(self.vocabulary)
+        # 特征之间并不独立，直接相加会让长文本的后验概率趋近0或1；按特征数的平方根缩放似然，
+        # 使置信度可以作为是否回退到LLM的依据
+        scale = 1 / math.sqrt(sum(count for _, count in grams) or 1)
+        scores = {}
+        for label in self.labels:
+            counts = self.feature_counts.get(label, {})
+            denominator = math.log(self.feature_totals[label] + self.alpha * size)
+            likelihood = 0.0
+            for gram, count in grams:
+                seen = counts.get(gram)
+                if seen:
+                    likelihood += count * (math.log(seen + self.alpha) - denominator)
+                else:
+                    likelihood += count * self._log_unseen[label]
+            scores[label] = self._log_priors[label] + likelihood * scale
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exps.values())
+        return {label: value / norm for label, value in exps.items()}
+
+    def predict(self, text: str, threshold: Optional[float] = None) -> Tuple[str, float]:
+        """
+        预测代理类型
+
+        Args:
+            text: 用户输入
+            threshold: 置信度阈值，只用于统计达到阈值的比例
+
+        Returns:
+            (代理类型, 置信度)；未训练或输入为空时返回("edu", 0.0)
+        """
+        probabilities = self.predict_proba(text) if (text or "").strip() else {}
+        if probabilities:
+            label = max(probabilities, key=probabilities.get)
+            confidence = probabilities[label]
+        else:
+            label, confidence = "edu", 0.0
+        with self._lock:
+            self.predictions += 1
+            if threshold is not None and confidence >= threshold:
+                self.confident += 1
+        return label, confidence
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ngram_range": list(self.ngram_range),
+            "alpha": self.alpha,
+            "class_counts": self.class_counts,
+            "feature_counts": self.feature_counts
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NaiveBayesIntentClassifier":
+        classifier = cls(tuple(data.get("ngram_range", (1, 3))), data.get("alpha", 0.5))
+        classifier.class_counts = dict(data["class_counts"])
+        classifier.feature_counts = {label: dict(counts) for label, counts in data["feature_counts"].items()}
+        classifier._prepare()
+        return classifier
+
+    def save(self, path: str) -> None:
+        """
+        保存模型为JSON文件
+
+        Args:
+            path: 文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesIntentClassifier":
+        """
+        从JSON文件加载模型
+
+        Args:
+            path: 文件路径
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取分类器状态
+
+        Returns:
+            各类别样本数、词表大小、预测次数和达到阈值的比例
+        """
+        with self._lock:
+            return {
+                "class_counts": self.class_counts,
+                "vocabulary_size": len(self.vocabulary),
+                "predictions": self.predictions,
+                "confident": self.confident,
+                "confident_rate": round(self.confident / self.predictions, 4) if self.predictions else 0.0
+            }
+
+
+def seed_training_data() -> List[Tuple[str, str]]:
+    """
+    内置种子样本
+
+    Returns:
+        [(文本, 代理类型)]
+    """
+    return [(text, label) for label, texts in SEED_EXAMPLES.items() for text in texts]
+
+
+def distill_training_data(db, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    从历史路由结果中提取训练样本
+
+    conversations表按(用户, 代理类型)保存对话，agent_type即当时路由到的代理，
+    其中每轮的user_input作为样本文本；相同文本只保留出现最多的标签。
+
+    Args:
+        db: 数据库会话
+        limit: 最多读取的对话记录数
+
+    Returns:
+        [(文本, 代理类型)]
+    """
+    from models.user import Conversation
+
+    query = db.query(Conversation).filter(Conversation.agent_type.in_(INTENT_LABELS))
+    if limit:
+        query = query.limit(limit)
+
+    votes: Dict[str, Counter] = defaultdict(Counter)
+    for conversation in query:
+        for turn in conversation.conversation_history or []:
+            text = (turn.get("user_input") or "").strip() if isinstance(turn, dict) else ""
+            if text:
+                votes[text][conversation.agent_type] += 1
+    return [(text, counter.most_common(1)[0][0]) for text, counter in votes.items()]
+
+
+def split_samples(
+    samples: List[Tuple[str, str]],
+    test_ratio: float = 0.2,
+    seed: int = 42
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """
+    打乱后划分训练集和测试集
+
+    Returns:
+        (训练集, 测试集)
+    """
+    shuffled = list(samples)
+    random.Random(seed).shuffle(shuffled)
+    cut = int(len(shuffled) * (1 - test_ratio))
+    return shuffled[:cut], shuffled[cut:]
+
+
+def train_intent_classifier(samples: List[Tuple[str, str]], include_seed: bool = True) -> NaiveBayesIntentClassifier:
+    """
+    训练意图分类器
+
+    Args:
+        samples: [(文本, 代理类型)]
+        include_seed: 是否加入内置种子样本
+
+    Returns:
+        训练好的分类器
+    """
+    data = list(samples) + (seed_training_data() if include_seed else [])
+    return NaiveBayesIntentClassifier().fit([text for text, _ in data], [label for _, label in data])
+
+
+def evaluate_intent_classifier(
+    classifier: NaiveBayesIntentClassifier,
+    samples: List[Tuple[str, str]],
+    threshold: float
+) -> Dict[str, Any]:
+    """
+    在带标签的样本上评估分类器
+
+    Args:
+        classifier: 分类器
+        samples: [(文本, 代理类型)]
+        threshold: 置信度阈值
+
+    Returns:
+        整体准确率、达到阈值的覆盖率及其中的准确率
+    """
+    correct = confident = confident_correct = 0
+    for text, label in samples:
+        predicted, confidence = classifier.predict(text)
+        correct += predicted == label
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += predicted == label
+    total = len(samples)
+    return {
+        "samples": total,
+        "accuracy": round(correct / total, 4) if total else 0.0,
+        "coverage": round(confident / total, 4) if total else 0.0,
+        "confident_accuracy": round(confident_correct / confident, 4) if confident else 0.0
+    }
+
+
+def load_intent_classifier(path: Optional[str] = None) -> NaiveBayesIntentClassifier:
+    """
+    加载模型文件，不存在或无法读取时使用种子样本训练
+
+    Args:
+        path: 模型文件路径，为空时使用配置
+
+    Returns:
+        分类器
+    """
+    path = path or getattr(settings, 'intent_model_path', '')
+    if path and os.path.exists(path):
+        try:
+            return NaiveBayesIntentClassifier.load(path)
+        except Exception as e:
+            print(f"加载意图分类模型失败，使用种子样本: {e}")
+    return train_intent_classifier([])
+
+
+# 全局意图分类器实例
+intent_classifier = load_intent_classifier()
@@ -0,0 +1,285 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+
+class KeywordMatch(NamedTuple):
+    """一次关键词命中，start/end为在原文中的偏移（end不含）"""
+    keyword: str
+    category: str
+    start: int
+    end: int
+
+
+def _fold(text: str) -> str:
+    """转为小写并保持长度不变，保证命中偏移对应原文"""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+
+class KeywordMatcher:
+    """
+    多模式关键词匹配器（Aho-Corasick自动机）
+
+    构建时把所有分类的关键词编译为一个自动机，匹配时对文本做一次线性扫描，
+    返回全部命中（含重叠命中）及其分类和偏移，耗时与关键词数量无关。
+    构建后只读，可在多线程间共享。
+    """
+
+    def __init__(self, keywords: Mapping[str, Iterable[str]], ignore_case: bool = True):
+        """
+        Args:
+            keywords: {分类: 关键词列表}，同一关键词可以属于多个分类
+            ignore_case: 是否忽略大小写
+        """
+        self.ignore_case = ignore_case
+        self.keywords: Dict[str, List[str]] = {}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态对应的前缀长度
+        self._depth: List[int] = [0]
+        # 每个状态结束的(关键词, 分类)，包含后缀链上的输出
+        self._output: List[Tuple[Tuple[str, str], ...]] = [()]
+        self._size = 0
+
+        own: List[List[Tuple[str, str]]] = [[]]
+        seen: Set[Tuple[str, str]] = set()
+        for category, words in keywords.items():
+            self.keywords[category] = []
+            for word in words:
+                if not word or (word, category) in seen:
+                    continue
+                seen.add((word, category))
+                self.keywords[category].append(word)
+                state = 0
+                for ch in (_fold(word) if ignore_case else word):
+                    next_state = self._goto[state].get(ch)
+                    if next_state is None:
+                        next_state = len(self._goto)
+                        self._goto[state][ch] = next_state
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._depth.append(self._depth[state] + 1)
+                        own.append([])
+                    state = next_state
+                own[state].append((word, category))
+        self._size = len(seen)
+        self._build_links(own)
+
+    def _build_links(self, own: List[List[Tuple[str, str]]]) -> None:
+        """按广度优先计算失败链接，并把后缀状态的输出合并到当前状态"""
+        self._output = [()] * len(self._goto)
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            self._output[state] = tuple(own[state])
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = tuple(own[next_state]) + self._output[self._fail[next_state]]
+                queue.append(next_state)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stream(self, categories: Optional[Set[str]] = None) -> "KeywordStream":
+        """
+        创建增量匹配器，用于逐块到达的文本（如模型的流式输出）
+
+        Args:
+            categories: 只返回这些分类的命中，为空时返回全部
+        """
+        return KeywordStream(self, categories)
+
+    def _scan(self, text: str):
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for index, ch in enumerate(_fold(text) if self.ignore_case else text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                yield index, output[state]
+
+    def find_all(self, text: str, categories: Optional[Set[str]] = None) -> List[KeywordMatch]:
+        """
+        查找全部命中
+
+        Args:
+            text: 待匹配文本
+            categories: 只返回这些分类的命中，为空时返回全部
+
+        Returns:
+            按结束位置排序的命中列表
+        """
+        if not text or not self._size:
+            return []
+        matches = []
+        for index, hits in self._scan(text):
+            for keyword, category in hits:
+                if categories is None or category in categories:
+                    matches.append(KeywordMatch(keyword, category, index + 1 - len(keyword), index + 1))
+        return matches
+
+    def search(self, text: str, categories: Optional[Set[str]] = None) -> Optional[KeywordMatch]:
+        """
+        查找第一个命中，找到即停止扫描
+
+        Args:
+            text: 待匹配文本
+            categories: 只考虑这些分类，为空时考虑全部
+
+        Returns:
+            第一个命中，没有时为None
+        """
+        if not text or not self._size:
+            return None
+        for index, hits in self._scan(text):
+            for keyword, category in hits:
+                if categories is None or category in categories:
+                    return KeywordMatch(keyword, category, index + 1 - len(keyword), index + 1)
+        return None
+
+
+class KeywordStream:
+    """
+    对分块到达的文本做增量匹配
+
+    自动机状态在各块之间保留，跨块的关键词同样能命中，命中偏移相对于整个流。
+    pending为末尾可能构成关键词开头的字符数，在此之前的文本不会再出现新的命中。
+    """
+
+    def __init__(self, matcher: KeywordMatcher, categories: Optional[Set[str]] = None):
+        self.matcher = matcher
+        self.categories = categories
+        self.position = 0
+        self._state = 0
+
+    @property
+    def pending(self) -> int:
+        """末尾尚不能确定是否属于某个关键词的字符数"""
+        return self.matcher._depth[self._state]
+
+    def feed(self, chunk: str) -> List[KeywordMatch]:
+        """
+        输入下一块文本
+
+        Args:
+            chunk: 文本块
+
+        Returns:
+            本块中结束的命中
+        """
+        matcher = self.matcher
+        goto = matcher._goto
+        fail = matcher._fail
+        output = matcher._output
+        state = self._state
+        matches = []
+        for ch in (_fold(chunk) if matcher.ignore_case else chunk):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            self.position += 1
+            for keyword, category in output[state]:
+                if self.categories is None or category in self.categories:
+                    matches.append(KeywordMatch(keyword, category, self.position - len(keyword), self.position))
+        self._state = state
+        return matches
+
+
+class KeywordMatcherRegistry:
+    """
+    按名称管理共享的关键词匹配器
+
+    更新关键词时先在锁外编译新的自动机，再整体替换引用，
+    正在匹配的调用继续使用旧的匹配器，不会看到构建到一半的状态。
+    """
+
+    def __init__(self):
+        self._matchers: Dict[str, KeywordMatcher] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, keywords: Mapping[str, Iterable[str]], ignore_case: bool = True) -> KeywordMatcher:
+        """
+        编译并注册（或替换）匹配器
+
+        Args:
+            name: 匹配器名称
+            keywords: {分类: 关键词列表}
+            ignore_case: 是否忽略大小写
+
+        Returns:
+            新的匹配器
+        """
+        return self.put(name, KeywordMatcher(keywords, ignore_case=ignore_case))
+
+    def put(self, name: str, matcher: KeywordMatcher) -> KeywordMatcher:
+        """
+        注册已编译好的匹配器，可让多个名称共用同一个匹配器
+
+        Args:
+            name: 匹配器名称
+            matcher: 匹配器
+
+        Returns:
+            传入的匹配器
+        """
+        with self._lock:
+            self._matchers[name] = matcher
+            self._versions[name] = self._versions.get(name, 0) + 1
+        return matcher
+
+    def get(self, name: str) -> Optional[KeywordMatcher]:
+        """
+        获取当前的匹配器
+
+        Args:
+            name: 匹配器名称
+        """
+        return self._matchers.get(name)
+
+    def remove(self, name: str) -> None:
+        """
+        移除匹配器
+
+        Args:
+            name: 匹配器名称
+        """
+        with self._lock:
+            self._matchers.pop(name, None)
+
+    def remove_prefix(self, prefix: str) -> int:
+        """
+        移除名称以指定前缀开头的所有匹配器
+
+        Args:
+            prefix: 名称前缀
+
+        Returns:
+            移除的数量
+        """
+        with self._lock:
+            names = [name for name in self._matchers if name.startswith(prefix)]
+            for name in names:
+                del self._matchers[name]
+        return len(names)
+
+    def version(self, name: str) -> int:
+        """匹配器被重建的次数，未注册时为0"""
+        return self._versions.get(name, 0)
+
+
+# 全局关键词匹配器注册表
+keyword_matchers = KeywordMatcherRegistry()
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+from config.settings import settings
+from utils.singleflight import llm_singleflight
+
+
+class LLMResultCache:
+    """
+    确定性LLM调用结果缓存（LRU + TTL）
+
+    仅用于路由、学科分类等低温度、输出近似确定的调用，由调用方按需开启，
+    创作类生成不应使用。缓存键由后端、模型、归一化后的消息和采样参数组成。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(
+        backend: str,
+        model: Optional[str],
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int]
+    ) -> str:
+        """
+        生成缓存键
+
+        消息内容会折叠空白字符，避免提示词缩进差异导致缓存失效。
+
+        Args:
+            backend: 后端名称（ollama/openai）
+            model: 模型名称
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大令牌数
+
+        Returns:
+            缓存键
+        """
+        normalized = [
+            [message.get('role', ''), " ".join(str(message.get('content', '')).split())]
+            for message in messages
+        ]
+        raw = json.dumps(
+            [backend, model, normalized, round(float(temperature), 3), max_tokens],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存，过期条目会被移除
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的结果，未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 调用结果
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_call(self, key: str, call: Callable[[], str]) -> str:
+        """
+        命中则返回缓存结果，否则执行调用并缓存结果
+
+        调用抛出的异常不会被缓存，直接向上传播。
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = call()
+        self.set(key, value)
+        return value
+
+    async def aget_or_call(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        """
+        get_or_call的异步版本
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = await call()
+        self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """清空缓存（计数器保留）"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中、未命中、淘汰等计数及当前条目数
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": getattr(settings, 'llm_cache_enabled', True),
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# 全局LLM结果缓存实例
+llm_result_cache = LLMResultCache(
+    max_entries=getattr(settings, 'llm_cache_max_entries', 1024),
+    ttl=getattr(settings, 'llm_cache_ttl', 600)
+)
+
+
+def dispatch_call(key: str, call: Callable[[], str], cache: bool = False) -> str:
+    """
+    执行一次非流式LLM调用：先查结果缓存（调用方开启时），未命中再经请求合并执行
+
+    Args:
+        key: 请求键，见LLMResultCache.make_key
+        call: 实际发起请求的调用
+        cache: 是否使用结果缓存
+
+    Returns:
+        调用结果
+    """
+    if getattr(settings, 'llm_coalesce_enabled', True):
+        upstream = call
+        call = lambda: llm_singleflight.do(key, upstream)
+    if cache and getattr(settings, 'llm_cache_enabled', True):
+        return llm_result_cache.get_or_call(key, call)
+    return call()
+
+
+async def adispatch_call(key: str, call: Callable[[], Awaitable[str]], cache: bool = False) -> str:
+    """
+    dispatch_call的异步版本
+    """
+    if getattr(settings, 'llm_coalesce_enabled', True):
+        upstream = call
+        call = lambda: llm_singleflight.ado(key, upstream)
+    if cache and getattr(settings, 'llm_cache_enabled', True):
+        return await llm_result_cache.aget_or_call(key, call)
+    return await call()
@@ -0,0 +1,336 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+
+class Priority(IntEnum):
+    """LLM调用的优先级，数值越小越先执行"""
+    INTERACTIVE_VOICE = 0
+    INTERACTIVE_TEXT = 1
+    BACKGROUND = 2
+
+
+class LLMOverloadedError(Exception):
+    """预计排队时间超过期限或排队超时，调用被拒绝"""
+
+
+# 当前上下文中LLM调用的优先级，由接口层或后台任务设置，客户端调用时读取
+current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "llm_priority", default=Priority.INTERACTIVE_TEXT
+)
+
+
+def priority_for_input_mode(input_mode: Optional[str]) -> Priority:
+    """
+    根据请求的输入方式确定交互请求的优先级
+
+    Args:
+        input_mode: 输入方式，voice为语音，其余按文字处理
+
+    Returns:
+        优先级
+    """
+    return Priority.INTERACTIVE_VOICE if input_mode == "voice" else Priority.INTERACTIVE_TEXT
+
+
+class _Waiter:
+    """排队中的调用"""
+
+    __slots__ = ("priority", "granted", "event", "loop", "future")
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None and self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _BackendState:
+    """单个后端的并发和排队状态"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.queue: List[Tuple[int, int, _Waiter]] = []
+        self.service_ewma: Optional[float] = None
+        self.stats = {
+            priority: {"admitted": 0, "rejected": 0, "timed_out": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in Priority
+        }
+
+
+class LLMScheduler:
+    """
+    LLM调用的准入控制和优先级调度
+
+    每个后端（ollama/openai）有独立的并发上限，超出上限的调用按优先级排队，
+    同一优先级内先到先得；空出的并发槽位直接交给队首的调用。
+    根据排在前面的调用数和平均占用时长估算排队时间，超过该优先级的期限时立即拒绝，
+    不再等到ollama_timeout才失败；实际排队超过期限同样拒绝。
+    同步和异步调用共享同一组槽位。
+    """
+
+    # 占用时长指数滑动平均的权重
+    SERVICE_ALPHA = 0.2
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, deadlines: Optional[Dict[Priority, float]] = None):
+        """
+        Args:
+            limits: 各后端的并发上限，未列出的后端不限制
+            deadlines: 各优先级的最长排队秒数
+        """
+        self.limits = limits or {}
+        self.deadlines = deadlines or {
+            Priority.INTERACTIVE_VOICE: 5,
+            Priority.INTERACTIVE_TEXT: 15,
+            Priority.BACKGROUND: 60
+        }
+        self._backends: Dict[str, _BackendState] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def priority(self, priority: Priority) -> Iterator[None]:
+        """
+        在当前上下文中设置LLM调用的优先级
+
+        Args:
+            priority: 优先级
+        """
+        token = current_priority.set(priority)
+        try:
+            yield
+        finally:
+            current_priority.reset(token)
+
+    def _state(self, backend: str) -> Optional[_BackendState]:
+        limit = self.limits.get(backend)
+        if not limit or limit <= 0:
+            return None
+        state = self._backends.get(backend)
+        if state is None:
+            state = _BackendState(limit)
+            self._backends[backend] = state
+        return state
+
+    def _estimate_wait(self, state: _BackendState, priority: Priority) -> Optional[float]:
+        """估算新调用的排队时间，尚无占用时长数据时返回None"""
+        if state.service_ewma is None:
+            return None
+        ahead = sum(1 for entry in state.queue if entry[0] <= priority) + 1
+        return math.ceil(ahead / state.limit) * state.service_ewma
+
+    def _enqueue(
+        self,
+        backend: str,
+        priority: Priority,
+        deadline: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Tuple[Optional[_BackendState], Optional[_Waiter]]:
+        """
+        尝试立即占用槽位，否则加入队列；预计排队超过期限时拒绝
+
+        loop不为空时排队对象以该事件循环的future通知，否则以线程事件通知。
+
+        Returns:
+            (后端状态, 排队对象)；不限制的后端返回(None, None)，立即占用时排队对象为None
+        """
+        with self._lock:
+            state = self._state(backend)
+            if state is None:
+                return None, None
+            if state.in_flight < state.limit and not state.queue:
+                state.in_flight += 1
+                state.stats[priority]["admitted"] += 1
+                return state, None
+            estimate = self._estimate_wait(state, priority)
+            if estimate is not None and estimate > deadline:
+                state.stats[priority]["rejected"] += 1
+                raise LLMOverloadedError(
+                    f"LLM服务繁忙：{backend}预计排队{estimate:.1f}秒，超过{deadline:.1f}秒的期限"
+                )
+            waiter = _Waiter(priority)
+            if loop is not None:
+                waiter.loop = loop
+                waiter.future = loop.create_future()
+            else:
+                waiter.event = threading.Event()
+            heapq.heappush(state.queue, (int(priority), next(self._seq), waiter))
+            return state, waiter
+
+    def _admitted(self, state: _BackendState, waiter: _Waiter, waited: float) -> None:
+        with self._lock:
+            stats = state.stats[waiter.priority]
+            stats["admitted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def _abandon(self, backend: str, state: _BackendState, waiter: _Waiter, timed_out: bool) -> None:
+        """放弃排队；若槽位恰好已分配给该调用，则转交给下一个调用"""
+        with self._lock:
+            if waiter.granted:
+                self._hand_over(state)
+                return
+            state.queue = [entry for entry in state.queue if entry[2] is not waiter]
+            heapq.heapify(state.queue)
+            if timed_out:
+                state.stats[waiter.priority]["timed_out"] += 1
+
+    def _hand_over(self, state: _BackendState) -> None:
+        """把空出的槽位交给队首的调用，队列为空时归还槽位（需持有锁）"""
+        if state.queue:
+            _, _, waiter = heapq.heappop(state.queue)
+            waiter.granted = True
+            waiter.wake()
+        else:
+            state.in_flight -= 1
+
+    def _release(self, state: _BackendState, held: float) -> None:
+        with self._lock:
+            if state.service_ewma is None:
+                state.service_ewma = held
+            else:
+                state.service_ewma += self.SERVICE_ALPHA * (held - state.service_ewma)
+            self._hand_over(state)
+
+    def _resolve(self, priority: Optional[Priority], deadline: Optional[float]) -> Tuple[Priority, float]:
+        priority = current_priority.get() if priority is None else priority
+        return priority, self.deadlines.get(priority, 60) if deadline is None else deadline
+
+    @contextmanager
+    def slot(
+        self,
+        backend: str,
+        priority: Optional[Priority] = None,
+        deadline: Optional[float] = None
+    ) -> Iterator[None]:
+        """
+        占用一个并发槽位执行同步调用
+
+        Args:
+            backend: 后端名称
+            priority: 优先级，为空时使用当前上下文的优先级
+            deadline: 最长排队秒数，为空时使用该优先级的默认期限
+
+        Raises:
+            LLMOverloadedError: 预计或实际排队时间超过期限
+        """
+        priority, deadline = self._resolve(priority, deadline)
+        state, waiter = self._enqueue(backend, priority, deadline)
+        if state is None:
+            yield
+            return
+        if waiter is not None:
+            start = time.monotonic()
+            if not waiter.event.wait(deadline):
+                self._abandon(backend, state, waiter, timed_out=True)
+                raise LLMOverloadedError(f"LLM服务繁忙：{backend}排队超过{deadline:.1f}秒")
+            self._admitted(state, waiter, time.monotonic() - start)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(state, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aslot(
+        self,
+        backend: str,
+        priority: Optional[Priority] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        占用一个并发槽位执行异步调用，排队时不阻塞事件循环，参数同slot
+        """
+        priority, deadline = self._resolve(priority, deadline)
+        state, waiter = self._enqueue(backend, priority, deadline, loop=asyncio.get_running_loop())
+        if state is None:
+            yield
+            return
+        if waiter is not None:
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), deadline)
+            except asyncio.TimeoutError:
+                self._abandon(backend, state, waiter, timed_out=True)
+                raise LLMOverloadedError(f"LLM服务繁忙：{backend}排队超过{deadline:.1f}秒")
+            except asyncio.CancelledError:
+                self._abandon(backend, state, waiter, timed_out=False)
+                raise
+            self._admitted(state, waiter, time.monotonic() - start)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(state, time.monotonic() - start)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取调度统计信息
+
+        Returns:
+            各后端的并发上限、执行中数量、各优先级排队数、准入/拒绝/超时次数和排队时间
+        """
+        with self._lock:
+            backends = {}
+            for backend, state in self._backends.items():
+                queued = {priority.name.lower(): 0 for priority in Priority}
+                for entry in state.queue:
+                    queued[Priority(entry[0]).name.lower()] += 1
+                priorities = {}
+                for priority, stats in state.stats.items():
+                    waited = stats["admitted"]
+                    priorities[priority.name.lower()] = {
+                        "admitted": stats["admitted"],
+                        "rejected": stats["rejected"],
+                        "timed_out": stats["timed_out"],
+                        "avg_wait_ms": round(stats["wait_total"] / waited * 1000, 1) if waited else 0.0,
+                        "max_wait_ms": round(stats["wait_max"] * 1000, 1)
+                    }
+                backends[backend] = {
+                    "limit": state.limit,
+                    "in_flight": state.in_flight,
+                    "queued": queued,
+                    "avg_service_ms": round(state.service_ewma * 1000, 1) if state.service_ewma is not None else None,
+                    "priorities": priorities
+                }
+            return {
+                "enabled": getattr(settings, 'llm_scheduler_enabled', True),
+                "deadlines": {priority.name.lower(): value for priority, value in self.deadlines.items()},
+                "backends": backends
+            }
+
+
+# 全局LLM调度实例；关闭时不设置并发上限，所有调用直接执行
+llm_scheduler = LLMScheduler(
+    limits={
+        "ollama": getattr(settings, 'llm_max_concurrency_ollama', 4),
+        "openai": getattr(settings, 'llm_max_concurrency_openai', 16)
+    } if getattr(settings, 'llm_scheduler_enabled', True) else {},
+    deadlines={
+        Priority.INTERACTIVE_VOICE: getattr(settings, 'llm_queue_deadline_voice', 5),
+        Priority.INTERACTIVE_TEXT: getattr(settings, 'llm_queue_deadline_text', 15),
+        Priority.BACKGROUND: getattr(settings, 'llm_queue_deadline_background', 60)
+    }
+)
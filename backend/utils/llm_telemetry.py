@@ -0,0 +1,314 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+
+# 当前上下文中LLM调用的调用点（router/safety/edu/emotion/summary等），由各代理设置
+current_call_site: contextvars.ContextVar[str] = contextvars.ContextVar("llm_call_site", default="other")
+
+
+@contextmanager
+def llm_call_site(name: str) -> Iterator[None]:
+    """
+    在当前上下文中标记LLM调用的调用点
+
+    Args:
+        name: 调用点名称
+    """
+    token = current_call_site.set(name)
+    try:
+        yield
+    finally:
+        current_call_site.reset(token)
+
+
+class Histogram:
+    """固定分桶的直方图，桶边界为上界（含）"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        累计分桶计数
+
+        Returns:
+            [(上界, 小于等于该上界的样本数)]，最后一项为+Inf
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.bounds + [None], self.counts):
+            total += count
+            result.append(("+Inf" if bound is None else f"{bound:g}", total))
+        return result
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """按分桶估算分位数，取所在桶的上界（不超过最大值）"""
+        if not self.count:
+            return None
+        target = percentile * self.count
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            if total >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": dict(self.cumulative())
+        }
+
+
+_MS_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 60000]
+_TOKEN_BUCKETS = [8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+_RATE_BUCKETS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 200]
+
+
+class _Series:
+    """单个(调用点, 后端, 模型)的统计"""
+
+    METRICS = {
+        "latency_ms": _MS_BUCKETS,
+        "queue_ms": _MS_BUCKETS,
+        "ttft_ms": _MS_BUCKETS,
+        "prefill_ms": _MS_BUCKETS,
+        "decode_ms": _MS_BUCKETS,
+        "load_ms": _MS_BUCKETS,
+        "prompt_tokens": _TOKEN_BUCKETS,
+        "output_tokens": _TOKEN_BUCKETS,
+        "tokens_per_second": _RATE_BUCKETS
+    }
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.model_loads = 0
+        self.histograms = {name: Histogram(bounds) for name, bounds in self.METRICS.items()}
+
+
+class LLMTelemetry:
+    """
+    LLM调用遥测
+
+    按(调用点, 后端, 模型)记录每次调用的服务耗时、调度排队时间、首字延迟，
+    以及Ollama响应中的prompt_eval_count/eval_count和prefill、decode、模型加载耗时，
+    以直方图形式汇总，用于查看哪个代理的提示最占用推理容量、模型何时被换入换出。
+    """
+
+    def __init__(self, enabled: bool = True, load_threshold_ms: float = 500, max_load_events: int = 100):
+        """
+        Args:
+            enabled: 是否记录
+            load_threshold_ms: 模型加载耗时超过该值时记为一次模型换入
+            max_load_events: 保留的最近模型换入事件数
+        """
+        self.enabled = enabled
+        self.load_threshold_ms = load_threshold_ms
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self._load_events: Deque[Dict[str, Any]] = deque(maxlen=max_load_events)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        backend: str,
+        model: Optional[str],
+        latency: Optional[float] = None,
+        queue_time: Optional[float] = None,
+        ttft: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        prefill: Optional[float] = None,
+        decode: Optional[float] = None,
+        load: Optional[float] = None,
+        error: bool = False,
+        call_site: Optional[str] = None
+    ) -> None:
+        """
+        记录一次LLM调用，时间参数单位为秒，缺失的指标不记录
+
+        Args:
+            backend: 后端名称（ollama/openai）
+            model: 模型名称
+            latency: 获得并发槽位后到调用结束的耗时
+            queue_time: 在调度器中排队的时间
+            ttft: 流式调用获得槽位后到首个令牌的时间
+            prompt_tokens: 输入令牌数
+            output_tokens: 输出令牌数
+            prefill: 提示处理耗时
+            decode: 生成耗时
+            load: 模型加载耗时
+            error: 调用是否失败
+            call_site: 调用点，为空时使用当前上下文的调用点
+        """
+        if not self.enabled:
+            return
+        site = call_site or current_call_site.get()
+        key = (site, backend, model or "")
+        observations = {
+            "latency_ms": latency * 1000 if latency is not None else None,
+            "queue_ms": queue_time * 1000 if queue_time is not None else None,
+            "ttft_ms": ttft * 1000 if ttft is not None else None,
+            "prefill_ms": prefill * 1000 if prefill is not None else None,
+            "decode_ms": decode * 1000 if decode is not None else None,
+            "load_ms": load * 1000 if load is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "tokens_per_second": output_tokens / decode if output_tokens and decode else None
+        }
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = _Series()
+                self._series[key] = series
+            series.calls += 1
+            if error:
+                series.errors += 1
+            for name, value in observations.items():
+                if value is not None:
+                    series.histograms[name].observe(value)
+            load_ms = observations["load_ms"]
+            if load_ms is not None and load_ms >= self.load_threshold_ms:
+                series.model_loads += 1
+                self._load_events.append({
+                    "time": time.time(),
+                    "call_site": site,
+                    "backend": backend,
+                    "model": model,
+                    "load_ms": round(load_ms, 1)
+                })
+
+    def record_ollama(
+        self,
+        model: Optional[str],
+        response: Dict[str, Any],
+        latency: float,
+        queue_time: Optional[float] = None,
+        ttft: Optional[float] = None
+    ) -> None:
+        """
+        从Ollama响应（或流式最后一个分块）的计时字段记录一次调用
+
+        Args:
+            model: 请求的模型名称
+            response: 含eval_count、eval_duration、prompt_eval_count、
+                prompt_eval_duration、load_duration（纳秒）的响应
+            latency: 获得并发槽位后到调用结束的耗时（秒）
+            queue_time: 排队时间（秒）
+            ttft: 首个令牌时间（秒）
+        """
+        def seconds(field: str) -> Optional[float]:
+            value = response.get(field)
+            return value / 1e9 if isinstance(value, (int, float)) else None
+
+        self.record(
+            "ollama",
+            response.get("model") or model,
+            latency=latency,
+            queue_time=queue_time,
+            ttft=ttft,
+            prompt_tokens=response.get("prompt_eval_count"),
+            output_tokens=response.get("eval_count"),
+            prefill=seconds("prompt_eval_duration"),
+            decode=seconds("eval_duration"),
+            load=seconds("load_duration")
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取遥测汇总
+
+        Returns:
+            各(调用点, 后端, 模型)的调用数、失败数、模型换入次数和各指标直方图，
+            按调用点汇总的总输出令牌数和总服务耗时，以及最近的模型换入事件
+        """
+        with self._lock:
+            series = []
+            sites: Dict[str, Dict[str, float]] = {}
+            for (site, backend, model), item in sorted(self._series.items()):
+                series.append({
+                    "call_site": site,
+                    "backend": backend,
+                    "model": model,
+                    "calls": item.calls,
+                    "errors": item.errors,
+                    "model_loads": item.model_loads,
+                    "histograms": {name: hist.to_dict() for name, hist in item.histograms.items()}
+                })
+                totals = sites.setdefault(site, {"calls": 0, "output_tokens": 0, "busy_ms": 0.0})
+                totals["calls"] += item.calls
+                totals["output_tokens"] += item.histograms["output_tokens"].sum
+                totals["busy_ms"] = round(totals["busy_ms"] + item.histograms["latency_ms"].sum, 1)
+            return {
+                "enabled": self.enabled,
+                "sites": sites,
+                "series": series,
+                "model_load_events": list(self._load_events)
+            }
+
+    def export_prometheus(self) -> str:
+        """
+        以Prometheus文本格式导出直方图和计数
+
+        Returns:
+            指标文本
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+            for counter in ("calls", "errors", "model_loads"):
+                name = f"llm_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                for (site, backend, model), item in items:
+                    labels = f'call_site="{site}",backend="{backend}",model="{model}"'
+                    lines.append(f"{name}{{{labels}}} {getattr(item, counter)}")
+            for metric in _Series.METRICS:
+                name = f"llm_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for (site, backend, model), item in items:
+                    hist = item.histograms[metric]
+                    if not hist.count:
+                        continue
+                    labels = f'call_site="{site}",backend="{backend}",model="{model}"'
+                    for bound, count in hist.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{labels}}} {hist.sum:g}")
+                    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空已记录的数据"""
+        with self._lock:
+            self._series.clear()
+            self._load_events.clear()
+
+
+# 全局LLM遥测实例
+llm_telemetry = LLMTelemetry(
+    enabled=getattr(settings, 'llm_telemetry_enabled', True),
+    load_threshold_ms=getattr(settings, 'llm_model_load_threshold_ms', 500)
+)
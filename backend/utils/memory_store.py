@@ -0,0 +1,336 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+from config.settings import settings
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    """估算一条对话记录占用的内存（按JSON序列化后的UTF-8字节数计）"""
+    return len(json.dumps(entry, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+class _UserMemory:
+    """单个用户的对话环形缓冲区"""
+
+    __slots__ = ("entries", "bytes", "last_id", "checked_at")
+
+    def __init__(self, capacity: int):
+        self.entries: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=capacity)
+        self.bytes = 0
+        # 数据库中该用户最新一条记录的ID，用于发现其他进程的写入
+        self.last_id: Optional[int] = None
+        # 上次与数据库核对last_id的时间
+        self.checked_at = time.monotonic()
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        size = _entry_size(entry)
+        if len(self.entries) == self.entries.maxlen:
+            self.bytes -= self.entries[0][0]
+        self.entries.append((size, entry))
+        self.bytes += size
+
+
+class UserMemoryStore:
+    """
+    按用户隔离的对话记忆存储
+
+    每个用户一个固定容量的环形缓冲区，超出容量时丢弃最旧的记录。所有用户的记录总字节数
+    超过上限时，按最久未访问的顺序淘汰整个用户的缓冲区。开启持久化时每次写入同步写入
+    user_memories表（只保留每个用户最近capacity条），淘汰或重启后再访问时从数据库载入。
+    写入时顺带核对该用户在数据库中的上一条记录，读取时距上次核对超过recheck_seconds才比对
+    最新记录的ID，其他工作进程写入或清空后最多延迟recheck_seconds读到一致的结果。
+
+    数据库读写只持有该用户所在分段的锁，全局锁只保护内存中的缓冲区和字节数统计，
+    一个用户的数据库操作不会阻塞其他用户。
+    """
+
+    # 按用户ID散列的锁分段数
+    LOCK_STRIPES = 64
+
+    def __init__(
+        self,
+        capacity: int = 50,
+        max_total_bytes: int = 32 * 1024 * 1024,
+        persistent: bool = False,
+        session_factory: Optional[Callable[[], Any]] = None,
+        recheck_seconds: float = 1.0
+    ):
+        """
+        Args:
+            capacity: 每个用户保留的最近对话条数
+            max_total_bytes: 所有用户记录的总字节数上限
+            persistent: 是否写入数据库
+            session_factory: 数据库会话工厂，为空时使用db.database.SessionLocal
+            recheck_seconds: 读取时与数据库核对的最短间隔（秒），为0时每次读取都核对
+        """
+        self.capacity = capacity
+        self.max_total_bytes = max_total_bytes
+        self.persistent = persistent
+        self.session_factory = session_factory
+        self.recheck_seconds = recheck_seconds
+        self._users: "OrderedDict[str, _UserMemory]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._user_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self.evicted_users = 0
+        self.loads = 0
+        self.db_errors = 0
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from db.database import SessionLocal
+        return SessionLocal()
+
+    def _user_lock(self, user_key: str) -> threading.Lock:
+        """该用户所在分段的锁，同一用户的操作依次进行"""
+        return self._user_locks[hash(user_key) % self.LOCK_STRIPES]
+
+    def _db_error(self, action: str, error: Exception) -> None:
+        with self._lock:
+            self.db_errors += 1
+        print(f"{action}对话记忆失败: {error}")
+
+    def _latest_id(self, user_key: str) -> Optional[int]:
+        """查询数据库中该用户最新记录的ID"""
+        from sqlalchemy import func
+        from models.user import UserMemory
+
+        db = self._session()
+        try:
+            return db.query(func.max(UserMemory.id)).filter(UserMemory.user_id == user_key).scalar()
+        finally:
+            db.close()
+
+    def _load(self, user_key: str) -> _UserMemory:
+        """从数据库载入该用户最近capacity条记录"""
+        from models.user import UserMemory
+
+        memory = _UserMemory(self.capacity)
+        db = self._session()
+        try:
+            rows = (
+                db.query(UserMemory).filter(UserMemory.user_id == user_key)
+                .order_by(UserMemory.id.desc()).limit(self.capacity).all()
+            )
+        finally:
+            db.close()
+        for row in reversed(rows):
+            memory.append(row.entry)
+        memory.last_id = rows[0].id if rows else None
+        return memory
+
+    def _replace(self, user_key: str, memory: _UserMemory) -> None:
+        """放入用户的缓冲区并标记为最近使用（需持有全局锁）"""
+        previous = self._users.pop(user_key, None)
+        if previous is not None:
+            self._total_bytes -= previous.bytes
+        self._users[user_key] = memory
+        self._total_bytes += memory.bytes
+
+    def _reload(self, user_key: str) -> _UserMemory:
+        """从数据库重新载入用户的缓冲区（需持有该用户的锁）"""
+        memory = self._load(user_key)
+        with self._lock:
+            self._replace(user_key, memory)
+            self.loads += 1
+        return memory
+
+    def _get_memory(self, user_key: str, create: bool = True) -> Optional[_UserMemory]:
+        """
+        取得用户的缓冲区并标记为最近使用（需持有该用户的锁）
+
+        持久化时不在内存中的用户从数据库载入；距上次核对超过recheck_seconds时比对数据库中
+        最新记录的ID，发现其他进程的改动则重新载入。数据库查询不持有全局锁。
+        """
+        with self._lock:
+            memory = self._users.get(user_key)
+            if memory is not None:
+                self._users.move_to_end(user_key)
+        if self.persistent:
+            try:
+                if memory is None:
+                    memory = self._reload(user_key)
+                elif time.monotonic() - memory.checked_at >= self.recheck_seconds:
+                    if memory.last_id != self._latest_id(user_key):
+                        memory = self._reload(user_key)
+                    else:
+                        memory.checked_at = time.monotonic()
+            except Exception as e:
+                self._db_error("读取", e)
+        if memory is None:
+            if not create:
+                return None
+            memory = _UserMemory(self.capacity)
+            with self._lock:
+                self._replace(user_key, memory)
+        return memory
+
+    def _enforce_limit(self, keep: str) -> None:
+        """总字节数超过上限时淘汰最久未访问的用户，当前用户保留"""
+        while self._total_bytes > self.max_total_bytes and len(self._users) > 1:
+            user_key, memory = next(iter(self._users.items()))
+            if user_key == keep:
+                self._users.move_to_end(user_key)
+                continue
+            del self._users[user_key]
+            self._total_bytes -= memory.bytes
+            self.evicted_users += 1
+
+    def append(self, user_id: Union[int, str], entry: Dict[str, Any]) -> None:
+        """
+        追加一条对话记录
+
+        Args:
+            user_id: 用户ID
+            entry: 对话记录
+        """
+        user_key = str(user_id)
+        with self._user_lock(user_key):
+            memory = self._get_memory(user_key)
+            expected_id = memory.last_id
+            with self._lock:
+                before = memory.bytes
+                memory.append(entry)
+                if self._users.get(user_key) is memory:
+                    self._total_bytes += memory.bytes - before
+                else:
+                    # 载入后被其他用户的写入淘汰，重新放入
+                    self._replace(user_key, memory)
+                self._enforce_limit(user_key)
+            if not self.persistent:
+                return
+            try:
+                previous_id, memory.last_id = self._persist(user_key, entry)
+                memory.checked_at = time.monotonic()
+                # 上一条记录不是本进程知道的最新记录，说明其他进程有改动
+                if previous_id != expected_id:
+                    self._reload(user_key)
+            except Exception as e:
+                self._db_error("保存", e)
+
+    def _persist(self, user_key: str, entry: Dict[str, Any]) -> Tuple[Optional[int], int]:
+        """
+        写入一条记录并删除超出容量的旧记录
+
+        Returns:
+            (写入前该用户最新记录的ID, 新记录的ID)
+        """
+        from sqlalchemy import func
+        from models.user import UserMemory
+
+        db = self._session()
+        try:
+            previous_id = db.query(func.max(UserMemory.id)).filter(UserMemory.user_id == user_key).scalar()
+            row = UserMemory(user_id=user_key, entry=json.loads(json.dumps(entry, ensure_ascii=False, default=str)))
+            db.add(row)
+            db.flush()
+            oldest_kept = (
+                db.query(UserMemory.id).filter(UserMemory.user_id == user_key)
+                .order_by(UserMemory.id.desc()).offset(self.capacity - 1).limit(1).scalar()
+            )
+            if oldest_kept is not None:
+                db.query(UserMemory).filter(
+                    UserMemory.user_id == user_key, UserMemory.id < oldest_kept
+                ).delete(synchronize_session=False)
+            db.commit()
+            return previous_id, row.id
+        finally:
+            db.close()
+
+    def get(self, user_id: Union[int, str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取用户最近的对话记录
+
+        Args:
+            user_id: 用户ID
+            limit: 最多返回的条数，为空时返回全部
+
+        Returns:
+            按时间先后排列的对话记录
+        """
+        user_key = str(user_id)
+        with self._user_lock(user_key):
+            memory = self._get_memory(user_key, create=False)
+            if memory is None:
+                return []
+            with self._lock:
+                entries = [entry for _, entry in memory.entries]
+        if limit is not None:
+            return entries[-limit:] if limit > 0 else []
+        return entries
+
+    def count(self, user_id: Union[int, str]) -> int:
+        """获取用户当前保留的对话条数"""
+        user_key = str(user_id)
+        with self._user_lock(user_key):
+            memory = self._get_memory(user_key, create=False)
+            return len(memory.entries) if memory is not None else 0
+
+    def clear(self, user_id: Union[int, str]) -> None:
+        """
+        清空一个用户的对话记录，其他用户不受影响
+
+        Args:
+            user_id: 用户ID
+        """
+        user_key = str(user_id)
+        with self._user_lock(user_key):
+            with self._lock:
+                memory = self._users.pop(user_key, None)
+                if memory is not None:
+                    self._total_bytes -= memory.bytes
+            if self.persistent:
+                try:
+                    from models.user import UserMemory
+
+                    db = self._session()
+                    try:
+                        db.query(UserMemory).filter(UserMemory.user_id == user_key).delete(synchronize_session=False)
+                        db.commit()
+                    finally:
+                        db.close()
+                except Exception as e:
+                    self._db_error("清空", e)
+
+    def get_stats(self, top: int = 20) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Args:
+            top: 列出占用内存最多的用户数
+
+        Returns:
+            常驻用户数、总条数、总字节数及上限、每个用户的平均占用和占用最多的用户
+        """
+        with self._lock:
+            users = {
+                user_key: {"entries": len(memory.entries), "bytes": memory.bytes}
+                for user_key, memory in self._users.items()
+            }
+            total_bytes = self._total_bytes
+        largest = sorted(users.items(), key=lambda item: item[1]["bytes"], reverse=True)[:top]
+        return {
+            "persistent": self.persistent,
+            "capacity": self.capacity,
+            "active_users": len(users),
+            "total_entries": sum(user["entries"] for user in users.values()),
+            "total_bytes": total_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "avg_bytes_per_user": round(total_bytes / len(users), 1) if users else 0.0,
+            "largest_users": dict(largest),
+            "evicted_users": self.evicted_users,
+            "loads": self.loads,
+            "db_errors": self.db_errors
+        }
+
+
+# 全局对话记忆存储，服务进程内的MemoryAgent共用
+user_memory_store = UserMemoryStore(
+    capacity=getattr(settings, 'memory_store_capacity', 50),
+    max_total_bytes=getattr(settings, 'memory_store_max_bytes', 32 * 1024 * 1024),
+    persistent=getattr(settings, 'memory_store_persistent', True),
+    recheck_seconds=getattr(settings, 'memory_store_recheck_seconds', 1.0)
+)
@@ -1,8 +1,103 @@
-import requests
+import httpx
+import hashlib
 import json
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Callable, Tuple
 from config.settings import settings
+from utils.http_pool import HTTPClientPool
+from utils.llm_cache import llm_result_cache, dispatch_call, adispatch_call
+from utils.ollama_pool import OllamaHostPool
+from utils.llm_scheduler import llm_scheduler
+from utils.llm_telemetry import llm_telemetry
+
+
+# 经调度器排队并记录遥测的生成接口；拉取、创建、查询模型等管理请求不占用生成并发
+GENERATION_ENDPOINTS = ('/api/generate', '/api/chat')
+
+
+class OllamaSessionStore:
+    """
+    按会话保存Ollama上下文，用于跨轮复用KV缓存
+
+    会话键由会话ID、模型和系统提示摘要组成，不同agent的系统提示互不混用。
+    chat模式保存最近的对话轮次，generate模式保存Ollama返回的context。
+    """
+
+    def __init__(self, max_sessions: int = 256, max_turns: int = 6, max_context_tokens: int = 1536):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_context_tokens = max_context_tokens
+        self._sessions: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(session_id: Any, model: str, messages: List[Dict[str, str]]) -> Tuple[str, str, str]:
+        """
+        生成会话键
+        """
+        system_text = "\n".join(m.get('content', '') for m in messages if m.get('role') == 'system')
+        return str(session_id), model, hashlib.sha1(system_text.encode('utf-8')).hexdigest()
+
+    def _entry(self, key: Tuple[str, str, str]) -> Dict[str, Any]:
+        entry = self._sessions.get(key)
+        if entry is None:
+            entry = {'history': [], 'context': None}
+            self._sessions[key] = entry
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def affinity_key(key: Optional[Tuple[str, str, str]]) -> Optional[str]:
+        """
+        会话对应的节点亲和键，多节点部署时同一会话尽量落在保存其KV缓存的节点上
+        """
+        return "|".join(key) if key is not None else None
+
+    def get_history(self, key: Tuple[str, str, str]) -> List[Dict[str, str]]:
+        """获取会话之前的对话轮次（chat模式）"""
+        with self._lock:
+            entry = self._sessions.get(key)
+            return list(entry['history']) if entry else []
+
+    def append_turn(self, key: Tuple[str, str, str], turn_messages: List[Dict[str, str]], reply: str) -> None:
+        """
+        追加一轮对话（chat模式）
+
+        超过轮数上限时一次丢弃较早的一半轮次，而不是每轮滑动一条，
+        这样相邻多轮之间的前缀保持不变，Ollama的提示缓存仍能命中。
+        """
+        with self._lock:
+            history = self._entry(key)['history']
+            history.extend(turn_messages)
+            history.append({'role': 'assistant', 'content': reply})
+            turns = [i for i, m in enumerate(history) if m.get('role') == 'assistant']
+            if len(turns) > self.max_turns:
+                cut = turns[len(turns) // 2 - 1] + 1
+                del history[:cut]
+
+    def get_context(self, key: Tuple[str, str, str]) -> Optional[List[int]]:
+        """获取上一轮返回的context（generate模式）"""
+        with self._lock:
+            entry = self._sessions.get(key)
+            return entry['context'] if entry else None
+
+    def set_context(self, key: Tuple[str, str, str], context: List[int]) -> None:
+        """保存context，超出上下文预算时丢弃，下一轮重新开始"""
+        with self._lock:
+            self._entry(key)['context'] = context if len(context) <= self.max_context_tokens else None
+
+    def clear(self, session_id: Any = None) -> None:
+        """清除指定会话或全部会话的上下文"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                return
+            for key in [k for k in self._sessions if k[0] == str(session_id)]:
+                del self._sessions[key]
 
 
 class OllamaClient:
@@ -24,11 +119,42 @@ class OllamaClient:
             
         # 初始化Ollama客户端配置
         self.base_url = getattr(settings, 'ollama_base_url', 'http://localhost:11434')
+        # 多节点配置，未配置时只使用ollama_base_url
+        hosts = [url.strip() for url in getattr(settings, 'ollama_hosts', '').split(',') if url.strip()]
+        self.hosts = hosts or [self.base_url]
+        self.base_url = self.hosts[0]
         self.default_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
         self.timeout = getattr(settings, 'ollama_timeout', 60)
+        # 接口模式：chat使用/api/chat，generate使用手工拼接模板的/api/generate
+        self.api_mode = getattr(settings, 'ollama_api_mode', 'chat')
+        # 模型常驻时长，避免模型被卸载导致KV缓存失效
+        self.keep_alive = getattr(settings, 'ollama_keep_alive', '30m')
+        # 共享的keep-alive连接池，同步和异步调用分别复用各自的客户端
+        self.pool = HTTPClientPool(timeout=self.timeout)
+        # 节点负载均衡和健康探测
+        self.host_pool = OllamaHostPool(
+            self.hosts,
+            probe=self._probe_host,
+            health_check_interval=getattr(settings, 'ollama_health_check_interval', 15),
+            max_failures=getattr(settings, 'ollama_host_max_failures', 2)
+        )
+        # 按会话复用的上下文；预留四分之一窗口给新一轮的输入和输出
+        self.sessions = OllamaSessionStore(
+            max_sessions=getattr(settings, 'ollama_session_max', 256),
+            max_turns=getattr(settings, 'ollama_session_max_turns', 6),
+            max_context_tokens=getattr(settings, 'ollama_num_ctx', 2048) * 3 // 4
+        )
         self._initialized = True
     
-    def _make_request(self, endpoint: str, method: str = 'GET', data: Optional[Dict] = None) -> Dict[str, Any]:
+    def _make_request(
+        self,
+        endpoint: str,
+        method: str = 'GET',
+        data: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        base_url: Optional[str] = None,
+        affinity: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         发送HTTP请求到Ollama API
         
@@ -36,63 +162,149 @@ class OllamaClient:
             endpoint: API端点
             method: HTTP方法
             data: 请求数据
+            timeout: 本次调用的超时秒数，为空时使用默认超时
+            base_url: 指定节点地址，为空时由负载均衡选择节点
+            affinity: 会话亲和键，相同键尽量落在同一节点
             
         Returns:
             响应数据
         """
-        url = f"{self.base_url}{endpoint}"
-        headers = {'Content-Type': 'application/json'}
+        if base_url is None:
+            model = (data or {}).get('model')
+            # 查询、模型管理等非生成请求直接执行
+            if endpoint not in GENERATION_ENDPOINTS:
+                with self.host_pool.lease(model, affinity) as host:
+                    return self._make_request(endpoint, method, data, timeout, base_url=host.url)
+            # 生成类请求经调度器排队，并记录排队时间和响应中的计时字段
+            start = time.monotonic()
+            try:
+                with llm_scheduler.slot('ollama'), self.host_pool.lease(model, affinity) as host:
+                    admitted = time.monotonic()
+                    response = self._make_request(endpoint, method, data, timeout, base_url=host.url)
+            except Exception:
+                llm_telemetry.record('ollama', model, error=True)
+                raise
+            llm_telemetry.record_ollama(model, response, time.monotonic() - admitted, admitted - start)
+            return response
+        url = f"{base_url}{endpoint}"
         
         try:
             if method == 'GET':
-                response = requests.get(url, timeout=self.timeout)
+                response = self.pool.client.get(url, timeout=self.pool.timeout(timeout))
             elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=self.timeout)
+                response = self.pool.client.post(url, json=data, timeout=self.pool.timeout(timeout))
             else:
                 raise ValueError(f"不支持的HTTP方法: {method}")
             
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Ollama API请求失败: {str(e)}")
     
-    def check_service(self) -> bool:
+    async def _amake_request(
+        self,
+        endpoint: str,
+        method: str = 'GET',
+        data: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        base_url: Optional[str] = None,
+        affinity: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        异步发送HTTP请求到Ollama API，参数同_make_request
+        """
+        if base_url is None:
+            model = (data or {}).get('model')
+            if endpoint not in GENERATION_ENDPOINTS:
+                with self.host_pool.lease(model, affinity) as host:
+                    return await self._amake_request(endpoint, method, data, timeout, base_url=host.url)
+            start = time.monotonic()
+            try:
+                async with llm_scheduler.aslot('ollama'):
+                    with self.host_pool.lease(model, affinity) as host:
+                        admitted = time.monotonic()
+                        response = await self._amake_request(endpoint, method, data, timeout, base_url=host.url)
+            except Exception:
+                llm_telemetry.record('ollama', model, error=True)
+                raise
+            llm_telemetry.record_ollama(model, response, time.monotonic() - admitted, admitted - start)
+            return response
+        url = f"{base_url}{endpoint}"
+        
+        try:
+            client = self.pool.async_client
+            if method == 'GET':
+                response = await client.get(url, timeout=self.pool.timeout(timeout))
+            elif method == 'POST':
+                response = await client.post(url, json=data, timeout=self.pool.timeout(timeout))
+            else:
+                raise ValueError(f"不支持的HTTP方法: {method}")
+            
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API请求失败: {str(e)}")
+    
+    def check_service(self, base_url: Optional[str] = None) -> bool:
         """
         检查Ollama服务是否运行
         
+        Args:
+            base_url: 指定检查的节点，为空时由负载均衡选择
+            
         Returns:
             服务是否可用
         """
         try:
-            response = self._make_request('/api/tags')
+            response = self._make_request('/api/tags', base_url=base_url)
             return 'models' in response
         except Exception:
             return False
     
-    def list_models(self) -> List[str]:
+    def list_models(self, base_url: Optional[str] = None) -> List[str]:
         """
         获取可用的模型列表
         
+        Args:
+            base_url: 指定查询的节点，为空时由负载均衡选择
+            
         Returns:
             模型名称列表
         """
         try:
-            response = self._make_request('/api/tags')
+            response = self._make_request('/api/tags', base_url=base_url)
             models = response.get('models', [])
             return [model.get('name', '') for model in models]
         except Exception as e:
             return []
     
-    def chat_completion(
+    def _probe_host(self, base_url: str) -> Tuple[bool, List[str]]:
+        """
+        探测单个节点，供负载均衡的后台健康检查使用
+        
+        Returns:
+            (是否健康, 节点上的模型列表)
+        """
+        if not self.check_service(base_url):
+            return False, []
+        return True, self.list_models(base_url)
+    
+    def get_host_stats(self) -> Dict[str, Any]:
+        """
+        获取各节点的健康状态、延迟和队列深度
+        """
+        return self.host_pool.get_stats()
+    
+    def _build_generate_request(
         self,
         messages: List[Dict[str, str]],
-        model: str = None,
+        model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         stream: bool = False
-    ) -> str:
+    ) -> Dict[str, Any]:
         """
-        调用Ollama聊天接口
+        将消息列表转换为/api/generate的请求数据
         
         Args:
             messages: 消息列表
@@ -102,7 +314,7 @@ class OllamaClient:
             stream: 是否流式输出
             
         Returns:
-            模型回复内容
+            请求数据
         """
         if model is None:
             model = self.default_model
@@ -135,49 +347,435 @@ class OllamaClient:
             'model': model,
             'prompt': prompt,
             'stream': stream,
-            'options': {
-                'temperature': temperature
-            }
+            'options': self._build_options(temperature, max_tokens),
+            'keep_alive': self.keep_alive
         }
         
+        return data
+    
+    def _build_options(self, temperature: float, max_tokens: Optional[int]) -> Dict[str, Any]:
+        """
+        构建采样参数
+        """
+        options = {
+            'temperature': temperature
+        }
         if max_tokens:
-            data['options']['num_predict'] = max_tokens
+            options['num_predict'] = max_tokens
+        return options
+    
+    def _prepare_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        session_id: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any], Optional[Tuple[str, str, str]]]:
+        """
+        根据接口模式构建请求
+        
+        chat模式直接发送消息列表到/api/chat，由模型自带模板拼接，系统提示在前形成稳定前缀；
+        提供session_id时会带上该会话之前的轮次，Ollama的提示缓存只需计算新增部分。
+        generate模式提供session_id时复用上一轮返回的context，只发送最新的用户消息。
+        
+        Returns:
+            (端点, 请求数据, 会话键)
+        """
+        if model is None:
+            model = self.default_model
+        session_key = self.sessions.make_key(session_id, model, messages) if session_id is not None else None
+        
+        if self.api_mode == 'chat':
+            history = self.sessions.get_history(session_key) if session_key else []
+            system_messages = [m for m in messages if m.get('role') == 'system']
+            turn_messages = [m for m in messages if m.get('role') != 'system']
+            data = {
+                'model': model,
+                'messages': system_messages + history + turn_messages,
+                'stream': stream,
+                'options': self._build_options(temperature, max_tokens),
+                'keep_alive': self.keep_alive
+            }
+            return '/api/chat', data, session_key
+        
+        context = self.sessions.get_context(session_key) if session_key else None
+        if context:
+            latest = [m for m in messages if m.get('role') == 'user'][-1:]
+            data = {
+                'model': model,
+                'prompt': latest[0].get('content', '') if latest else '',
+                'context': context,
+                'stream': stream,
+                'options': self._build_options(temperature, max_tokens),
+                'keep_alive': self.keep_alive
+            }
+        else:
+            data = self._build_generate_request(messages, model, temperature, max_tokens, stream)
+        return '/api/generate', data, session_key
+    
+    @staticmethod
+    def _extract_text(response: Dict[str, Any]) -> str:
+        """
+        从/api/chat或/api/generate的响应（或流式分块）中提取文本
+        """
+        if 'message' in response:
+            return (response.get('message') or {}).get('content', '') or ''
+        return response.get('response', '') or ''
+    
+    def _remember_turn(
+        self,
+        session_key: Optional[Tuple[str, str, str]],
+        messages: List[Dict[str, str]],
+        reply: str,
+        response: Dict[str, Any]
+    ) -> None:
+        """
+        记录会话轮次：chat模式保存对话轮次，generate模式保存返回的context
+        """
+        if session_key is None:
+            return
+        if self.api_mode == 'chat':
+            turn_messages = [m for m in messages if m.get('role') != 'system']
+            self.sessions.append_turn(session_key, turn_messages, reply)
+        elif response.get('context'):
+            self.sessions.set_context(session_key, response['context'])
+    
+    def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        调用Ollama聊天接口
         
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 温度参数
+            max_tokens: 最大令牌数
+            stream: 是否流式输出
+            timeout: 本次调用的超时秒数
+            on_token: 增量文本回调，提供时自动使用流式输出并逐块回调
+            cache: 是否使用确定性结果缓存，仅适用于路由、分类等输出稳定的调用
+            session_id: 会话ID，提供时跨轮复用该会话的上下文
+            
+        Returns:
+            模型回复内容，请求失败时返回错误信息
+        """
         try:
-            if stream:
-                return self._stream_chat_completion(data)
-            else:
-                response = self._make_request('/api/generate', method='POST', data=data)
-                return response.get('response', '')
+            return self.complete(
+                messages, model, temperature, max_tokens, stream, timeout, on_token, cache, session_id
+            )
         except Exception as e:
+            if stream or on_token is not None:
+                return f"流式调用Ollama API时出错: {str(e)}"
             return f"调用Ollama API时出错: {str(e)}"
     
-    def _stream_chat_completion(self, data: Dict[str, Any]) -> str:
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
         """
-        流式聊天补全
+        调用Ollama聊天接口，参数同chat_completion
+        
+        请求失败时抛出异常而不是返回错误信息，供需要区分成功与失败的调用方
+        （如熔断和备用后端切换）使用。
         """
-        url = f"{self.base_url}/api/generate"
-        headers = {'Content-Type': 'application/json'}
+        stream = stream or on_token is not None
+        endpoint, data, session_key = self._prepare_request(
+            messages, model, temperature, max_tokens, stream, session_id
+        )
         
-        try:
-            response = requests.post(url, json=data, headers=headers, stream=True, timeout=self.timeout)
-            response.raise_for_status()
+        def generate() -> str:
+            response = self._make_request(
+                endpoint, method='POST', data=data, timeout=timeout,
+                affinity=self.sessions.affinity_key(session_key)
+            )
+            reply = self._extract_text(response)
+            self._remember_turn(session_key, messages, reply, response)
+            return reply
+        
+        if stream:
+            return self._stream_chat_completion(endpoint, data, timeout, on_token, session_key, messages)
+        elif session_key is not None:
+            # 会话内的对话式生成依赖会话上下文，不参与缓存和请求合并
+            return generate()
+        else:
+            key = llm_result_cache.make_key('ollama', data['model'], messages, temperature, max_tokens)
+            return dispatch_call(key, generate, cache)
+    
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        异步调用Ollama聊天接口，不阻塞事件循环
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 温度参数
+            max_tokens: 最大令牌数
+            timeout: 本次调用的超时秒数
+            cache: 是否使用确定性结果缓存
+            session_id: 会话ID，提供时跨轮复用该会话的上下文
             
-            full_response = ""
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        chunk = json.loads(line.decode('utf-8'))
-                        if 'response' in chunk:
-                            full_response += chunk['response']
+        Returns:
+            模型回复内容，请求失败时返回错误信息
+        """
+        try:
+            return await self.acomplete(messages, model, temperature, max_tokens, timeout, cache, session_id)
+        except Exception as e:
+            return f"调用Ollama API时出错: {str(e)}"
+    
+    async def acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        异步调用Ollama聊天接口，参数同achat_completion，请求失败时抛出异常
+        """
+        endpoint, data, session_key = self._prepare_request(
+            messages, model, temperature, max_tokens, session_id=session_id
+        )
+        
+        async def generate() -> str:
+            response = await self._amake_request(
+                endpoint, method='POST', data=data, timeout=timeout,
+                affinity=self.sessions.affinity_key(session_key)
+            )
+            reply = self._extract_text(response)
+            self._remember_turn(session_key, messages, reply, response)
+            return reply
+        
+        if session_key is not None:
+            return await generate()
+        key = llm_result_cache.make_key('ollama', data['model'], messages, temperature, max_tokens)
+        return await adispatch_call(key, generate, cache)
+    
+    def _stream_chat_completion(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        session_key: Optional[Tuple[str, str, str]] = None,
+        messages: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        流式聊天补全，边接收边回调on_token，最终返回完整文本；请求失败时抛出异常
+        """
+        full_response = ""
+        final_chunk: Dict[str, Any] = {}
+        affinity = self.sessions.affinity_key(session_key)
+        for token in self._iter_stream(endpoint, data, timeout, final_chunk, affinity=affinity):
+            full_response += token
+            if on_token is not None:
+                on_token(token)
+        self._remember_turn(session_key, messages or [], full_response, final_chunk)
+        return full_response
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[Dict[str, Any]]:
+        """
+        解析流式响应中的一行JSON，无法解析时返回None
+        """
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+    
+    def _iter_stream(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None,
+        final_chunk: Optional[Dict[str, Any]] = None,
+        affinity: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        逐块读取流式响应，产出增量文本；final_chunk用于接收最后一个分块（含context等统计字段）
+        """
+        data = {**data, 'stream': True}
+        start = time.monotonic()
+        first_token = None
+        
+        try:
+            with llm_scheduler.slot('ollama'), self.host_pool.lease(data.get('model'), affinity) as host:
+                admitted = time.monotonic()
+                url = f"{host.url}{endpoint}"
+                with self.pool.client.stream('POST', url, json=data, timeout=self.pool.timeout(timeout)) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        chunk = self._parse_stream_line(line)
+                        if chunk is None:
+                            continue
+                        if chunk.get('error'):
+                            # 生成中途出错时Ollama以error分块结束流
+                            raise Exception(f"Ollama API请求失败: {chunk['error']}")
+                        text = self._extract_text(chunk)
+                        if text:
+                            if first_token is None:
+                                first_token = time.monotonic()
+                            yield text
                         if chunk.get('done', False):
+                            if final_chunk is not None:
+                                final_chunk.update(chunk)
+                            llm_telemetry.record_ollama(
+                                data.get('model'),
+                                chunk,
+                                time.monotonic() - admitted,
+                                admitted - start,
+                                first_token - admitted if first_token is not None else None
+                            )
                             break
-                    except json.JSONDecodeError:
-                        continue
+        except httpx.HTTPError as e:
+            llm_telemetry.record('ollama', data.get('model'), error=True)
+            raise Exception(f"Ollama API请求失败: {str(e)}")
+        except Exception:
+            llm_telemetry.record('ollama', data.get('model'), error=True)
+            raise
+    
+    async def _aiter_stream(
+        self,
+        endpoint: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None,
+        final_chunk: Optional[Dict[str, Any]] = None,
+        affinity: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        异步逐块读取流式响应，参数同_iter_stream
+        """
+        data = {**data, 'stream': True}
+        start = time.monotonic()
+        first_token = None
+        
+        try:
+            client = self.pool.async_client
+            async with llm_scheduler.aslot('ollama'):
+                with self.host_pool.lease(data.get('model'), affinity) as host:
+                    admitted = time.monotonic()
+                    url = f"{host.url}{endpoint}"
+                    async with client.stream('POST', url, json=data, timeout=self.pool.timeout(timeout)) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            chunk = self._parse_stream_line(line)
+                            if chunk is None:
+                                continue
+                            if chunk.get('error'):
+                                # 生成中途出错时Ollama以error分块结束流
+                                raise Exception(f"Ollama API请求失败: {chunk['error']}")
+                            text = self._extract_text(chunk)
+                            if text:
+                                if first_token is None:
+                                    first_token = time.monotonic()
+                                yield text
+                            if chunk.get('done', False):
+                                if final_chunk is not None:
+                                    final_chunk.update(chunk)
+                                llm_telemetry.record_ollama(
+                                    data.get('model'),
+                                    chunk,
+                                    time.monotonic() - admitted,
+                                    admitted - start,
+                                    first_token - admitted if first_token is not None else None
+                                )
+                                break
+        except httpx.HTTPError as e:
+            llm_telemetry.record('ollama', data.get('model'), error=True)
+            raise Exception(f"Ollama API请求失败: {str(e)}")
+        except Exception:
+            llm_telemetry.record('ollama', data.get('model'), error=True)
+            raise
+    
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        流式调用Ollama聊天接口，逐块产出模型生成的文本
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 温度参数
+            max_tokens: 最大令牌数
+            timeout: 本次调用的超时秒数
+            session_id: 会话ID，提供时跨轮复用该会话的上下文
             
-            return full_response
-        except Exception as e:
-            return f"流式调用Ollama API时出错: {str(e)}"
+        Returns:
+            增量文本迭代器，请求失败时抛出异常
+        """
+        endpoint, data, session_key = self._prepare_request(
+            messages, model, temperature, max_tokens, True, session_id
+        )
+        reply = ""
+        final_chunk: Dict[str, Any] = {}
+        affinity = self.sessions.affinity_key(session_key)
+        for token in self._iter_stream(endpoint, data, timeout, final_chunk, affinity=affinity):
+            reply += token
+            yield token
+        self._remember_turn(session_key, messages, reply, final_chunk)
+    
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        异步流式调用Ollama聊天接口，参数同stream
+        """
+        endpoint, data, session_key = self._prepare_request(
+            messages, model, temperature, max_tokens, True, session_id
+        )
+        reply = ""
+        final_chunk: Dict[str, Any] = {}
+        affinity = self.sessions.affinity_key(session_key)
+        async for token in self._aiter_stream(endpoint, data, timeout, final_chunk, affinity=affinity):
+            reply += token
+            yield token
+        self._remember_turn(session_key, messages, reply, final_chunk)
     
     def generate(
         self,
@@ -201,51 +799,83 @@ class OllamaClient:
         messages = [{'role': 'user', 'content': prompt}]
         return self.chat_completion(messages, model, temperature, max_tokens)
     
+    async def agenerate(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        异步的简单文本生成接口，参数同generate
+        """
+        messages = [{'role': 'user', 'content': prompt}]
+        return await self.achat_completion(messages, model, temperature, max_tokens)
+    
+    def _on_every_host(self, endpoint: str, data: Dict[str, Any], action: str) -> bool:
+        """
+        向每个节点发送同一个模型管理请求，让所有节点都拥有该模型
+
+        Args:
+            endpoint: API端点
+            data: 请求数据
+            action: 失败时日志中的操作名称
+
+        Returns:
+            是否所有节点都成功
+        """
+        succeeded = True
+        for host in self.hosts:
+            try:
+                response = self._make_request(endpoint, method='POST', data=data, base_url=host)
+                if 'status' not in response:
+                    succeeded = False
+            except Exception as e:
+                print(f"{action}失败({host}): {str(e)}")
+                succeeded = False
+        # 节点上的模型有变化，立即重新探测，按模型路由时能用上新模型
+        if len(self.hosts) > 1:
+            self.host_pool.check_hosts()
+        return succeeded
+    
     def create_model(self, model_name: str, modelfile_path: str) -> bool:
         """
-        创建新模型
+        在所有节点上创建新模型
         
         Args:
             model_name: 模型名称
             modelfile_path: Modelfile路径
             
         Returns:
-            是否创建成功
+            是否所有节点都创建成功
         """
         try:
             # 读取Modelfile
             with open(modelfile_path, 'r', encoding='utf-8') as f:
                 modelfile_content = f.read()
-            
-            # 创建模型
-            data = {
-                'name': model_name,
-                'modelfile': modelfile_content
-            }
-            
-            response = self._make_request('/api/create', method='POST', data=data)
-            return 'status' in response
         except Exception as e:
             print(f"创建模型失败: {str(e)}")
             return False
+        
+        # 创建模型
+        data = {
+            'name': model_name,
+            'modelfile': modelfile_content,
+            'stream': False
+        }
+        return self._on_every_host('/api/create', data, "创建模型")
     
     def pull_model(self, model_name: str) -> bool:
         """
-        拉取模型
+        在所有节点上拉取模型
         
         Args:
             model_name: 模型名称
             
         Returns:
-            是否拉取成功
+            是否所有节点都拉取成功
         """
-        try:
-            data = {'name': model_name}
-            response = self._make_request('/api/pull', method='POST', data=data)
-            return 'status' in response
-        except Exception as e:
-            print(f"拉取模型失败: {str(e)}")
-            return False
+        return self._on_every_host('/api/pull', {'name': model_name, 'stream': False}, "拉取模型")
     
     def get_model_info(self, model_name: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+
+def normalize_model_name(name: str) -> str:
+    """
+    统一模型名称，未带标签的名称补全为:latest，与/api/tags返回的名称一致
+    """
+    return name if ':' in name else f"{name}:latest"
+
+
+class OllamaHost:
+    """
+    单个Ollama节点的状态
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        # 节点上已有的模型，None表示尚未探测
+        self.models: Optional[Set[str]] = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.last_checked: Optional[float] = None
+
+    def has_model(self, model: Optional[str]) -> bool:
+        """节点是否有指定模型，未探测或未指定模型时视为有"""
+        if model is None or self.models is None:
+            return True
+        return normalize_model_name(model) in self.models
+
+    def to_dict(self) -> Dict[str, Any]:
+        """节点状态快照"""
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": sorted(self.models) if self.models is not None else None,
+            "queue_depth": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "last_checked": self.last_checked
+        }
+
+
+class OllamaHostPool:
+    """
+    多节点Ollama负载均衡
+
+    每次调用选择拥有所需模型的健康节点中进行中请求最少的一个，相同时按延迟均值选择。
+    同一会话优先回到上次的节点以复用其KV缓存，除非该节点明显比其他节点更忙。
+    后台线程定期探测各节点的健康状态和模型列表；请求连续失败达到上限时节点会被
+    标记为不健康，直到下一次探测成功。只有一个节点时不启动探测，行为与单节点一致。
+    """
+
+    # 延迟指数滑动平均的权重
+    LATENCY_ALPHA = 0.2
+    # 会话亲和记录的最大数量
+    MAX_AFFINITY = 4096
+
+    def __init__(
+        self,
+        urls: List[str],
+        probe: Optional[Callable[[str], Tuple[bool, List[str]]]] = None,
+        health_check_interval: float = 15,
+        max_failures: int = 2
+    ):
+        """
+        Args:
+            urls: 节点地址列表
+            probe: 探测函数，接收节点地址，返回(是否健康, 模型列表)
+            health_check_interval: 探测间隔秒数，小于等于0时不做后台探测
+            max_failures: 连续失败多少次后标记为不健康
+        """
+        if not urls:
+            raise ValueError("至少需要一个Ollama节点")
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.probe = probe
+        self.health_check_interval = health_check_interval
+        self.max_failures = max_failures
+        self._affinity: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def select(self, model: Optional[str] = None, affinity: Optional[str] = None) -> OllamaHost:
+        """
+        选择处理本次调用的节点
+
+        Args:
+            model: 需要的模型名称
+            affinity: 会话亲和键，相同键尽量选择同一节点
+
+        Returns:
+            选中的节点
+        """
+        self._ensure_health_checks()
+        with self._lock:
+            healthy = [host for host in self.hosts if host.healthy]
+            candidates = [host for host in healthy if host.has_model(model)] or healthy or self.hosts
+            best = min(candidates, key=self._load_key)
+            if affinity is not None:
+                preferred_url = self._affinity.get(affinity)
+                for host in candidates:
+                    if host.url == preferred_url and host.outstanding <= best.outstanding + 1:
+                        best = host
+                        break
+            return best
+
+    @staticmethod
+    def _load_key(host: OllamaHost) -> Tuple[int, float]:
+        return host.outstanding, host.latency_ewma if host.latency_ewma is not None else 0.0
+
+    @contextmanager
+    def lease(self, model: Optional[str] = None, affinity: Optional[str] = None) -> Iterator[OllamaHost]:
+        """
+        占用一个节点执行调用，结束后记录延迟和成功/失败
+
+        同步和异步调用都可以使用，占用和释放本身不阻塞。
+
+        Args:
+            model: 需要的模型名称
+            affinity: 会话亲和键
+
+        Returns:
+            选中的节点
+        """
+        host = self.select(model, affinity)
+        with self._lock:
+            host.outstanding += 1
+            host.requests += 1
+        start = time.monotonic()
+        try:
+            yield host
+        except Exception:
+            self._record(host, None)
+            raise
+        else:
+            self._record(host, time.monotonic() - start)
+            if affinity is not None:
+                self._remember_affinity(affinity, host)
+        finally:
+            with self._lock:
+                host.outstanding -= 1
+
+    def _record(self, host: OllamaHost, latency: Optional[float]) -> None:
+        """记录一次调用的结果，latency为None表示失败"""
+        with self._lock:
+            if latency is None:
+                host.failures += 1
+                host.consecutive_failures += 1
+                if host.consecutive_failures >= self.max_failures and len(self.hosts) > 1:
+                    host.healthy = False
+                return
+            host.consecutive_failures = 0
+            host.last_latency = latency
+            if host.latency_ewma is None:
+                host.latency_ewma = latency
+            else:
+                host.latency_ewma += self.LATENCY_ALPHA * (latency - host.latency_ewma)
+
+    def _remember_affinity(self, affinity: str, host: OllamaHost) -> None:
+        with self._lock:
+            self._affinity[affinity] = host.url
+            self._affinity.move_to_end(affinity)
+            while len(self._affinity) > self.MAX_AFFINITY:
+                self._affinity.popitem(last=False)
+
+    def check_hosts(self) -> None:
+        """
+        立即探测所有节点，更新健康状态和模型列表
+        """
+        if self.probe is None:
+            return
+        for host in self.hosts:
+            try:
+                healthy, models = self.probe(host.url)
+            except Exception:
+                healthy, models = False, []
+            with self._lock:
+                host.healthy = healthy
+                host.last_checked = time.time()
+                if healthy:
+                    host.consecutive_failures = 0
+                    host.models = {normalize_model_name(name) for name in models if name}
+
+    def _ensure_health_checks(self) -> None:
+        """首次使用时启动后台探测线程"""
+        if (self._thread is not None or self.probe is None
+                or self.health_check_interval <= 0 or len(self.hosts) < 2):
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._thread.start()
+
+    def _health_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.check_hosts()
+            except Exception as e:
+                print(f"Ollama节点探测失败: {e}")
+            self._stop.wait(self.health_check_interval)
+
+    def stop(self) -> None:
+        """停止后台探测"""
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取各节点的状态
+
+        Returns:
+            节点列表，包含健康状态、模型、队列深度和延迟
+        """
+        with self._lock:
+            return {
+                "health_check_interval": self.health_check_interval,
+                "hosts": [host.to_dict() for host in self.hosts]
+            }
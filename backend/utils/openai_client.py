@@ -1,85 +1,710 @@
+import asyncio
+import contextvars
+import threading
+import time
 import openai
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from config.settings import settings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Callable, Awaitable
 from utils.ollama_client import ollama_client
+from utils.http_pool import HTTPClientPool
+from utils.llm_cache import llm_result_cache, dispatch_call, adispatch_call
+from utils.llm_scheduler import llm_scheduler, LLMOverloadedError
+from utils.circuit_breaker import get_circuit_breaker, CircuitOpenError
+from utils.llm_telemetry import llm_telemetry
 
 
 class OpenAIClient:
     """
     OpenAI客户端封装类，支持Ollama本地模型
+
+    use_ollama决定主后端；配置了llm_fallback_backend时，主后端熔断或调用失败会切换到备用后端，
+    开启对冲后主后端超过延迟分位数仍未返回时，同时向备用后端发起请求，取先返回的结果。
     """
-    
+
     _instance: Optional['OpenAIClient'] = None
-    
+
     def __new__(cls) -> 'OpenAIClient':
         if cls._instance is None:
             cls._instance = super(OpenAIClient, cls).__new__(cls)
             cls._instance._initialized = False
         return cls._instance
-    
+
     def __init__(self):
         if self._initialized:
             return
-            
+
         # 检查是否使用Ollama
         self.use_ollama = getattr(settings, 'use_ollama', False)
-        
-        if self.use_ollama:
-            # 使用Ollama客户端
-            self.ollama_client = ollama_client
-        else:
-            # 使用OpenAI客户端
+        self.timeout = getattr(settings, 'openai_timeout', 60)
+
+        # 主后端和备用后端
+        self.primary = "ollama" if self.use_ollama else "openai"
+        fallback = getattr(settings, 'llm_fallback_backend', '')
+        self.fallback = fallback if fallback in ("ollama", "openai") and fallback != self.primary else None
+        self.breaker_enabled = getattr(settings, 'llm_breaker_enabled', True)
+        self.hedge_enabled = getattr(settings, 'llm_hedge_enabled', False) and self.fallback is not None
+        self.hedge_percentile = getattr(settings, 'llm_hedge_percentile', 0.95)
+        # 每个后端一个线程池：主后端的慢请求占满自己的线程池时，备用请求仍能立即发出
+        self._hedge_executors: Dict[str, ThreadPoolExecutor] = {}
+        self._hedge_executors_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+        # Ollama客户端
+        self.ollama_client = ollama_client
+
+        if "openai" in (self.primary, self.fallback):
+            # 使用OpenAI客户端，底层复用共享的keep-alive连接池
+            self.pool = HTTPClientPool(timeout=self.timeout)
             self.client = openai.OpenAI(
                 api_key=settings.openai_api_key or "sk-xxx",  # 默认值避免报错
-                base_url=settings.openai_base_url
+                base_url=settings.openai_base_url,
+                http_client=self.pool.client
             )
-        
+            self._async_client: Optional[openai.AsyncOpenAI] = None
+            self._async_http_client = None
+
         self._initialized = True
-    
+
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        """
+        获取当前事件循环对应的异步OpenAI客户端
+        """
+        http_client = self.pool.async_client
+        if self._async_client is None or self._async_http_client is not http_client:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=settings.openai_api_key or "sk-xxx",
+                base_url=settings.openai_base_url,
+                http_client=http_client
+            )
+            self._async_http_client = http_client
+        return self._async_client
+
+    def _backends(self) -> List[str]:
+        """按优先顺序排列的后端"""
+        return [self.primary] + ([self.fallback] if self.fallback else [])
+
+    def _error_message(self, error: Exception) -> str:
+        if self.use_ollama:
+            return f"调用Ollama API时出错: {str(error)}"
+        return f"调用OpenAI API时出错: {str(error)}"
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _record_usage(model: str, response: Any, latency: float, queue_time: float) -> None:
+        """记录非流式OpenAI调用的耗时和usage中的令牌数"""
+        usage = getattr(response, 'usage', None)
+        llm_telemetry.record(
+            'openai',
+            model,
+            latency=latency,
+            queue_time=queue_time,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None),
+            output_tokens=getattr(usage, 'completion_tokens', None)
+        )
+
+    @staticmethod
+    def _record_stream(model: str, start: float, admitted: float, first_token: Optional[float], tokens: int) -> None:
+        """记录流式OpenAI调用：输出令牌数按内容分块数计，生成耗时从首个分块算起"""
+        end = time.monotonic()
+        llm_telemetry.record(
+            'openai',
+            model,
+            latency=end - admitted,
+            queue_time=admitted - start,
+            ttft=first_token - admitted if first_token is not None else None,
+            output_tokens=tokens,
+            decode=end - first_token if first_token is not None else None
+        )
+
     def chat_completion(
-        self, 
-        messages: List[Dict[str, str]], 
+        self,
+        messages: List[Dict[str, str]],
         model: str = "deepseek-chat",
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
     ) -> str:
         """
         调用聊天接口，支持OpenAI和Ollama
-        
+
         Args:
             messages: 消息列表
             model: 模型名称
             temperature: 温度参数
             max_tokens: 最大令牌数
-            
+            timeout: 本次调用的超时秒数
+            on_token: 增量文本回调，提供时使用流式输出并逐块回调
+            cache: 是否使用确定性结果缓存，仅适用于路由、分类等输出稳定的调用
+            session_id: 会话ID，Ollama模式下用于跨轮复用上下文；OpenAI接口按前缀自动缓存，无需额外处理
+
         Returns:
             模型回复内容
         """
+        # 记录是否已输出增量文本，已输出时不再切换后端，避免重复输出
+        emitted: List[bool] = []
+        tracked_on_token = None
+        if on_token is not None:
+            def tracked_on_token(token: str) -> None:
+                emitted.append(True)
+                on_token(token)
+
+        def call_for(backend: str) -> Callable[[], str]:
+            return lambda: self._complete(
+                backend, messages, model, temperature, max_tokens, timeout, tracked_on_token, cache, session_id
+            )
+
         try:
-            if self.use_ollama:
-                # 使用Ollama客户端
-                ollama_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
-                return self.ollama_client.chat_completion(
+            if self.hedge_enabled and on_token is None:
+                return self._hedged(call_for)
+            last_error: Optional[Exception] = None
+            for index, backend in enumerate(self._backends()):
+                if index > 0:
+                    if emitted:
+                        break
+                    self._count("fallbacks")
+                try:
+                    return self._guarded(backend, call_for(backend))
+                except Exception as e:
+                    last_error = e
+            raise last_error
+        except Exception as e:
+            return self._error_message(e)
+
+    def _complete(
+        self,
+        backend: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float],
+        on_token: Optional[Callable[[str], None]],
+        cache: bool,
+        session_id: Optional[str]
+    ) -> str:
+        """
+        调用指定后端，失败时抛出异常
+        """
+        if backend == "ollama":
+            # 使用Ollama客户端
+            ollama_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
+            return self.ollama_client.complete(
+                messages=messages,
+                model=ollama_model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                on_token=on_token,
+                cache=cache,
+                session_id=session_id
+            )
+        elif on_token is not None:
+            # 流式输出，边生成边回调
+            full_response = ""
+            for token in self._stream_openai(messages, model, temperature, max_tokens, timeout):
+                full_response += token
+                on_token(token)
+            return full_response
+        else:
+            # 使用OpenAI客户端
+            def generate() -> str:
+                start = time.monotonic()
+                try:
+                    with llm_scheduler.slot('openai'):
+                        admitted = time.monotonic()
+                        response = self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            timeout=timeout if timeout is not None else self.timeout
+                        )
+                except Exception:
+                    llm_telemetry.record('openai', model, error=True)
+                    raise
+                self._record_usage(model, response, time.monotonic() - admitted, admitted - start)
+                return response.choices[0].message.content or ""
+
+            key = llm_result_cache.make_key('openai', model, messages, temperature, max_tokens)
+            return dispatch_call(key, generate, cache)
+
+    def _guarded(self, backend: str, call: Callable[[], str]) -> str:
+        """
+        经熔断器执行调用，记录成功、失败和耗时
+
+        Raises:
+            CircuitOpenError: 后端熔断中
+        """
+        if not self.breaker_enabled:
+            return call()
+        breaker = get_circuit_breaker(backend)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{backend}后端熔断中")
+        start = time.monotonic()
+        try:
+            result = call()
+        except LLMOverloadedError:
+            # 本地排队拒绝不代表后端故障，不计入失败率
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False, time.monotonic() - start)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(True, time.monotonic() - start)
+        return result
+
+    def _get_hedge_executor(self, backend: str) -> ThreadPoolExecutor:
+        """获取执行某个后端对冲请求的线程池（首次使用时创建）"""
+        with self._hedge_executors_lock:
+            executor = self._hedge_executors.get(backend)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix=f"llm-hedge-{backend}")
+                self._hedge_executors[backend] = executor
+            return executor
+
+    def _hedged(self, call_for: Callable[[str], Callable[[], str]]) -> str:
+        """
+        对冲调用：主后端超过延迟分位数仍未返回时向备用后端再发一次请求，取先成功的结果
+
+        主后端失败（含熔断）时立即发起备用请求；延迟样本不足时只做失败切换。
+        同步调用无法中途取消，落后的请求结果会被丢弃。主后端和备用后端的请求在各自的线程池中执行，
+        主后端的线程池排满时请求仍在排队，超过对冲时机后照常发起备用请求。
+        """
+        def submit(backend: str):
+            # 每个请求使用独立的上下文副本，保留调度优先级等上下文变量
+            context = contextvars.copy_context()
+            return self._get_hedge_executor(backend).submit(context.run, self._guarded, backend, call_for(backend))
+
+        delay = None
+        if self.breaker_enabled:
+            delay = get_circuit_breaker(self.primary).latency_percentile(self.hedge_percentile)
+        futures = {submit(self.primary): self.primary}
+        hedged = False
+        done, pending = wait(futures, timeout=delay)
+        if not done:
+            hedged = True
+            self._count("hedged")
+            futures[submit(self.fallback)] = self.fallback
+            pending = set(futures)
+
+        last_error: Optional[BaseException] = None
+        while True:
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    for other in pending:
+                        other.cancel()
+                    if futures[future] != self.primary:
+                        self._count("hedge_wins" if hedged else "fallbacks")
+                    return future.result()
+                last_error = error
+            if not hedged:
+                # 主后端在对冲时机之前就失败了，立即改用备用后端
+                hedged = True
+                self._count("fallbacks")
+                future = submit(self.fallback)
+                futures[future] = self.fallback
+                pending = {future}
+            if not pending:
+                raise last_error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "deepseek-chat",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        异步调用聊天接口，不阻塞事件循环，参数同chat_completion
+        """
+        def call_for(backend: str) -> Callable[[], Awaitable[str]]:
+            return lambda: self._acomplete(
+                backend, messages, model, temperature, max_tokens, timeout, cache, session_id
+            )
+
+        try:
+            if self.hedge_enabled:
+                return await self._ahedged(call_for)
+            last_error: Optional[Exception] = None
+            for index, backend in enumerate(self._backends()):
+                if index > 0:
+                    self._count("fallbacks")
+                try:
+                    return await self._aguarded(backend, call_for(backend))
+                except Exception as e:
+                    last_error = e
+            raise last_error
+        except Exception as e:
+            return self._error_message(e)
+
+    async def _acomplete(
+        self,
+        backend: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float],
+        cache: bool,
+        session_id: Optional[str]
+    ) -> str:
+        """
+        异步调用指定后端，失败时抛出异常
+        """
+        if backend == "ollama":
+            ollama_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
+            return await self.ollama_client.acomplete(
+                messages=messages,
+                model=ollama_model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                cache=cache,
+                session_id=session_id
+            )
+
+        async def generate() -> str:
+            start = time.monotonic()
+            try:
+                async with llm_scheduler.aslot('openai'):
+                    admitted = time.monotonic()
+                    response = await self._get_async_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=timeout if timeout is not None else self.timeout
+                    )
+            except Exception:
+                llm_telemetry.record('openai', model, error=True)
+                raise
+            self._record_usage(model, response, time.monotonic() - admitted, admitted - start)
+            return response.choices[0].message.content or ""
+
+        key = llm_result_cache.make_key('openai', model, messages, temperature, max_tokens)
+        return await adispatch_call(key, generate, cache)
+
+    async def _aguarded(self, backend: str, call: Callable[[], Awaitable[str]]) -> str:
+        """
+        _guarded的异步版本；被取消的调用不计入失败率
+        """
+        if not self.breaker_enabled:
+            return await call()
+        breaker = get_circuit_breaker(backend)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{backend}后端熔断中")
+        start = time.monotonic()
+        try:
+            result = await call()
+        except LLMOverloadedError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False, time.monotonic() - start)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(True, time.monotonic() - start)
+        return result
+
+    async def _ahedged(self, call_for: Callable[[str], Callable[[], Awaitable[str]]]) -> str:
+        """
+        _hedged的异步版本，先成功的请求胜出后取消落后的请求
+        """
+        delay = None
+        if self.breaker_enabled:
+            delay = get_circuit_breaker(self.primary).latency_percentile(self.hedge_percentile)
+        tasks = {asyncio.ensure_future(self._aguarded(self.primary, call_for(self.primary))): self.primary}
+        hedged = False
+        try:
+            done, pending = await asyncio.wait(set(tasks), timeout=delay)
+            if not done:
+                hedged = True
+                self._count("hedged")
+                tasks[asyncio.ensure_future(self._aguarded(self.fallback, call_for(self.fallback)))] = self.fallback
+                pending = set(tasks)
+
+            last_error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if tasks[task] != self.primary:
+                            self._count("hedge_wins" if hedged else "fallbacks")
+                        return task.result()
+                    last_error = error
+                if not hedged:
+                    hedged = True
+                    self._count("fallbacks")
+                    task = asyncio.ensure_future(self._aguarded(self.fallback, call_for(self.fallback)))
+                    tasks[task] = self.fallback
+                    pending = {task}
+                if not pending:
+                    raise last_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "deepseek-chat",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        流式调用聊天接口，逐块产出模型生成的文本
+
+        主后端熔断或在输出任何内容前失败时切换到备用后端。
+
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            temperature: 温度参数
+            max_tokens: 最大令牌数
+            timeout: 本次调用的超时秒数
+            session_id: 会话ID，Ollama模式下用于跨轮复用上下文
+
+        Returns:
+            增量文本迭代器，请求失败时抛出异常
+        """
+        last_error: Optional[Exception] = None
+        for index, backend in enumerate(self._backends()):
+            breaker = get_circuit_breaker(backend) if self.breaker_enabled else None
+            if breaker is not None and not breaker.allow():
+                last_error = CircuitOpenError(f"{backend}后端熔断中")
+                continue
+            if index > 0:
+                self._count("fallbacks")
+            start = time.monotonic()
+            emitted = False
+            try:
+                for token in self._stream_backend(backend, messages, model, temperature, max_tokens, timeout, session_id):
+                    emitted = True
+                    yield token
+            except LLMOverloadedError as e:
+                if breaker is not None:
+                    breaker.release()
+                last_error = e
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(False, time.monotonic() - start)
+                # 已输出部分内容时不再切换后端，避免重复输出
+                if emitted:
+                    raise
+                last_error = e
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record(True, time.monotonic() - start)
+                return
+        raise last_error
+
+    def _stream_backend(
+        self,
+        backend: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float],
+        session_id: Optional[str]
+    ) -> Iterator[str]:
+        """流式调用指定后端"""
+        if backend == "ollama":
+            ollama_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
+            return self.ollama_client.stream(
+                messages=messages,
+                model=ollama_model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                session_id=session_id
+            )
+        return self._stream_openai(messages, model, temperature, max_tokens, timeout)
+
+    def _stream_openai(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float]
+    ) -> Iterator[str]:
+        """流式调用OpenAI兼容接口"""
+        start = time.monotonic()
+        first_token = None
+        tokens = 0
+        try:
+            with llm_scheduler.slot('openai'):
+                admitted = time.monotonic()
+                response = self.client.chat.completions.create(
+                    model=model,
                     messages=messages,
-                    model=ollama_model,
                     temperature=temperature,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    stream=True,
+                    timeout=timeout if timeout is not None else self.timeout
                 )
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token is None:
+                            first_token = time.monotonic()
+                        tokens += 1
+                        yield chunk.choices[0].delta.content
+        except Exception:
+            llm_telemetry.record('openai', model, error=True)
+            raise
+        self._record_stream(model, start, admitted, first_token, tokens)
+
+    async def astream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "deepseek-chat",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        异步流式调用聊天接口，参数同stream
+        """
+        last_error: Optional[Exception] = None
+        for index, backend in enumerate(self._backends()):
+            breaker = get_circuit_breaker(backend) if self.breaker_enabled else None
+            if breaker is not None and not breaker.allow():
+                last_error = CircuitOpenError(f"{backend}后端熔断中")
+                continue
+            if index > 0:
+                self._count("fallbacks")
+            start = time.monotonic()
+            emitted = False
+            try:
+                async for token in self._astream_backend(backend, messages, model, temperature, max_tokens, timeout, session_id):
+                    emitted = True
+                    yield token
+            except LLMOverloadedError as e:
+                if breaker is not None:
+                    breaker.release()
+                last_error = e
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(False, time.monotonic() - start)
+                if emitted:
+                    raise
+                last_error = e
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
             else:
-                # 使用OpenAI客户端
-                response = self.client.chat.completions.create(
+                if breaker is not None:
+                    breaker.record(True, time.monotonic() - start)
+                return
+        raise last_error
+
+    def _astream_backend(
+        self,
+        backend: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float],
+        session_id: Optional[str]
+    ) -> AsyncIterator[str]:
+        """异步流式调用指定后端"""
+        if backend == "ollama":
+            ollama_model = getattr(settings, 'ollama_default_model', 'emotion_lora')
+            return self.ollama_client.astream(
+                messages=messages,
+                model=ollama_model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                session_id=session_id
+            )
+        return self._astream_openai(messages, model, temperature, max_tokens, timeout)
+
+    async def _astream_openai(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        timeout: Optional[float]
+    ) -> AsyncIterator[str]:
+        """异步流式调用OpenAI兼容接口"""
+        start = time.monotonic()
+        first_token = None
+        tokens = 0
+        try:
+            async with llm_scheduler.aslot('openai'):
+                admitted = time.monotonic()
+                response = await self._get_async_client().chat.completions.create(
                     model=model,
                     messages=messages,
                     temperature=temperature,
-                    max_tokens=max_tokens
+                    max_tokens=max_tokens,
+                    stream=True,
+                    timeout=timeout if timeout is not None else self.timeout
                 )
-                return response.choices[0].message.content or ""
-        except Exception as e:
-            if self.use_ollama:
-                return f"调用Ollama API时出错: {str(e)}"
-            else:
-                return f"调用OpenAI API时出错: {str(e)}"
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token is None:
+                            first_token = time.monotonic()
+                        tokens += 1
+                        yield chunk.choices[0].delta.content
+        except Exception:
+            llm_telemetry.record('openai', model, error=True)
+            raise
+        self._record_stream(model, start, admitted, first_token, tokens)
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """
+        获取熔断、对冲和备用切换的状态
+
+        Returns:
+            主备后端、各后端熔断器状态，以及对冲次数、对冲胜出次数和备用切换次数
+        """
+        with self._stats_lock:
+            counters = {"hedged": self.hedged, "hedge_wins": self.hedge_wins, "fallbacks": self.fallbacks}
+        return {
+            "primary": self.primary,
+            "fallback": self.fallback,
+            "breaker_enabled": self.breaker_enabled,
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_percentile": self.hedge_percentile,
+            "breakers": {backend: get_circuit_breaker(backend).get_stats() for backend in self._backends()},
+            **counters
+        }
 
 
 # 全局OpenAI客户端实例
-openai_client = OpenAIClient()
\ No newline at end of file
+openai_client = OpenAIClient()
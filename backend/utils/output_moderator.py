@@ -0,0 +1,140 @@
+from typing import Callable, List, Optional, Set
+from utils.keyword_matcher import KeywordMatch, KeywordMatcher
+
+
+DEFAULT_CUTOFF_NOTICE = "……这部分内容不太适合小朋友，我们换个话题聊聊吧！"
+
+
+class OutputBlocked(BaseException):
+    """
+    输出审查中止了生成
+
+    与取消一样继承BaseException，穿过客户端的异常处理直接回到调用方，
+    不会被当作后端故障计入熔断统计，也不会触发备用后端重试。
+    """
+
+    def __init__(self, match: KeywordMatch):
+        super().__init__(f"输出命中敏感词: {match.keyword}")
+        self.match = match
+
+
+class OutputModerator:
+    """
+    模型输出的流式审查
+
+    作为on_token回调包住下游回调，用编译好的关键词自动机逐块扫描输出：
+    可能构成敏感词开头的末尾几个字符暂缓下发，确认后再转发，
+    因此敏感词在下发前就能被打码（redact）或在命中处截断生成（cutoff），
+    额外延迟只有被暂缓的几个字符。
+    """
+
+    def __init__(
+        self,
+        matcher: KeywordMatcher,
+        on_token: Optional[Callable[[str], None]] = None,
+        mode: str = "redact",
+        categories: Optional[Set[str]] = None,
+        mask: str = "*",
+        notice: str = DEFAULT_CUTOFF_NOTICE
+    ):
+        """
+        Args:
+            matcher: 关键词匹配器
+            on_token: 下游增量文本回调
+            mode: redact为把敏感词替换为mask，cutoff为在敏感词处截断并追加提示
+            categories: 只审查这些分类，为空时审查全部
+            mask: 打码字符
+            notice: 截断时追加的提示
+        """
+        self.matcher = matcher
+        self.on_token = on_token
+        self.mode = mode
+        self.categories = categories
+        self.mask = mask
+        self.notice = notice
+        self.matches: List[KeywordMatch] = []
+        self.blocked = False
+        self._stream = matcher.stream(categories)
+        self._raw: List[str] = []
+        self._chars: List[str] = []
+        self._emitted = 0
+
+    def _emit(self, end: int) -> None:
+        if end > self._emitted:
+            text = "".join(self._chars[self._emitted:end])
+            self._emitted = end
+            if self.on_token is not None and text:
+                self.on_token(text)
+
+    def feed(self, token: str) -> None:
+        """
+        输入一块模型输出，可直接作为on_token回调
+
+        Raises:
+            OutputBlocked: cutoff模式下命中敏感词，调用方应停止生成
+        """
+        if self.blocked or not token:
+            return
+        self._raw.append(token)
+        self._chars.extend(token)
+        matches = self._stream.feed(token)
+        if matches:
+            self.matches.extend(matches)
+            if self.mode == "cutoff":
+                cut = min(match.start for match in matches)
+                self._emit(cut)
+                del self._chars[cut:]
+                self.blocked = True
+                if self.on_token is not None:
+                    self.on_token(self.notice)
+                raise OutputBlocked(matches[0])
+            for match in matches:
+                self._chars[match.start:match.end] = self.mask * (match.end - match.start)
+        self._emit(len(self._chars) - self._stream.pending)
+
+    def finish(self, response: str) -> str:
+        """
+        生成结束后下发暂缓的字符，并返回审查后的完整回复
+
+        Args:
+            response: 客户端返回的完整回复；与已输入的文本不一致时（如非流式调用或调用出错）单独审查
+
+        Returns:
+            审查后的回复
+        """
+        if self.blocked:
+            return "".join(self._chars) + self.notice
+        self._emit(len(self._chars))
+        if "".join(self._raw) == response:
+            return "".join(self._chars)
+        return moderate_text(self.matcher, response, self.mode, self.categories, self.mask, self.notice)
+
+
+def moderate_text(
+    matcher: KeywordMatcher,
+    text: str,
+    mode: str = "redact",
+    categories: Optional[Set[str]] = None,
+    mask: str = "*",
+    notice: str = DEFAULT_CUTOFF_NOTICE
+) -> str:
+    """
+    审查一段完整文本
+
+    Args:
+        matcher: 关键词匹配器
+        text: 文本
+        mode: redact或cutoff
+        categories: 只审查这些分类，为空时审查全部
+        mask: 打码字符
+        notice: 截断时追加的提示
+
+    Returns:
+        审查后的文本
+    """
+    moderator = OutputModerator(matcher, mode=mode, categories=categories, mask=mask, notice=notice)
+    try:
+        moderator.feed(text)
+    except OutputBlocked:
+        pass
+    return moderator.finish(text)
@@ -0,0 +1,248 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from config.settings import settings
+
+try:
+    import opencc
+    _T2S = opencc.OpenCC('t2s')
+except Exception:
+    # 未安装opencc时不做繁简转换，其余归一化照常进行
+    _T2S = None
+
+
+def normalize_content(text: str) -> str:
+    """
+    归一化待审查内容，使只有写法差异的消息共用一条安全结论
+
+    全角转半角（NFKC）、繁体转简体、忽略大小写，并去掉空白和标点。
+
+    Args:
+        text: 原始内容
+
+    Returns:
+        归一化后的内容，去掉标点后为空时保留标点
+    """
+    folded = unicodedata.normalize('NFKC', text or '')
+    if _T2S is not None:
+        folded = _T2S.convert(folded)
+    folded = folded.lower()
+    compact = "".join(
+        ch for ch in folded
+        if not ch.isspace() and not unicodedata.category(ch).startswith('P')
+    )
+    return compact or "".join(folded.split())
+
+
+class SafetyVerdictCache:
+    """
+    安全审查结论缓存（内存LRU + 数据库持久化）
+
+    以归一化内容和审查规则指纹的哈希为键，先查内存，未命中再查数据库，
+    使重启后已审查过的内容仍不必再次调用模型。结论超过TTL后失效；
+    审查规则或模型变化时指纹随之变化，旧结论自然不再命中，也可调用invalidate清除。
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 604800, session_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            max_entries: 内存中最多保留的结论数
+            ttl: 结论有效秒数
+            session_factory: 数据库会话工厂，为空时使用db.database.SessionLocal
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.db_errors = 0
+
+    @staticmethod
+    def make_key(content: str, namespace: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            content: 原始内容
+            namespace: 审查规则指纹
+
+        Returns:
+            缓存键
+        """
+        raw = f"{namespace}\n{normalize_content(content)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from db.database import SessionLocal
+        return SessionLocal()
+
+    def _remember(self, key: str, stored_at: float, verdict: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, verdict)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, content: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """
+        读取安全结论
+
+        Args:
+            content: 原始内容
+            namespace: 审查规则指纹
+
+        Returns:
+            缓存的结论（is_safe/issues/filtered_content），未命中或已过期时返回None
+        """
+        key = self.make_key(content, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, verdict = entry
+                if time.time() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return verdict
+                del self._entries[key]
+                self.expirations += 1
+
+        verdict = None
+        try:
+            from models.user import SafetyVerdict
+
+            db = self._session()
+            try:
+                row = db.query(SafetyVerdict).filter(SafetyVerdict.content_hash == key).first()
+                if row is not None:
+                    created_at = row.created_at
+                    if created_at.tzinfo is None:
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    stored_at = created_at.timestamp()
+                    if time.time() - stored_at <= self.ttl:
+                        verdict = row.verdict
+                    else:
+                        db.delete(row)
+                        db.commit()
+                        with self._lock:
+                            self.expirations += 1
+            finally:
+                db.close()
+        except Exception as e:
+            with self._lock:
+                self.db_errors += 1
+            print(f"读取安全结论缓存失败: {e}")
+
+        if verdict is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.db_hits += 1
+        self._remember(key, stored_at, verdict)
+        return verdict
+
+    def set(self, content: str, namespace: str, verdict: Dict[str, Any]) -> None:
+        """
+        保存安全结论，同时写入内存和数据库
+
+        Args:
+            content: 原始内容
+            namespace: 审查规则指纹
+            verdict: 结论（is_safe/issues/filtered_content）
+        """
+        key = self.make_key(content, namespace)
+        stored_at = time.time()
+        now = datetime.fromtimestamp(stored_at, timezone.utc)
+        self._remember(key, stored_at, verdict)
+        try:
+            from models.user import SafetyVerdict
+
+            db = self._session()
+            try:
+                row = db.query(SafetyVerdict).filter(SafetyVerdict.content_hash == key).first()
+                if row is None:
+                    db.add(SafetyVerdict(content_hash=key, namespace=namespace, verdict=verdict, created_at=now))
+                else:
+                    row.verdict = verdict  # type: ignore
+                    row.created_at = now  # type: ignore
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            with self._lock:
+                self.db_errors += 1
+            print(f"保存安全结论缓存失败: {e}")
+
+    def invalidate(self, keep_namespace: Optional[str] = None) -> int:
+        """
+        清除安全结论，在更新安全指导原则或更换审查模型后调用
+
+        Args:
+            keep_namespace: 保留该指纹下的结论，为空时全部清除
+
+        Returns:
+            从数据库删除的条数
+        """
+        with self._lock:
+            self._entries.clear()
+        try:
+            from models.user import SafetyVerdict
+
+            db = self._session()
+            try:
+                query = db.query(SafetyVerdict)
+                if keep_namespace is not None:
+                    query = query.filter(SafetyVerdict.namespace != keep_namespace)
+                deleted = query.delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            with self._lock:
+                self.db_errors += 1
+            print(f"清除安全结论缓存失败: {e}")
+            return 0
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            内存和数据库命中数、未命中数、淘汰和过期数及当前内存条目数
+        """
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                "enabled": getattr(settings, 'safety_verdict_cache_enabled', True),
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "db_errors": self.db_errors
+            }
+
+
+# 全局安全结论缓存实例
+safety_verdict_cache = SafetyVerdictCache(
+    max_entries=getattr(settings, 'safety_verdict_cache_max_entries', 4096),
+    ttl=getattr(settings, 'safety_verdict_cache_ttl', 604800)
+)
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    """同步调用的共享状态"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.shared = 0
+
+
+class _AsyncCall:
+    """异步调用的共享状态"""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    相同请求合并（single-flight）
+
+    并发执行的相同键调用只会真正执行一次，其余调用等待并共享同一结果：
+    - 上游抛出的异常会传递给所有等待者，且不会被记住，下一次调用重新执行
+    - 异步模式下某个等待者被取消不会影响其他等待者；只有当所有等待者
+      都已取消时，才会取消上游请求
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], _AsyncCall] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def do(self, key: str, call: Callable[[], Any]) -> Any:
+        """
+        同步执行调用，相同键的并发调用共享结果
+
+        Args:
+            key: 请求键
+            call: 实际执行的调用
+
+        Returns:
+            调用结果
+        """
+        with self._lock:
+            existing = self._calls.get(key)
+            if existing is None:
+                existing = _Call()
+                self._calls[key] = existing
+                leader = True
+                self.executed += 1
+            else:
+                existing.shared += 1
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            existing.event.wait()
+            if existing.error is not None:
+                raise existing.error
+            return existing.result
+
+        try:
+            existing.result = call()
+            return existing.result
+        except BaseException as e:
+            existing.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            existing.event.set()
+
+    async def ado(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        异步执行调用，相同键的并发调用共享同一个上游任务
+
+        Args:
+            key: 请求键
+            call: 返回协程的调用
+
+        Returns:
+            调用结果
+        """
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+
+        with self._lock:
+            existing = self._async_calls.get(slot)
+            if existing is None:
+                existing = _AsyncCall(loop.create_task(call()))
+                self._async_calls[slot] = existing
+                existing.task.add_done_callback(lambda _task: self._forget(slot, existing))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            existing.waiters += 1
+
+        try:
+            # shield保证单个等待者被取消时不会连带取消共享的上游任务
+            return await asyncio.shield(existing.task)
+        except asyncio.CancelledError:
+            if not existing.task.done():
+                with self._lock:
+                    existing.waiters -= 1
+                    abandon = existing.waiters == 0
+                    if abandon:
+                        self._async_calls.pop(slot, None)
+                        self.cancelled += 1
+                if abandon:
+                    existing.task.cancel()
+            raise
+
+    def _forget(self, slot: Tuple[int, str], entry: _AsyncCall) -> None:
+        """上游任务结束后移除记录，后续调用重新执行"""
+        with self._lock:
+            if self._async_calls.get(slot) is entry:
+                del self._async_calls[slot]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取合并统计信息
+
+        Returns:
+            实际执行数、被合并数、整体取消数和当前进行中的请求数
+        """
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "cancelled": self.cancelled,
+                "in_flight": len(self._calls) + len(self._async_calls)
+            }
+
+
+# 全局LLM请求合并实例
+llm_singleflight = SingleFlight()
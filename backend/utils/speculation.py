@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class SpeculationCancelled(BaseException):
+    """
+    推测执行的结果已被放弃，中止仍在进行的生成
+
+    与OutputBlocked一样继承BaseException，从增量回调中抛出后穿过客户端的异常处理，
+    流式连接随之关闭，不会被当作后端故障计入熔断统计，也不会触发备用后端重试。
+    """
+
+
+class SpeculationStats:
+    """推测执行的命中率、浪费的令牌数和节省的等待时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = 0
+            self.skipped = 0
+            self.hits = 0
+            self.misses = 0
+            self.discarded = 0
+            self.wasted_tokens = 0
+            self.saved_seconds = 0.0
+
+    def record_skip(self) -> None:
+        """没有足够把握猜测目标代理，未推测"""
+        with self._lock:
+            self.skipped += 1
+
+    def record_start(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def record_hit(self, saved_seconds: float) -> None:
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += saved_seconds
+
+    def record_loss(self, tokens: int, discarded: bool) -> None:
+        """
+        记录一次放弃的推测
+
+        Args:
+            tokens: 放弃时已生成的令牌数
+            discarded: 为True时路由与猜测一致但内容被安全检查改写，否则为路由与猜测不一致
+        """
+        with self._lock:
+            if discarded:
+                self.discarded += 1
+            else:
+                self.misses += 1
+            self.wasted_tokens += tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+
+        Returns:
+            推测次数、未推测次数、命中/未命中/丢弃次数、命中率、浪费的令牌数和累计节省的秒数
+        """
+        with self._lock:
+            resolved = self.hits + self.misses + self.discarded
+            return {
+                "started": self.started,
+                "skipped": self.skipped,
+                "hits": self.hits,
+                "misses": self.misses,
+                "discarded": self.discarded,
+                "hit_rate": round(self.hits / resolved, 4) if resolved else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+                "saved_seconds": round(self.saved_seconds, 3)
+            }
+
+
+class SpeculativeRun:
+    """
+    一次推测执行的代理调用
+
+    路由确定前生成的增量文本先缓存起来，不下发给孩子；路由与猜测一致时commit把缓存的文本
+    交给真正的回调并继续转发后续文本，不一致时cancel让下一次回调抛出SpeculationCancelled中止生成。
+    """
+
+    def __init__(self, agent: str, content: str, stats: Optional[SpeculationStats] = None):
+        """
+        Args:
+            agent: 猜测的目标代理
+            content: 推测时使用的用户内容
+            stats: 统计对象，为空时使用全局speculation_stats
+        """
+        self.agent = agent
+        self.content = content
+        self.stats = stats or speculation_stats
+        self.future: Optional[asyncio.Future] = None
+        self.tokens = 0
+        self._buffer: List[str] = []
+        self._sink: Optional[Callable[[str], None]] = None
+        self._cancelled = False
+        self._resolved = False
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started_at = time.monotonic()
+        self._finished_at: Optional[float] = None
+
+    def start(self, call: Callable[[Callable[[str], None]], Any]) -> None:
+        """
+        开始推测执行
+
+        Args:
+            call: 以增量回调为参数发起代理调用的协程函数
+        """
+        self._loop = asyncio.get_running_loop()
+        self.future = asyncio.ensure_future(call(self.on_token))
+        self.future.add_done_callback(self._mark_finished)
+        self.stats.record_start()
+
+    def _mark_finished(self, future: asyncio.Future) -> None:
+        self._finished_at = time.monotonic()
+        # 放弃的推测没有人等待结果，取出异常避免事件循环报告未处理的异常
+        if not future.cancelled():
+            future.exception()
+
+    def on_token(self, token: str) -> None:
+        """代理的增量回调，在执行代理的线程中调用"""
+        with self._lock:
+            if self._cancelled:
+                raise SpeculationCancelled()
+            self.tokens += 1
+            if self._sink is None:
+                self._buffer.append(token)
+                return
+            sink = self._sink
+        sink(token)
+
+    async def commit(self, on_token: Optional[Callable[[str], None]] = None) -> Any:
+        """
+        路由与猜测一致，采用推测结果
+
+        Args:
+            on_token: 真正的增量回调，缓存的文本先依次回调
+
+        Returns:
+            代理调用的结果
+        """
+        committed_at = time.monotonic()
+        with self._lock:
+            self._resolved = True
+            buffered, self._buffer = self._buffer, []
+            self._sink = on_token or (lambda token: None)
+            if on_token is not None:
+                for token in buffered:
+                    on_token(token)
+        try:
+            return await self.future
+        finally:
+            finished_at = self._finished_at if self._finished_at is not None else committed_at
+            self.stats.record_hit(max(0.0, min(finished_at, committed_at) - self._started_at))
+
+    def cancel(self, discarded: bool = False) -> None:
+        """
+        放弃推测结果：已排队未开始的调用直接取消，进行中的生成在下一次回调时中止
+
+        可在任意线程调用，重复调用或已commit时不做任何事。
+
+        Args:
+            discarded: 路由与猜测一致但内容被改写时为True
+        """
+        with self._lock:
+            if self._resolved:
+                return
+            self._resolved = True
+            self._cancelled = True
+            self._buffer = []
+            tokens = self.tokens
+        self.stats.record_loss(tokens, discarded)
+        if self.future is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.future.cancel)
+
+
+# 全局推测执行统计
+speculation_stats = SpeculationStats()